@@ -8,9 +8,10 @@ from starkware.cairo.common.math_cmp import is_nn_le
 from starkware.cairo.common.hash_state import (hash_init,
     hash_update, HashState)
 from starkware.cairo.common.alloc import alloc
-from starkware.starknet.common.syscalls import get_caller_address
+from starkware.starknet.common.syscalls import (get_caller_address,
+    get_block_timestamp)
 
-from contracts.utils.market_maker import trade
+from contracts.utils.market_maker import trade, quote
 from contracts.utils.game_constants import (DEALER_DASH_BP,
     WRANGLE_DASHED_DEALER_BP, MUGGING_BP, MUGGING_IMPACT,
     RUN_FROM_MUGGING_BP, GANG_WAR_BP, GANG_WAR_IMPACT,
@@ -18,11 +19,11 @@ from contracts.utils.game_constants import (DEALER_DASH_BP,
     BRIBE_COPS_BP, FIND_ITEM_BP, FIND_ITEM_IMPACT, LOCAL_SHIPMENT_BP,
     LOCAL_SHIPMENT_IMPACT, WAREHOUSE_SEIZURE_BP,
     WAREHOUSE_SEIZURE_IMPACT, MIN_EVENT_FRACTION, MIN_TURN_LOCKOUT, DRUG_LORD_PERCENTAGE, NUM_COMBAT_STATS,
-    LOCATIONS, DISTRICTS, STARTING_MONEY)
+    LOCATIONS, DISTRICTS, CITIES, ITEMS, STARTING_MONEY)
 from contracts.utils.game_structs import UserData, TurnLog
 from contracts.utils.general import scale
 from contracts.utils.game_data_helpers import fetch_user_data
-from contracts.utils.interfaces import (IModuleController,
+from contracts.utils.interfaces import (IModuleController, IArbiter,
     I02_LocationOwned, I03_UserOwned, I04_UserRegistry, I05_Combat,
     I06_DrugLord, I07_PseudoRandom)
 
@@ -44,6 +45,17 @@ from contracts.utils.interfaces import (IModuleController,
 
 # E.g., first location (location_id=0), first item (item_id=1)
 
+############ Clock modes ############
+# By default every turn advances the global game_clock, so every turn
+# in the world reads and writes that slot. After enable_city_clocks()
+# each city (location_id // DISTRICTS) has its own clock, lockout and
+# pseudorandom seed, and turns are logged by (city, clock). Turns in
+# different cities then write no common storage slot (except the
+# balance of a drug lord holding titles in both). The turns of a city
+# are ordered by its clock. Turns in different cities commute, so any
+# merge of the city orders is a valid global order. The block
+# timestamp of each city turn is logged for that merge.
+
 ############ Events ############
 
 # An event emitted whenever have_turn() is called.
@@ -53,6 +65,13 @@ func have_turn_called(
         clock : felt):
 end
 
+# As have_turn_called, in the per-city clock mode.
+@event
+func city_turn_called(
+        city : felt,
+        clock : felt):
+end
+
 ############ Game state ############
 # Records if a user has been initialized (flips to 1 on first turn).
 @storage_var
@@ -75,10 +94,48 @@ func clock_at_previous_turn(user_id : felt) -> (value : felt):
 end
 
 # Stores the information about a turn that can be used for a frontend/testing.
+# Stored at the slot of the clock (see log_slot).
 @storage_var
 func logs_at_given_clock(clock_value : felt) -> (turn_log : TurnLog):
 end
 
+# Number of most recent turns that keep their TurnLog, per clock.
+# 0 (default) keeps all. Otherwise the log of a clock is stored at
+# slot clock % log_retention, overwriting the log of clock -
+# log_retention. Older logs are only available from an archive (see
+# test/utils/turn_archive.py).
+@storage_var
+func log_retention() -> (turns : felt):
+end
+
+# 1 once the per-city clocks are enabled (see Clock modes).
+@storage_var
+func city_clocks_enabled() -> (bool : felt):
+end
+
+# The game clock of each city in the per-city clock mode.
+@storage_var
+func city_clock(city : felt) -> (value : felt):
+end
+
+# The clock of a city recorded during the previous turn of a user there.
+@storage_var
+func city_clock_at_previous_turn(user_id : felt, city : felt) -> (
+        value : felt):
+end
+
+# TurnLogs and block timestamps of the turns in the per-city mode, by
+# slot as logs_at_given_clock.
+@storage_var
+func logs_at_city_clock(city : felt, clock_value : felt) -> (
+        turn_log : TurnLog):
+end
+
+@storage_var
+func city_turn_timestamp(city : felt, clock_value : felt) -> (
+        timestamp : felt):
+end
+
 # Stores the address of the ModuleController.
 @storage_var
 func controller_address() -> (address : felt):
@@ -100,6 +157,44 @@ func constructor{
     return ()
 end
 
+# Switches have_turn() to per-city clocks. One-way: turns before the
+# switch stay logged by the global clock.
+@external
+func enable_city_clocks{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }():
+    only_admin()
+    let (enabled) = city_clocks_enabled.read()
+    assert enabled = 0
+    city_clocks_enabled.write(1)
+    init_city_clocks(CITIES)
+    return ()
+end
+
+# Sets log_retention. Only once, before the first turn, so that every
+# log is in the ring.
+@external
+func set_log_retention{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        turns : felt
+    ):
+    only_admin()
+    assert_not_zero(turns)
+    let (retention) = log_retention.read()
+    assert retention = 0
+    let (clock) = game_clock.read()
+    assert clock = MIN_TURN_LOCKOUT
+    let (city_mode) = city_clocks_enabled.read()
+    assert city_mode = 0
+    log_retention.write(turns)
+    return ()
+end
+
 ############ Game functions ############
 # Actions turn (move user, execute trade).
 @external
@@ -127,12 +222,15 @@ func have_turn{
     # E.g., Buy using 120 units of money. amount_to_give = 120.
     # Record initial state for UI and QA.
     let (local controller) = controller_address.read()
+    let (local city_mode) = city_clocks_enabled.read()
+    let (local city, _) = unsigned_div_rem(location_id, DISTRICTS)
+    # The pseudorandom seed: 0 is the global seed, else that of city + 1.
+    local seed_id = city_mode * (city + 1)
 
     let (local location_owned_addr) = IModuleController.get_module_address(
         controller, 2)
-    let (local market_pre_trade_item) = I02_LocationOwned.location_has_item_read(
-        location_owned_addr, location_id, item_id)
-    let (local market_pre_trade_money) = I02_LocationOwned.location_has_money_read(
+    let (local market_pre_trade_item,
+        local market_pre_trade_money) = I02_LocationOwned.read_pair(
         location_owned_addr, location_id, item_id)
 
     let (local user_owned_addr) = IModuleController.get_module_address(
@@ -151,15 +249,13 @@ func have_turn{
     # Drug lord takes a cut.
     let (local amount_to_give_post_cut) = take_cut(user_id,
         location_id, buy_or_sell, item_id,
-        amount_to_give)
+        amount_to_give, city_mode)
     let b = a
     # Affect pseudorandom seed at start of turn.
     # User can grind a favourable number by incrementing lots of 10.
     let (low_precision_quant, _) = unsigned_div_rem(amount_to_give_post_cut, 10)
-    let (pseudo_random_addr) = IModuleController.get_module_address(
-        controller, 7)
-    let (pseudorandom) = I07_PseudoRandom.add_to_seed(
-        pseudo_random_addr, item_id, amount_to_give_post_cut)
+    let (pseudorandom) = add_to_turn_seed(seed_id, item_id,
+        amount_to_give_post_cut)
     # Get all events for this turn.
     # For UI, pass through values temporarily (in lieu of 'events').
     let (
@@ -178,7 +274,7 @@ func have_turn{
         local find_item_bool : felt,
         local local_shipment_bool : felt,
         local warehouse_seizure_bool : felt
-    ) = get_events(user_data)
+    ) = get_events(user_data, seed_id)
 
     # Apply trade and save results for market QA checks.
     # TODO: QA checks need to account for cut taken by drug_lord.
@@ -186,9 +282,8 @@ func have_turn{
             amount_to_give_post_cut, trade_occurs_bool)
 
     # Save post-trade pre-event state.
-    let (local market_post_trade_pre_event_item) = I02_LocationOwned.location_has_item_read(
-        location_owned_addr, location_id, item_id)
-    let (local market_post_trade_pre_event_money) = I02_LocationOwned.location_has_money_read(
+    let (local market_post_trade_pre_event_item,
+        local market_post_trade_pre_event_money) = I02_LocationOwned.read_pair(
         location_owned_addr, location_id, item_id)
 
     # Apply post-trade money using factors that arose from events.
@@ -209,19 +304,12 @@ func have_turn{
         regional_item_reduction_factor)
 
     # Return the post-trade posmarket_post_trade_post_event_item-event values for UI and QA checks.
-    let (local market_post_trade_post_event_item) = I02_LocationOwned.location_has_item_read(
-        location_owned_addr, location_id, item_id)
-    let (local market_post_trade_post_event_money) = I02_LocationOwned.location_has_money_read(
+    let (local market_post_trade_post_event_item,
+        local market_post_trade_post_event_money) = I02_LocationOwned.read_pair(
         location_owned_addr, location_id, item_id)
 
     # Check that turn for this player is sufficiently spaced.
-    let (current_clock) = game_clock.read()
-    let (last_turn) = clock_at_previous_turn.read(user_id)
-    assert_nn_le(MIN_TURN_LOCKOUT + last_turn, current_clock)
-    # The turn that is happening now is 'current_clock + 1'.
-    game_clock.write(current_clock + 1)
-    clock_at_previous_turn.write(user_id, current_clock + 1)
-
+    let (local clock) = advance_clock(user_id, city_mode, city)
 
     local turn_log : TurnLog
     assert turn_log = TurnLog(user_id=user_id,
@@ -257,8 +345,7 @@ func have_turn{
         local_shipment_bool=local_shipment_bool,
         warehouse_seizure_bool=warehouse_seizure_bool)
 
-    logs_at_given_clock.write(current_clock + 1, turn_log)
-    have_turn_called.emit(current_clock + 1)
+    record_turn(city_mode, city, clock, turn_log)
     return ()
 end
 
@@ -289,10 +376,157 @@ func view_given_turn{
     ) -> (
         turn_log : TurnLog
     ):
-    let (turn_log : TurnLog) = logs_at_given_clock.read(game_clock_at_turn)
+    alloc_locals
+    let (current_clock) = game_clock.read()
+    let (local slot) = retained_log_slot(game_clock_at_turn, current_clock)
+    let (turn_log : TurnLog) = logs_at_given_clock.read(slot)
     return (turn_log)
 end
 
+# Gets log_retention (0 if all logs are kept).
+@view
+func read_log_retention{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }() -> (
+        turns : felt
+    ):
+    let (turns) = log_retention.read()
+    return (turns)
+end
+
+# 1 if turns are on per-city clocks (see Clock modes).
+@view
+func read_clock_mode{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }() -> (
+        city_clocks : felt
+    ):
+    let (city_clocks) = city_clocks_enabled.read()
+    return (city_clocks)
+end
+
+# Gets the clock of the most recent turn in a city.
+@view
+func read_city_clock{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        city : felt
+    ) -> (
+        clock : felt
+    ):
+    assert_nn_le(city, CITIES - 1)
+    let (clock) = city_clock.read(city)
+    return (clock)
+end
+
+# Gets the clocks of all cities, indexed by city.
+@view
+func read_city_clocks{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }() -> (
+        clocks_len : felt,
+        clocks : felt*
+    ):
+    alloc_locals
+    let (local clocks : felt*) = alloc()
+    read_city_clock_range(CITIES, clocks)
+    return (CITIES, clocks)
+end
+
+# Returns the log and block timestamp of a turn in the per-city mode.
+@view
+func view_given_city_turn{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        city : felt,
+        city_clock_at_turn : felt
+    ) -> (
+        turn_log : TurnLog,
+        timestamp : felt
+    ):
+    alloc_locals
+    let (current_clock) = city_clock.read(city)
+    let (local slot) = retained_log_slot(city_clock_at_turn, current_clock)
+    let (local turn_log : TurnLog) = logs_at_city_clock.read(city, slot)
+    let (timestamp) = city_turn_timestamp.read(city, slot)
+    return (turn_log, timestamp)
+end
+
+
+# Quotes a have_turn trade for the caller without writing anything: the
+# amount left after the drug lord cut, what the user would get for it
+# and the market before the trade (generated if uninitialized).
+# user_gets is 0 if the trade would fail. Events of the turn (e.g.,
+# dealer dash, mugging, regional supply) are not included. A call
+# without an account is quoted as a user who is not the drug lord.
+@view
+func quote_trade{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        location_id : felt,
+        buy_or_sell : felt,
+        item_id : felt,
+        amount_to_give : felt
+    ) -> (
+        amount_to_give_post_cut : felt,
+        user_gets : felt,
+        market_item_quantity : felt,
+        market_money_quantity : felt
+    ):
+    alloc_locals
+    assert_nn_le(buy_or_sell, 1)
+    assert_nn_le(item_id - 1, ITEMS - 1)
+    let (local user_id) = get_caller_address()
+    let (local location_owned_addr, local drug_lord_addr) = quote_modules()
+    let (amount_to_give_post_cut, user_gets, market_item_quantity,
+        market_money_quantity) = quote_at(location_owned_addr,
+        drug_lord_addr, user_id, location_id, buy_or_sell, item_id,
+        amount_to_give)
+    return (amount_to_give_post_cut, user_gets, market_item_quantity,
+        market_money_quantity)
+end
+
+# quote_trade for one trade at each of a list of locations. Returns the
+# user_gets of each location, in order.
+@view
+func quote_trades{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        buy_or_sell : felt,
+        item_id : felt,
+        amount_to_give : felt,
+        location_ids_len : felt,
+        location_ids : felt*
+    ) -> (
+        user_gets_len : felt,
+        user_gets : felt*
+    ):
+    alloc_locals
+    assert_nn_le(buy_or_sell, 1)
+    assert_nn_le(item_id - 1, ITEMS - 1)
+    let (local user_id) = get_caller_address()
+    let (local location_owned_addr, local drug_lord_addr) = quote_modules()
+    let (local user_gets : felt*) = alloc()
+    quote_locations(location_owned_addr, drug_lord_addr, user_id,
+        buy_or_sell, item_id, amount_to_give, location_ids_len,
+        location_ids, user_gets)
+    return (location_ids_len, user_gets)
+end
+
 
 ############ Helper Functions ############
 # Execute trade
@@ -348,28 +582,22 @@ func execute_trade{
     # Post-receiving balance depends on MarketMaker.
 
     # Record pre-trade market balances.
+    let (local market_item_pre, local market_money_pre) = I02_LocationOwned.read_pair(
+        location_owned_addr, location_id, item_id)
     local market_a_pre
     local market_b_pre
     if buy_or_sell == 0:
         # Buying. A money, B item.
-        let (market_a_pre_temp) = I02_LocationOwned.location_has_money_read(
-            location_owned_addr, location_id, item_id)
-        let (market_b_pre_temp) = I02_LocationOwned.location_has_item_read(
-            location_owned_addr, location_id, item_id)
-        assert market_a_pre = market_a_pre_temp
-        assert market_b_pre = market_b_pre_temp
+        assert market_a_pre = market_money_pre
+        assert market_b_pre = market_item_pre
     else:
         # Selling. A item, B money.
-        let (market_a_pre_temp) = I02_LocationOwned.location_has_item_read(
-            location_owned_addr, location_id, item_id)
-        let (market_b_pre_temp) = I02_LocationOwned.location_has_money_read(
-            location_owned_addr, location_id, item_id)
-        assert market_a_pre = market_a_pre_temp
-        assert market_b_pre = market_b_pre_temp
+        assert market_a_pre = market_item_pre
+        assert market_b_pre = market_money_pre
     end
 
     # Execute trade by calling the market maker contract.
-    let (market_a_post, market_b_post, user_gets_b) = trade(
+    let (local market_a_post, local market_b_post, local user_gets_b) = trade(
         market_a_pre, market_b_pre, amount_to_give)
 
     # Post-receiving balance depends on user_gets_b.
@@ -377,22 +605,20 @@ func execute_trade{
     # Save increased balance to state.
     I03_UserOwned.user_has_item_write(user_owned_addr, user_id, receiving_id, user_b_post)
 
-    # Update post-trade states (market & user, items a & b).
+    # Update post-trade market state (items a & b).
+    local market_item_post
+    local market_money_post
     if buy_or_sell == 0:
-        # User bought item. A is money.
-        I02_LocationOwned.location_has_money_write(
-            location_owned_addr, location_id, item_id, market_a_post)
-        # B is item.
-        I02_LocationOwned.location_has_item_write(
-            location_owned_addr, location_id, item_id, market_b_post)
+        # User bought item. A is money, B is item.
+        assert market_money_post = market_a_post
+        assert market_item_post = market_b_post
     else:
-        # User sold item. A is item.
-        I02_LocationOwned.location_has_item_write(
-            location_owned_addr, location_id, item_id, market_a_post)
-        # B is money.
-        I02_LocationOwned.location_has_money_write(
-            location_owned_addr, location_id, item_id, market_b_post)
+        # User sold item. A is item, B is money.
+        assert market_item_post = market_a_post
+        assert market_money_post = market_b_post
     end
+    I02_LocationOwned.write_pair(location_owned_addr, location_id, item_id,
+        market_item_post, market_money_post)
     return ()
 end
 
@@ -406,7 +632,8 @@ func get_events{
         range_check_ptr,
         bitwise_ptr: BitwiseBuiltin*
     }(
-        user_data : UserData
+        user_data : UserData,
+        seed_id : felt
     ) -> (
         trade_occurs_bool : felt,
         money_reduction_factor : felt,
@@ -460,17 +687,17 @@ func get_events{
         BRIBE_COPS_BP, 0)
 
     # Retrieve events
-    let (local dealer_dash_bool) = event_occured(DEALER_DASH_BP)
-    let (local wrangle_dashed_dealer_bool) = event_occured(wrangle_bp)
-    let (local mugging_bool) = event_occured(mugging_bp)
-    let (local run_from_mugging_bool) = event_occured(run_bp)
-    let (local gang_war_bool) = event_occured(war_bp)
-    let (local defend_gang_war_bool) = event_occured(war_bp)
-    let (local cop_raid_bool) = event_occured(cop_raid_bp)
-    let (local bribe_cops_bool) = event_occured(bribe_bp)
-    let (local find_item_bool) = event_occured(FIND_ITEM_BP)
-    let (local local_shipment_bool) = event_occured(LOCAL_SHIPMENT_BP)
-    let (local warehouse_seizure_bool) = event_occured(WAREHOUSE_SEIZURE_BP)
+    let (local dealer_dash_bool) = event_occured(DEALER_DASH_BP, seed_id)
+    let (local wrangle_dashed_dealer_bool) = event_occured(wrangle_bp, seed_id)
+    let (local mugging_bool) = event_occured(mugging_bp, seed_id)
+    let (local run_from_mugging_bool) = event_occured(run_bp, seed_id)
+    let (local gang_war_bool) = event_occured(war_bp, seed_id)
+    let (local defend_gang_war_bool) = event_occured(war_bp, seed_id)
+    let (local cop_raid_bool) = event_occured(cop_raid_bp, seed_id)
+    let (local bribe_cops_bool) = event_occured(bribe_bp, seed_id)
+    let (local find_item_bool) = event_occured(FIND_ITEM_BP, seed_id)
+    let (local local_shipment_bool) = event_occured(LOCAL_SHIPMENT_BP, seed_id)
+    let (local warehouse_seizure_bool) = event_occured(WAREHOUSE_SEIZURE_BP, seed_id)
 
     # Apply events
     let trade_occurs_bool = 1
@@ -590,18 +817,15 @@ func event_occured{
         range_check_ptr,
         bitwise_ptr: BitwiseBuiltin*
     }(
-        probability_bp : felt
+        probability_bp : felt,
+        seed_id : felt
     ) -> (
         event_boolean : felt
     ):
     # Returns 1 if the event occured, 0 otherwise.
     # Event evaluation = num modulo max_basis_points
     alloc_locals
-    let (controller) = controller_address.read()
-    let (pseudo_random_addr) = IModuleController.get_module_address(
-        controller, 7)
-    let (p_rand_num) = I07_PseudoRandom.get_pseudorandom(
-        pseudo_random_addr)
+    let (p_rand_num) = draw_pseudorandom(seed_id)
     let (_, event) = unsigned_div_rem(p_rand_num, 10000)
 
     # Save pointers here (otherwise revoked by is_nn_le).
@@ -624,49 +848,336 @@ func update_regional_items{
         factor : felt
     ):
     # 76 Locations [0, 75] are divided into 19 cities with 4 suburbs.
-    # location_ids are sequential.
-    # [loc_0_dis_0, loc_0_dis_1, ..., loc_75_dis_3, loc_75_dis_3]
-
-    # For the supplied location_id, find the ids of nearby districts.
-    # E.g., loc 7 is second city third district (city 1, district 3)
-    # 1. City = integer division by number of districts. 7//4 = 1
-    # and location 34 is city index 8.
-    let (city_index, _) = unsigned_div_rem(location_id, DISTRICTS)
-    # Loction id is the city + district index. [0, 3] for 4 districts.
-    # E.g. for city index 8, the location_ids are:
-    # 8 * 4, 8 * 4 + 1, 8 * 4 + 2, 8 * 4 + 3.
-    # So location_id for first city in this region is:
-    let city = city_index * DISTRICTS
-
-    # new = old * factor.
+    # The item side of item_id in all four districts of the city of
+    # location_id is multiplied by factor / 100. 02_LocationOwned
+    # records the factor and applies it when the markets are read.
     let (controller) = controller_address.read()
     let (location_owned_addr) = IModuleController.get_module_address(
         controller, 2)
+    I02_LocationOwned.scale_region(location_owned_addr, location_id,
+        item_id, factor)
+    return ()
+end
+
+# Addresses of the modules read by quotes.
+func quote_modules{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }() -> (
+        location_owned_addr : felt,
+        drug_lord_addr : felt
+    ):
+    alloc_locals
+    let (controller) = controller_address.read()
+    let (local location_owned_addr) = IModuleController.get_module_address(
+        controller, 2)
+    let (drug_lord_addr) = IModuleController.get_module_address(
+        controller, 6)
+    return (location_owned_addr, drug_lord_addr)
+end
+
+# Computes take_cut and execute_trade without writing.
+func quote_at{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        location_owned_addr : felt,
+        drug_lord_addr : felt,
+        user_id : felt,
+        location_id : felt,
+        buy_or_sell : felt,
+        item_id : felt,
+        amount_to_give : felt
+    ) -> (
+        amount_to_give_post_cut : felt,
+        user_gets : felt,
+        market_item_quantity : felt,
+        market_money_quantity : felt
+    ):
+    alloc_locals
+    assert_nn_le(location_id, LOCATIONS - 1)
+    let (local lord_user_id) = I06_DrugLord.drug_lord_read(drug_lord_addr,
+        location_id)
+    # As in take_cut.
+    let (cut_1_PC, _) = unsigned_div_rem(amount_to_give, 100)
+    local lord_cut = cut_1_PC * DRUG_LORD_PERCENTAGE
+    local amount_to_give_post_cut
+    if user_id == lord_user_id:
+        if user_id != 0:
+            # User is the current Drug Lord and does not pay.
+            assert amount_to_give_post_cut = amount_to_give
+        else:
+            # No caller: nobody to match the lord.
+            assert amount_to_give_post_cut = amount_to_give - lord_cut
+        end
+    else:
+        assert amount_to_give_post_cut = amount_to_give - lord_cut
+    end
+    let (local market_item, local market_money) = I02_LocationOwned.quote_pair(
+        location_owned_addr, location_id, item_id)
+    if buy_or_sell == 0:
+        # Buying. A money, B item.
+        let (gets_item) = quote(market_money, market_item,
+            amount_to_give_post_cut)
+        return (amount_to_give_post_cut, gets_item, market_item,
+            market_money)
+    end
+    # Selling. A item, B money.
+    let (gets_money) = quote(market_item, market_money,
+        amount_to_give_post_cut)
+    return (amount_to_give_post_cut, gets_money, market_item, market_money)
+end
+
+# Recursively quotes a trade at count locations.
+func quote_locations{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        location_owned_addr : felt,
+        drug_lord_addr : felt,
+        user_id : felt,
+        buy_or_sell : felt,
+        item_id : felt,
+        amount_to_give : felt,
+        count : felt,
+        location_ids : felt*,
+        user_gets : felt*
+    ):
+    if count == 0:
+        return ()
+    end
+    let (_, gets, _, _) = quote_at(location_owned_addr, drug_lord_addr,
+        user_id, location_ids[0], buy_or_sell, item_id, amount_to_give)
+    assert user_gets[0] = gets
+    quote_locations(location_owned_addr, drug_lord_addr, user_id,
+        buy_or_sell, item_id, amount_to_give, count - 1, location_ids + 1,
+        user_gets + 1)
+    return ()
+end
+
+# Checks that turns of a user are sufficiently spaced and returns the
+# clock of the turn that is happening now.
+func advance_clock{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        user_id : felt,
+        city_mode : felt,
+        city : felt
+    ) -> (
+        clock : felt
+    ):
+    if city_mode == 0:
+        let (clock) = advance_game_clock(user_id)
+        return (clock)
+    end
+    let (city_turn_clock) = advance_city_clock(user_id, city)
+    return (city_turn_clock)
+end
+
+func advance_game_clock{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        user_id : felt
+    ) -> (
+        clock : felt
+    ):
+    alloc_locals
+    let (local current_clock) = game_clock.read()
+    let (last_turn) = clock_at_previous_turn.read(user_id)
+    assert_nn_le(MIN_TURN_LOCKOUT + last_turn, current_clock)
+    # The turn that is happening now is 'current_clock + 1'.
+    game_clock.write(current_clock + 1)
+    clock_at_previous_turn.write(user_id, current_clock + 1)
+    return (current_clock + 1)
+end
+
+# As advance_game_clock, with the clock and lockout of a city.
+func advance_city_clock{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        user_id : felt,
+        city : felt
+    ) -> (
+        clock : felt
+    ):
+    alloc_locals
+    let (local current_clock) = city_clock.read(city)
+    let (last_turn) = city_clock_at_previous_turn.read(user_id, city)
+    assert_nn_le(MIN_TURN_LOCKOUT + last_turn, current_clock)
+    city_clock.write(city, current_clock + 1)
+    city_clock_at_previous_turn.write(user_id, city, current_clock + 1)
+    return (current_clock + 1)
+end
+
+# Stores the log of a turn under the clock of its mode.
+func record_turn{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        city_mode : felt,
+        city : felt,
+        clock : felt,
+        turn_log : TurnLog
+    ):
+    alloc_locals
+    let (local slot) = log_slot(clock)
+    if city_mode == 0:
+        logs_at_given_clock.write(slot, turn_log)
+        have_turn_called.emit(clock)
+        return ()
+    end
+    let (local timestamp) = get_block_timestamp()
+    logs_at_city_clock.write(city, slot, turn_log)
+    city_turn_timestamp.write(city, slot, timestamp)
+    city_turn_called.emit(city, clock)
+    return ()
+end
+
+# The storage slot of the log of a clock (see log_retention).
+func log_slot{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        clock : felt
+    ) -> (
+        slot : felt
+    ):
+    let (retention) = log_retention.read()
+    if retention == 0:
+        return (clock)
+    end
+    let (_, slot) = unsigned_div_rem(clock, retention)
+    return (slot)
+end
 
-    # Get current count, apply factor, save.
-    let (val_0) = I02_LocationOwned.location_has_item_read(
-        location_owned_addr, city, item_id)
-    let (val_0_new, _) = unsigned_div_rem(val_0 * factor, 100)
-    I02_LocationOwned.location_has_item_write(
-        location_owned_addr, city, item_id, val_0_new)
-
-    let (val_1) = I02_LocationOwned.location_has_item_read(
-        location_owned_addr, city + 1, item_id)
-    let (val_1_new, _) = unsigned_div_rem(val_1 * factor, 100)
-    I02_LocationOwned.location_has_item_write(
-        location_owned_addr, city + 1, item_id, val_1_new)
-
-    let (val_2) = I02_LocationOwned.location_has_item_read(
-        location_owned_addr, city + 2, item_id)
-    let (val_2_new, _) = unsigned_div_rem(val_2 * factor, 100)
-    I02_LocationOwned.location_has_item_write(
-        location_owned_addr, city + 2, item_id, val_2_new)
-
-    let (val_3) = I02_LocationOwned.location_has_item_read(
-        location_owned_addr, city + 3, item_id)
-    let (val_3_new, _) = unsigned_div_rem(val_3 * factor, 100)
-    I02_LocationOwned.location_has_item_write(
-        location_owned_addr, city + 3, item_id, val_3_new)
+# As log_slot, asserting that the log of the clock is still retained:
+# one of the log_retention clocks up to current_clock.
+func retained_log_slot{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        clock : felt,
+        current_clock : felt
+    ) -> (
+        slot : felt
+    ):
+    alloc_locals
+    let (local retention) = log_retention.read()
+    if retention == 0:
+        return (clock)
+    end
+    assert_nn_le(current_clock - clock, retention - 1)
+    let (_, slot) = unsigned_div_rem(clock, retention)
+    return (slot)
+end
+
+# Mixes values into the pseudorandom seed of the turn (see seed_id).
+func add_to_turn_seed{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        seed_id : felt,
+        val0 : felt,
+        val1 : felt
+    ) -> (
+        num_to_use : felt
+    ):
+    alloc_locals
+    let (controller) = controller_address.read()
+    let (local pseudo_random_addr) = IModuleController.get_module_address(
+        controller, 7)
+    if seed_id == 0:
+        let (num_to_use) = I07_PseudoRandom.add_to_seed(
+            pseudo_random_addr, val0, val1)
+        return (num_to_use)
+    end
+    let (city_seed) = I07_PseudoRandom.add_to_city_seed(
+        pseudo_random_addr, seed_id - 1, val0, val1)
+    return (city_seed)
+end
+
+# Draws from the pseudorandom seed of the turn (see seed_id).
+func draw_pseudorandom{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        seed_id : felt
+    ) -> (
+        num_to_use : felt
+    ):
+    alloc_locals
+    let (controller) = controller_address.read()
+    let (local pseudo_random_addr) = IModuleController.get_module_address(
+        controller, 7)
+    if seed_id == 0:
+        let (num_to_use) = I07_PseudoRandom.get_pseudorandom(
+            pseudo_random_addr)
+        return (num_to_use)
+    end
+    let (city_num) = I07_PseudoRandom.get_city_pseudorandom(
+        pseudo_random_addr, seed_id - 1)
+    return (city_num)
+end
+
+func init_city_clocks{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        count : felt
+    ):
+    if count == 0:
+        return ()
+    end
+    # City clocks start where game_clock starts.
+    city_clock.write(count - 1, MIN_TURN_LOCKOUT)
+    init_city_clocks(count - 1)
+    return ()
+end
+
+func read_city_clock_range{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        count : felt,
+        clocks : felt*
+    ):
+    if count == 0:
+        return ()
+    end
+    let (clock) = city_clock.read(count - 1)
+    assert clocks[count - 1] = clock
+    read_city_clock_range(count - 1, clocks)
+    return ()
+end
+
+# Asserts that the caller is the admin (the owner of the Arbiter).
+func only_admin{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }():
+    alloc_locals
+    let (local caller) = get_caller_address()
+    let (controller) = controller_address.read()
+    let (arbiter) = IModuleController.get_arbiter(controller)
+    let (owner) = IArbiter.get_owner(arbiter)
+    assert caller = owner
     return ()
 end
 
@@ -724,7 +1235,8 @@ func take_cut{
         location_id : felt,
         buy_or_sell : felt,
         item_id : felt,
-        amount_to_give : felt
+        amount_to_give : felt,
+        city_mode : felt
     ) -> (
         amount_to_give_post_cut : felt
     ):
@@ -745,6 +1257,13 @@ func take_cut{
     # E.g., amount to give 451. 1pc = 4.51 = 4.
     let (cut_1_PC, _) = unsigned_div_rem(amount_to_give, 100)
     let lord_cut = cut_1_PC * DRUG_LORD_PERCENTAGE
+    if city_mode == 1:
+        if lord_user_id == 0:
+            # Nobody holds the title. Not paid to user 0, whose balance
+            # would be a slot written in every city.
+            return (amount_to_give - lord_cut)
+        end
+    end
     # The drug lord is another user. Increase their money or drug.
     # id = 0 if buying.
     let giving_id = item_id * buy_or_sell
@@ -1,15 +1,16 @@
 %lang starknet
 
+from starkware.cairo.common.alloc import alloc
 from starkware.cairo.common.cairo_builtins import HashBuiltin
-from starkware.cairo.common.math import unsigned_div_rem
+from starkware.cairo.common.math import assert_nn_le, unsigned_div_rem
 from starkware.cairo.common.dict import dict_write, dict_read
 from starkware.cairo.common.default_dict import (default_dict_new,
     default_dict_finalize)
 from starkware.starknet.common.syscalls import get_caller_address
 
-from contracts.utils.interfaces import IModuleController
+from contracts.utils.interfaces import IModuleController, IArbiter
 from contracts.utils.game_constants import (DEFAULT_MARKET_MONEY,
-    DEFAULT_MARKET_ITEM, DISTRICTS)
+    DEFAULT_MARKET_ITEM, DISTRICTS, LOCATIONS, ITEMS)
 
 ##### Module 02 #####
 #
@@ -18,16 +19,61 @@ from contracts.utils.game_constants import (DEFAULT_MARKET_MONEY,
 # curve in each location (76). The markets initially have opaque
 # values and upon first trade, a value is procedurally generated
 # according to a profile that is defined by the nature of the location
-# and the nature of the item. After this point, the value is susceptible
-# to market dynamics and randomised exogenous shocks.
+# and the nature of the item (or ahead of play by init_markets, so the
+# first turns do not pay for it). After this point, the value is
+# susceptible to market dynamics and randomised exogenous shocks.
 # There is no concept of users providing liquidity - they give
 # either money or an item to the curve and receive something in return.
 #
 ####################
 
-# Returns item count for item-money pair in location.
+# Both sides of a market share one storage slot:
+#     packed = (region_turn * PAIR_SHIFT + item_count) * PAIR_SHIFT +
+#         money_count
+# with all three below PAIR_SHIFT. region_turn is the number of turns
+# of the region (see Regional supply) already applied to the counts. A
+# packed value of 0 is a market that has not been initialized, or that
+# is still in the legacy slots.
+# MUST be consistent with BALANCE_UPPER_BOUND in market_maker.cairo.
+const PAIR_SHIFT = 2 ** 64
+
+# Regional supply. Every turn multiplies the item side of the traded
+# item in all districts of the city (a region) by a factor / 100.
+# Rather than writing the four markets, the factor of each turn of a
+# region is recorded, and markets apply the turns they have not seen
+# yet when read. A market is folded (stored with the current turn of
+# its region) when it is written, e.g. by a trade, and the four
+# markets of the region are folded whenever a page fills, so that a
+# read applies at most REGION_PAGE turns whoever plays the region.
+#
+# Turns of a region are numbered from 1. The factors of REGION_PAGE
+# turns are packed in one felt, FACTOR_SHIFT per turn (the first turn
+# lowest). The page of the latest turn is kept in the head:
+#     head = turns * HEAD_SHIFT + factors of the latest page
+# so a turn writes one slot, plus the previous page and the four
+# markets when it is full. Factors are applied one turn at a time (as
+# the item count is rounded down after each factor) and an empty
+# market is generated again before a factor is applied, as read_pair
+# would.
+const FACTOR_SHIFT = 2 ** 8
+const REGION_PAGE = 15
+const HEAD_SHIFT = 2 ** 128
+
+# Returns the packed item-money pair in location.
 # E.g., first location (location_id=0), first item (item_id=1)
 @storage_var
+func market_pair(
+        location_id : felt,
+        item_id : felt
+    ) -> (
+        packed : felt
+    ):
+end
+
+# Legacy storage, one slot per side of a market. Only read for markets
+# that have not been migrated to market_pair (see migrate_markets).
+# Returns item count for item-money pair in location.
+@storage_var
 func location_has_item(
         location_id : felt,
         item_id : felt
@@ -36,8 +82,7 @@ func location_has_item(
     ):
 end
 
-# Returns money count for item-money pair in location.
-# E.g., first location (location_id=0), first item (item_id=1)
+# Legacy storage. Returns money count for item-money pair in location.
 @storage_var
 func location_has_money(
         location_id : felt,
@@ -47,6 +92,28 @@ func location_has_money(
     ):
 end
 
+# Returns the number of turns and the factors of the latest page of a
+# region (packed as above).
+@storage_var
+func region_head(
+        city_index : felt,
+        item_id : felt
+    ) -> (
+        packed : felt
+    ):
+end
+
+# Returns the factors of a full page of turns of a region.
+@storage_var
+func region_page(
+        city_index : felt,
+        item_id : felt,
+        page : felt
+    ) -> (
+        factors : felt
+    ):
+end
+
 @storage_var
 func controller_address() -> (address : felt):
 end
@@ -80,6 +147,43 @@ func update_value{
 end
 
 
+# Returns both sides of a market, initializing it if needed.
+@external
+func read_pair{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        location_id : felt,
+        item_id : felt
+    ) -> (
+        item_quantity : felt,
+        money_quantity : felt
+    ):
+    only_approved()
+    let (item_quantity, money_quantity) = get_pair(location_id, item_id)
+    return (item_quantity, money_quantity)
+end
+
+# Sets both sides of a market.
+@external
+func write_pair{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        location_id : felt,
+        item_id : felt,
+        item_quantity : felt,
+        money_quantity : felt
+    ):
+    only_approved()
+    store_pair(location_id, item_id, item_quantity, money_quantity)
+    return ()
+end
+
+# The single-sided functions below are kept for compatibility. They
+# read and write the packed slot.
 @external
 func location_has_item_read{
         syscall_ptr : felt*,
@@ -92,15 +196,8 @@ func location_has_item_read{
         count : felt
     ):
     only_approved()
-    let (count) = location_has_item.read(location_id, item_id)
-    # If the count is zero, the market has not been initialized.
-    if count == 0:
-        let (item, money) = generate_curve(location_id, item_id)
-        location_has_item.write(location_id, item_id, item)
-        location_has_money.write(location_id, item_id, money)
-        return (item)
-    end
-    return (count)
+    let (item, _) = get_pair(location_id, item_id)
+    return (item)
 end
 
 
@@ -116,15 +213,8 @@ func location_has_money_read{
         count : felt
     ):
     only_approved()
-    let (count) = location_has_money.read(location_id, item_id)
-    # If the count is zero, the market has not been initialized.
-    if count == 0:
-        let (item, money) = generate_curve(location_id, item_id)
-        location_has_item.write(location_id, item_id, item)
-        location_has_money.write(location_id, item_id, money)
-        return (money)
-    end
-    return (count)
+    let (_, money) = get_pair(location_id, item_id)
+    return (money)
 end
 
 @external
@@ -137,8 +227,10 @@ func location_has_item_write{
         item_id : felt,
         count : felt
     ):
+    alloc_locals
     only_approved()
-    location_has_item.write(location_id, item_id, count)
+    let (_, local money, _) = load_market(location_id, item_id)
+    store_pair(location_id, item_id, count, money)
     return ()
 end
 
@@ -152,8 +244,96 @@ func location_has_money_write{
         item_id : felt,
         count : felt
     ):
+    alloc_locals
     only_approved()
-    location_has_money.write(location_id, item_id, count)
+    let (local item, _, _) = load_market(location_id, item_id)
+    store_pair(location_id, item_id, item, count)
+    return ()
+end
+
+# Records a turn of the region of location_id: the item side of item_id
+# in every district of the city is multiplied by factor / 100.
+@external
+func scale_region{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        location_id : felt,
+        item_id : felt,
+        factor : felt
+    ):
+    alloc_locals
+    only_approved()
+    assert_nn_le(factor, FACTOR_SHIFT - 1)
+    let (local city_index, _) = get_indices(location_id)
+    let (local turns, local factors) = read_region_head(city_index,
+        item_id)
+    # The new turn is at position turns % REGION_PAGE of its page.
+    let (local page, local position) = unsigned_div_rem(turns,
+        REGION_PAGE)
+    if position == 0:
+        if turns != 0:
+            # The page of the head is full. Its turns are applied to the
+            # markets of the region, which never lag by more than a page.
+            region_page.write(city_index, item_id, page - 1, factors)
+            fold_region(city_index * DISTRICTS, DISTRICTS, item_id,
+                city_index, turns, factors)
+            tempvar syscall_ptr = syscall_ptr
+            tempvar pedersen_ptr = pedersen_ptr
+            tempvar range_check_ptr = range_check_ptr
+        else:
+            tempvar syscall_ptr = syscall_ptr
+            tempvar pedersen_ptr = pedersen_ptr
+            tempvar range_check_ptr = range_check_ptr
+        end
+        region_head.write(city_index, item_id,
+            (turns + 1) * HEAD_SHIFT + factor)
+        return ()
+    end
+    let (shift) = factor_shift(position)
+    region_head.write(city_index, item_id,
+        (turns + 1) * HEAD_SHIFT + factors + factor * shift)
+    return ()
+end
+
+# Initializes the markets with indices [start, start + count) (see
+# check_market_states for the indices) as their first read would, so
+# that turns do not pay for it. Markets already in market_pair are
+# unchanged. Admin only. See utils/market_pair.py for a driver that
+# sizes the ranges.
+@external
+func init_markets{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        start : felt,
+        count : felt
+    ):
+    only_admin()
+    assert_nn_le(start, LOCATIONS * ITEMS)
+    assert_nn_le(count, LOCATIONS * ITEMS - start)
+    init_market_range(start, count)
+    return ()
+end
+
+# Moves the markets with indices [start, start + count) from the legacy
+# slots to market_pair (see check_market_states for the indices).
+# Markets are moved unchanged, so anyone may call this. Markets that
+# are not touched by this are moved on their next read_pair instead.
+@external
+func migrate_markets{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        start : felt,
+        count : felt
+    ):
+    assert_nn_le(start, LOCATIONS * ITEMS)
+    assert_nn_le(count, LOCATIONS * ITEMS - start)
+    migrate_market_range(start, count)
     return ()
 end
 
@@ -171,13 +351,546 @@ func check_market_state{
         item_quantity : felt,
         money_quantity : felt
     ):
-    alloc_locals
     # Get the quantity held for each item for item-money pair.
-    let (item_quantity) = location_has_item.read(location_id, item_id)
-    let (money_quantity) = location_has_money.read(location_id, item_id)
+    let (item_quantity, money_quantity, _) = load_market(location_id,
+        item_id)
+    return (item_quantity, money_quantity)
+end
+
+# The market as read_pair would return it, without writing: an
+# uninitialized market is generated but not saved.
+@view
+func quote_pair{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        location_id : felt,
+        item_id : felt
+    ) -> (
+        item_quantity : felt,
+        money_quantity : felt
+    ):
+    alloc_locals
+    let (local item, local money, _) = load_market(location_id, item_id)
+    let (item_quantity, money_quantity) = fill_market(location_id,
+        item_id, item, money)
     return (item_quantity, money_quantity)
 end
 
+# Reads many markets in one call. Market index i is the pair
+# location_id = i // ITEMS, item_id = i % ITEMS + 1. Returns the
+# markets with indices [start, start + count). Uninitialized markets
+# are (0, 0), as in check_market_state.
+@view
+func check_market_states{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        start : felt,
+        count : felt
+    ) -> (
+        item_quantities_len : felt,
+        item_quantities : felt*,
+        money_quantities_len : felt,
+        money_quantities : felt*
+    ):
+    alloc_locals
+    assert_nn_le(start, LOCATIONS * ITEMS)
+    assert_nn_le(count, LOCATIONS * ITEMS - start)
+    let (local item_quantities : felt*) = alloc()
+    let (local money_quantities : felt*) = alloc()
+    read_markets(start, count, item_quantities, money_quantities)
+    return (count, item_quantities, count, money_quantities)
+end
+
+# Recursively reads count markets from market index `index`.
+func read_markets{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        index : felt,
+        count : felt,
+        item_quantities : felt*,
+        money_quantities : felt*
+    ):
+    alloc_locals
+    if count == 0:
+        return ()
+    end
+    let (local location_id, local item_index) = unsigned_div_rem(index,
+        ITEMS)
+    let (item_quantity, money_quantity, _) = load_market(location_id,
+        item_index + 1)
+    assert item_quantities[0] = item_quantity
+    assert money_quantities[0] = money_quantity
+    read_markets(index + 1, count - 1, item_quantities + 1,
+        money_quantities + 1)
+    return ()
+end
+
+
+
+##### Packed pairs #####
+
+func pack_pair{
+        range_check_ptr
+    }(
+        item : felt,
+        money : felt,
+        region_turn : felt
+    ) -> (
+        packed : felt
+    ):
+    assert_nn_le(item, PAIR_SHIFT - 1)
+    assert_nn_le(money, PAIR_SHIFT - 1)
+    assert_nn_le(region_turn, PAIR_SHIFT - 1)
+    return ((region_turn * PAIR_SHIFT + item) * PAIR_SHIFT + money)
+end
+
+func unpack_pair{
+        range_check_ptr
+    }(
+        packed : felt
+    ) -> (
+        item : felt,
+        money : felt,
+        region_turn : felt
+    ):
+    alloc_locals
+    let (rest, local money) = unsigned_div_rem(packed, PAIR_SHIFT)
+    let (region_turn, item) = unsigned_div_rem(rest, PAIR_SHIFT)
+    return (item, money, region_turn)
+end
+
+# Reads a market as stored, without writing. from_legacy is 1 if the
+# market is in the legacy slots rather than in market_pair.
+func load_pair{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        location_id : felt,
+        item_id : felt
+    ) -> (
+        item : felt,
+        money : felt,
+        region_turn : felt,
+        from_legacy : felt
+    ):
+    alloc_locals
+    let (packed) = market_pair.read(location_id, item_id)
+    if packed != 0:
+        let (item, money, region_turn) = unpack_pair(packed)
+        return (item, money, region_turn, 0)
+    end
+    let (local item) = location_has_item.read(location_id, item_id)
+    let (local money) = location_has_money.read(location_id, item_id)
+    local total = item + money
+    if total == 0:
+        # Uninitialized.
+        return (0, 0, 0, 0)
+    end
+    return (item, money, 0, 1)
+end
+
+# Reads a market with the turns of its region applied, without
+# writing. An uninitialized market of a region with no turns is (0, 0).
+func load_market{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        location_id : felt,
+        item_id : felt
+    ) -> (
+        item : felt,
+        money : felt,
+        from_legacy : felt
+    ):
+    alloc_locals
+    let (local item, local money, local region_turn,
+        local from_legacy) = load_pair(location_id, item_id)
+    let (local city_index, _) = get_indices(location_id)
+    let (local turns, local factors) = read_region_head(city_index,
+        item_id)
+    let (new_item, new_money) = apply_region_turns(location_id, item_id,
+        city_index, item, money, region_turn, turns, factors)
+    return (new_item, new_money, from_legacy)
+end
+
+# Stores a market as of the current turn of its region.
+func store_pair{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        location_id : felt,
+        item_id : felt,
+        item : felt,
+        money : felt
+    ):
+    alloc_locals
+    let (local city_index, _) = get_indices(location_id)
+    let (turns, _) = read_region_head(city_index, item_id)
+    store_packed(location_id, item_id, item, money, turns)
+    return ()
+end
+
+func store_packed{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        location_id : felt,
+        item_id : felt,
+        item : felt,
+        money : felt,
+        region_turn : felt
+    ):
+    alloc_locals
+    let (local packed) = pack_pair(item, money, region_turn)
+    market_pair.write(location_id, item_id, packed)
+    if packed == 0:
+        # The legacy slots must not show through.
+        clear_legacy(location_id, item_id)
+        return ()
+    end
+    return ()
+end
+
+func clear_legacy{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        location_id : felt,
+        item_id : felt
+    ):
+    location_has_item.write(location_id, item_id, 0)
+    location_has_money.write(location_id, item_id, 0)
+    return ()
+end
+
+# Reads a market. If either side is zero, the market has not been
+# initialized and a value is generated and saved. A legacy market is
+# moved to market_pair.
+func get_pair{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        location_id : felt,
+        item_id : felt
+    ) -> (
+        item : felt,
+        money : felt
+    ):
+    alloc_locals
+    let (local item, local money, local from_legacy) = load_market(
+        location_id, item_id)
+    if item == 0:
+        let (new_item, new_money) = init_pair(location_id, item_id)
+        return (new_item, new_money)
+    end
+    if money == 0:
+        let (new_item, new_money) = init_pair(location_id, item_id)
+        return (new_item, new_money)
+    end
+    if from_legacy == 1:
+        store_pair(location_id, item_id, item, money)
+        clear_legacy(location_id, item_id)
+        return (item, money)
+    end
+    return (item, money)
+end
+
+func init_pair{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        location_id : felt,
+        item_id : felt
+    ) -> (
+        item : felt,
+        money : felt
+    ):
+    alloc_locals
+    let (local item, local money) = generate_curve(location_id, item_id)
+    store_pair(location_id, item_id, item, money)
+    return (item, money)
+end
+
+# Recursively migrates count markets from market index `index`.
+func migrate_market_range{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        index : felt,
+        count : felt
+    ):
+    alloc_locals
+    if count == 0:
+        return ()
+    end
+    let (local location_id, local item_index) = unsigned_div_rem(index,
+        ITEMS)
+    let (item, money, _, from_legacy) = load_pair(location_id,
+        item_index + 1)
+    # Nothing to move if already packed or uninitialized.
+    if from_legacy != 0:
+        # Unchanged: no turn of the region is applied yet.
+        store_packed(location_id, item_index + 1, item, money, 0)
+        clear_legacy(location_id, item_index + 1)
+        tempvar syscall_ptr = syscall_ptr
+        tempvar pedersen_ptr = pedersen_ptr
+        tempvar range_check_ptr = range_check_ptr
+    else:
+        tempvar syscall_ptr = syscall_ptr
+        tempvar pedersen_ptr = pedersen_ptr
+        tempvar range_check_ptr = range_check_ptr
+    end
+    migrate_market_range(index + 1, count - 1)
+    return ()
+end
+
+# Recursively initializes count markets from market index `index`.
+func init_market_range{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        index : felt,
+        count : felt
+    ):
+    if count == 0:
+        return ()
+    end
+    let (location_id, item_index) = unsigned_div_rem(index, ITEMS)
+    init_market(location_id, item_index + 1)
+    init_market_range(index + 1, count - 1)
+    return ()
+end
+
+# Stores a market that is not in market_pair yet, as read_pair would
+# see it: generated if empty, with the turns of its region applied and
+# moved from the legacy slots.
+func init_market{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        location_id : felt,
+        item_id : felt
+    ):
+    alloc_locals
+    let (packed) = market_pair.read(location_id, item_id)
+    if packed != 0:
+        return ()
+    end
+    let (item, money, local from_legacy) = load_market(location_id,
+        item_id)
+    let (filled_item, filled_money) = fill_market(location_id, item_id,
+        item, money)
+    store_pair(location_id, item_id, filled_item, filled_money)
+    if from_legacy != 0:
+        clear_legacy(location_id, item_id)
+        return ()
+    end
+    return ()
+end
+
+##### Regional supply #####
+
+func read_region_head{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        city_index : felt,
+        item_id : felt
+    ) -> (
+        turns : felt,
+        factors : felt
+    ):
+    let (packed) = region_head.read(city_index, item_id)
+    let (turns, factors) = unsigned_div_rem(packed, HEAD_SHIFT)
+    return (turns, factors)
+end
+
+# Recursively applies the turns (region_turn, turns] of a region to a
+# market, a page at a time: each page is read once. factors is the
+# latest page (from the head).
+func apply_region_turns{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        location_id : felt,
+        item_id : felt,
+        city_index : felt,
+        item : felt,
+        money : felt,
+        region_turn : felt,
+        turns : felt,
+        factors : felt
+    ) -> (
+        new_item : felt,
+        new_money : felt
+    ):
+    alloc_locals
+    if region_turn == turns:
+        return (item, money)
+    end
+    # The next turn is at position region_turn % REGION_PAGE of its page.
+    let (local page, local position) = unsigned_div_rem(region_turn,
+        REGION_PAGE)
+    let (latest_page, _) = unsigned_div_rem(turns - 1, REGION_PAGE)
+    local page_factors
+    local page_end
+    if page == latest_page:
+        assert page_factors = factors
+        assert page_end = turns
+        tempvar syscall_ptr = syscall_ptr
+        tempvar pedersen_ptr = pedersen_ptr
+        tempvar range_check_ptr = range_check_ptr
+    else:
+        let (stored_factors) = region_page.read(city_index, item_id, page)
+        assert page_factors = stored_factors
+        assert page_end = (page + 1) * REGION_PAGE
+        tempvar syscall_ptr = syscall_ptr
+        tempvar pedersen_ptr = pedersen_ptr
+        tempvar range_check_ptr = range_check_ptr
+    end
+    let (shift) = factor_shift(position)
+    let (remaining_factors, _) = unsigned_div_rem(page_factors, shift)
+    let (local page_item, local page_money) = apply_page_factors(
+        location_id, item_id, item, money, remaining_factors,
+        page_end - region_turn)
+    let (applied_item, applied_money) = apply_region_turns(location_id,
+        item_id, city_index, page_item, page_money, page_end, turns,
+        factors)
+    return (applied_item, applied_money)
+end
+
+# Recursively applies the lowest count factors of a page (shifted to
+# the first turn to apply) to a market.
+func apply_page_factors{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        location_id : felt,
+        item_id : felt,
+        item : felt,
+        money : felt,
+        factors : felt,
+        count : felt
+    ) -> (
+        new_item : felt,
+        new_money : felt
+    ):
+    alloc_locals
+    if count == 0:
+        return (item, money)
+    end
+    let (local higher, local factor) = unsigned_div_rem(factors,
+        FACTOR_SHIFT)
+    let (filled_item, local filled_money) = fill_market(location_id,
+        item_id, item, money)
+    let (scaled_item, _) = unsigned_div_rem(filled_item * factor, 100)
+    let (applied_item, applied_money) = apply_page_factors(location_id,
+        item_id, scaled_item, filled_money, higher, count - 1)
+    return (applied_item, applied_money)
+end
+
+# Recursively folds count markets of item_id from location_id: the
+# turns of the region up to `turns` (the latest page being factors)
+# are applied and stored. Markets are stored as read_pair would see
+# them, so an uninitialized one is generated and a legacy one moved.
+func fold_region{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        location_id : felt,
+        count : felt,
+        item_id : felt,
+        city_index : felt,
+        turns : felt,
+        factors : felt
+    ):
+    alloc_locals
+    if count == 0:
+        return ()
+    end
+    let (local item, local money, local region_turn,
+        local from_legacy) = load_pair(location_id, item_id)
+    if region_turn == turns:
+        # Written during the latest turn: nothing to apply.
+        fold_region(location_id + 1, count - 1, item_id, city_index,
+            turns, factors)
+        return ()
+    end
+    let (new_item, new_money) = apply_region_turns(location_id, item_id,
+        city_index, item, money, region_turn, turns, factors)
+    store_packed(location_id, item_id, new_item, new_money, turns)
+    if from_legacy != 0:
+        clear_legacy(location_id, item_id)
+        tempvar syscall_ptr = syscall_ptr
+        tempvar pedersen_ptr = pedersen_ptr
+        tempvar range_check_ptr = range_check_ptr
+    else:
+        tempvar syscall_ptr = syscall_ptr
+        tempvar pedersen_ptr = pedersen_ptr
+        tempvar range_check_ptr = range_check_ptr
+    end
+    fold_region(location_id + 1, count - 1, item_id, city_index, turns,
+        factors)
+    return ()
+end
+
+# Returns FACTOR_SHIFT ** position.
+func factor_shift(
+        position : felt
+    ) -> (
+        shift : felt
+    ):
+    if position == 0:
+        return (1)
+    end
+    let (shift) = factor_shift(position - 1)
+    return (shift * FACTOR_SHIFT)
+end
+
+# An empty market (either side 0) is generated again, as in get_pair.
+func fill_market{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        location_id : felt,
+        item_id : felt,
+        item : felt,
+        money : felt
+    ) -> (
+        filled_item : felt,
+        filled_money : felt
+    ):
+    if item == 0:
+        let (new_item, new_money) = generate_curve(location_id, item_id)
+        return (new_item, new_money)
+    end
+    if money == 0:
+        let (new_item, new_money) = generate_curve(location_id, item_id)
+        return (new_item, new_money)
+    end
+    return (item, money)
+end
 
 
 ##### Initial value generation #####
@@ -482,3 +1195,17 @@ func only_approved{
     return ()
 end
 
+# Checks the caller is the owner of the Arbiter.
+func only_admin{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }():
+    alloc_locals
+    let (local caller) = get_caller_address()
+    let (controller) = controller_address.read()
+    let (arbiter) = IModuleController.get_arbiter(controller)
+    let (owner) = IArbiter.get_owner(arbiter)
+    assert caller = owner
+    return ()
+end
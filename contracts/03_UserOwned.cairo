@@ -2,9 +2,11 @@
 
 from starkware.cairo.common.alloc import alloc
 from starkware.cairo.common.cairo_builtins import HashBuiltin
+from starkware.cairo.common.math import assert_nn_le, unsigned_div_rem
 from starkware.starknet.common.syscalls import get_caller_address
 
 from contracts.utils.interfaces import IModuleController
+from contracts.utils.game_constants import ITEMS
 
 ##### Module 03 #####
 #
@@ -14,7 +16,31 @@ from contracts.utils.interfaces import IModuleController
 #
 ####################
 
-# Specify user, item, return quantity.
+# The inventory of a user is money (item 0) and the ITEMS drugs. It is
+# stored as 64-bit balances, three per felt, with a tag above them:
+#     slot = item_id // 3, lane = item_id % 3
+#     packed = lane_0 + lane_1 * 2**64 + lane_2 * 2**128 + 2**192
+# The tag makes a written slot non-zero. A slot that is zero has not
+# been written since packing was introduced: its balances are read
+# from the legacy user_has_item slots, and moved on its first write.
+const BALANCE_SHIFT = 2 ** 64
+const SLOT_TAG = 2 ** 192
+const LANES = 3
+# Money and ITEMS balances.
+const INVENTORY_SIZE = ITEMS + 1
+const INVENTORY_SLOTS = 7
+
+# Specify user, slot, return packed balances.
+@storage_var
+func user_inventory(
+        user_id : felt,
+        slot : felt
+    ) -> (
+        packed : felt
+    ):
+end
+
+# Legacy storage. Specify user, item, return quantity.
 @storage_var
 func user_has_item(
         user_id : felt,
@@ -64,8 +90,20 @@ func user_has_item_write{
         item_id : felt,
         value : felt
     ):
+    alloc_locals
     only_approved()
-    user_has_item.write(user_id, item_id, value)
+    assert_nn_le(item_id, INVENTORY_SIZE - 1)
+    let (local slot, local lane) = unsigned_div_rem(item_id, LANES)
+    let (a, b, c) = load_slot(user_id, slot)
+    if lane == 0:
+        store_slot(user_id, slot, value, b, c)
+        return ()
+    end
+    if lane == 1:
+        store_slot(user_id, slot, a, value, c)
+        return ()
+    end
+    store_slot(user_id, slot, a, b, value)
     return ()
 end
 
@@ -80,8 +118,57 @@ func user_has_item_read{
     ) -> (
         value : felt
     ):
-    let (value) = user_has_item.read(user_id, item_id)
-    return (value)
+    alloc_locals
+    assert_nn_le(item_id, INVENTORY_SIZE - 1)
+    let (slot, local lane) = unsigned_div_rem(item_id, LANES)
+    let (a, b, c) = load_slot(user_id, slot)
+    if lane == 0:
+        return (a)
+    end
+    if lane == 1:
+        return (b)
+    end
+    return (c)
+end
+
+# Returns all balances of a user, indexed by item_id (0 is money).
+@view
+func read_inventory{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        user_id : felt
+    ) -> (
+        items_len : felt,
+        items : felt*
+    ):
+    alloc_locals
+    let (local items : felt*) = alloc()
+    load_slots(user_id, 0, items)
+    return (INVENTORY_SIZE, items)
+end
+
+# Sets all balances of a user, indexed by item_id (0 is money).
+@external
+func write_inventory{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        user_id : felt,
+        items_len : felt,
+        items : felt*
+    ):
+    alloc_locals
+    only_approved()
+    assert items_len = INVENTORY_SIZE
+    # The unused last lane is 0.
+    local last_lanes : felt* = items + (INVENTORY_SLOTS - 1) * LANES
+    store_slots(user_id, 0, INVENTORY_SLOTS - 1, items)
+    store_slot(user_id, INVENTORY_SLOTS - 1, last_lanes[0], last_lanes[1],
+        0)
+    return ()
 end
 
 
@@ -131,51 +218,117 @@ func check_user_state{
     alloc_locals
     # Get the quantity held for each item.
     # Item 0 is money. First drug is item 1.
-    let (money) = user_has_item_read(user_id, 0)
-    let (id1) = user_has_item_read(user_id, 1)
-    let (id2) = user_has_item_read(user_id, 2)
-    let (id3) = user_has_item_read(user_id, 3)
-    let (id4) = user_has_item_read(user_id, 4)
-    let (id5) = user_has_item_read(user_id, 5)
-    let (id6) = user_has_item_read(user_id, 6)
-    let (id7) = user_has_item_read(user_id, 7)
-    let (id8) = user_has_item_read(user_id, 8)
-    let (id9) = user_has_item_read(user_id, 9)
-    let (id10) = user_has_item_read(user_id, 10)
-    let (id11) = user_has_item_read(user_id, 11)
-    let (id12) = user_has_item_read(user_id, 12)
-    let (id13) = user_has_item_read(user_id, 13)
-    let (id14) = user_has_item_read(user_id, 14)
-    let (id15) = user_has_item_read(user_id, 15)
-    let (id16) = user_has_item_read(user_id, 16)
-    let (id17) = user_has_item_read(user_id, 17)
-    let (id18) = user_has_item_read(user_id, 18)
-    let (id19) = user_has_item_read(user_id, 19)
-
-    let (items : felt*) = alloc()
-    assert items[0] = money
-    assert items[1] = id1
-    assert items[2] = id2
-    assert items[3] = id3
-    assert items[4] = id4
-    assert items[5] = id5
-    assert items[6] = id6
-    assert items[7] = id7
-    assert items[8] = id8
-    assert items[9] = id9
-    assert items[10] = id10
-    assert items[11] = id11
-    assert items[12] = id12
-    assert items[13] = id13
-    assert items[14] = id14
-    assert items[15] = id15
-    assert items[16] = id16
-    assert items[17] = id17
-    assert items[18] = id18
-    assert items[19] = id19
+    let (local items_len, local items : felt*) = read_inventory(user_id)
     # Get location
     let (location) = user_in_location.read(user_id)
-    return (20, items, location)
+    return (items_len, items, location)
+end
+
+
+##### Packed inventory #####
+
+# Reads the three balances of a slot.
+func load_slot{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        user_id : felt,
+        slot : felt
+    ) -> (
+        a : felt,
+        b : felt,
+        c : felt
+    ):
+    alloc_locals
+    let (packed) = user_inventory.read(user_id, slot)
+    if packed != 0:
+        let (a, b, c) = unpack_slot(packed)
+        return (a, b, c)
+    end
+    # Not written yet: use the legacy slots.
+    local item_id = slot * LANES
+    let (local a) = user_has_item.read(user_id, item_id)
+    let (local b) = user_has_item.read(user_id, item_id + 1)
+    let (c) = user_has_item.read(user_id, item_id + 2)
+    return (a, b, c)
+end
+
+func store_slot{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        user_id : felt,
+        slot : felt,
+        a : felt,
+        b : felt,
+        c : felt
+    ):
+    assert_nn_le(a, BALANCE_SHIFT - 1)
+    assert_nn_le(b, BALANCE_SHIFT - 1)
+    assert_nn_le(c, BALANCE_SHIFT - 1)
+    user_inventory.write(user_id, slot,
+        a + b * BALANCE_SHIFT + c * BALANCE_SHIFT * BALANCE_SHIFT + SLOT_TAG)
+    return ()
+end
+
+func unpack_slot{
+        range_check_ptr
+    }(
+        packed : felt
+    ) -> (
+        a : felt,
+        b : felt,
+        c : felt
+    ):
+    # Quotients must be below 2**128, so split the 193 bits in the middle.
+    let (high, low) = unsigned_div_rem(packed,
+        BALANCE_SHIFT * BALANCE_SHIFT)
+    let (b, a) = unsigned_div_rem(low, BALANCE_SHIFT)
+    let (_, c) = unsigned_div_rem(high, BALANCE_SHIFT)
+    return (a, b, c)
+end
+
+# Recursively reads slots [slot, INVENTORY_SLOTS) to items.
+func load_slots{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        user_id : felt,
+        slot : felt,
+        items : felt*
+    ):
+    if slot == INVENTORY_SLOTS:
+        return ()
+    end
+    let (a, b, c) = load_slot(user_id, slot)
+    # The last lane of the last slot is unused, and is read as 0.
+    assert items[0] = a
+    assert items[1] = b
+    assert items[2] = c
+    load_slots(user_id, slot + 1, items + LANES)
+    return ()
+end
+
+# Recursively writes the first count slots from items.
+func store_slots{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        user_id : felt,
+        slot : felt,
+        count : felt,
+        items : felt*
+    ):
+    if count == 0:
+        return ()
+    end
+    store_slot(user_id, slot, items[0], items[1], items[2])
+    store_slots(user_id, slot + 1, count - 1, items + LANES)
+    return ()
 end
 
 
@@ -1,9 +1,10 @@
 %lang starknet
 
+from starkware.cairo.common.alloc import alloc
 from starkware.cairo.common.cairo_builtins import (HashBuiltin,
     BitwiseBuiltin)
 from starkware.cairo.common.math import assert_nn_le, unsigned_div_rem
-from starkware.cairo.common.math_cmp import is_nn_le
+from starkware.cairo.common.math_cmp import is_le, is_nn_le
 from starkware.starknet.common.syscalls import get_caller_address
 
 from contracts.utils.game_structs import UserData, Fighter
@@ -15,10 +16,10 @@ from contracts.utils.interfaces import (IModuleController,
 
 ##### Module 05 #####
 #
-# The fighter contract has no storage - it attempts to create complex
+# The fighter contract attempts to create complex
 # interrelated dynamics requiring many computations to make the game
-# interesting. The contract accepts two fighters and emits events
-# during a multi-round battle. The winner is decided and is passed
+# interesting. The contract accepts two fighters and records
+# a multi-round battle. The winner is decided and is passed
 # for storage in module 06. King-of-the-Hill style game. Module 01
 # gives users taxes/cuts in a location if they are the curent Drug Lord.
 #
@@ -28,6 +29,25 @@ from contracts.utils.interfaces import (IModuleController,
 ## [ ] Review the combat structure then implement the fight logic.
 ## [ ] Add token-UserData to the fight logic in addition to the user inputs
 
+# Number of rounds in a fight. Each round both fighters attack.
+const ROUNDS = 10
+# Number of stats read from a combat stats array (see array_to_struct).
+const NUM_FIGHTER_STATS = 16
+# Largest value for a single stat. The quadratic total in
+# are_params_legal already limits a category to 31 (31**2 <= 1000).
+const MAX_STAT = 31
+
+# Combat records. The fighter healths after every attack sequence
+# (two per round) are packed into the move_sequence_* felts:
+# 20 bits per health (offset so a used sequence is never zero, and
+# checked to fit), user health in the low bits, lord health in the
+# high bits of each 40-bit sequence. Five sequences per felt, first sequence in the
+# least significant bits. Unused sequences are zero.
+const HEALTH_BITS = 20
+const HEALTH_OFFSET = 2 ** 19
+const SEQUENCE_SHIFT = 2 ** 40
+const SEQUENCES_PER_FELT = 5
+
 struct AutoCombat:
     member index : felt
     member user : felt
@@ -44,6 +64,16 @@ end
 func controller_address() -> (address : felt):
 end
 
+# Number of combats recorded. The first combat has index 1.
+@storage_var
+func combat_count() -> (value : felt):
+end
+
+# The record of a combat by index.
+@storage_var
+func combat_record(combat_index : felt) -> (combat : AutoCombat):
+end
+
 
 # Called on deployment only.
 @constructor
@@ -85,12 +115,13 @@ func challenge_current_drug_lord{
     let (local user_owned_addr) = IModuleController.get_module_address(
         controller, 3)
     let (local location_id) = I03_UserOwned.user_in_location_read(user_owned_addr, user_id)
-    let (lord_user_id) = I06_DrugLord.drug_lord_read(drug_lord_addr, location_id)
+    let (local lord_user_id) = I06_DrugLord.drug_lord_read(drug_lord_addr, location_id)
 
     let (local user_data : UserData) = fetch_user_data(controller, user_id)
     let (local lord_user_data : UserData) = fetch_user_data(controller, lord_user_id)
 
-    let (win_bool) = fight_lord(
+    let (local combat_log : felt*) = alloc()
+    let (local win_bool, local n_sequences) = fight_lord(
         controller,
         location_id,
         user_id,
@@ -99,41 +130,66 @@ func challenge_current_drug_lord{
         user_combat_stats_len,
         user_combat_stats,
         drug_lord_combat_stats_len,
-        drug_lord_combat_stats,)
-
-    ## [ ] Store win_bool and the events for harvesting by view_combat.
+        drug_lord_combat_stats,
+        combat_log)
 
+    # Store win_bool and the fight for harvesting by view_combat.
+    local winner : felt
+    if win_bool == 1:
+        assert winner = user_id
+    else:
+        assert winner = lord_user_id
+    end
+    let (local seq_1) = pack_combat_log(combat_log, n_sequences, 0)
+    let (local seq_2) = pack_combat_log(combat_log, n_sequences, 1)
+    let (local seq_3) = pack_combat_log(combat_log, n_sequences, 2)
+    let (local seq_4) = pack_combat_log(combat_log, n_sequences, 3)
+    let (count) = combat_count.read()
+    local combat_index = count + 1
+    local combat : AutoCombat
+    assert combat = AutoCombat(
+        index=combat_index,
+        user=user_id,
+        drug_lord=lord_user_id,
+        winner=winner,
+        move_sequence_1=seq_1,
+        move_sequence_2=seq_2,
+        move_sequence_3=seq_3,
+        move_sequence_4=seq_4)
+    combat_count.write(combat_index)
+    combat_record.write(combat_index, combat)
     return ()
 end
 
+# Returns the record of a combat. The move sequences can be decoded
+# with test/utils/combat.py (unpack_combat_log).
 @view
-func view_combat{}(
+func view_combat{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
         combat_index : felt
     ) -> (
         combat_details : AutoCombat
     ):
-    alloc_locals
-
-    local combat : AutoCombat
-
-    # TODO
-    # Store each combat as a packed felt(s) that can be queried for the
-    # result of an autocombat. The data can include details of the fight
-    # that can be used by a front end to communicate the fight after
-    # the transaction has been included.
-
-    # TODO Return actual data.
-    assert combat = AutoCombat(index=0,
-        user=0,
-        drug_lord=0,
-        winner=0,
-        move_sequence_1=0,
-        move_sequence_2=0,
-        move_sequence_3=0,
-        move_sequence_4=0)
+    let (combat) = combat_record.read(combat_index)
     return (combat)
 end
 
+# Returns the number of combats recorded.
+@view
+func read_combat_count{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }() -> (
+        count : felt
+    ):
+    let (count) = combat_count.read()
+    return (count)
+end
+
 
 # Fight the drug lord.
 func fight_lord{
@@ -150,9 +206,11 @@ func fight_lord{
         user_combat_stats_len : felt,
         user_combat_stats : felt*,
         drug_lord_combat_stats_len : felt,
-        drug_lord_combat_stats : felt*
+        drug_lord_combat_stats : felt*,
+        combat_log : felt*
     ) -> (
-        win_bool : felt
+        win_bool : felt,
+        n_sequences : felt
     ):
     alloc_locals
     # Check that the user provided the drug lord stats.
@@ -165,8 +223,14 @@ func fight_lord{
         drug_lord_addr, location_id)
 
 
-    # If no current lord, save and 'win'.
+    # If no current lord, save and 'win'. The stats are checked as a
+    # challenger's would be.
     if current_lord_hash == 0:
+        let (legal_bool) = are_fighter_stats_legal(user_combat_stats_len,
+            user_combat_stats, user_data)
+        if legal_bool == 0:
+            return (win_bool=0, n_sequences=0)
+        end
         local syscall_ptr : felt* = syscall_ptr
         let (user_combat_hash) = list_to_hash(user_combat_stats,
             user_combat_stats_len)
@@ -174,29 +238,30 @@ func fight_lord{
         I06_DrugLord.drug_lord_stat_hash_write(drug_lord_addr,
             location_id, user_combat_hash)
         I06_DrugLord.drug_lord_write(drug_lord_addr, location_id, user_id)
-        return (win_bool=1)
+        return (win_bool=1, n_sequences=0)
     else:
         local syscall_ptr : felt* = syscall_ptr
     end
     # If you fail to provide the current lord stats, pay the tax.
     if current_lord_hash != provided_lord_hash:
-        return (win_bool=0)
+        return (win_bool=0, n_sequences=0)
     end
 
     local pedersen_ptr : HashBuiltin* = pedersen_ptr
 
     # Execute combat.
-    let (local win_bool : felt) = fight_1v1(
+    let (local win_bool : felt, local n_sequences) = fight_1v1(
         user_data,
         lord_user_data,
         user_combat_stats_len,
         user_combat_stats,
         drug_lord_combat_stats_len,
-        drug_lord_combat_stats)
+        drug_lord_combat_stats,
+        combat_log)
     local syscall_ptr : felt* = syscall_ptr
 
     if win_bool == 0:
-        return (win_bool=0)
+        return (win_bool=0, n_sequences=n_sequences)
     end
 
     # Hash and store the user_id and combat stats as new lord.
@@ -207,7 +272,7 @@ func fight_lord{
         location_id, user_combat_hash)
     I06_DrugLord.drug_lord_write(drug_lord_addr, location_id, user_id)
 
-    return(win_bool=1)
+    return(win_bool=1, n_sequences=n_sequences)
 end
 
 
@@ -221,20 +286,30 @@ func fight_1v1{
         user_combat_stats_len : felt,
         user_combat_stats : felt*,
         drug_lord_combat_stats_len : felt,
-        drug_lord_combat_stats : felt*
+        drug_lord_combat_stats : felt*,
+        combat_log : felt*
     ) -> (
-        user_wins_bool : felt
+        user_wins_bool : felt,
+        n_sequences : felt
     ):
     alloc_locals
+    # Both arrays hold exactly the stats read by array_to_struct.
+    assert drug_lord_combat_stats_len = NUM_FIGHTER_STATS
+    # If the user selected illegal parameters, they lose
+    let (legal_bool) = are_fighter_stats_legal(user_combat_stats_len,
+        user_combat_stats, user_data)
+    if legal_bool == 0:
+        return (user_wins_bool=0, n_sequences=0)
+    end
     # Make user stats readable.
     let (local user : Fighter) = array_to_struct(user_combat_stats,
         user_data)
-    # If the user selected illegal parameters, they lose
-    let (legal_params_bool) = are_params_legal(user)
-    local range_check_ptr = range_check_ptr
 
-    if legal_params_bool == 0:
-        return (user_wins_bool=0)
+    # A lord with stats out of range cannot defend the title.
+    let (lord_in_range_bool) = are_stats_in_range(NUM_FIGHTER_STATS,
+        drug_lord_combat_stats)
+    if lord_in_range_bool == 0:
+        return (user_wins_bool=1, n_sequences=0)
     end
 
     # Make lord stats readable.
@@ -242,51 +317,68 @@ func fight_1v1{
         lord_user_data)
 
     # Start fight
-    let (user_wins_bool : felt) = fight(user=user, lord=lord, round=10)
+    let (user_wins_bool : felt, n_sequences) = fight(user=user, lord=lord,
+        user_health=user.health, lord_health=lord.health, round=ROUNDS,
+        combat_log=combat_log)
 
-    return (user_wins_bool=user_wins_bool)
+    return (user_wins_bool=user_wins_bool, n_sequences=n_sequences)
 end
 
 
-# Entry function for the actual fight
+# Entry function for the actual fight. Fighter structs hold the
+# selected stats, health is carried separately as it changes.
 func fight{
         range_check_ptr
     }(
         user : Fighter,
         lord : Fighter,
-        round : felt
+        user_health : felt,
+        lord_health : felt,
+        round : felt,
+        combat_log : felt*
     ) -> (
-        defeated_bool : felt
+        user_wins_bool : felt,
+        n_sequences : felt
     ):
     alloc_locals
-    # If anyone is defeated before the last round, return.
-    let defeated_bool = (1 - user.defeated) * (1 - lord.defeated)
-    if defeated_bool == 0:
-        return (defeated_bool)
-    end
+    # If nobody is defeated after the last round, the lord stays.
     if round == 0:
-        return (defeated_bool)
+        return (user_wins_bool=0, n_sequences=0)
     end
 
-    let (local defeated_bool) = fight(user=user, lord=lord,
-        round=round-1)
-
     # One round is two parts: First attack then be attacked.
 
     # E.g., attack, block attack, defend, block defend
-    let (defeated_bool) = attack_sequence(att=user, def=lord)
+    let (local user_health_1, local lord_health_1) = attack_sequence(
+        att=user, def=lord, att_health=user_health, def_health=lord_health)
+    # Record the healths after each sequence as (user, lord).
+    assert combat_log[0] = user_health_1
+    assert combat_log[1] = lord_health_1
+    let (local user_defeated) = is_le(user_health_1, 0)
+    let (local lord_defeated) = is_le(lord_health_1, 0)
 
     # If anyone is defeated, return.
-    if user.defeated + lord.defeated != 0:
-        return (defeated_bool=1)
+    if user_defeated + lord_defeated != 0:
+        return (user_wins_bool=lord_defeated * (1 - user_defeated),
+            n_sequences=1)
     end
-    let (defeated_bool) = attack_sequence(att=lord, def=user)
+    let (local lord_health_2, local user_health_2) = attack_sequence(
+        att=lord, def=user, att_health=lord_health_1,
+        def_health=user_health_1)
+    assert combat_log[2] = user_health_2
+    assert combat_log[3] = lord_health_2
+    let (local user_defeated_2) = is_le(user_health_2, 0)
+    let (local lord_defeated_2) = is_le(lord_health_2, 0)
 
     # If anyone is defeated, return.
-    if user.defeated + lord.defeated != 0:
-        return (defeated_bool=1)
+    if user_defeated_2 + lord_defeated_2 != 0:
+        return (user_wins_bool=lord_defeated_2 * (1 - user_defeated_2),
+            n_sequences=2)
     end
-    return (defeated_bool=0)
+    let (user_wins_bool, n_sequences) = fight(user=user, lord=lord,
+        user_health=user_health_2, lord_health=lord_health_2,
+        round=round - 1, combat_log=combat_log + 4)
+    return (user_wins_bool, n_sequences + 2)
 end
 
 # Executes a four-part sequence for specified attacker/defender.
@@ -294,22 +386,42 @@ func attack_sequence{
         range_check_ptr
     }(
         att : Fighter,
-        def : Fighter
+        def : Fighter,
+        att_health : felt,
+        def_health : felt
     ) -> (
-        defeated_bool : felt
+        att_health : felt,
+        def_health : felt
     ):
+    alloc_locals
     # In an attack, the defender accumulates damage, however, the
     # attacker may also receive damage from a react action.
-    # Reset the damage cache before the sequence begins.
-    assert att.temp_damage = 0
-    assert def.temp_damage = 0
-    attack(att, def)
-    attack_react(att, def)
-    defence(att, def)
-    defence_react(att, def)
-
-    # TODO: If health < 0, defeated_ool = 1.
-    return (defeated_bool=0)
+    let (local damage) = attack(att, def)
+    let (local react_damage) = attack_react(att, def)
+    let (local damage_reduction) = defence(att, def)
+    let (local counter_damage) = defence_react(att, def)
+
+    # Damage beyond the remaining health stops at 0 (defeated). If the
+    # defender is very strong, being attacked may increase health.
+    local def_damage = damage - damage_reduction + counter_damage
+    let (local att_health_post) = clamp_health(att_health - react_damage)
+    let (def_health_post) = clamp_health(def_health - def_damage)
+    return (att_health_post, def_health_post)
+end
+
+# Health does not go below 0.
+func clamp_health{
+        range_check_ptr
+    }(
+        health : felt
+    ) -> (
+        clamped : felt
+    ):
+    let (defeated) = is_le(health, 0)
+    if defeated == 1:
+        return (0)
+    end
+    return (health)
 end
 
 # Attacker damages the defender.
@@ -318,14 +430,14 @@ func attack{
     }(
         att : Fighter,
         def : Fighter
+    ) -> (
+        damage : felt
     ):
     # TODO More action complexity and dependency.
     # E.g., conditionals, non-linearity, multipliers and modifiers
     # based on other traits.
-    assert def.temp_damage = att.strike * att.strength +
-        att.shoot * att.shoot
-
-    return ()
+    let damage = att.strike * att.strength + att.shoot * att.shoot
+    return (damage)
 end
 
 # Attacker gets damaged by the defender.
@@ -334,9 +446,11 @@ func attack_react{
     }(
         att : Fighter,
         def : Fighter
+    ) -> (
+        damage : felt
     ):
-    assert att.temp_damage = def.iq * def.iq + def.courage * def.psyops
-    return ()
+    let damage = def.iq * def.iq + def.courage * def.psyops
+    return (damage)
 end
 
 # Defender reduces the damage sustained.
@@ -345,18 +459,17 @@ func defence{
     }(
         att : Fighter,
         def : Fighter
+    ) -> (
+        damage_reduction : felt
     ):
-    # TODO
     alloc_locals
     let damage_reduction = def.duck * def.speed + def.climb * def.stamina
     let (no_clout) = is_nn_le(def.notoriety + def.friends, 10)
-    local range_check_ptr = range_check_ptr
     if no_clout == 0:
         # Reduced damage only if has clout.
-        assert damage_reduction = damage_reduction + def.friends * def.friends
+        return (damage_reduction + def.friends * def.friends)
     end
-    assert def.temp_damage = def.temp_damage - damage_reduction
-    return ()
+    return (damage_reduction)
 end
 
 # Attacker counters the defence, and defender sustains damage.
@@ -365,21 +478,110 @@ func defence_react{
     }(
         att : Fighter,
         def : Fighter
+    ) -> (
+        damage : felt
     ):
-    alloc_locals
     let outwit = att.psyops + att.iq
     let (cant_outwit) = is_nn_le(outwit, 10)
-    local range_check_ptr = range_check_ptr
     if cant_outwit == 0:
         # If the attacker outwits, increase damage to defender.
-        assert def.temp_damage = def.temp_damage + att.stamina
+        return (att.stamina)
     end
+    return (0)
+end
 
-    # TODO Make sure negatives are handled (damage > health).
-    # E.g., if the defender is very strong, being attacked may
-    # increase health, which is possibly okay.
-    assert def.health = def.health - def.temp_damage
-    return ()
+
+# Packs the part of a combat log that belongs in the felt_index-th
+# move_sequence felt (zero-based). See HEALTH_BITS for the layout.
+func pack_combat_log{
+        range_check_ptr
+    }(
+        combat_log : felt*,
+        n_sequences : felt,
+        felt_index : felt
+    ) -> (
+        packed : felt
+    ):
+    let start = felt_index * SEQUENCES_PER_FELT
+    let (started) = is_le(start + 1, n_sequences)
+    if started == 0:
+        return (0)
+    end
+    let (full) = is_le(start + SEQUENCES_PER_FELT, n_sequences)
+    if full == 1:
+        let (packed) = pack_sequences(combat_log + start * 2,
+            SEQUENCES_PER_FELT)
+        return (packed)
+    end
+    let (packed) = pack_sequences(combat_log + start * 2,
+        n_sequences - start)
+    return (packed)
+end
+
+# Packs n (user_health, lord_health) pairs, first pair lowest. Each
+# offset health must fit in HEALTH_BITS.
+func pack_sequences{
+        range_check_ptr
+    }(
+        a : felt*,
+        n : felt
+    ) -> (
+        packed : felt
+    ):
+    if n == 0:
+        return (0)
+    end
+    assert_nn_le(a[0] + HEALTH_OFFSET, 2 ** HEALTH_BITS - 1)
+    assert_nn_le(a[1] + HEALTH_OFFSET, 2 ** HEALTH_BITS - 1)
+    let (rest) = pack_sequences(a + 2, n - 1)
+    let user = a[0] + HEALTH_OFFSET
+    let lord = a[1] + HEALTH_OFFSET
+    return (rest * SEQUENCE_SHIFT + lord * 2 ** HEALTH_BITS + user)
+end
+
+
+# Checks that the first n stats are each in the range [0, MAX_STAT].
+func are_stats_in_range{
+        range_check_ptr
+    }(
+        n : felt,
+        stats : felt*
+    ) -> (
+        in_range_bool : felt
+    ):
+    if n == 0:
+        return (1)
+    end
+    let (ok) = is_nn_le(stats[n - 1], MAX_STAT)
+    if ok == 0:
+        return (0)
+    end
+    let (in_range_bool) = are_stats_in_range(n - 1, stats)
+    return (in_range_bool)
+end
+
+
+# Checks the stats of a fighter: exactly NUM_FIGHTER_STATS of them,
+# each in range, and legal params.
+func are_fighter_stats_legal{
+        range_check_ptr
+    }(
+        stats_len : felt,
+        stats : felt*,
+        user_data : UserData
+    ) -> (
+        legal_bool : felt
+    ):
+    alloc_locals
+    assert stats_len = NUM_FIGHTER_STATS
+    # Stats must be small non-negative numbers.
+    let (in_range_bool) = are_stats_in_range(NUM_FIGHTER_STATS, stats)
+    if in_range_bool == 0:
+        return (0)
+    end
+    let (local fighter : Fighter) = array_to_struct(stats, user_data)
+    let (legal_params_bool) = are_params_legal(fighter)
+    return (legal_params_bool)
 end
 
 
@@ -446,6 +648,9 @@ func array_to_struct(
     assert F.health = arr[14] * 10
     assert F.speed = arr[15]
     assert F.core = user_data
+    assert F.score = 0
+    assert F.defeated = 0
+    assert F.temp_damage = 0
 
     return (fighter=F)
 end
\ No newline at end of file
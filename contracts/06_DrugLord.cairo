@@ -1,10 +1,13 @@
 %lang starknet
 
+from starkware.cairo.common.alloc import alloc
 from starkware.cairo.common.cairo_builtins import HashBuiltin
+from starkware.cairo.common.math import assert_nn_le
 from starkware.starknet.common.syscalls import get_caller_address
 
 from contracts.utils.interfaces import IModuleController
 from contracts.utils.game_structs import UserData
+from contracts.utils.game_constants import LOCATIONS
 
 ##### Module 06 #####
 #
@@ -86,7 +89,7 @@ func drug_lord_stat_hash_read{
     ) -> (
         stat_hash : felt
     ):
-    let (stat_hash) = drug_lord.read(location_id)
+    let (stat_hash) = drug_lord_stat_hash.read(location_id)
     return (stat_hash)
 end
 
@@ -101,7 +104,93 @@ func drug_lord_stat_hash_write{
         stat_hash : felt
     ):
     only_approved()
-    drug_lord.write(location_id, stat_hash)
+    drug_lord_stat_hash.write(location_id, stat_hash)
+    return ()
+end
+
+
+# Reads the drug lord and stat hash of many locations in one call.
+# Returns them in the order of location_ids. A location without a
+# drug lord has user_id 0 and stat_hash 0.
+@view
+func drug_lords_read{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        location_ids_len : felt,
+        location_ids : felt*
+    ) -> (
+        user_ids_len : felt,
+        user_ids : felt*,
+        stat_hashes_len : felt,
+        stat_hashes : felt*
+    ):
+    alloc_locals
+    let (local user_ids : felt*) = alloc()
+    let (local stat_hashes : felt*) = alloc()
+    read_lords(location_ids_len, location_ids, user_ids, stat_hashes)
+    return (location_ids_len, user_ids, location_ids_len, stat_hashes)
+end
+
+# Reads the drug lord and stat hash of every location. Index i of the
+# arrays is location_id i.
+@view
+func all_drug_lords_read{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }() -> (
+        user_ids_len : felt,
+        user_ids : felt*,
+        stat_hashes_len : felt,
+        stat_hashes : felt*
+    ):
+    alloc_locals
+    let (local location_ids : felt*) = alloc()
+    fill_range(0, LOCATIONS, location_ids)
+    let (local user_ids : felt*) = alloc()
+    let (local stat_hashes : felt*) = alloc()
+    read_lords(LOCATIONS, location_ids, user_ids, stat_hashes)
+    return (LOCATIONS, user_ids, LOCATIONS, stat_hashes)
+end
+
+# Recursively reads the first count locations of location_ids.
+func read_lords{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        count : felt,
+        location_ids : felt*,
+        user_ids : felt*,
+        stat_hashes : felt*
+    ):
+    alloc_locals
+    if count == 0:
+        return ()
+    end
+    local location_id = location_ids[0]
+    assert_nn_le(location_id, LOCATIONS - 1)
+    let (user_id) = drug_lord.read(location_id)
+    assert user_ids[0] = user_id
+    let (stat_hash) = drug_lord_stat_hash.read(location_id)
+    assert stat_hashes[0] = stat_hash
+    read_lords(count - 1, location_ids + 1, user_ids + 1, stat_hashes + 1)
+    return ()
+end
+
+# Writes start, start + 1, ... (count values) to array.
+func fill_range(
+        start : felt,
+        count : felt,
+        array : felt*
+    ):
+    if count == 0:
+        return ()
+    end
+    assert array[0] = start
+    fill_range(start + 1, count - 1, array + 1)
     return ()
 end
 
@@ -23,6 +23,12 @@ func entropy_seed() -> (value : felt):
 end
 
 
+# Seeds used instead of entropy_seed in the per-city clock mode of
+# 01_DopeWars, so that turns in different cities share no slot.
+@storage_var
+func city_entropy_seed(city : felt) -> (value : felt):
+end
+
 @storage_var
 func controller_address() -> (address : felt):
 end
@@ -54,19 +60,30 @@ func get_pseudorandom{
         num_to_use : felt
     ):
     only_approved()
-    # Seed is fed to linear congruential generator.
-    # seed = (multiplier * seed + increment) % modulus.
-    # Params from GCC. (https://en.wikipedia.org/wiki/Linear_congruential_generator).
     let (old_seed) = entropy_seed.read()
-    # Snip in half to a manageable size for unsigned_div_rem.
-    let (left, right) = split_felt(old_seed)
-    let (_, new_seed) = unsigned_div_rem(1103515245 * right + 1,
-        2**31)
-    # Number has form: 10**9 (xxxxxxxxxx).
+    let (new_seed) = next_seed(old_seed)
     entropy_seed.write(new_seed)
     return (new_seed)
 end
 
+# As get_pseudorandom, from the seed of a city.
+@external
+func get_city_pseudorandom{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        city : felt
+    ) -> (
+        num_to_use : felt
+    ):
+    only_approved()
+    let (old_seed) = city_entropy_seed.read(city)
+    let (new_seed) = next_seed(old_seed)
+    city_entropy_seed.write(city, new_seed)
+    return (new_seed)
+end
+
 # Add to seed. If modules want to make manipulation difficult, make
 # val0 and val1 hard-to-grind values (grinding val0 or val1 will
 # wildly affect their turn and therefore make it largely nonviable).
@@ -91,6 +108,27 @@ func add_to_seed{
     return (new_seed)
 end
 
+# As add_to_seed, to the seed of a city.
+@external
+func add_to_city_seed{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        bitwise_ptr : BitwiseBuiltin*,
+        range_check_ptr
+    }(
+        city : felt,
+        val0 : felt,
+        val1 : felt
+    ) -> (
+        num_to_use : felt
+    ):
+    let (hash) = hash2{hash_ptr=pedersen_ptr}(val0, val1)
+    let (old_seed) = city_entropy_seed.read(city)
+    let (new_seed) = bitwise_xor(hash, old_seed)
+    city_entropy_seed.write(city, new_seed)
+    return (new_seed)
+end
+
 # This returns the stored number without running the generator.
 @view
 func read_current{
@@ -106,6 +144,25 @@ func read_current{
 end
 
 
+# Seed is fed to linear congruential generator.
+# seed = (multiplier * seed + increment) % modulus.
+# Params from GCC. (https://en.wikipedia.org/wiki/Linear_congruential_generator).
+func next_seed{
+        range_check_ptr
+    }(
+        old_seed : felt
+    ) -> (
+        new_seed : felt
+    ):
+    # Snip in half to a manageable size for unsigned_div_rem.
+    let (left, right) = split_felt(old_seed)
+    let (_, new_seed) = unsigned_div_rem(1103515245 * right + 1,
+        2**31)
+    # Number has form: 10**9 (xxxxxxxxxx).
+    return (new_seed)
+end
+
+
 # Checks write-permission of the calling contract.
 func only_approved{
         syscall_ptr : felt*,
@@ -31,6 +31,22 @@ const LEN_REPORT = 10
 const LEN_ACTION_HISTORY = 10
 const LEN_ACTION = 3
 
+# Positions of the Move members in a move array. This is the order
+# the elements are hashed in (see array_to_move_struct).
+# [id, commit, history, hash, nonce, parent_hash, player_index, reveal]
+# The hash slot is a zero placeholder (the hash is not self referential).
+const POS_CHANNEL_ID = 0
+const POS_COMMIT = 1
+const POS_HISTORY = 2
+# After achievements (2 * (1 + LEN_ACHIEVEMENTS)), reports
+# (2 * LEN_REPORT) and the action history length element.
+const POS_ACTION_HISTORY = 45
+const POS_NONCE = 76
+const POS_PARENT_HASH = 77
+const POS_PLAYER_INDEX = 78
+const POS_REVEAL = 79
+const MOVE_LEN = 82
+
 # State transition rule constants.
 const MAX_X = 9
 const MAX_Y = 9
@@ -152,6 +168,11 @@ end
 func player_signing_key(player_account : felt) -> (signing_key : felt):
 end
 
+# Index of the oldest queue slot that may hold an open offer.
+@storage_var
+func queue_head() -> (index : felt):
+end
+
 # Records array of users who are available.
 @storage_var
 func queue_index_of_player(address) -> (index : felt):
@@ -162,6 +183,11 @@ end
 func queue_length() -> (value : felt):
 end
 
+# Index of the next free queue slot. Slots are never reused.
+@storage_var
+func queue_tail() -> (index : felt):
+end
+
 # @notice Called on deployment only.
 @constructor
 func constructor{
@@ -192,49 +218,24 @@ func signal_available{
     # their opponent will win.
     let (local player) = get_caller_address()
     let (local clock_now) = clock.read()
-    let (queue_len) = queue_length.read()
 
-    if queue_len != 0:
-        # If queue is not empty, look for a match.
-
-        # First update the active list
-        update_active_signals(player, clock_now, queue_len)
-
-        # Is anyone in the queue compatible?
-        let (success, matched_player) = check_for_match(queue_len)
-        if success != 0:
-            # If match.
-            open_channel(player, matched_player, clock_now)
-            tempvar syscall_ptr = syscall_ptr
-            tempvar pedersen_ptr = pedersen_ptr
-            tempvar range_check_ptr = range_check_ptr
-            jmp dont_join_queue
-        else:
-            # If no match.
-            tempvar syscall_ptr = syscall_ptr
-            tempvar pedersen_ptr = pedersen_ptr
-            tempvar range_check_ptr = range_check_ptr
-            jmp join_queue
-        end
+    # Is anyone in the queue compatible? Expired offers at the front
+    # of the queue are dropped on the way.
+    let (success, matched_player) = check_for_match(clock_now)
+    if success != 0:
+        # If match.
+        open_channel(player, matched_player, clock_now)
+        tempvar syscall_ptr = syscall_ptr
+        tempvar pedersen_ptr = pedersen_ptr
+        tempvar range_check_ptr = range_check_ptr
     else:
-        # If queue is empty, join queue.
+        # If no match, join the back of the queue.
+        join_queue(player, clock_now + duration)
         tempvar syscall_ptr = syscall_ptr
         tempvar pedersen_ptr = pedersen_ptr
         tempvar range_check_ptr = range_check_ptr
-        jmp join_queue
     end
 
-    join_queue:
-    # Re-read the queue, some may have been removed.
-    let (old_queue_length) = queue_length.read()
-    queue_length.write(old_queue_length + 1)
-    let free_index = old_queue_length
-
-    player_from_queue_index.write(free_index, player)
-    queue_index_of_player.write(player, free_index)
-
-    dont_join_queue:
-
     register_new_account(pub_key)
     clock.write(clock_now + 1)
 
@@ -530,8 +531,17 @@ func status_of_player{
     # function to see if they are queued or matched.
     # Could be replaced by listening to an Event when technically feasible.
 
-    let (game_key) = player_signing_key.read(player_address)
-    let (index_in_queue) = queue_index_of_player.read(player_address)
+    let (local game_key) = player_signing_key.read(player_address)
+    let (local index) = queue_index_of_player.read(player_address)
+    let (local head) = queue_head.read()
+    let (queued_player) = player_from_queue_index.read(index)
+    # Position relative to the front of the queue.
+    local index_in_queue : felt
+    if queued_player == player_address:
+        assert index_in_queue = index - head
+    else:
+        assert index_in_queue = 0
+    end
     let (queue_len) = queue_length.read()
     let (channel_id) = channel_of_player.read(player_address)
     let (local channel : Channel) = channel_from_id.read(channel_id)
@@ -558,7 +568,8 @@ func read_queue_length{
         player_at_index_0 : felt
     ):
     let (length) = queue_length.read()
-    let (zeroth_queuer) = player_from_queue_index.read(0)
+    let (head) = queue_head.read()
+    let (zeroth_queuer) = player_from_queue_index.read(head)
     return (length, zeroth_queuer)
 end
 
@@ -612,13 +623,41 @@ func erase_from_queue{
     }(
         player_address : felt
     ):
-
-    let (index) = queue_index_of_player.read(player_address)
+    alloc_locals
+    let (local index) = queue_index_of_player.read(player_address)
     player_from_queue_index.write(index, 0)
     queue_index_of_player.write(player_address, 0)
     offer_expires.write(player_address, 0)
     let (length) = queue_length.read()
     queue_length.write(length - 1)
+    # Matches are taken from the front. A slot erased anywhere else
+    # is skipped once it reaches the front (lazy deletion).
+    let (head) = queue_head.read()
+    if index == head:
+        queue_head.write(head + 1)
+        return ()
+    end
+    return ()
+end
+
+
+# @notice Adds a player to the back of the queue.
+func join_queue{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        player_address : felt,
+        expiry : felt
+    ):
+    alloc_locals
+    let (local tail) = queue_tail.read()
+    player_from_queue_index.write(tail, player_address)
+    queue_index_of_player.write(player_address, tail)
+    offer_expires.write(player_address, expiry)
+    queue_tail.write(tail + 1)
+    let (length) = queue_length.read()
+    queue_length.write(length + 1)
     return ()
 end
 
@@ -637,6 +676,15 @@ func erase_channel{
     let player_b = c.addresses[1]
     # Wipe channel details.
     local null_channel : Channel
+    assert null_channel = Channel(
+        addresses=(0, 0),
+        balance=(0, 0),
+        id=0,
+        initial_channel_data=0,
+        last_challenged_at_block=0,
+        nonce=0,
+        opened_at_block=0,
+        state_hash=0)
     channel_from_id.write(c.id, null_channel)
     let (channels) = highest_channel_id.read()
     highest_channel_id.write(channels - 1)
@@ -648,96 +696,6 @@ func erase_channel{
     return ()
 end
 
-# @notice Used to check which of the channel offers are still valid.
-func update_active_signals{
-        syscall_ptr : felt*,
-        pedersen_ptr : HashBuiltin*,
-        range_check_ptr
-    }(
-        player : felt,
-        clock_now : felt,
-        original_queue_length : felt
-    ):
-    alloc_locals
-    # Build up a queue by checking if players have been erased.
-
-    let (local queue : felt*) = alloc()
-    # Build queue and record the new length.
-    let (length) = build_queue(original_queue_length, queue, clock_now)
-    queue_length.write(length)
-    save_queue(length, queue)
-
-    return ()
-end
-
-# @notice Walks from the start to the end of the queue.
-func build_queue{
-        syscall_ptr : felt*,
-        pedersen_ptr : HashBuiltin*,
-        range_check_ptr
-    }(
-        n : felt,
-        queue : felt*,
-        clock_now : felt
-    ) -> (
-        length : felt
-    ):
-    alloc_locals
-    if n == 0:
-        return (0)
-    end
-    let (length) = build_queue(n - 1, queue, clock_now)
-    # On first entry, n=1.
-    let index = 0
-    let (player) = player_from_queue_index.read(index)
-    if player == 0:
-        # If the player has been removed from the queue already.
-        offer_expires.write(player, 0)
-        queue_index_of_player.write(player, 0)
-        return (length)
-    end
-
-    let (expiry) = offer_expires.read(player)
-    let (expired) = is_nn_le(clock_now, expiry)
-
-    # This queue is possibly outdated, wipe the order.
-    queue_index_of_player.write(player, 0)
-    player_from_queue_index.write(index, 0)
-
-    if expired == 1:
-        # If the players offer is expired,
-        # don't add them to the new_queue.
-        offer_expires.write(player, 0)
-        return (length)
-    end
-
-    # Add the player to the new queue
-    assert queue[index] = player
-    # Increment the length of this new queue.
-    return (length + 1)
-end
-
-# @notice Saves the order of the new queue.
-func save_queue{
-        syscall_ptr : felt*,
-        pedersen_ptr : HashBuiltin*,
-        range_check_ptr
-    }(
-        n : felt,
-        queue : felt*
-    ):
-    alloc_locals
-    if n == 0:
-        return ()
-    end
-    save_queue(n - 1, queue)
-    # On first entry, n=1.
-    let index = 0
-    queue_index_of_player.write(queue[index], index)
-    player_from_queue_index.write(index, queue[index])
-    return ()
-end
-
 # @notice This applies the final outcome of a state channel.
 # @dev Used once, when no further challenges are permitted.
 # @param c Channel details, sourced from on-chain state.
@@ -820,7 +778,7 @@ func is_valid_move_signature{
 end
 
 # @notice Ensures the hash supplied/signed is correctly computed.
-# @dev The order of the array elements is defined in
+# @dev The order of the array elements is defined in array_to_move_struct.
 func is_valid_hash{
         syscall_ptr : felt*,
         pedersen_ptr : HashBuiltin*,
@@ -832,6 +790,7 @@ func is_valid_hash{
     ):
     # All the Move elements are hashed alphabetically by Move struct name.
     # Omitted: hash, sig_r, sig_s (the hash cannot be self referential).
+    assert move_array_len = MOVE_LEN
     let (hash) = list_to_hash(move_array, move_array_len)
     assert supplied_hash = hash
     return ()
@@ -860,43 +819,87 @@ func get_player_index{
 end
 
 # Returns the details of a matched player to open a channel with if found.
+# @dev Stale offers at the front of the queue are removed here. Each
+# offer is removed at most once, so matching is O(1) amortized.
 func check_for_match{
         syscall_ptr : felt*,
         pedersen_ptr : HashBuiltin*,
         range_check_ptr
     }(
-        queue_pos : felt
+        clock_now : felt
     ) -> (
         match_found_bool : felt,
         matched_player : felt
     ):
     alloc_locals
-    if queue_pos == 0:
+    let (local head) = queue_head.read()
+    let (tail) = queue_tail.read()
+    let (local new_head, local n_expired,
+        local candidate) = skip_stale_offers(head, tail, clock_now)
+
+    if new_head != head:
+        queue_head.write(new_head)
+        let (length) = queue_length.read()
+        queue_length.write(length - n_expired)
+        tempvar syscall_ptr = syscall_ptr
+        tempvar pedersen_ptr = pedersen_ptr
+        tempvar range_check_ptr = range_check_ptr
+    else:
+        tempvar syscall_ptr = syscall_ptr
+        tempvar pedersen_ptr = pedersen_ptr
+        tempvar range_check_ptr = range_check_ptr
+    end
+
+    if candidate == 0:
         return (0, 0)
     end
-    # Recursive loop.
-
-    let (bool, match) = check_for_match(queue_pos - 1)
-    # Upon first entry here, queue_pos=1.
-    let index = queue_pos - 1
-
-    let (candidate) = player_from_queue_index.read(index)
-    assert_not_zero(candidate)
-    local matched_player : felt
-    local bool_result : felt
-    if bool != 1:
-        # If no match found yet, look for one.
-        # If suitable (currently everyone is suitable), save.
-        assert matched_player = candidate
-        # let (ok) = apply_check_to_selected_player(matched_player)
-        let ok = 1
-        assert bool_result = ok
-    else:
-        # If match already found
-        assert matched_player = match
-        assert bool_result = 1
+    # If suitable (currently everyone is suitable), match.
+    # let (ok) = apply_check_to_selected_player(candidate)
+    return (1, candidate)
+end
+
+# @notice Walks from the front of the queue to the first open offer.
+# @dev Expired offers are erased and their players may signal again.
+# Erased slots (player is zero) are stepped over.
+func skip_stale_offers{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        index : felt,
+        tail : felt,
+        clock_now : felt
+    ) -> (
+        head : felt,
+        n_expired : felt,
+        candidate : felt
+    ):
+    alloc_locals
+    if index == tail:
+        # Queue is empty.
+        return (index, 0, 0)
+    end
+    let (local player) = player_from_queue_index.read(index)
+    if player == 0:
+        let (head, n_expired, candidate) = skip_stale_offers(
+            index + 1, tail, clock_now)
+        return (head, n_expired, candidate)
     end
-    return (bool_result, matched_player)
+
+    let (expiry) = offer_expires.read(player)
+    let (still_open) = is_nn_le(clock_now, expiry)
+    if still_open == 1:
+        return (index, 0, player)
+    end
+
+    # The offer expired. Wipe the player so they can signal again.
+    player_from_queue_index.write(index, 0)
+    queue_index_of_player.write(player, 0)
+    offer_expires.write(player, 0)
+    player_signing_key.write(player, 0)
+    let (head, n_expired, candidate) = skip_stale_offers(
+        index + 1, tail, clock_now)
+    return (head, n_expired + 1, candidate)
 end
 
 # Ensures an account cannot be used twice simultaneously.
@@ -974,26 +977,24 @@ func array_to_move_struct{
         m : Move
     ):
     alloc_locals
-    # Dummy values. Needs to incorporate nested struct once actual
-    # channel data format is worked out (e.g., game elements/awards/actions).
+    # Achievements and reports are still placeholders (see structs).
     # Create empty structs to populate.
     let (local actions : Action*) = alloc()
-    local game : GameHistory
     local m : Move
 
     # Action history index, representing where the first element is.
-    let ah = 23  # Dummy value
-    # Everything comes from the array. E.g.,
-    assert actions[0] = Action(1, 1, 1) # Action(a[ah + 0], a[ah + 2], a[ah + 3]),
-    assert actions[1] = Action(1, 1, 1) # Action(a[ah + 4], a[ah + 5], a[ah + 6]),
-    assert actions[2] = Action(1, 1, 1)
-    assert actions[3] = Action(1, 1, 1)
-    assert actions[4] = Action(1, 1, 1)
-    assert actions[5] = Action(1, 1, 1)
-    assert actions[6] = Action(1, 1, 1)
-    assert actions[7] = Action(1, 1, 1)
-    assert actions[8] = Action(1, 1, 1)
-    assert actions[9] = Action(1, 1, 1)
+    # Most recent action first: [a_latest, b_latest, a_2nd_last, ...].
+    let ah = POS_ACTION_HISTORY
+    assert actions[0] = Action(a[ah], a[ah + 1], a[ah + 2])
+    assert actions[1] = Action(a[ah + 3], a[ah + 4], a[ah + 5])
+    assert actions[2] = Action(a[ah + 6], a[ah + 7], a[ah + 8])
+    assert actions[3] = Action(a[ah + 9], a[ah + 10], a[ah + 11])
+    assert actions[4] = Action(a[ah + 12], a[ah + 13], a[ah + 14])
+    assert actions[5] = Action(a[ah + 15], a[ah + 16], a[ah + 17])
+    assert actions[6] = Action(a[ah + 18], a[ah + 19], a[ah + 20])
+    assert actions[7] = Action(a[ah + 21], a[ah + 22], a[ah + 23])
+    assert actions[8] = Action(a[ah + 24], a[ah + 25], a[ah + 26])
+    assert actions[9] = Action(a[ah + 27], a[ah + 28], a[ah + 29])
 
     local gh : GameHistory
     assert gh = GameHistory(
@@ -1004,25 +1005,22 @@ func array_to_move_struct{
         action_history=actions
     )
 
-    let action : Action = Action(1, 1, 1)
+    local action : Action
+    assert action = Action(a[POS_REVEAL], a[POS_REVEAL + 1],
+        a[POS_REVEAL + 2])
     # A message is passed to the contract as an array.
     # The length of the achievements/reports/movehistory elements
     # affect the parsing of the array. These lengths are recorded
-    # as constants at the top of this page.
+    # as constants at the top of this page and fix the POS_* values.
     # LEN_ACHIEVEMENTS, LEN_REPORT, LEN_ACTION_HISTORY, LEN_ACTION
-    let game_history_len = ((1 + LEN_ACHIEVEMENTS) * 2 +
-        LEN_REPORT * 2 + 1 + LEN_ACTION_HISTORY * LEN_ACTION)
-    # [id, commit, history, hash, nonce, ...]
-    let nonce_pos = 2 + game_history_len + 1
-    let reveal_pos = nonce_pos + 2
     assert m = Move(
-        channel_id=a[0],
-        commit=a[1],
+        channel_id=a[POS_CHANNEL_ID],
+        commit=a[POS_COMMIT],
         history=gh,
         hash=hash,
-        nonce=a[nonce_pos],
-        parent_hash=a[nonce_pos + 1],
-        player_index=a[nonce_pos + 2],
+        nonce=a[POS_NONCE],
+        parent_hash=a[POS_PARENT_HASH],
+        player_index=a[POS_PLAYER_INDEX],
         reveal=action,
         sig_r=sig_r,
         sig_s=sig_s
@@ -1045,15 +1043,24 @@ func apply_penalty{
     let (local c : Channel) = channel_from_id.read(m.channel_id)
     # Player looses all of their collateral. This could be modified
     # to burn some of it, or distribute it differently.
+    let total = c.balance[0] + c.balance[1]
+    local penalized : Channel
     if m.player_index == 0:
-        assert c.balance[0] = 0
-        assert c.balance[1] = c.balance[1] + c.balance[0]
+        assert penalized.balance[0] = 0
+        assert penalized.balance[1] = total
     else:
-        assert c.balance[1] = 0
-        assert c.balance[0] = c.balance[0] + c.balance[1]
+        assert penalized.balance[0] = total
+        assert penalized.balance[1] = 0
     end
-    assert c.balance[0] * c.balance[1] = 0
-    channel_from_id.write(m.channel_id, c)
+    assert penalized.addresses[0] = c.addresses[0]
+    assert penalized.addresses[1] = c.addresses[1]
+    assert penalized.id = c.id
+    assert penalized.initial_channel_data = c.initial_channel_data
+    assert penalized.last_challenged_at_block = c.last_challenged_at_block
+    assert penalized.nonce = c.nonce
+    assert penalized.opened_at_block = c.opened_at_block
+    assert penalized.state_hash = c.state_hash
+    channel_from_id.write(m.channel_id, penalized)
     return ()
 end
 
@@ -2,6 +2,8 @@
 
 from starkware.cairo.common.cairo_builtins import HashBuiltin
 from starkware.cairo.common.alloc import alloc
+from starkware.cairo.common.math import assert_nn_le
+from starkware.cairo.common.math_cmp import is_le
 from starkware.starknet.common.syscalls import get_caller_address
 
 from contracts.utils.interfaces import IModuleController
@@ -19,6 +21,11 @@ from contracts.utils.interfaces import IModuleController
 #
 ####################
 
+# Most tags returned by a single read_tags_page call.
+const MAX_PAGE_SIZE = 100
+# Number of tags kept in the points leaderboard.
+const TOP_TAGS = 10
+
 
 @storage_var
 func controller_address() -> (address : felt):
@@ -38,6 +45,16 @@ end
 func tag_points(tag_index : felt) -> (value : felt):
 end
 
+# Leaderboard of tags by points. Stores tag_index + 1 (0 is empty).
+@storage_var
+func top_tag(rank : felt) -> (tag_index_plus_one : felt):
+end
+
+# Rank of a tag in the leaderboard. Stores rank + 1 (0 is not ranked).
+@storage_var
+func top_rank_of_tag(tag_index : felt) -> (rank_plus_one : felt):
+end
+
 # Called on deployment only.
 @constructor
 func constructor{
@@ -77,8 +94,39 @@ func respect_a_tag{
     }(
         tag_index : felt
     ):
+    alloc_locals
+    let (count) = tag_count.read()
+    # A negative index would wrap, so bound the index itself.
+    assert_nn_le(tag_index, count - 1)
     let (points) = tag_points.read(tag_index)
-    tag_points.write(tag_index, points + 1)
+    local new_points = points + 1
+    tag_points.write(tag_index, new_points)
+    # Keep the leaderboard sorted. Only the respected tag can move.
+    let (rank_plus_one) = top_rank_of_tag.read(tag_index)
+    if rank_plus_one != 0:
+        bubble_up(rank_plus_one - 1, tag_index, new_points)
+        return ()
+    end
+    # An unranked tag enters at the bottom if it beats the last place.
+    let (last_plus_one) = top_tag.read(TOP_TAGS - 1)
+    if last_plus_one != 0:
+        let (last_points) = tag_points.read(last_plus_one - 1)
+        let (not_better) = is_le(new_points, last_points)
+        if not_better == 1:
+            return ()
+        end
+        top_rank_of_tag.write(last_plus_one - 1, 0)
+        tempvar syscall_ptr = syscall_ptr
+        tempvar pedersen_ptr = pedersen_ptr
+        tempvar range_check_ptr = range_check_ptr
+    else:
+        tempvar syscall_ptr = syscall_ptr
+        tempvar pedersen_ptr = pedersen_ptr
+        tempvar range_check_ptr = range_check_ptr
+    end
+    top_tag.write(TOP_TAGS - 1, tag_index + 1)
+    top_rank_of_tag.write(tag_index, TOP_TAGS)
+    bubble_up(TOP_TAGS - 1, tag_index, new_points)
     return ()
 end
 
@@ -98,16 +146,91 @@ func read_tags{
     let (local points : felt*) = alloc()
     let (local tags_len) = tag_count.read()
 
-    loop_tags(tags_len, tags, points)
+    loop_tags(0, tags_len, tags, points)
     return (tags_len, tags, tags_len, points)
 end
 
-# Loops over tags and appends the text and points to arrays.
+# Returns up to limit tags from offset, limit is capped to
+# MAX_PAGE_SIZE so the cost of a call does not grow with the wall.
+@view
+func read_tags_page{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        offset : felt,
+        limit : felt
+    ) -> (
+        tags_len : felt,
+        tags : felt*,
+        points_len : felt,
+        points : felt*,
+    ):
+    alloc_locals
+    let (local tags : felt*) = alloc()
+    let (local points : felt*) = alloc()
+    let (local count) = tag_count.read()
+    assert_nn_le(limit, MAX_PAGE_SIZE)
+    # The offset may be the end of the wall, but not past it.
+    assert_nn_le(offset, count)
+    # Number of tags after the offset.
+    local available = count - offset
+    local page_len : felt
+    let (full_page) = is_le(limit, available)
+    if full_page == 1:
+        assert page_len = limit
+    else:
+        assert page_len = available
+    end
+    loop_tags(offset, page_len, tags, points)
+    return (page_len, tags, page_len, points)
+end
+
+# Returns the tag count, e.g., to know how many pages to read.
+@view
+func read_tag_count{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }() -> (
+        count : felt
+    ):
+    let (count) = tag_count.read()
+    return (count)
+end
+
+# Returns the n tags with the most points, most points first.
+@view
+func read_top_tags{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        n : felt
+    ) -> (
+        tag_indices_len : felt,
+        tag_indices : felt*,
+        tags_len : felt,
+        tags : felt*,
+        points_len : felt,
+        points : felt*
+    ):
+    alloc_locals
+    assert_nn_le(n, TOP_TAGS)
+    let (local tag_indices : felt*) = alloc()
+    let (local tags : felt*) = alloc()
+    let (local points : felt*) = alloc()
+    let (n_ranked) = loop_top_tags(0, n, tag_indices, tags, points)
+    return (n_ranked, tag_indices, n_ranked, tags, n_ranked, points)
+end
+
+# Loops over n tags from start and appends the text and points.
 func loop_tags{
         syscall_ptr : felt*,
         pedersen_ptr : HashBuiltin*,
         range_check_ptr
     }(
+        start : felt,
         n : felt,
         tags : felt*,
         points : felt*
@@ -115,12 +238,85 @@ func loop_tags{
     if n == 0:
         return ()
     end
-    loop_tags(n, tags, points)
-    let tag_index = n - 1
+    let (current_tag) = tag.read(start)
+    let (current_points) = tag_points.read(start)
+    assert tags[0] = current_tag
+    assert points[0] = current_points
+    loop_tags(start + 1, n - 1, tags + 1, points + 1)
+    return ()
+end
+
+# Reads the leaderboard from rank until n ranks or an empty rank.
+func loop_top_tags{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        rank : felt,
+        n : felt,
+        tag_indices : felt*,
+        tags : felt*,
+        points : felt*
+    ) -> (
+        n_ranked : felt
+    ):
+    alloc_locals
+    if rank == n:
+        return (0)
+    end
+    let (tag_index_plus_one) = top_tag.read(rank)
+    if tag_index_plus_one == 0:
+        return (0)
+    end
+    local tag_index = tag_index_plus_one - 1
     let (current_tag) = tag.read(tag_index)
     let (current_points) = tag_points.read(tag_index)
-    assert tags[tag_index] = current_tag
-    assert points[tag_index] = current_points
+    assert tag_indices[0] = tag_index
+    assert tags[0] = current_tag
+    assert points[0] = current_points
+    let (n_ranked) = loop_top_tags(rank + 1, n, tag_indices + 1, tags + 1,
+        points + 1)
+    return (n_ranked + 1)
+end
+
+# Moves a tag up the leaderboard while it has more points than the
+# tag ranked above it.
+func bubble_up{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        rank : felt,
+        tag_index : felt,
+        points : felt
+    ):
+    alloc_locals
+    if rank == 0:
+        return ()
+    end
+    let (local above_plus_one) = top_tag.read(rank - 1)
+    if above_plus_one != 0:
+        let (above_points) = tag_points.read(above_plus_one - 1)
+        let (not_better) = is_le(points, above_points)
+        if not_better == 1:
+            return ()
+        end
+        # Swap with the tag above.
+        top_tag.write(rank, above_plus_one)
+        top_rank_of_tag.write(above_plus_one - 1, rank + 1)
+        tempvar syscall_ptr = syscall_ptr
+        tempvar pedersen_ptr = pedersen_ptr
+        tempvar range_check_ptr = range_check_ptr
+    else:
+        # The rank above is empty, move up.
+        top_tag.write(rank, 0)
+        tempvar syscall_ptr = syscall_ptr
+        tempvar pedersen_ptr = pedersen_ptr
+        tempvar range_check_ptr = range_check_ptr
+    end
+    top_tag.write(rank - 1, tag_index + 1)
+    top_rank_of_tag.write(tag_index, rank)
+    bubble_up(rank - 1, tag_index, points)
     return ()
 end
 
@@ -1,10 +1,15 @@
 %lang starknet
 
 # Imports
+from starkware.cairo.common.alloc import alloc
 from starkware.cairo.common.cairo_builtins import HashBuiltin
-from starkware.cairo.common.math import unsigned_div_rem
+from starkware.cairo.common.math import assert_in_range, unsigned_div_rem
+from starkware.cairo.common.math_cmp import is_nn_le
+from starkware.cairo.common.registers import get_fp_and_pc
 from starkware.starknet.common.syscalls import get_caller_address
 
+from contracts.utils.bell_labs_tables import (NUM_SLOTS, NUM_AXES,
+    NEUTRAL_SCORE, score_offsets, score_lengths, score_table)
 from contracts.utils.interfaces import IModuleController
 
 ##### Module 11 #####
@@ -22,6 +27,11 @@ from contracts.utils.interfaces import IModuleController
 # - 1 Red
 # - 2 Green
 # - 3 Blue
+#
+# Item scores are in [0, 99], 50 is neutral. They are read from tables
+# generated from mappings/*.csv: weapon strength scores red, ring and
+# necklace bribes and drug value score green, vehicle and foot speed
+# score blue.
 
 # @notice A struct representing the wearable traits.
 # @dev This is the order they should appear in the array.
@@ -77,6 +87,7 @@ func get_aggregate_score{
         score : felt
     ):
     alloc_locals
+    assert items_array_len = NUM_SLOTS
     # Convert the array to a struct.
     let (local items : Items) = array_to_struct(items_array)
 
@@ -111,160 +122,39 @@ func get_item_score{
         result : felt
     ):
     alloc_locals
-    # This is all a hacky method to call different functions based
-    # on different input value (if 0 call func_0, if 1 call func_1 etc).
-    # If you are reading this and see a better method let me know.
-    let bool_weapon = item_type - 0
-    let bool_clothes = item_type - 1
-    let bool_vehicle = item_type - 2
-    let bool_waist = item_type - 3
-    let bool_foot = item_type - 4
-    let bool_hand = item_type - 5
-    let bool_necklace = item_type - 6
-    let bool_ring = item_type - 7
-    let bool_item_suffix = item_type - 8
-    let bool_drug = item_type - 9
-    let bool_name_prefix = item_type - 10
-    let bool_name_suffix = item_type - 11
-
-    # If the item is that being examined, get the score.
-    local result
-    if bool_weapon == 0:
-        let (score) = get_weapon(axis, items.weapon)
-        tempvar syscall_ptr = syscall_ptr
-        tempvar pedersen_ptr = pedersen_ptr
-        tempvar range_check_ptr = range_check_ptr
-        assert result = score
-    else:
-        tempvar syscall_ptr = syscall_ptr
-        tempvar pedersen_ptr = pedersen_ptr
-        tempvar range_check_ptr = range_check_ptr
-    end
-    if bool_clothes == 0:
-        let (score) = get_clothes(axis, items.clothes)
-        tempvar syscall_ptr = syscall_ptr
-        tempvar pedersen_ptr = pedersen_ptr
-        tempvar range_check_ptr = range_check_ptr
-        assert result = score
-    else:
-        tempvar syscall_ptr = syscall_ptr
-        tempvar pedersen_ptr = pedersen_ptr
-        tempvar range_check_ptr = range_check_ptr
-    end
-    if bool_vehicle == 0:
-        let (score) = get_vehicle(axis, items.vehicle)
-        tempvar syscall_ptr = syscall_ptr
-        tempvar pedersen_ptr = pedersen_ptr
-        tempvar range_check_ptr = range_check_ptr
-        assert result = score
-    else:
-        tempvar syscall_ptr = syscall_ptr
-        tempvar pedersen_ptr = pedersen_ptr
-        tempvar range_check_ptr = range_check_ptr
-    end
-    if bool_waist == 0:
-        let (score) = get_waist(axis, items.waist)
-        tempvar syscall_ptr = syscall_ptr
-        tempvar pedersen_ptr = pedersen_ptr
-        tempvar range_check_ptr = range_check_ptr
-        assert result = score
-    else:
-        tempvar syscall_ptr = syscall_ptr
-        tempvar pedersen_ptr = pedersen_ptr
-        tempvar range_check_ptr = range_check_ptr
-    end
-    if bool_foot == 0:
-        let (score) = get_foot(axis, items.foot)
-        tempvar syscall_ptr = syscall_ptr
-        tempvar pedersen_ptr = pedersen_ptr
-        tempvar range_check_ptr = range_check_ptr
-        assert result = score
-    else:
-        tempvar syscall_ptr = syscall_ptr
-        tempvar pedersen_ptr = pedersen_ptr
-        tempvar range_check_ptr = range_check_ptr
-    end
-    if bool_hand == 0:
-        let (score) = get_hand(axis, items.hand)
-        tempvar syscall_ptr = syscall_ptr
-        tempvar pedersen_ptr = pedersen_ptr
-        tempvar range_check_ptr = range_check_ptr
-        assert result = score
-    else:
-        tempvar syscall_ptr = syscall_ptr
-        tempvar pedersen_ptr = pedersen_ptr
-        tempvar range_check_ptr = range_check_ptr
-    end
-    if bool_necklace == 0:
-        let (score) = get_necklace(axis, items.necklace)
-        tempvar syscall_ptr = syscall_ptr
-        tempvar pedersen_ptr = pedersen_ptr
-        tempvar range_check_ptr = range_check_ptr
-        assert result = score
-    else:
-        tempvar syscall_ptr = syscall_ptr
-        tempvar pedersen_ptr = pedersen_ptr
-        tempvar range_check_ptr = range_check_ptr
-    end
-    if bool_ring == 0:
-        let (score) = get_ring(axis, items.ring)
-        tempvar syscall_ptr = syscall_ptr
-        tempvar pedersen_ptr = pedersen_ptr
-        tempvar range_check_ptr = range_check_ptr
-        assert result = score
-    else:
-        tempvar syscall_ptr = syscall_ptr
-        tempvar pedersen_ptr = pedersen_ptr
-        tempvar range_check_ptr = range_check_ptr
-    end
-    if bool_item_suffix == 0:
-        let (score) = get_item_suffix(axis, items.item_suffix)
-        tempvar syscall_ptr = syscall_ptr
-        tempvar pedersen_ptr = pedersen_ptr
-        tempvar range_check_ptr = range_check_ptr
-        assert result = score
-    else:
-        tempvar syscall_ptr = syscall_ptr
-        tempvar pedersen_ptr = pedersen_ptr
-        tempvar range_check_ptr = range_check_ptr
-    end
-    if bool_drug == 0:
-        let (score) = get_drug(axis, items.drug)
-        tempvar syscall_ptr = syscall_ptr
-        tempvar pedersen_ptr = pedersen_ptr
-        tempvar range_check_ptr = range_check_ptr
-        assert result = score
-    else:
-        tempvar syscall_ptr = syscall_ptr
-        tempvar pedersen_ptr = pedersen_ptr
-        tempvar range_check_ptr = range_check_ptr
-    end
-    if bool_name_prefix == 0:
-        let (score) = get_name_prefix(axis, items.name_prefix)
-        tempvar syscall_ptr = syscall_ptr
-        tempvar pedersen_ptr = pedersen_ptr
-        tempvar range_check_ptr = range_check_ptr
-        assert result = score
-    else:
-        tempvar syscall_ptr = syscall_ptr
-        tempvar pedersen_ptr = pedersen_ptr
-        tempvar range_check_ptr = range_check_ptr
-    end
-    if bool_name_suffix == 0:
-        let (score) = get_name_suffix(axis, items.name_suffix)
-        tempvar syscall_ptr = syscall_ptr
-        tempvar pedersen_ptr = pedersen_ptr
-        tempvar range_check_ptr = range_check_ptr
-        assert result = score
-    else:
-        tempvar syscall_ptr = syscall_ptr
-        tempvar pedersen_ptr = pedersen_ptr
-        tempvar range_check_ptr = range_check_ptr
-    end
-
+    assert_in_range(axis, 1, NUM_AXES + 1)
+    assert_in_range(item_type, 0, NUM_SLOTS)
+    # The struct members are in slot order, so index it as an array.
+    let (__fp__, _) = get_fp_and_pc()
+    let items_array = cast(&items, felt*)
+    let (result) = lookup_score(axis, item_type, items_array[item_type])
     return (result)
 end
 
+# @notice Returns the score of every item slot on every axis.
+# @param items_array_len Length of the list (A helper value).
+# @param items_array An array of item ids, as ordered in the DOPE NFT.
+# @return scores_len Length of the scores (NUM_SLOTS * NUM_AXES).
+# @return scores Score of slot s on axis a at index s * NUM_AXES + a - 1.
+@view
+func get_all_scores{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        items_array_len : felt,
+        items_array : felt*
+    ) -> (
+        scores_len : felt,
+        scores : felt*
+    ):
+    alloc_locals
+    assert items_array_len = NUM_SLOTS
+    let (local scores : felt*) = alloc()
+    score_slots(0, items_array, scores)
+    return (NUM_SLOTS * NUM_AXES, scores)
+end
+
 
 
 # @notice Helper function that makes an array into a struct
@@ -295,186 +185,55 @@ func array_to_struct(
     return (items)
 end
 
-
-
-# @notice Gets the score for a given item on a given axis.
-func get_weapon{
-        syscall_ptr : felt*,
-        pedersen_ptr : HashBuiltin*,
-        range_check_ptr
-    }(
-        axis : felt,
-        item : felt
-    ) -> (
-        result : felt
-    ):
-    let result = 50
-    return (result)
-end
-
 # @notice Gets the score for a given item on a given axis.
-func get_clothes{
-        syscall_ptr : felt*,
-        pedersen_ptr : HashBuiltin*,
-        range_check_ptr
-    }(
-        axis : felt,
-        item : felt
-    ) -> (
-        result : felt
-    ):
-    let result = 50
-    return (result)
-end
-
-# @notice Gets the score for a given item on a given axis.
-func get_vehicle{
-        syscall_ptr : felt*,
-        pedersen_ptr : HashBuiltin*,
-        range_check_ptr
-    }(
-        axis : felt,
-        item : felt
-    ) -> (
-        result : felt
-    ):
-    let result = 50
-    return (result)
-end
-
-# @notice Gets the score for a given item on a given axis.
-func get_waist{
-        syscall_ptr : felt*,
-        pedersen_ptr : HashBuiltin*,
-        range_check_ptr
-    }(
-        axis : felt,
-        item : felt
-    ) -> (
-        result : felt
-    ):
-    let result = 50
-    return (result)
-end
-
-# @notice Gets the score for a given item on a given axis.
-func get_foot{
-        syscall_ptr : felt*,
-        pedersen_ptr : HashBuiltin*,
-        range_check_ptr
-    }(
-        axis : felt,
-        item : felt
-    ) -> (
-        result : felt
-    ):
-    let result = 50
-    return (result)
-end
-
-# @notice Gets the score for a given item on a given axis.
-func get_hand{
-        syscall_ptr : felt*,
-        pedersen_ptr : HashBuiltin*,
-        range_check_ptr
-    }(
-        axis : felt,
-        item : felt
-    ) -> (
-        result : felt
-    ):
-    let result = 50
-    return (result)
-end
-
-# @notice Gets the score for a given item on a given axis.
-func get_necklace{
-        syscall_ptr : felt*,
-        pedersen_ptr : HashBuiltin*,
-        range_check_ptr
-    }(
-        axis : felt,
-        item : felt
-    ) -> (
-        result : felt
-    ):
-    let result = 50
-    return (result)
-end
-
-# @notice Gets the score for a given item on a given axis.
-func get_ring{
-        syscall_ptr : felt*,
-        pedersen_ptr : HashBuiltin*,
-        range_check_ptr
-    }(
-        axis : felt,
-        item : felt
-    ) -> (
-        result : felt
-    ):
-    let result = 50
-    return (result)
-end
-
-# @notice Gets the score for a given item on a given axis.
-func get_item_suffix{
-        syscall_ptr : felt*,
-        pedersen_ptr : HashBuiltin*,
-        range_check_ptr
-    }(
-        axis : felt,
-        item : felt
-    ) -> (
-        result : felt
-    ):
-    let result = 50
-    return (result)
-end
-
-# @notice Gets the score for a given item on a given axis.
-func get_drug{
-        syscall_ptr : felt*,
-        pedersen_ptr : HashBuiltin*,
-        range_check_ptr
-    }(
-        axis : felt,
-        item : felt
-    ) -> (
-        result : felt
-    ):
-    let result = 50
-    return (result)
-end
-
-# @notice Gets the score for a given item on a given axis.
-func get_name_prefix{
-        syscall_ptr : felt*,
-        pedersen_ptr : HashBuiltin*,
+# @dev Reads the tables generated from mappings/*.csv (see bin/gen).
+# Slots without a table for the axis and unknown items are neutral.
+func lookup_score{
         range_check_ptr
     }(
         axis : felt,
+        item_type : felt,
         item : felt
     ) -> (
         result : felt
     ):
-    let result = 50
-    return (result)
+    alloc_locals
+    let (offsets) = score_offsets()
+    local entry = item_type * NUM_AXES + axis - 1
+    local offset_plus_one = offsets[entry]
+    if offset_plus_one == 0:
+        return (NEUTRAL_SCORE)
+    end
+    let (lengths) = score_lengths()
+    # Also false for negative items (large felts).
+    let (known) = is_nn_le(item, lengths[entry] - 1)
+    if known == 0:
+        return (NEUTRAL_SCORE)
+    end
+    let (table) = score_table()
+    return (table[offset_plus_one - 1 + item])
 end
 
-# @notice Gets the score for a given item on a given axis.
-func get_name_suffix{
-        syscall_ptr : felt*,
-        pedersen_ptr : HashBuiltin*,
+# @notice Recursively scores the slots from item_type onwards.
+func score_slots{
         range_check_ptr
     }(
-        axis : felt,
-        item : felt
-    ) -> (
-        result : felt
+        item_type : felt,
+        items_array : felt*,
+        scores : felt*
     ):
-    let result = 50
-    return (result)
+    if item_type == NUM_SLOTS:
+        return ()
+    end
+    let item = items_array[item_type]
+    let (red) = lookup_score(1, item_type, item)
+    assert scores[0] = red
+    let (green) = lookup_score(2, item_type, item)
+    assert scores[1] = green
+    let (blue) = lookup_score(3, item_type, item)
+    assert scores[2] = blue
+    score_slots(item_type + 1, items_array, scores + NUM_AXES)
+    return ()
 end
 
 # @notice Used in situations where other modules have write access here.
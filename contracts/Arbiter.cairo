@@ -160,6 +160,19 @@ func batch_set_controller_addresses{
     return ()
 end
 
+# The owner is the admin of the game (see only_admin in modules).
+@view
+func get_owner{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }() -> (
+        owner : felt
+    ):
+    let (owner) = owner_of_arbiter.read()
+    return (owner)
+end
+
 # Assert that the person calling has authority.
 func only_owner{
         syscall_ptr : felt*,
@@ -209,6 +209,20 @@ func get_module_address{
 end
 
 
+# The current Arbiter, e.g. for modules with admin functions.
+@view
+func get_arbiter{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }() -> (
+        arbiter_address : felt
+    ):
+    let (arbiter_address) = arbiter.read()
+    return (arbiter_address)
+end
+
+
 # Called by a module before it updates internal state.
 @view
 func has_write_access{
@@ -0,0 +1,187 @@
+%lang starknet
+
+# Generated by test/utils/bell_labs.py from mappings/*.csv.
+# Do not edit, run bin/gen instead.
+
+from starkware.cairo.common.registers import get_label_location
+
+const NUM_SLOTS = 12
+const NUM_AXES = 3
+const NEUTRAL_SCORE = 50
+
+# Start of the scores of (slot, axis) in score_table() plus one, 0 if neutral.
+func score_offsets() -> (table : felt*):
+    let (address) = get_label_location(data)
+    return (table=address)
+
+    data:
+    dw 1  # weapon red
+    dw 0  # weapon green
+    dw 0  # weapon blue
+    dw 0  # clothes red
+    dw 0  # clothes green
+    dw 0  # clothes blue
+    dw 0  # vehicle red
+    dw 0  # vehicle green
+    dw 19  # vehicle blue
+    dw 0  # waist red
+    dw 0  # waist green
+    dw 0  # waist blue
+    dw 0  # foot red
+    dw 0  # foot green
+    dw 36  # foot blue
+    dw 0  # hand red
+    dw 0  # hand green
+    dw 0  # hand blue
+    dw 0  # necklace red
+    dw 53  # necklace green
+    dw 0  # necklace blue
+    dw 0  # ring red
+    dw 56  # ring green
+    dw 0  # ring blue
+    dw 0  # item_suffix red
+    dw 0  # item_suffix green
+    dw 0  # item_suffix blue
+    dw 0  # drug red
+    dw 63  # drug green
+    dw 0  # drug blue
+    dw 0  # name_prefix red
+    dw 0  # name_prefix green
+    dw 0  # name_prefix blue
+    dw 0  # name_suffix red
+    dw 0  # name_suffix green
+    dw 0  # name_suffix blue
+end
+
+# Number of items with a score for (slot, axis).
+func score_lengths() -> (table : felt*):
+    let (address) = get_label_location(data)
+    return (table=address)
+
+    data:
+    dw 18  # weapon red
+    dw 0  # weapon green
+    dw 0  # weapon blue
+    dw 0  # clothes red
+    dw 0  # clothes green
+    dw 0  # clothes blue
+    dw 0  # vehicle red
+    dw 0  # vehicle green
+    dw 17  # vehicle blue
+    dw 0  # waist red
+    dw 0  # waist green
+    dw 0  # waist blue
+    dw 0  # foot red
+    dw 0  # foot green
+    dw 17  # foot blue
+    dw 0  # hand red
+    dw 0  # hand green
+    dw 0  # hand blue
+    dw 0  # necklace red
+    dw 3  # necklace green
+    dw 0  # necklace blue
+    dw 0  # ring red
+    dw 7  # ring green
+    dw 0  # ring blue
+    dw 0  # item_suffix red
+    dw 0  # item_suffix green
+    dw 0  # item_suffix blue
+    dw 0  # drug red
+    dw 19  # drug green
+    dw 0  # drug blue
+    dw 0  # name_prefix red
+    dw 0  # name_prefix green
+    dw 0  # name_prefix blue
+    dw 0  # name_suffix red
+    dw 0  # name_suffix green
+    dw 0  # name_suffix blue
+end
+
+# Item scores in [0, 99].
+func score_table() -> (table : felt*):
+    let (address) = get_label_location(data)
+    return (table=address)
+
+    data:
+    dw 29  # weapon 0, red
+    dw 29  # weapon 1, red
+    dw 39  # weapon 2, red
+    dw 49  # weapon 3, red
+    dw 59  # weapon 4, red
+    dw 99  # weapon 5, red
+    dw 19  # weapon 6, red
+    dw 29  # weapon 7, red
+    dw 29  # weapon 8, red
+    dw 29  # weapon 9, red
+    dw 9  # weapon 10, red
+    dw 19  # weapon 11, red
+    dw 29  # weapon 12, red
+    dw 39  # weapon 13, red
+    dw 9  # weapon 14, red
+    dw 79  # weapon 15, red
+    dw 69  # weapon 16, red
+    dw 89  # weapon 17, red
+    dw 69  # vehicle 0, blue
+    dw 99  # vehicle 1, blue
+    dw 9  # vehicle 2, blue
+    dw 19  # vehicle 3, blue
+    dw 49  # vehicle 4, blue
+    dw 9  # vehicle 5, blue
+    dw 29  # vehicle 6, blue
+    dw 39  # vehicle 7, blue
+    dw 59  # vehicle 8, blue
+    dw 19  # vehicle 9, blue
+    dw 59  # vehicle 10, blue
+    dw 49  # vehicle 11, blue
+    dw 79  # vehicle 12, blue
+    dw 89  # vehicle 13, blue
+    dw 29  # vehicle 14, blue
+    dw 89  # vehicle 15, blue
+    dw 79  # vehicle 16, blue
+    dw 59  # foot 0, blue
+    dw 69  # foot 1, blue
+    dw 39  # foot 2, blue
+    dw 79  # foot 3, blue
+    dw 59  # foot 4, blue
+    dw 49  # foot 5, blue
+    dw 69  # foot 6, blue
+    dw 9  # foot 7, blue
+    dw 99  # foot 8, blue
+    dw 29  # foot 9, blue
+    dw 59  # foot 10, blue
+    dw 39  # foot 11, blue
+    dw 29  # foot 12, blue
+    dw 9  # foot 13, blue
+    dw 9  # foot 14, blue
+    dw 9  # foot 15, blue
+    dw 19  # foot 16, blue
+    dw 29  # necklace 0, green
+    dw 49  # necklace 1, green
+    dw 69  # necklace 2, green
+    dw 79  # ring 0, green
+    dw 69  # ring 1, green
+    dw 99  # ring 2, green
+    dw 89  # ring 3, green
+    dw 49  # ring 4, green
+    dw 19  # ring 5, green
+    dw 29  # ring 6, green
+    dw 16  # drug 0, green
+    dw 99  # drug 1, green
+    dw 66  # drug 2, green
+    dw 24  # drug 3, green
+    dw 33  # drug 4, green
+    dw 12  # drug 5, green
+    dw 16  # drug 6, green
+    dw 8  # drug 7, green
+    dw 12  # drug 8, green
+    dw 3  # drug 9, green
+    dw 82  # drug 10, green
+    dw 66  # drug 11, green
+    dw 8  # drug 12, green
+    dw 24  # drug 13, green
+    dw 24  # drug 14, green
+    dw 24  # drug 15, green
+    dw 12  # drug 16, green
+    dw 16  # drug 17, green
+    dw 12  # drug 18, green
+end
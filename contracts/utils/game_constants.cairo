@@ -46,6 +46,9 @@ const DISTRICTS = 4
 # Number of locations total (CITIES * DISTRICTS)
 const LOCATIONS = 76
 
+# Number of item types (drugs), item_id in [1, 19]. Money is item 0.
+const ITEMS = 19
+
 # Amount of money a user starts with.
 const STARTING_MONEY = 20000
 
@@ -20,6 +20,12 @@ namespace IModuleController:
     ):
     end
 
+    func get_arbiter(
+    ) -> (
+        arbiter_address : felt
+    ):
+    end
+
     func appoint_new_arbiter(
         new_arbiter : felt
     ):
@@ -47,6 +53,17 @@ namespace IModuleController:
 end
 
 
+# Interface for the Arbiter.
+@contract_interface
+namespace IArbiter:
+    func get_owner(
+    ) -> (
+        owner : felt
+    ):
+    end
+end
+
+
 @contract_interface
 namespace I02_LocationOwned:
     func location_has_item_read(
@@ -75,6 +92,35 @@ namespace I02_LocationOwned:
         count : felt
     ):
     end
+    func read_pair(
+        location_id : felt,
+        item_id : felt
+    ) -> (
+        item_quantity : felt,
+        money_quantity : felt
+    ):
+    end
+    func write_pair(
+        location_id : felt,
+        item_id : felt,
+        item_quantity : felt,
+        money_quantity : felt
+    ):
+    end
+    func scale_region(
+        location_id : felt,
+        item_id : felt,
+        factor : felt
+    ):
+    end
+    func quote_pair(
+        location_id : felt,
+        item_id : felt
+    ) -> (
+        item_quantity : felt,
+        money_quantity : felt
+    ):
+    end
 end
 
 
@@ -105,6 +151,19 @@ namespace I03_UserOwned:
         location_id : felt
     ):
     end
+    func read_inventory(
+        user_id : felt
+    ) -> (
+        items_len : felt,
+        items : felt*
+    ):
+    end
+    func write_inventory(
+        user_id : felt,
+        items_len : felt,
+        items : felt*
+    ):
+    end
 end
 
 
@@ -167,6 +226,24 @@ namespace I06_DrugLord:
         stat_hash : felt
     ):
     end
+    func drug_lords_read(
+        location_ids_len : felt,
+        location_ids : felt*
+    ) -> (
+        user_ids_len : felt,
+        user_ids : felt*,
+        stat_hashes_len : felt,
+        stat_hashes : felt*
+    ):
+    end
+    func all_drug_lords_read(
+    ) -> (
+        user_ids_len : felt,
+        user_ids : felt*,
+        stat_hashes_len : felt,
+        stat_hashes : felt*
+    ):
+    end
 end
 
 
@@ -184,4 +261,18 @@ namespace I07_PseudoRandom:
         num_to_use : felt
     ):
     end
+    func get_city_pseudorandom(
+        city : felt
+    ) -> (
+        num_to_use : felt
+    ):
+    end
+    func add_to_city_seed(
+        city : felt,
+        val0 : felt,
+        val1 : felt
+    ) -> (
+        num_to_use : felt
+    ):
+    end
 end
\ No newline at end of file
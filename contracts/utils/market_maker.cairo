@@ -1,5 +1,6 @@
 
 from starkware.cairo.common.math import assert_nn_le, unsigned_div_rem
+from starkware.cairo.common.math_cmp import is_nn_le
 
 # The maximum value an item can have.
 const BALANCE_UPPER_BOUND = 2 ** 64
@@ -42,3 +43,32 @@ func trade{
         market_a_post + market_b_post + user_gets_b)
     return (market_a_post, market_b_post, user_gets_b)
 end
+
+# The user_gets_b of trade() for the same order, or 0 if trade() would
+# fail. Never fails, for quotes.
+func quote{
+        range_check_ptr
+    }(
+        market_a_pre : felt,
+        market_b_pre : felt,
+        user_gives_a : felt
+    ) -> (
+        user_gets_b : felt
+    ):
+    alloc_locals
+    let (local a_in_range) = is_nn_le(market_a_pre, BALANCE_UPPER_BOUND - 1)
+    let (local b_in_range) = is_nn_le(market_b_pre, BALANCE_UPPER_BOUND - 1)
+    let (local gives_in_range) = is_nn_le(user_gives_a,
+        BALANCE_UPPER_BOUND - 1)
+    local in_range = a_in_range * b_in_range * gives_in_range
+    if in_range == 0:
+        return (0)
+    end
+    if user_gives_a == 0:
+        return (0)
+    end
+    # Below 1 if the trade would fail.
+    let (user_gets_b, _) = unsigned_div_rem(
+        market_b_pre * user_gives_a, market_a_pre + user_gives_a)
+    return (user_gets_b)
+end
@@ -0,0 +1,114 @@
+import pytest
+import asyncio
+import numpy as np
+from utils.turn_analytics import (simulate, run, arun, read_files,
+    contract_turn_logs, EVENTS, LOCATIONS, ITEMS, MIN_TURN_LOCKOUT)
+
+N_TURNS = 5000
+
+
+def test_pipeline_matches_log(tmp_path):
+    logs = list(simulate(N_TURNS, seed=1))
+    analytics = run(iter(logs), str(tmp_path), chunk_size=700,
+        window_turns=400, windows=3)
+    assert analytics.count == N_TURNS
+
+    # The chunks hold the whole log, in order.
+    chunks = list(read_files(str(tmp_path)))
+    assert len(chunks) == -(-N_TURNS // 700)
+    clocks = np.concatenate([c['clock'] for c in chunks])
+    assert list(clocks) == [clock for clock, _ in logs]
+    amounts = np.concatenate([c['amount_to_give'] for c in chunks])
+    assert list(amounts) == [log.amount_to_give for _, log in logs]
+
+    # Totals from a plain pass over the log.
+    trades = np.zeros((LOCATIONS, ITEMS), dtype=np.int64)
+    item_volume = np.zeros((LOCATIONS, ITEMS))
+    hits = np.zeros(len(EVENTS), dtype=np.int64)
+    last_price = {}
+    money = {}
+    for _, log in logs:
+        market = (log.location_id, log.item_id - 1)
+        trades[market] += log.trade_occurs_bool
+        item_volume[market] += abs(log.market_post_trade_pre_event_item -
+            log.market_pre_trade_item)
+        hits += [getattr(log, e) for e in EVENTS]
+        last_price[market] = log.market_post_trade_post_event_money / \
+            log.market_post_trade_post_event_item
+        money[log.user_id] = log.user_post_trade_post_event_money
+    totals = analytics.totals()
+    assert (totals['trades'] == trades).all()
+    assert np.allclose(totals['item_volume'], item_volume)
+    assert (totals['event_hits'].sum(axis=0) == hits).all()
+    for market, price in last_price.items():
+        assert totals['last_price'][market] == pytest.approx(price)
+    assert totals['user_money'].sum() == sum(money.values())
+
+    # Every window was written once, in order, and they add up.
+    windows = list(read_files(str(tmp_path), 'windows'))
+    index = np.concatenate([w['window'] for w in windows])
+    assert list(index) == list(range(-(-N_TURNS // 400)))
+    turns = np.concatenate([w['turns'] for w in windows])
+    assert turns.sum() == N_TURNS
+    window_trades = np.concatenate([w['trades'] for w in windows])
+    assert (window_trades.sum(axis=0) == trades).all()
+    # The rolling view is the last three windows.
+    assert (analytics.rolling()['trades'] ==
+        window_trades[-3:].sum(axis=0)).all()
+    assert windows[-1]['money_supply'][-1] == totals['money_supply']
+
+    with np.load(str(tmp_path / 'aggregates.npz')) as data:
+        assert int(data['count']) == N_TURNS
+        assert len(data['users']) == len(money)
+
+
+def test_chunking_does_not_change_results():
+    a = run(simulate(2000, seed=2), chunk_size=2000).totals()
+    b = run(simulate(2000, seed=2), chunk_size=37).totals()
+    for key in a:
+        assert np.array_equal(a[key], b[key], equal_nan=True)
+
+
+@pytest.mark.asyncio
+async def test_contract_source(ctx_factory):
+    ctx = ctx_factory()
+    turns = [("alice", 34, 0, 13, 2000), ("bob", 35, 0, 13, 1000),
+        ("carol", 12, 0, 2, 500)]
+    for player, location_id, buy_or_sell, item_id, amount in turns:
+        await ctx.execute(player, ctx.engine.contract_address, 'have_turn',
+            [location_id, buy_or_sell, item_id, amount])
+    analytics = await arun(contract_turn_logs(ctx.engine), chunk_size=2)
+    totals = analytics.totals()
+    assert analytics.count == len(turns)
+    assert totals['turns'][34, 12] == totals['turns'][35, 12] == 1
+    assert totals['turns'][12, 1] == 1
+    assert totals['turns'].sum() == len(turns)
+    assert len(totals['user_money']) == len(turns)
+
+
+@pytest.mark.asyncio
+async def test_contract_source_city_clocks(ctx_factory):
+    ctx = ctx_factory()
+    await ctx.execute("dave", ctx.engine.contract_address, 'have_turn',
+        [0, 0, 1, 100])
+    await ctx.execute("admin", ctx.engine.contract_address,
+        'enable_city_clocks', [])
+    turns = [("alice", 34, 0, 13, 2000), ("bob", 35, 0, 13, 1000),
+        ("carol", 12, 0, 2, 500)]
+    for player, location_id, buy_or_sell, item_id, amount in turns:
+        await ctx.execute(player, ctx.engine.contract_address, 'have_turn',
+            [location_id, buy_or_sell, item_id, amount])
+    # Turns of all clocks, numbered in one order.
+    rows = [row async for row in contract_turn_logs(ctx.engine)]
+    assert [clock for clock, _ in rows] == list(range(
+        MIN_TURN_LOCKOUT + 1, MIN_TURN_LOCKOUT + 5))
+    assert rows[0][1].user_id == ctx.dave.contract_address
+    assert sorted(log.user_id for _, log in rows[1:]) == sorted(
+        getattr(ctx, player).contract_address for player, *_ in turns)
+    rows = [row async for row in contract_turn_logs(ctx.engine,
+        first=MIN_TURN_LOCKOUT + 2, last=MIN_TURN_LOCKOUT + 3)]
+    assert len(rows) == 2
+
+    analytics = await arun(contract_turn_logs(ctx.engine), chunk_size=2)
+    assert analytics.count == len(turns) + 1
+    assert analytics.totals()['turns'][34, 12] == 1
@@ -0,0 +1,112 @@
+import pytest
+import asyncio
+from utils.city_clocks import (Turn, merge, global_turn_logs, city_of,
+    CITIES, MIN_TURN_LOCKOUT)
+
+
+async def have_turn(ctx, account_name, location_id, buy_or_sell, item_id,
+        amount_to_give):
+    await ctx.execute(
+        account_name,
+        ctx.engine.contract_address,
+        'have_turn',
+        [location_id, buy_or_sell, item_id, amount_to_give])
+
+
+def storage(ctx):
+    # (address, key) -> value of every contract.
+    return {(address, key): leaf.value for address, state in
+        ctx.starknet.state.state.contract_states.items()
+        for key, leaf in state.storage_updates.items()}
+
+
+def written(ctx, before):
+    return {k for k, v in storage(ctx).items() if before.get(k) != v}
+
+
+def test_merge():
+    a = [Turn(0, 4, 10, 'a4'), Turn(0, 5, 30, 'a5')]
+    b = [Turn(1, 4, 10, 'b4'), Turn(1, 5, 20, 'b5')]
+    legacy = [Turn(None, 4, 0, 'g4')]
+    assert [t.log for t in merge([a, b, legacy])] == \
+        ['g4', 'a4', 'b4', 'b5', 'a5']
+    assert city_of(34) == 8 and city_of(75) == CITIES - 1
+
+
+@pytest.mark.asyncio
+async def test_enable_city_clocks(ctx_factory):
+    ctx = ctx_factory()
+    with pytest.raises(Exception):
+        await ctx.execute("alice", ctx.engine.contract_address,
+            'enable_city_clocks', [])
+    await ctx.execute("admin", ctx.engine.contract_address,
+        'enable_city_clocks', [])
+    res = await ctx.engine.read_clock_mode().call()
+    assert res.result.city_clocks == 1
+    res = await ctx.engine.read_city_clocks().call()
+    assert res.result.clocks == [MIN_TURN_LOCKOUT] * CITIES
+    with pytest.raises(Exception):
+        await ctx.execute("admin", ctx.engine.contract_address,
+            'enable_city_clocks', [])
+
+
+@pytest.mark.asyncio
+async def test_city_turns(ctx_factory):
+    ctx = ctx_factory()
+    # One turn on the global clock before the switch.
+    await have_turn(ctx, "dave", 0, 0, 1, 100)
+    await ctx.execute("admin", ctx.engine.contract_address,
+        'enable_city_clocks', [])
+    await have_turn(ctx, "alice", 34, 0, 13, 2000)
+    ctx.advance_clock(10)
+    await have_turn(ctx, "bob", 12, 0, 2, 500)
+    await have_turn(ctx, "carol", 35, 0, 13, 1000)
+
+    res = await ctx.engine.read_game_clock().call()
+    assert res.result.clock == MIN_TURN_LOCKOUT + 1
+    res = await ctx.engine.read_city_clocks().call()
+    clocks = res.result.clocks
+    assert clocks[8] == MIN_TURN_LOCKOUT + 2
+    assert clocks[3] == MIN_TURN_LOCKOUT + 1
+    assert sum(clocks) == MIN_TURN_LOCKOUT * CITIES + 3
+    res = await ctx.engine.view_given_city_turn(8, clocks[8]).call()
+    assert res.result.turn_log.user_id == ctx.carol.contract_address
+    assert res.result.timestamp == ctx.get_clock()
+
+    # The lockout is per city.
+    with pytest.raises(Exception):
+        await have_turn(ctx, "alice", 33, 0, 13, 1000)
+    await have_turn(ctx, "alice", 13, 0, 2, 500)
+
+    turns = [t async for _, t in global_turn_logs(ctx.engine)]
+    assert [(t.city, t.log.user_id) for t in turns] == [
+        (None, ctx.dave.contract_address),
+        (8, ctx.alice.contract_address),
+        (3, ctx.bob.contract_address),
+        (3, ctx.alice.contract_address),
+        (8, ctx.carol.contract_address)]
+
+
+@pytest.mark.asyncio
+async def test_cities_write_disjoint_storage(ctx_factory):
+    base = ctx_factory()
+    await base.execute("admin", base.engine.contract_address,
+        'enable_city_clocks', [])
+    before = storage(base)
+    a = base.copy()
+    await have_turn(a, "alice", 34, 0, 13, 2000)
+    b = base.copy()
+    await have_turn(b, "bob", 12, 0, 2, 500)
+    a_writes = written(a, before)
+    b_writes = written(b, before)
+    assert a_writes and b_writes
+    assert not a_writes & b_writes
+
+    # Without the switch both turns write the game clock.
+    base = ctx_factory()
+    before = storage(base)
+    a = base.copy()
+    await have_turn(a, "alice", 34, 0, 13, 2000)
+    b = base.copy()
+    await have_turn(b, "bob", 12, 0, 2, 500)
+    assert written(a, before) & written(b, before)
@@ -1,7 +1,10 @@
 import pytest
 import asyncio
 import random
+from types import SimpleNamespace
 from fixtures.account import account_factory
+from utils.recorder import Recorder, load, replay, bisect
+from utils.market_cache import MarketCache
 
 # Number of ticks a player is locked out before its next turn is allowed; MUST be consistent with MIN_TURN_LOCKOUT in contract
 MIN_TURN_LOCKOUT = 3
@@ -240,3 +243,103 @@ async def test_single_turn_logic(ctx_factory):
     # random_initialized_user = await user_owned.check_user_state(
     #     user_id - 1).call()
     # print('rand user', random_initialized_user.result)
+
+
+@pytest.mark.asyncio
+async def test_record_and_replay(ctx_factory, tmp_path):
+    ctx = ctx_factory()
+    base = ctx.copy()
+    log = str(tmp_path / "session.jsonl")
+    state = random.getstate()
+    recorder = Recorder(log, seed=1).attach(ctx)
+    # Only the recorder's own RNG is seeded.
+    assert random.getstate() == state
+    for user in ["alice", "bob", "carol", "dave"]:
+        location_id = recorder.rng.randrange(76)
+        await ctx.execute(
+            user,
+            ctx.engine.contract_address,
+            'have_turn',
+            [location_id, 0, 13, 2000])
+        ctx.advance_clock(60)
+    recorder.close()
+
+    session, = load(log)
+    assert session.seed == 1
+    assert [r['a'] for r in session.records] == \
+        ["alice", "bob", "carol", "dave"]
+    res = await replay(base, session)
+    assert res.diverged_at is None
+    assert await bisect(base, session) is None
+
+    # A different trade by carol changes everything from her turn on.
+    session.records[2]['c'][3] = 1000
+    res = await replay(base, session)
+    assert res.diverged_at == 2
+    assert await bisect(base, session) == 2
+
+    # Fingerprints hold addresses, so another build is refused.
+    session.build = 'another build'
+    with pytest.raises(ValueError):
+        await replay(base, session)
+    with pytest.raises(ValueError):
+        await bisect(base, session)
+
+
+@pytest.mark.asyncio
+async def test_market_cache(ctx_factory):
+    ctx = ctx_factory()
+    cache = await MarketCache(ctx.location_owned, ctx.engine).fill(chunk=500)
+    assert len(cache.markets) == 76 * 19
+
+    # Alice's turn initializes her whole city, which the cache re-reads.
+    # Bob trades in the same city, so the cache derives it all from his
+    # TurnLog. Calls are the game and city clocks and the TurnLog plus
+    # dirty markets.
+    turns = [("alice", 34, 3 + 3), ("bob", 35, 3), ("carol", 2, 3 + 3)]
+    for user, location_id, expected_calls in turns:
+        await ctx.execute(
+            user,
+            ctx.engine.contract_address,
+            'have_turn',
+            [location_id, 0, 13, 2000])
+        calls = cache.calls
+        markets = await cache.observe()
+        assert cache.calls - calls == expected_calls
+        fresh = await MarketCache(ctx.location_owned, ctx.engine).fill()
+        assert markets == fresh.markets
+
+
+@pytest.mark.asyncio
+async def test_market_cache_city_clocks(ctx_factory):
+    ctx = ctx_factory()
+    cache = await MarketCache(ctx.location_owned, ctx.engine).fill()
+    await ctx.execute("dave", ctx.engine.contract_address, 'have_turn',
+        [0, 0, 1, 100])
+    await ctx.execute("admin", ctx.engine.contract_address,
+        'enable_city_clocks', [])
+    # Turns logged by the game clock, then by two city clocks.
+    for user, location_id in [("alice", 34), ("bob", 35), ("carol", 12)]:
+        await ctx.execute(user, ctx.engine.contract_address, 'have_turn',
+            [location_id, 0, 13, 2000])
+    calls = cache.calls
+    await cache.sync()
+    assert cache.calls - calls == 2 + 4
+    markets = await cache.observe()
+    fresh = await MarketCache(ctx.location_owned, ctx.engine).fill()
+    assert markets == fresh.markets
+    assert cache.city_clocks == fresh.city_clocks
+
+
+def test_market_cache_empty_side():
+    # A district with either side empty is re-read, not scaled.
+    cache = MarketCache(None, None)
+    cache.markets = {(32, 13): (100, 0), (33, 13): (0, 100),
+        (34, 13): (100, 100), (35, 13): (100, 100)}
+    cache.apply_turn_log(SimpleNamespace(location_id=35, item_id=13,
+        regional_item_reduction_factor=50,
+        market_post_trade_post_event_item=90,
+        market_post_trade_post_event_money=110))
+    assert cache.dirty == {(32, 13), (33, 13)}
+    assert cache.markets[(34, 13)] == (50, 100)
+    assert cache.markets[(35, 13)] == (90, 110)
@@ -1,70 +1,37 @@
 import pytest
 import asyncio
-import random
 import math
-from starkware.starknet.testing.starknet import Starknet
-from utils.Signer import Signer
-from fixtures.account import account_factory
+from utils.market_cache import MarketCache
+from utils.market_pair import initialize
+from utils.recorder import Recorder
 
 # Game parameters
 MIN_TURN_LOCKOUT = 3 # MUST be consistent with MIN_TURN_LOCKOUT in contract
-LOCATION_COUNT = 40 # Number of locations
+LOCATION_COUNT = 76 # Number of locations
 ITEM_COUNT = 19 # Number of items; item_id in [1,19]
+STARTING_MONEY = 20000 # MUST be consistent with STARTING_MONEY in contract
 
 # Playtest parameters
-NUM_SIGNING_ACCOUNTS = MIN_TURN_LOCKOUT*5 # == total user count
-DUMMY_PRIVATE = 123456789987654321
-L1_ADDRESS = 0x1f9840a85d5aF5bf1D1762F925BDADdC4201F984 # All accounts currently have the same L1 fallback address.
+PLAYERS = ["alice", "bob", "carol", "dave", "eric", "frank", "grace", "hank"]
 N_TURN = 100
+# Observation calls per turn with the market cache (sync + dirty markets).
+MAX_OBSERVATION_CALLS = 2 + 4
 
 # Logging parameters
 COLOR_GREEN = '\33[32m'
 COLOR_RED = '\33[31m'
 ENDC = '\033[0m'
 
-@pytest.mark.asyncio
-async def populated_registry(ctx_factory):
-    ctx = ctx_factory()
+async def populated_game(ctx):
+    # Every market is initialized by the admin before the first turn,
+    # so turns cost the same from the start.
+    await initialize(ctx.execute, "admin",
+        ctx.location_owned.contract_address)
+    return ctx
 
-    # Populate the registry with some data.
-    sample_data = 84622096520155505419920978765481155
-
-    # Repeating sample data
-    # Indices from 0, 20, 40, 60, 80..., have values 3.
-    # Indices from 10, 30, 50, 70, 90..., have values 1.
-    # [00010000010011000011] * 6 == [1133] * 6
-    # Populate the registry with homogeneous users (same data each).
-    await Signer.send_transaction(
-        account=admin,
-        to=registry.contract_address,
-        selector_name='admin_fill_registry',
-        calldata=[len(signers), sample_data])
-    return registry
 
 @pytest.mark.asyncio
-async def populated_game(game_factory):
-    starknet, accounts, signers, arbiter, controller, engine, \
-        location_owned, user_owned, registry, combat = game_factory
-    admin = accounts[0]
-
-    # Populate the item pair of interest across all locations.
-    total_locations = LOCATION_COUNT
-    sample_item_count_list = [total_locations] + [(i+1)*200 for i in range(40)]
-    sample_item_money_list = [total_locations] + [(i+1)*2000 for i in range(40)]
-
-    for item_id in range(1, 20):
-        # raw-interact with engine to initialize market; using admin
-        # TODO figure out how to pass list as argument to admin.tx_with_nonce()
-        await Signer.send_transaction(account=admin,
-            to=location_owned.contract_address,
-            selector_name='admin_set_pairs',
-            calldata=[sample_item_count_list, sample_item_money_list])
-
-    return engine, accounts, sample_item_count_list, sample_item_money_list
-
-@pytest.mark.asyncio
-@pytest.mark.parametrize('account_factory', [dict(num_signers=NUM_SIGNING_ACCOUNTS)], indirect=True)
-async def test_exerciser(populated_game, populated_registry):
+async def test_exerciser(ctx_factory, tmp_path):
     '''
     test_exerciser blasts random stimulus at turn-based PvE game,
     where player (P) only interacts with the game environment (E)
@@ -72,7 +39,7 @@ async def test_exerciser(populated_game, populated_registry):
     states of E as well as take action to affect the states of E.
 
     Algorithm:
-    Step 0. Observe pre-game states S, open empty action record AR (omitted)
+    Step 0. Observe pre-game states S, open empty action record AR
     Loop:
         Step 1. Choose P among player pool to make a turn based on turn model (TM)
         Step 2. P assembles action space (A) based on observation model (OM)
@@ -91,87 +58,116 @@ async def test_exerciser(populated_game, populated_registry):
     - Set BM to "randomly sample a from A"
     - Update TM by "if P has null A then add P to TM's disabled-player-list
 
+    Markets are initialized before play (populated_game), observed
+    through a MarketCache that is filled once and then only re-reads
+    what the previous turn wrote. The action record AR is a transaction
+    log (utils/recorder.py) that can be replayed.
+
     TODO: abstractify this function e.g. abstract TM, OM, BM out as classes
     '''
+    ctx = ctx_factory()
 
-    engine, accounts, _, _ = populated_game
+    # Step 0. Observe pre-game states S, open the action record AR.
+    recorder = Recorder(str(tmp_path / "exerciser.jsonl")).attach(ctx)
+    rng = recorder.rng
+    await populated_game(ctx)
+    cache = await MarketCache(ctx.location_owned, ctx.engine).fill()
+    print(f"> test_exerciser begins with {N_TURN} turns (seed {recorder.seed})")
 
-    player_ids = [i for i in range(NUM_SIGNING_ACCOUNTS)]
     loc_ids = [i for i in range(LOCATION_COUNT)]
     item_ids = [i for i in range(1,ITEM_COUNT+1)] # item_id in range [1,ITEM_COUNT]
-
-    print(f"> test_exerciser begins with {N_TURN} turns")
+    players_with_turns = set()
     disabled_players = []
 
     for turn in range(N_TURN):
 
         # Step 1. Choose player P TODO: implement disabled-player-list
-        player_id = player_ids [turn % NUM_SIGNING_ACCOUNTS]
+        player = PLAYERS[turn % len(PLAYERS)]
+        player_address = getattr(ctx, player).contract_address
 
         # Step 2. Player builds action space == [actions]
         #         where each action is {type: buy/sell, item_id: item_id, quantity: quantity}
-        p = await engine.check_user_state(player_id).invoke()
-        player_items = [ p.result.money,
-            p.result.id1, p.result.id2, p.result.id3, p.result.id4, p.result.id5, p.result.id6, p.result.id7, p.result.id8, p.result.id9, p.result.id10,
-            p.result.id11, p.result.id12, p.result.id13, p.result.id14, p.result.id15, p.result.id16, p.result.id17, p.result.id18, p.result.id19 ]
+        p = await ctx.user_owned.check_user_state(player_address).call()
+        player_items = list(p.result.items)
+        if player not in players_with_turns:
+            # Money is given at the start of the first turn.
+            player_items[0] = STARTING_MONEY
 
-        random.shuffle(loc_ids) # explore locations in different order every time
+        calls_before = cache.calls
+        await cache.sync()
+
+        rng.shuffle(loc_ids) # explore locations in different order every time
         A = [] # start with empty action space
         for loc_id in loc_ids:
-            random.shuffle(item_ids) # explore items in different order every time
+            rng.shuffle(item_ids) # explore items in different order every time
             for item_id in item_ids:
-                curve = await engine.check_market_state(loc_id, item_id).invoke()
-                curve_item = curve.result.item_quantity
-                curve_money = curve.result.money_quantity
+                curve = await cache.get(loc_id, item_id)
+                curve_item = curve.item_quantity
+                curve_money = curve.money_quantity
 
                 # Calculate price_for_one:
                 #   curve_item * curve_money = (curve_item-1) * (curve_money + X)
                 #   => X = curve_money / (curve_item-1)
                 can_pay_max = int(player_items[0])
-                if curve_item>1: # has more than one item in inventory so that price_for_one != inf:
+                if curve_item == 0 and can_pay_max > 0:
+                    # Market is initialized on first trade, price unknown.
+                    A.append({ 'type':'buy', 'item_id':item_id, 'loc_id':loc_id, 'max_give_quantity':can_pay_max, 'price_for_one':1})
+                elif curve_item>1: # has more than one item in inventory so that price_for_one != inf:
                     price_for_one = math.ceil( curve_money/(curve_item-1) ) # if paying less than one item's price, transaction will revert
                     if can_pay_max >= price_for_one: # otherwise player can't afford even one item!
-                        A.append({ 'type':'buy',  'item_id':item_id, 'max_give_quantity':can_pay_max, 'price_for_one':price_for_one})
+                        A.append({ 'type':'buy', 'item_id':item_id, 'loc_id':loc_id, 'max_give_quantity':can_pay_max, 'price_for_one':price_for_one})
 
                 # Calculate can_sell_max == "all my item"
                 can_sell_max = int(player_items[item_id])
                 if can_sell_max > 0:
-                    A.append({ 'type' : 'sell', 'item_id' : item_id, 'max_give_quantity' : can_sell_max})
+                    A.append({ 'type' : 'sell', 'item_id' : item_id, 'loc_id':loc_id, 'max_give_quantity' : can_sell_max})
 
             if len(A) > 0: # impatient player is not going to scan all locations; test runs faster
                 break
 
+        assert cache.calls - calls_before <= MAX_OBSERVATION_CALLS
         #print(f"Size of action space = {len(A)}")
 
         # Step 3. P chooses one action (a) from A based on behavior model (BM)
         # TODO: check for null A, meaning a player who traded so badly that no further trades can be made anywhere
         # TODO: Should calculate the closet price to purchase integer amount of items (avoid overpaying)
-        a = random.choice(A)
+        if len(A) == 0:
+            disabled_players.append(player)
+            continue
+        a = rng.choice(A)
         if a['type'] == 'buy':
-            give_quantity = random.randint(a['price_for_one'], a['max_give_quantity'])
+            give_quantity = rng.randint(a['price_for_one'], a['max_give_quantity'])
         else:
-            give_quantity = random.randint(1,a['max_give_quantity'])
+            give_quantity = rng.randint(1,a['max_give_quantity'])
 
-        # Step 4. P performs action a against E
+        # Step 4. P performs action a against E, add action a to AR
         buy_or_sell = 0 if a['type']=='buy' else 1
         try:
-            turn_made = await Signer.send_transaction(
-                account=accounts[1],
-                to=engine.contract_address,
-                selector_name='have_turn',
-                calldata=[player_id, loc_id,
-                buy_or_sell, a['item_id'], give_quantity]).invoke()
+            await ctx.execute(
+                player,
+                ctx.engine.contract_address,
+                'have_turn',
+                [a['loc_id'], buy_or_sell, a['item_id'], give_quantity])
+            players_with_turns.add(player)
         except Exception as e:
-            print(f'\n*** Trade failed with exception raised:\n{e}\n')
+            print(f'\n*** Trade failed with exception raised (turn #{turn}, '
+                f'replay {recorder.path}):\n{e}\n')
 
         if a['type'] == 'buy':
             color = COLOR_GREEN
         else:
             color = COLOR_RED
         # TODO: use .format() to format the print
-        print(f"> Turn #{turn} completed: player #{player_id}" + color + f" {a['type']} " + ENDC + f"item #{a['item_id']} at location #{loc_id} by giving {give_quantity}.")
+        print(f"> Turn #{turn} completed: player {player}" + color + f" {a['type']} " + ENDC + f"item #{a['item_id']} at location #{a['loc_id']} by giving {give_quantity}.")
 
         # Step 5. Update TM TODO
 
+    # The cache saw every turn through the TurnLogs.
+    await cache.sync()
+    await cache.refresh()
+    fresh = await MarketCache(ctx.location_owned, ctx.engine).fill()
+    assert cache.markets == fresh.markets
+
+    recorder.close()
     print("> test_exerciser passes.")
     return
@@ -0,0 +1,43 @@
+from utils.market_fuzz import (BALANCE_UPPER_BOUND, CUT_UPPER_BOUND,
+    FAILED, trade, fuzz, fuzz_turns, minimize, post_cut)
+
+
+def test_mirror():
+    assert trade(10, 10, 10) == (20, 5, 5)
+    # Nothing given, or an amount that rounds to zero items.
+    assert trade(10, 10, 0) == FAILED
+    assert trade(100, 1, 1) == FAILED
+    # Values must be below the upper bound.
+    assert trade(1, BALANCE_UPPER_BOUND - 1, 1) == (2, 2 ** 63, 2 ** 63 - 1)
+    assert trade(BALANCE_UPPER_BOUND - 1, BALANCE_UPPER_BOUND - 1, 1) == \
+        FAILED
+    assert trade(BALANCE_UPPER_BOUND, 10, 10) == FAILED
+    assert trade(-1, 10, 10) == FAILED
+
+
+def test_minimize():
+    case = (1000, BALANCE_UPPER_BOUND + 1, -2)
+    assert minimize(case, lambda c: c[0] >= 7) == (7, 0, 0)
+
+
+def test_fuzz_trade():
+    # Cairo and the mirror agree on edge-heavy cases.
+    res = fuzz(400, workers=2, seed=1, shard_size=100)
+    assert res.cases == 400
+    assert res.discrepancies == []
+
+
+def test_post_cut():
+    assert post_cut(451, False) == 443
+    assert post_cut(451, True) == 451
+    assert post_cut(CUT_UPPER_BOUND - 1, False) != FAILED
+    assert post_cut(CUT_UPPER_BOUND, False) == FAILED
+
+
+def test_fuzz_turns(copyable_deployment):
+    # The have_turn() pipeline agrees with the mirrors, one forked
+    # deployment per worker.
+    res = fuzz_turns(copyable_deployment, 32, workers=2, seed=1,
+        shard_size=16)
+    assert res.turns == 32
+    assert res.discrepancies == []
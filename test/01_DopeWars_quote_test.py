@@ -0,0 +1,59 @@
+import pytest
+import asyncio
+
+CITY = [32, 33, 34, 35]
+
+
+def storage(ctx):
+    # (address, key) -> value of every contract.
+    return {(address, key): leaf.value for address, state in
+        ctx.starknet.state.state.contract_states.items()
+        for key, leaf in state.storage_updates.items()}
+
+
+@pytest.mark.asyncio
+async def test_quote_matches_turn(ctx_factory):
+    ctx = ctx_factory()
+    before = storage(ctx)
+    res = await ctx.engine.quote_trade(34, 0, 13, 2000).call()
+    quote = res.result
+    # The market is generated for the quote, but not saved.
+    assert quote.market_item_quantity > 0
+    assert storage(ctx) == before
+    res = await ctx.location_owned.check_market_state(34, 13).call()
+    assert res.result.item_quantity == 0
+
+    await ctx.execute("alice", ctx.engine.contract_address, 'have_turn',
+        [34, 0, 13, 2000])
+    res = await ctx.engine.read_game_clock().call()
+    res = await ctx.engine.view_given_turn(res.result.clock).call()
+    log = res.result.turn_log
+    assert (log.market_pre_trade_item, log.market_pre_trade_money) == (
+        quote.market_item_quantity, quote.market_money_quantity)
+    assert quote.amount_to_give_post_cut == 2000 - 2000 // 100 * 2
+    if log.trade_occurs_bool:
+        assert log.user_post_trade_pre_event_item - \
+            log.user_pre_trade_item == quote.user_gets
+        assert log.market_pre_trade_item - \
+            log.market_post_trade_pre_event_item == quote.user_gets
+
+
+@pytest.mark.asyncio
+async def test_quote_trades(ctx_factory):
+    ctx = ctx_factory()
+    await ctx.execute("bob", ctx.engine.contract_address, 'have_turn',
+        [33, 0, 13, 1000])
+    res = await ctx.engine.quote_trades(0, 13, 500, CITY).call()
+    user_gets = res.result.user_gets
+    assert len(user_gets) == len(CITY)
+    for location_id, gets in zip(CITY, user_gets):
+        res = await ctx.engine.quote_trade(location_id, 0, 13, 500).call()
+        assert gets == res.result.user_gets > 0
+
+    # Trades that would fail are quoted as 0 instead of reverting.
+    res = await ctx.engine.quote_trades(1, 13, 0, CITY).call()
+    assert res.result.user_gets == [0] * len(CITY)
+    with pytest.raises(Exception):
+        await ctx.engine.quote_trade(76, 0, 13, 500).call()
+    with pytest.raises(Exception):
+        await ctx.engine.quote_trade(34, 2, 13, 500).call()
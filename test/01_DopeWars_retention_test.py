@@ -0,0 +1,120 @@
+import pytest
+import asyncio
+from utils.city_clocks import Turn, MIN_TURN_LOCKOUT
+from utils.sdk import Game
+from utils.turn_archive import Archive, Archiver, Evicted, GAME
+
+RETENTION = 2
+# (account, location_id, buy_or_sell, item_id, amount_to_give)
+TURNS = [
+    ("alice", 34, 0, 13, 2000),
+    ("bob", 12, 0, 2, 500),
+    ("carol", 35, 0, 13, 1000),
+    ("dave", 0, 0, 1, 100),
+    ("eric", 40, 0, 5, 300),
+]
+
+
+async def have_turn(ctx, account_name, location_id, buy_or_sell, item_id,
+        amount_to_give):
+    await ctx.execute(
+        account_name,
+        ctx.engine.contract_address,
+        'have_turn',
+        [location_id, buy_or_sell, item_id, amount_to_give])
+
+
+async def set_log_retention(ctx, account_name, turns):
+    await ctx.execute(account_name, ctx.engine.contract_address,
+        'set_log_retention', [turns])
+
+
+def test_archive_segments(tmp_path):
+    archiver = Archiver(None, str(tmp_path), segment_turns=4)
+    first = MIN_TURN_LOCKOUT + 1
+    archiver.append(GAME, [Turn(None, c, 0, [c, 1]) for c in
+        range(first, first + 6)])
+    archiver.append('city-03', [Turn(3, first, 77, [9, 9])])
+    archiver.append(GAME, [Turn(None, first + 6, 0, [0, 2])])
+    # Two segment files, one of them with two members.
+    assert len(archiver.archive.entries[GAME]) == 3
+    assert len(list(tmp_path.glob('game-*.gz'))) == 2
+
+    # A second reader sees everything, by clock.
+    archive = Archive(str(tmp_path))
+    assert archive.lookup(GAME, first + 5).log == [first + 5, 1]
+    assert archive.lookup(GAME, first + 6).log == [0, 2]
+    assert archive.lookup(3, first) == Turn(3, first, 77, [9, 9])
+    assert archive.lookup(GAME, first + 7) is None
+    assert [t.clock for t in archive.turns(GAME)] == \
+        list(range(first, first + 7))
+
+    # And follows the index as it grows.
+    archiver.append(GAME, [Turn(None, first + 7, 0, [0, 3])])
+    assert archive.lookup(GAME, first + 7).log == [0, 3]
+
+
+@pytest.mark.asyncio
+async def test_set_log_retention(ctx_factory):
+    ctx = ctx_factory()
+    with pytest.raises(Exception):
+        await set_log_retention(ctx, "alice", RETENTION)
+    with pytest.raises(Exception):
+        await set_log_retention(ctx, "admin", 0)
+    await set_log_retention(ctx, "admin", RETENTION)
+    res = await ctx.engine.read_log_retention().call()
+    assert res.result.turns == RETENTION
+    with pytest.raises(Exception):
+        await set_log_retention(ctx, "admin", RETENTION + 1)
+
+    # Only before the first turn.
+    ctx = ctx_factory()
+    await have_turn(ctx, *TURNS[0])
+    with pytest.raises(Exception):
+        await set_log_retention(ctx, "admin", RETENTION)
+
+
+@pytest.mark.asyncio
+async def test_evicted_turns_are_archived(ctx_factory, tmp_path):
+    ctx = ctx_factory()
+    await set_log_retention(ctx, "admin", RETENTION)
+    Archiver(ctx.engine, str(tmp_path)).attach(ctx)
+    for turn in TURNS:
+        await have_turn(ctx, *turn)
+
+    res = await ctx.engine.read_game_clock().call()
+    last = res.result.clock
+    first = MIN_TURN_LOCKOUT + 1
+    assert last == first + len(TURNS) - 1
+    # Only the last RETENTION logs are kept on-chain.
+    for clock in range(first, last - RETENTION + 1):
+        with pytest.raises(Exception):
+            await ctx.engine.view_given_turn(clock).call()
+    res = await ctx.engine.view_given_turn(last).call()
+    assert res.result.turn_log.user_id == ctx.eric.contract_address
+
+    # The archive has all of them.
+    archive = Archive(str(tmp_path))
+    users = [getattr(ctx, name).contract_address for name, *_ in TURNS]
+    assert [t.clock for t in archive.turns(GAME)] == \
+        list(range(first, last + 1))
+    assert archive.lookup(GAME, last).log == list(res.result.turn_log)
+    game = await Game.in_process(ctx, "alice", archive=archive)
+    for clock, user_id in zip(range(first, last + 1), users):
+        log = (await game.engine.view_given_turn(clock)).turn_log
+        assert log.user_id == user_id
+        assert log.location_id == TURNS[clock - first][1]
+
+
+@pytest.mark.asyncio
+async def test_eviction_before_sync(ctx_factory, tmp_path):
+    ctx = ctx_factory()
+    await set_log_retention(ctx, "admin", RETENTION)
+    archiver = Archiver(ctx.engine, str(tmp_path))
+    for turn in TURNS[:RETENTION]:
+        await have_turn(ctx, *turn)
+    assert await archiver.sync() == RETENTION
+    for turn in TURNS[RETENTION:]:
+        await have_turn(ctx, *turn)
+    with pytest.raises(Evicted):
+        await archiver.sync()
@@ -0,0 +1,129 @@
+import pytest
+import asyncio
+import itertools
+import numpy as np
+from utils.route_planner import (Planner, Snapshot, fetch_snapshot,
+    load_travel_costs, snapshot_from_states, travel_matrix, CITIES,
+    DISTRICTS, LOCATIONS, ITEMS, MARKETS, TRAVEL_MONEY)
+
+START = 34
+
+
+def random_snapshot(seed):
+    rng = np.random.default_rng(seed)
+    item = rng.integers(0, 3000, size=(LOCATIONS, ITEMS))
+    money = rng.integers(0, 30000, size=(LOCATIONS, ITEMS))
+    return snapshot_from_states(item.reshape(-1), money.reshape(-1))
+
+
+def scalar_hop(snapshot, travel, lords, location, money, held, spend,
+        item_id, sell_at):
+    # One hop, one trade at a time as have_turn() prices it. None if a
+    # trade would fail.
+    def cut(amount, location_id):
+        return amount if lords[location_id] else amount - amount // 100 * 2
+
+    def amm(a, b, gives):
+        gets = b * gives // (a + gives) if a + gives else 0
+        return gets if gives >= 1 and gets >= 1 else None
+
+    index = item_id - 1
+    bought = 0
+    if spend:
+        bought = amm(int(snapshot.money[location, index]),
+            int(snapshot.item[location, index]), cut(spend, location))
+        if bought is None:
+            return None
+    got = amm(int(snapshot.item[sell_at, index]),
+        int(snapshot.money[sell_at, index]),
+        cut(bought + held.get(item_id, 0), sell_at))
+    if got is None:
+        return None
+    left = money - spend + got - int(travel[location, sell_at])
+    return left if left >= 0 else None
+
+
+def brute_force(planner, snapshot, start, money, held, hops):
+    # Best money at every location after hops hops, by enumeration.
+    best = {start: money}
+    for n in range(hops):
+        after = {}
+        for (location, have), item_id, sell_at, step in itertools.product(
+                best.items(), range(1, ITEMS + 1), range(LOCATIONS),
+                planner.steps):
+            spend = have * int(step) // planner.spend_steps
+            left = scalar_hop(snapshot, planner.travel, planner.lords,
+                location, have, held if n == 0 else {}, spend, item_id,
+                sell_at)
+            if left is not None and left > after.get(sell_at, -1):
+                after[sell_at] = left
+        best = after
+    return best
+
+
+def test_travel_costs():
+    costs = load_travel_costs()
+    assert len(costs) == CITIES
+    travel = travel_matrix(costs)
+    # Free within a city, the cost of the destination otherwise.
+    assert travel[32:36, 32:36].tolist() == [[0] * DISTRICTS] * DISTRICTS
+    assert travel[0, 33] == costs[8] * TRAVEL_MONEY // 1000
+    assert travel[33, 0] == costs[0] * TRAVEL_MONEY // 1000
+
+
+def test_plan_matches_brute_force():
+    snapshot = random_snapshot(0)
+    lords = np.zeros(LOCATIONS, dtype=bool)
+    lords[[START, 5, 60]] = True
+    planner = Planner(snapshot, lords=lords)
+    held = {13: 40, 2: 7}
+    for hops in [1, 2]:
+        routes = planner.plan(START, 20000, held, hops=hops,
+            top=LOCATIONS)
+        expected = brute_force(planner, snapshot, START, 20000, held, hops)
+        assert {r.hops[-1].sell_at: r.money for r in routes} == expected
+
+        # Each route replays hop by hop.
+        for route in routes[:5]:
+            assert len(route.hops) == hops
+            money, location = 20000, START
+            for n, hop in enumerate(route.hops):
+                assert hop.buy_at == location
+                money = scalar_hop(snapshot, planner.travel, lords,
+                    location, money, held if n == 0 else {}, hop.spend,
+                    hop.item_id, hop.sell_at)
+                assert money == hop.money
+                location = hop.sell_at
+            assert money == route.money
+    assert [r.money for r in routes] == sorted(
+        [r.money for r in routes], reverse=True)
+
+
+def test_inventory_only():
+    # Without money, only the inventory can be sold.
+    planner = Planner(random_snapshot(1), travel=np.zeros(
+        (LOCATIONS, LOCATIONS), dtype=np.int64))
+    routes = planner.plan(START, 0, {7: 100})
+    assert routes[0].hops[0].item_id == 7
+    assert routes[0].hops[0].spend == 0
+    assert planner.plan(START, 0) == []
+
+
+@pytest.mark.asyncio
+async def test_snapshot_matches_quote(ctx_factory):
+    ctx = ctx_factory()
+    await ctx.execute("alice", ctx.engine.contract_address, 'have_turn',
+        [34, 0, 13, 2000])
+    snapshot = await fetch_snapshot(ctx.location_owned)
+    planner = Planner(snapshot)
+    route = planner.plan(34, 5000, hops=1, top=1)[0]
+    hop = route.hops[0]
+    # The first trade of the route is priced as quote_trade prices it.
+    res = await ctx.engine.quote_trade(hop.buy_at, 0, hop.item_id,
+        hop.spend).call()
+    assert res.result.user_gets == hop.bought
+    for location_id in [0, 34, 75]:
+        res = await ctx.engine.quote_trade(location_id, 0, 5, 100).call()
+        assert (res.result.market_item_quantity,
+            res.result.market_money_quantity) == (
+            snapshot.item[location_id, 4], snapshot.money[location_id, 4])
@@ -0,0 +1,119 @@
+import pytest
+import asyncio
+from utils.market_pair import storage_key, MARKETS
+from utils.regional_supply import (Eager, Lazy, market_turn, simulate,
+    DISTRICTS, ITEMS, REGION_PAGE)
+
+# Accounts that take turns in turn, so none is locked out.
+PLAYERS = ["alice", "bob", "carol", "dave", "eric", "frank", "grace",
+    "hank"]
+
+
+def written(ctx, before):
+    # Storage keys of 02_LocationOwned changed since before.
+    address = ctx.location_owned.contract_address
+    slots = ctx.starknet.state.state.contract_states[address].storage_updates
+    return {k for k, leaf in slots.items() if before.get(k) != leaf.value}
+
+
+def snapshot(ctx):
+    address = ctx.location_owned.contract_address
+    slots = ctx.starknet.state.state.contract_states[address].storage_updates
+    return {k: leaf.value for k, leaf in slots.items()}
+
+
+def test_lazy_matches_eager():
+    # Many turns per region, all markets compared after every turn.
+    res = simulate(5000, seed=1, cities=[8], items=[13, 2])
+    assert res.mismatches == []
+    res = simulate(50000, seed=2, check_every=500)
+    assert res.mismatches == []
+    # A turn writes the head of its region, and a page and the four
+    # markets every REGION_PAGE turns, rather than four markets.
+    assert res.lazy_writes < res.eager_writes / 2
+    # No read applies more than a page of turns.
+    assert res.lazy.max_lag == REGION_PAGE
+
+
+def test_empty_markets_are_generated_again():
+    # Seizures without trades empty the other districts, which are
+    # generated again by the next turn of the region.
+    eager, lazy = Eager(), Lazy()
+    emptied = False
+    for n in range(3 * REGION_PAGE * 4):
+        factor = 100 if n % 7 == 6 else 80
+        for markets in (eager, lazy):
+            market_turn(markets, 32, 13, 0, 1, False, factor)
+        for location_id in range(32, 36):
+            market = eager.check_market_state(location_id, 13)
+            assert lazy.check_market_state(location_id, 13) == market
+            emptied = emptied or market[0] == 0
+    assert emptied
+
+
+@pytest.mark.asyncio
+async def test_contract_matches_eager(ctx_factory):
+    ctx = ctx_factory()
+    eager = Eager()
+    turns = 2 * REGION_PAGE + 2
+    region_turns = {13: 0, 2: 0}
+    for n in range(turns):
+        # Buying in the four districts of city 8, mostly item 13.
+        location_id = 32 + n % DISTRICTS
+        item_id = 13 if n % 5 else 2
+        before = snapshot(ctx)
+        await ctx.execute(PLAYERS[n % len(PLAYERS)],
+            ctx.engine.contract_address, 'have_turn',
+            [location_id, 0, item_id, 200])
+        # Only the traded market and the head of the region are
+        # written. When a page fills up, also the page of factors and
+        # the four markets of the region.
+        writes = written(ctx, before)
+        assert storage_key(location_id // DISTRICTS, item_id,
+            'region_head') in writes
+        full = region_turns[item_id] and \
+            region_turns[item_id] % REGION_PAGE == 0
+        assert len(writes) <= (2 + DISTRICTS if full else 2)
+        region_turns[item_id] += 1
+
+        res = await ctx.engine.read_game_clock().call()
+        res = await ctx.engine.view_given_turn(res.result.clock).call()
+        log = res.result.turn_log
+        assert eager.read_pair(location_id, item_id) == (
+            log.market_pre_trade_item, log.market_pre_trade_money)
+        eager.write_pair(location_id, item_id,
+            log.market_post_trade_pre_event_item,
+            log.market_post_trade_pre_event_money)
+        eager.scale_region(location_id, item_id,
+            log.regional_item_reduction_factor)
+        assert eager.read_pair(location_id, item_id) == (
+            log.market_post_trade_post_event_item,
+            log.market_post_trade_post_event_money)
+
+    res = await ctx.location_owned.check_market_states(0, MARKETS).call()
+    markets = list(zip(res.result.item_quantities,
+        res.result.money_quantities))
+    for index, market in enumerate(markets):
+        location_id, item_index = divmod(index, ITEMS)
+        assert market == eager.check_market_state(location_id,
+            item_index + 1)
+
+
+@pytest.mark.asyncio
+async def test_read_cost_is_bounded(ctx_factory):
+    # A district nobody trades in costs the same to read whatever the
+    # number of turns of its region, as at most a page of them is
+    # applied.
+    ctx = ctx_factory()
+    steps = []
+    for n in range(2 * REGION_PAGE + 3):
+        await ctx.execute(PLAYERS[n % len(PLAYERS)],
+            ctx.engine.contract_address, 'have_turn', [32, 0, 13, 200])
+        with ctx.profile() as p:
+            await ctx.location_owned.check_market_state(35, 13).call()
+        steps.append(p.total_steps())
+    # steps[n] is the read after n + 1 turns, so a page apart the same
+    # turns are pending.
+    for n in range(REGION_PAGE, REGION_PAGE + 3):
+        assert steps[n + REGION_PAGE] == steps[n]
+    assert max(steps[REGION_PAGE:]) <= max(steps[:REGION_PAGE])
@@ -0,0 +1,194 @@
+import pytest
+import asyncio
+from starkware.starknet.storage.starknet_storage import StorageLeaf
+from utils.market_pair import (pack, unpack, storage_key, migrate,
+    initialize, PAIR_SHIFT, MARKETS, ITEMS)
+from utils.regional_supply import fill
+
+
+def storage(ctx):
+    address = ctx.location_owned.contract_address
+    return ctx.starknet.state.state.contract_states[address].storage_updates
+
+
+def read_slot(ctx, key):
+    leaf = storage(ctx).get(key)
+    return 0 if leaf is None else leaf.value
+
+
+def write_legacy(ctx, location_id, item_id, item, money):
+    # State as written before market_pair existed.
+    slots = storage(ctx)
+    slots[storage_key(location_id, item_id, 'location_has_item')] = \
+        StorageLeaf(item)
+    slots[storage_key(location_id, item_id, 'location_has_money')] = \
+        StorageLeaf(money)
+
+
+def step_limited(ctx, max_steps):
+    # As ctx.execute, but a transaction of more than max_steps fails
+    # without being applied, as over the step limit of the network.
+    # Returns (execute, calldata of every attempt).
+    attempts = []
+
+    async def execute(account_name, address, selector_name, calldata):
+        attempts.append(calldata)
+        tx = await ctx.copy().execute(account_name, address, selector_name,
+            calldata)
+        if tx.call_info.cairo_usage.n_steps > max_steps:
+            raise Exception(f'{selector_name} {calldata}: over {max_steps} '
+                'steps')
+        return await ctx.execute(account_name, address, selector_name,
+            calldata)
+
+    return execute, attempts
+
+
+def test_codec():
+    for pair in [(0, 0), (1, 0), (0, 1), (1000, 10000),
+            (PAIR_SHIFT - 1, PAIR_SHIFT - 1)]:
+        assert unpack(pack(*pair)) == pair
+    assert pack(1, 2) == PAIR_SHIFT + 2
+    with pytest.raises(ValueError):
+        pack(PAIR_SHIFT, 0)
+    with pytest.raises(ValueError):
+        pack(0, -1)
+
+
+@pytest.mark.asyncio
+async def test_turn_uses_packed_pair(ctx_factory):
+    ctx = ctx_factory()
+    await ctx.execute("alice", ctx.engine.contract_address, 'have_turn',
+        [34, 0, 13, 2000])
+    res = await ctx.engine.read_game_clock().call()
+    res = await ctx.engine.view_given_turn(res.result.clock).call()
+    log = res.result.turn_log
+    res = await ctx.location_owned.check_market_state(34, 13).call()
+    market = (res.result.item_quantity, res.result.money_quantity)
+    assert market == (log.market_post_trade_post_event_item,
+        log.market_post_trade_post_event_money)
+    # The regional factor of the turn is applied on read.
+    assert unpack(read_slot(ctx, storage_key(34, 13))) == (
+        log.market_post_trade_pre_event_item,
+        log.market_post_trade_pre_event_money)
+    assert read_slot(ctx, storage_key(34, 13, 'location_has_item')) == 0
+    assert read_slot(ctx, storage_key(34, 13, 'location_has_money')) == 0
+
+
+@pytest.mark.asyncio
+async def test_migration(ctx_factory):
+    ctx = ctx_factory()
+    legacy = {(0, 1): (500, 7000), (5, 19): (12, 345), (75, 19): (1, 2)}
+    for (location_id, item_id), pair in legacy.items():
+        write_legacy(ctx, location_id, item_id, *pair)
+
+    # Legacy markets are visible before migration.
+    for (location_id, item_id), pair in legacy.items():
+        res = await ctx.location_owned.check_market_state(location_id,
+            item_id).call()
+        assert (res.result.item_quantity, res.result.money_quantity) == pair
+    res = await ctx.location_owned.check_market_states(0, MARKETS).call()
+    before = list(zip(res.result.item_quantities,
+        res.result.money_quantities))
+
+    # Anyone may migrate.
+    assert await migrate(ctx.execute, "alice",
+        ctx.location_owned.contract_address, chunk=400) == 4
+    for (location_id, item_id), pair in legacy.items():
+        assert unpack(read_slot(ctx, storage_key(location_id, item_id))) \
+            == pair
+        for name in ['location_has_item', 'location_has_money']:
+            assert read_slot(ctx, storage_key(location_id, item_id,
+                name)) == 0
+    # Uninitialized markets stay uninitialized.
+    assert read_slot(ctx, storage_key(0, 2)) == 0
+    res = await ctx.location_owned.check_market_states(0, MARKETS).call()
+    assert list(zip(res.result.item_quantities,
+        res.result.money_quantities)) == before
+
+    # A legacy market is also moved by its first trade.
+    write_legacy(ctx, 1, 1, 800, 9000)
+    await ctx.execute("bob", ctx.engine.contract_address, 'have_turn',
+        [1, 0, 1, 900])
+    res = await ctx.engine.read_game_clock().call()
+    res = await ctx.engine.view_given_turn(res.result.clock).call()
+    log = res.result.turn_log
+    assert (log.market_pre_trade_item, log.market_pre_trade_money) == \
+        (800, 9000)
+    assert read_slot(ctx, storage_key(1, 1, 'location_has_item')) == 0
+    assert unpack(read_slot(ctx, storage_key(1, 1))) == (
+        log.market_post_trade_pre_event_item,
+        log.market_post_trade_pre_event_money)
+
+
+async def market_states(ctx):
+    res = await ctx.location_owned.check_market_states(0, MARKETS).call()
+    return list(zip(res.result.item_quantities,
+        res.result.money_quantities))
+
+
+@pytest.mark.asyncio
+async def test_init_markets(ctx_factory):
+    ctx = ctx_factory()
+    address = ctx.location_owned.contract_address
+    with pytest.raises(Exception):
+        await ctx.execute("alice", address, 'init_markets', [0, 1])
+    with pytest.raises(Exception):
+        await ctx.execute("admin", address, 'init_markets', [MARKETS, 1])
+
+    # A legacy market, and markets of city 8 with a regional turn.
+    write_legacy(ctx, 0, 1, 500, 7000)
+    await ctx.execute("alice", ctx.engine.contract_address, 'have_turn',
+        [34, 0, 13, 2000])
+    before = await market_states(ctx)
+
+    # Planned for four times the actual limit, chunks fail and are
+    # halved until they fit.
+    start, count = 32 * ITEMS - 1, 4 * ITEMS + 2
+    execute, attempts = step_limited(ctx, 40000)
+    sent = await initialize(execute, "admin", address, start, count,
+        max_steps=4 * 40000)
+    assert len(sent) > 1
+    assert len(attempts) > len(sent)
+    assert [lo for lo, _, _ in sent] == [start] + [lo + n for lo, n, _ in
+        sent[:-1]]
+    assert sum(n for _, n, _ in sent) == count
+    assert all(steps <= 40000 for _, _, steps in sent)
+    await initialize(ctx.execute, "admin", address, 0, 1)
+    # A single market over the limit is an error.
+    execute, _ = step_limited(ctx, 100)
+    with pytest.raises(Exception):
+        await initialize(execute, "admin", address, 1, 4)
+
+    # Every market reads as its first read would have generated it.
+    after = await market_states(ctx)
+    for index, (pre, post) in enumerate(zip(before, after)):
+        location_id, item_index = divmod(index, ITEMS)
+        if index == 0 or start <= index < start + count:
+            assert post == fill(location_id, item_index + 1, *pre)
+            assert unpack(read_slot(ctx, storage_key(location_id,
+                item_index + 1))) == post
+        else:
+            assert post == pre
+    assert read_slot(ctx, storage_key(0, 1, 'location_has_item')) == 0
+
+    # Initialized markets are not written again.
+    slots = {k: leaf.value for k, leaf in storage(ctx).items()}
+    await initialize(ctx.execute, "admin", address, start, count)
+    assert {k: leaf.value for k, leaf in storage(ctx).items()} == slots
+
+
+@pytest.mark.asyncio
+async def test_turn_after_init_markets(ctx_factory):
+    # The first turn at a market no longer generates it.
+    turn = [33, 0, 13, 2000]
+    for initialized in [False, True]:
+        ctx = ctx_factory()
+        if initialized:
+            await initialize(ctx.execute, "admin",
+                ctx.location_owned.contract_address, 33 * ITEMS, ITEMS)
+        with ctx.profile() as p:
+            await ctx.execute("alice", ctx.engine.contract_address,
+                'have_turn', turn)
+        generated = "location_owned::generate_curve" in p.functions()
+        assert generated != initialized
@@ -0,0 +1,79 @@
+import pytest
+import asyncio
+from starkware.starknet.storage.starknet_storage import StorageLeaf
+from utils.inventory import (pack, unpack, pack_slot, unpack_slot, locate,
+    storage_key, legacy_storage_key, BALANCE_SHIFT, INVENTORY_SIZE,
+    INVENTORY_SLOTS)
+
+
+def storage(ctx):
+    address = ctx.user_owned.contract_address
+    return ctx.starknet.state.state.contract_states[address].storage_updates
+
+
+def read_words(ctx, user_id):
+    slots = storage(ctx)
+    return [slots[storage_key(user_id, slot)].value
+        if storage_key(user_id, slot) in slots else 0
+        for slot in range(INVENTORY_SLOTS)]
+
+
+def test_codec():
+    items = list(range(INVENTORY_SIZE))
+    items[7] = BALANCE_SHIFT - 1
+    words = pack(items)
+    assert len(words) == INVENTORY_SLOTS
+    assert unpack(words) == items
+    assert unpack_slot(pack_slot([1, 2])) == [1, 2, 0]
+    assert locate(0) == (0, 0)
+    assert locate(19) == (6, 1)
+    # Unwritten slots come from the legacy layout.
+    words[2] = 0
+    assert unpack(words, lambda item_id: 100 + item_id)[6:9] == \
+        [106, 107, 108]
+    with pytest.raises(ValueError):
+        pack_slot([BALANCE_SHIFT])
+    with pytest.raises(ValueError):
+        locate(INVENTORY_SIZE)
+
+
+@pytest.mark.asyncio
+async def test_turn_writes_packed_slots(ctx_factory):
+    ctx = ctx_factory()
+    alice = ctx.alice.contract_address
+    await ctx.execute("alice", ctx.engine.contract_address, 'have_turn',
+        [34, 0, 13, 2000])
+    res = await ctx.user_owned.check_user_state(alice).call()
+    items = res.result.items
+    assert len(items) == INVENTORY_SIZE
+    res = await ctx.user_owned.read_inventory(alice).call()
+    assert res.result.items == items
+    words = read_words(ctx, alice)
+    # Money (slot 0) and item 13 (slot 4) were written.
+    assert [slot for slot, w in enumerate(words) if w] == [0, 4]
+    assert unpack(words) == items
+    assert legacy_storage_key(alice, 0) not in storage(ctx)
+
+
+@pytest.mark.asyncio
+async def test_legacy_inventory(ctx_factory):
+    ctx = ctx_factory()
+    dave = ctx.dave.contract_address
+    # State as written before packing was introduced.
+    legacy = {4: 7, 12: 3, 14: 11}
+    for item_id, value in legacy.items():
+        storage(ctx)[legacy_storage_key(dave, item_id)] = StorageLeaf(value)
+    res = await ctx.user_owned.check_user_state(dave).call()
+    assert {i: v for i, v in enumerate(res.result.items) if v} == legacy
+
+    # Buying item 13 moves its slot (items 12 to 14) only.
+    await ctx.execute("dave", ctx.engine.contract_address, 'have_turn',
+        [34, 0, 13, 2000])
+    words = read_words(ctx, dave)
+    assert words[1] == 0
+    lanes = unpack_slot(words[4])
+    assert lanes[0] == 3 and lanes[2] == 11
+    res = await ctx.user_owned.check_user_state(dave).call()
+    items = res.result.items
+    assert items[4] == 7
+    assert unpack(words, lambda item_id: legacy.get(item_id, 0)) == items
@@ -0,0 +1,138 @@
+import pytest
+import asyncio
+import numpy as np
+from starkware.starknet.public.abi import get_storage_var_address
+from starkware.starknet.storage.starknet_storage import StorageLeaf
+from utils.combat import (fight_1v1, search, random_legal_stats,
+    combat_log, pack_combat_log, unpack_combat_log, replay, HEALTH_OFFSET)
+from utils.drug_lord_index import stat_hash
+
+# Stats of the first drug lord. Legal: quadratic total 396.
+LORD_STATS = [3] * 16
+
+
+def set_lord(ctx, location_id, account_name, lord_stats):
+    # Stores a lord directly, e.g. one whose stats were never checked.
+    slots = ctx.starknet.state.state.contract_states[
+        ctx.drug_lord.contract_address].storage_updates
+    slots[get_storage_var_address('drug_lord', location_id)] = StorageLeaf(
+        getattr(ctx, account_name).contract_address)
+    slots[get_storage_var_address('drug_lord_stat_hash', location_id)] = \
+        StorageLeaf(stat_hash(lord_stats))
+
+
+async def challenge(ctx, account_name, user_stats, lord_stats):
+    await ctx.execute(
+        account_name,
+        ctx.combat.contract_address,
+        'challenge_current_drug_lord',
+        [len(user_stats)] + list(user_stats) +
+        [len(lord_stats)] + list(lord_stats))
+
+
+@pytest.mark.asyncio
+async def test_combat_matches_python_engine(ctx_factory):
+    rng = np.random.default_rng(0)
+    best, _ = search(LORD_STATS, n_candidates=1000, generations=5, seed=0)
+    challengers = [
+        [5] * 16,  # Illegal: quadratic total 1100.
+        [0] * 16,
+        [int(x) for x in best[0]],
+    ] + [[int(x) for x in s] for s in random_legal_stats(5, rng)]
+    expected = fight_1v1(challengers, LORD_STATS)
+    # Both outcomes are covered.
+    assert expected[0] == 0
+    assert expected[2] == 1
+    assert 0 in expected and 1 in expected
+
+    for user_stats, user_wins in zip(challengers, expected):
+        ctx = ctx_factory()
+        # With no current lord, the first challenger takes the title.
+        await challenge(ctx, "alice", LORD_STATS, [])
+        res = await ctx.drug_lord.drug_lord_read(0).call()
+        assert res.result.user_id == ctx.alice.contract_address
+
+        await challenge(ctx, "bob", user_stats, LORD_STATS)
+        res = await ctx.drug_lord.drug_lord_read(0).call()
+        winner = ctx.bob if user_wins else ctx.alice
+        assert res.result.user_id == winner.contract_address
+
+        # The fight is recorded and can be replayed.
+        res = await ctx.combat.read_combat_count().call()
+        assert res.result.count == 2
+        res = await ctx.combat.view_combat(2).call()
+        c = res.result.combat_details
+        assert c.index == 2
+        assert c.user == ctx.bob.contract_address
+        assert c.drug_lord == ctx.alice.contract_address
+        assert c.winner == winner.contract_address
+        log = combat_log(user_stats, LORD_STATS)
+        assert [c.move_sequence_1, c.move_sequence_2, c.move_sequence_3,
+            c.move_sequence_4] == pack_combat_log(log)
+        fight = replay(c, user_stats, LORD_STATS)
+        assert [(t.user_health, t.lord_health)
+            for t in fight.timeline] == log
+        if log:
+            last = fight.timeline[-1]
+            lord_defeated = last.lord_health <= 0 < last.user_health
+            assert lord_defeated == bool(user_wins)
+
+
+@pytest.mark.asyncio
+async def test_wrong_lord_stats(ctx_factory):
+    ctx = ctx_factory()
+    await challenge(ctx, "alice", LORD_STATS, [])
+    best, _ = search(LORD_STATS, n_candidates=1000, generations=5, seed=0)
+    # A winning loadout is not enough if the lord stats are wrong.
+    await challenge(ctx, "bob", [int(x) for x in best[0]], [4] * 16)
+    res = await ctx.drug_lord.drug_lord_read(0).call()
+    assert res.result.user_id == ctx.alice.contract_address
+
+
+@pytest.mark.asyncio
+async def test_stats_length_and_lord_range(ctx_factory):
+    ctx = ctx_factory()
+    await challenge(ctx, "alice", LORD_STATS, [])
+    # Short arrays are rejected rather than read past.
+    with pytest.raises(Exception):
+        await challenge(ctx, "bob", [0] * 15, LORD_STATS)
+    with pytest.raises(ValueError):
+        fight_1v1([0] * 15, LORD_STATS)
+
+    # A lord with stats out of range cannot defend the title.
+    ctx = ctx_factory()
+    lord_stats = [40] * 16
+    set_lord(ctx, 0, "alice", lord_stats)
+    assert fight_1v1([0] * 16, lord_stats)[0] == 1
+    assert combat_log([0] * 16, lord_stats) == []
+    await challenge(ctx, "bob", [0] * 16, lord_stats)
+    res = await ctx.drug_lord.drug_lord_read(0).call()
+    assert res.result.user_id == ctx.bob.contract_address
+
+
+@pytest.mark.asyncio
+async def test_first_claim_is_checked(ctx_factory):
+    ctx = ctx_factory()
+    # Illegal stats do not take the title, even with no lord.
+    await challenge(ctx, "alice", [5] * 16, [])
+    res = await ctx.drug_lord.drug_lord_read(0).call()
+    assert res.result.user_id == 0
+    with pytest.raises(Exception):
+        await challenge(ctx, "alice", LORD_STATS[:-1], [])
+    await challenge(ctx, "alice", LORD_STATS, [])
+    res = await ctx.drug_lord.drug_lord_read(0).call()
+    assert res.result.user_id == ctx.alice.contract_address
+
+
+def test_logged_healths_fit():
+    # Healths stop at 0 and legal fighters stay far inside the packed
+    # range, so every log packs and unpacks unchanged.
+    rng = np.random.default_rng(1)
+    users = random_legal_stats(200, rng)
+    lords = random_legal_stats(200, rng)
+    for user_stats, lord_stats in zip(users, lords):
+        log = combat_log(user_stats, lord_stats)
+        assert all(h >= 0 for entry in log for h in entry)
+        assert unpack_combat_log(pack_combat_log(log)) == log
+    with pytest.raises(ValueError):
+        pack_combat_log([(HEALTH_OFFSET, 0)])
@@ -0,0 +1,102 @@
+import pytest
+import asyncio
+from types import SimpleNamespace
+from utils.drug_lord_index import (DrugLordIndex, LOCATIONS, NO_LORD,
+    cut_of_turn, stat_hash)
+
+# Stats of the first drug lord. Legal: quadratic total 396.
+LORD_STATS = [3] * 16
+
+
+async def challenge(ctx, account_name, user_stats, lord_stats):
+    await ctx.execute(
+        account_name,
+        ctx.combat.contract_address,
+        'challenge_current_drug_lord',
+        [len(user_stats)] + list(user_stats) +
+        [len(lord_stats)] + list(lord_stats))
+
+
+async def have_turn(ctx, account_name, location_id, buy_or_sell, item_id,
+        amount_to_give):
+    await ctx.execute(
+        account_name,
+        ctx.engine.contract_address,
+        'have_turn',
+        [location_id, buy_or_sell, item_id, amount_to_give])
+
+
+@pytest.mark.asyncio
+async def test_bulk_views(ctx_factory):
+    ctx = ctx_factory()
+    res = await ctx.drug_lord.all_drug_lords_read().call()
+    assert res.result.user_ids == [NO_LORD] * LOCATIONS
+    assert res.result.stat_hashes == [0] * LOCATIONS
+
+    # Users start in location 0.
+    await challenge(ctx, "alice", LORD_STATS, [])
+    res = await ctx.drug_lord.all_drug_lords_read().call()
+    lords = res.result
+    assert lords.user_ids == [ctx.alice.contract_address] + \
+        [NO_LORD] * (LOCATIONS - 1)
+    res = await ctx.drug_lord.drug_lord_stat_hash_read(0).call()
+    assert lords.stat_hashes[0] == res.result.stat_hash == \
+        stat_hash(LORD_STATS)
+
+    res = await ctx.drug_lord.drug_lords_read([5, 0, 5]).call()
+    assert res.result.user_ids == [NO_LORD, ctx.alice.contract_address,
+        NO_LORD]
+    assert res.result.stat_hashes == [0, lords.stat_hashes[0], 0]
+    res = await ctx.drug_lord.drug_lords_read([]).call()
+    assert res.result.user_ids == []
+
+    with pytest.raises(Exception):
+        await ctx.drug_lord.drug_lords_read([LOCATIONS]).call()
+
+
+@pytest.mark.asyncio
+async def test_lord_index(ctx_factory):
+    ctx = ctx_factory()
+    alice = ctx.alice.contract_address
+    attached = await DrugLordIndex(ctx).fill()
+    polled = await DrugLordIndex(ctx).fill()
+    attached.attach(ctx)
+    start = attached.clock
+
+    await challenge(ctx, "alice", LORD_STATS, [])
+    await polled.sync()
+    assert attached.lord(0) == polled.lord(0) == alice
+    assert attached.turnover()[0] == 1
+
+    # Bob pays the lord 2% of the money he gives.
+    await have_turn(ctx, "bob", 0, 0, 1, 2000)
+    # The lord does not pay.
+    await have_turn(ctx, "alice", 0, 0, 2, 3000)
+    # Without a lord, the cut goes to user 0.
+    await have_turn(ctx, "carol", 5, 0, 3, 1000)
+    await polled.sync()
+
+    for index in [attached, polled]:
+        assert index.revenue(alice) == {0: 40}
+        assert index.revenue(NO_LORD, 5) == {0: 20}
+        assert index.lord_at(0, start) is None
+        assert index.lord_at(0, start + 1) == alice
+        history = index.history(alice)
+        assert len(history) == 1
+        assert history[0].location_id == 0
+        assert history[0].start == start
+        assert history[0].end is None
+        assert history[0].turns == 2
+        assert index.combat_count == 1
+    assert attached.tenures == polled.tenures
+
+
+def test_cut_of_turn():
+    log = SimpleNamespace(user_id=1, location_id=0, buy_or_sell=1,
+        item_id=7, amount_to_give=451)
+    # Sellers pay in the item they sell, whole percents only.
+    assert cut_of_turn(log, 2) == (7, 8)
+    assert cut_of_turn(log, 1) == (0, 0)
+    log.buy_or_sell = 0
+    log.amount_to_give = 99
+    assert cut_of_turn(log, 2) == (0, 0)
@@ -0,0 +1,245 @@
+import pytest
+import asyncio
+from utils.state_channel import (ChannelPeer, LocalTransport, Action,
+    DURATION, check_state_transition, exchange)
+
+# How long a channel offer persists ('time-units')
+OFFER_DURATION = 20
+
+
+async def open_channel(ctx):
+    # Alice queues, Bob is matched with her. Bob sends the tx that
+    # opens the channel so is recorded at index 0 in the channel.
+    await ctx.execute(
+        "alice",
+        ctx.state_channel.contract_address,
+        'signal_available',
+        [OFFER_DURATION, ctx.signers["alice"].public_key])
+    await ctx.execute(
+        "bob",
+        ctx.state_channel.contract_address,
+        'signal_available',
+        [OFFER_DURATION, ctx.signers["bob"].public_key])
+
+
+def make_peers(ctx, channel_id=1):
+    # Players sign moves with the key they registered for the channel.
+    bob_transport, alice_transport = LocalTransport.pair()
+    keys = (ctx.signers["bob"].public_key, ctx.signers["alice"].public_key)
+    peers = []
+    for index, name, transport in [(0, "bob", bob_transport),
+            (1, "alice", alice_transport)]:
+        async def execute(to, selector_name, calldata, name=name):
+            return await ctx.execute(name, to, selector_name, calldata)
+        peer = ChannelPeer(index, ctx.signers[name].private_key, transport,
+            execute=execute,
+            channel_address=ctx.state_channel.contract_address)
+        peer.attach(channel_id, keys)
+        peers.append(peer)
+    return peers
+
+
+def walk(peer, nonce):
+    # Small steps along the x axis, always within MAX_X.
+    return Action(nonce % 5, 0, 1)
+
+
+@pytest.mark.asyncio
+async def test_channel_open(ctx_factory):
+    ctx = ctx_factory()
+    await ctx.execute(
+        "alice",
+        ctx.state_channel.contract_address,
+        'signal_available',
+        [OFFER_DURATION, ctx.signers["alice"].public_key])
+
+    res = await ctx.state_channel.status_of_player(
+        ctx.alice.contract_address).call()
+    assert res.result.game_key == ctx.signers["alice"].public_key
+    assert res.result.queue_len == 1
+    assert res.result.index_in_queue == 0
+    c = res.result.channel_details
+    assert c.id == 0  # Empty channel has zero ID.
+    assert c.addresses == (0, 0)
+    res = await ctx.state_channel.read_queue_length().call()
+    assert res.result.length == 1
+
+    # Second user signals availability and is matched.
+    await ctx.execute(
+        "bob",
+        ctx.state_channel.contract_address,
+        'signal_available',
+        [OFFER_DURATION, ctx.signers["bob"].public_key])
+
+    res = await ctx.state_channel.read_queue_length().call()
+    assert res.result.length == 0
+
+    res = await ctx.state_channel.status_of_player(
+        ctx.bob.contract_address).call()
+    assert res.result.game_key == ctx.signers["bob"].public_key
+    assert res.result.queue_len == 0
+    assert res.result.index_in_queue == 0
+    c = res.result.channel_details
+    assert c.id == 1  # First channel has id==1.
+    assert c.opened_at_block == 1
+    assert c.last_challenged_at_block == 1
+    # Bob opens channel so is recorded at index 0 in the channel.
+    assert c.addresses[0] == ctx.bob.contract_address
+    assert c.addresses[1] == ctx.alice.contract_address
+    assert c.balance == (100, 100)
+    assert c.initial_channel_data == 987654321
+    print("Passed: Open a channel.")
+
+
+@pytest.mark.asyncio
+async def test_queue_function(ctx_factory):
+    ctx = ctx_factory()
+    # User signals availability and submits a pubkey for the channel.
+    await ctx.execute(
+        "alice",
+        ctx.state_channel.contract_address,
+        'signal_available',
+        [OFFER_DURATION, ctx.signers["alice"].public_key])
+
+    res = await ctx.state_channel.read_queue_length().call()
+    assert res.result.length == 1
+    assert res.result.player_at_index_0 == ctx.alice.contract_address
+
+    # Alice cannot rejoin queue.
+    with pytest.raises(Exception):
+        await ctx.execute(
+            "alice",
+            ctx.state_channel.contract_address,
+            'signal_available',
+            [OFFER_DURATION, ctx.signers["alice"].public_key])
+
+    # Second user signals availability and is matched.
+    await ctx.execute(
+        "bob",
+        ctx.state_channel.contract_address,
+        'signal_available',
+        [OFFER_DURATION, ctx.signers["bob"].public_key])
+
+    # Bob matches, channel should open and queue length reduces.
+    res = await ctx.state_channel.read_queue_length().call()
+    assert res.result.length == 0
+
+    # Alice cannot rejoin queue now they are in a channel.
+    with pytest.raises(Exception):
+        await ctx.execute(
+            "alice",
+            ctx.state_channel.contract_address,
+            'signal_available',
+            [OFFER_DURATION, ctx.signers["alice"].public_key])
+
+    # Third user signals availability and enters the queue.
+    await ctx.execute(
+        "carol",
+        ctx.state_channel.contract_address,
+        'signal_available',
+        [OFFER_DURATION, ctx.signers["carol"].public_key])
+
+    res = await ctx.state_channel.read_queue_length().call()
+    assert res.result.length == 1
+
+    res = await ctx.state_channel.status_of_player(
+        ctx.carol.contract_address).call()
+    assert res.result.game_key == ctx.signers["carol"].public_key
+    assert res.result.queue_len == 1
+    assert res.result.index_in_queue == 0
+
+
+@pytest.mark.asyncio
+async def test_cooperative_close(ctx_factory):
+    ctx = ctx_factory()
+    await open_channel(ctx)
+    bob, alice = make_peers(ctx)
+
+    # All moves are exchanged off-chain.
+    cheater = await exchange(bob, alice, walk)
+    assert cheater is None
+    assert alice.latest.nonce == DURATION
+    assert [m.hash for m in alice.moves] == [m.hash for m in bob.moves]
+
+    # The final move is signed by Alice (index 1), either may submit.
+    await bob.close()
+
+    for player in [ctx.alice, ctx.bob]:
+        res = await ctx.state_channel.status_of_player(
+            player.contract_address).call()
+        assert res.result.game_key == 0
+        assert res.result.channel_details.id == 0
+
+
+@pytest.mark.asyncio
+async def test_submit_bad_state(ctx_factory):
+    ctx = ctx_factory()
+    await open_channel(ctx)
+    bob, alice = make_peers(ctx)
+
+    # Bob commits to jumping across the map on his first move. The
+    # move is revealed two moves later and breaks the movement rule.
+    def jump(peer, nonce):
+        if peer is bob and nonce == 1:
+            return Action(50, 0, 1)
+        return walk(peer, nonce)
+
+    detector = await exchange(bob, alice, jump)
+    assert detector is alice
+    bad_move, parent_move = alice.evidence
+    assert bad_move.player_index == 0
+    assert bad_move.nonce == 3
+    assert check_state_transition(parent_move, bad_move) == 0
+
+    # A valid transition cannot be disputed.
+    valid, valid_parent = alice.moves[2], alice.moves[1]
+    alice.evidence = (valid, valid_parent)
+    with pytest.raises(Exception):
+        await alice.dispute()
+
+    # The bad move is punished on L2 and the channel is closed.
+    alice.evidence = (bad_move, parent_move)
+    await alice.dispute()
+
+    for player in [ctx.alice, ctx.bob]:
+        res = await ctx.state_channel.status_of_player(
+            player.contract_address).call()
+        assert res.result.game_key == 0
+        assert res.result.channel_details.id == 0
+
+
+@pytest.mark.asyncio
+async def test_offer_expiry(ctx_factory):
+    ctx = ctx_factory()
+    # Alice's offer expires straight away.
+    await ctx.execute(
+        "alice",
+        ctx.state_channel.contract_address,
+        'signal_available',
+        [0, ctx.signers["alice"].public_key])
+
+    # Bob is not matched with the expired offer and waits instead.
+    await ctx.execute(
+        "bob",
+        ctx.state_channel.contract_address,
+        'signal_available',
+        [OFFER_DURATION, ctx.signers["bob"].public_key])
+    res = await ctx.state_channel.read_queue_length().call()
+    assert res.result.length == 1
+    assert res.result.player_at_index_0 == ctx.bob.contract_address
+    res = await ctx.state_channel.status_of_player(
+        ctx.alice.contract_address).call()
+    assert res.result.game_key == 0
+
+    # Alice can signal again and is matched with Bob.
+    await ctx.execute(
+        "alice",
+        ctx.state_channel.contract_address,
+        'signal_available',
+        [OFFER_DURATION, ctx.signers["alice"].public_key])
+    res = await ctx.state_channel.status_of_player(
+        ctx.alice.contract_address).call()
+    c = res.result.channel_details
+    assert c.id == 1
+    assert c.addresses == (ctx.alice.contract_address, ctx.bob.contract_address)
+    assert res.result.queue_len == 0
@@ -0,0 +1,96 @@
+import pytest
+import asyncio
+from starkware.cairo.lang.cairo_constants import DEFAULT_PRIME
+from utils.wall import WallReader, MAX_PAGE_SIZE
+
+NUM_TAGS = 12
+PAGE_SIZE = 5
+
+
+async def leave_tags(ctx, n):
+    for i in range(n):
+        await ctx.execute(
+            "alice",
+            ctx.wall.contract_address,
+            'leave_tag',
+            [1000 + i])
+
+
+async def respect(ctx, tag_index, times):
+    for _ in range(times):
+        await ctx.execute(
+            "bob",
+            ctx.wall.contract_address,
+            'respect_a_tag',
+            [tag_index])
+
+
+@pytest.mark.asyncio
+async def test_read_tags_page(ctx_factory):
+    ctx = ctx_factory()
+    await leave_tags(ctx, NUM_TAGS)
+    await respect(ctx, 3, 2)
+
+    res = await ctx.wall.read_tags_page(10, PAGE_SIZE).call()
+    assert res.result.tags == [1010, 1011]
+    assert res.result.points == [0, 0]
+    res = await ctx.wall.read_tags_page(NUM_TAGS, PAGE_SIZE).call()
+    assert res.result.tags == []
+    for offset in [NUM_TAGS + 1, DEFAULT_PRIME - 1]:
+        with pytest.raises(Exception):
+            await ctx.wall.read_tags_page(offset, PAGE_SIZE).call()
+    with pytest.raises(Exception):
+        await ctx.wall.read_tags_page(0, MAX_PAGE_SIZE + 1).call()
+
+    # The full read agrees with the pages.
+    res = await ctx.wall.read_tags().call()
+    assert res.result.tags == [1000 + i for i in range(NUM_TAGS)]
+    assert res.result.points[3] == 2
+
+    reader = WallReader(ctx.wall, page_size=PAGE_SIZE)
+    tags = [t async for t in reader.stream()]
+    assert [t.text for t in tags] == res.result.tags
+    assert [t.points for t in tags] == res.result.points
+    # One count and three pages.
+    assert reader.calls == 4
+
+    # Texts are cached, only the count is read again.
+    texts = [t.text async for t in reader.stream(with_points=False)]
+    assert texts == res.result.tags
+    assert reader.calls == 5
+
+    # New tags are fetched, the rest come from the cache.
+    await leave_tags(ctx, 1)
+    texts = [t.text async for t in reader.stream(with_points=False)]
+    assert texts[-1] == 1000
+    assert reader.calls == 7
+
+
+@pytest.mark.asyncio
+async def test_top_tags(ctx_factory):
+    ctx = ctx_factory()
+    await leave_tags(ctx, NUM_TAGS)
+    await respect(ctx, 5, 1)
+    await respect(ctx, 7, 3)
+    await respect(ctx, 2, 2)
+    # Tag 5 overtakes tag 2 and ties with tag 7 then passes it.
+    await respect(ctx, 5, 3)
+
+    reader = WallReader(ctx.wall)
+    top = await reader.top(3)
+    assert [t.index for t in top] == [5, 7, 2]
+    assert [t.points for t in top] == [4, 3, 2]
+    assert [t.text for t in top] == [1005, 1007, 1002]
+
+    # Only tags with points are ranked.
+    res = await ctx.wall.read_top_tags(10).call()
+    assert res.result.tag_indices == [5, 7, 2]
+    with pytest.raises(Exception):
+        await ctx.wall.read_top_tags(11).call()
+    with pytest.raises(Exception):
+        await respect(ctx, NUM_TAGS, 1)
+    # -1 must not wrap into range.
+    with pytest.raises(Exception):
+        await respect(ctx, DEFAULT_PRIME - 1, 1)
+    res = await ctx.wall.read_top_tags(10).call()
+    assert res.result.tag_indices == [5, 7, 2]
@@ -0,0 +1,63 @@
+import pytest
+import asyncio
+import numpy as np
+from utils.bell_labs import (TABLES_PATH, NUM_SLOTS, NUM_AXES,
+    NEUTRAL_SCORE, SLOT, RED, GREEN, BLUE, render_tables, all_scores,
+    item_score, aggregate_scores, batch_scores)
+
+# Knife, White T Shirt, ATV, ... (see mappings/data_encoding.md).
+ITEMS = [2, 0, 4, 1, 7, 3, 2, 6, 4, 1, 30, 5]
+# AK47, Porsche, Nike Cortez, Gold Chain, Diamond Ring and Cocaine.
+STRONG_ITEMS = [5, 0, 1, 0, 8, 0, 2, 2, 0, 1, 0, 0]
+# Unknown items score neutral.
+UNKNOWN_ITEMS = [100] * NUM_SLOTS
+
+
+def test_tables_up_to_date():
+    # Run bin/gen after changing mappings/*.csv.
+    with open(TABLES_PATH) as f:
+        assert f.read() == render_tables()
+
+
+@pytest.mark.asyncio
+async def test_all_scores(ctx_factory):
+    ctx = ctx_factory()
+    for items in [ITEMS, STRONG_ITEMS, UNKNOWN_ITEMS]:
+        res = await ctx.bell_labs.get_all_scores(items).call()
+        assert res.result.scores == all_scores(items)
+    assert all_scores(UNKNOWN_ITEMS) == [NEUTRAL_SCORE] * \
+        (NUM_SLOTS * NUM_AXES)
+
+    with pytest.raises(Exception):
+        await ctx.bell_labs.get_all_scores(ITEMS[:-1]).call()
+
+
+@pytest.mark.asyncio
+async def test_item_and_aggregate_scores(ctx_factory):
+    ctx = ctx_factory()
+    items = tuple(STRONG_ITEMS)
+    for axis in [RED, GREEN, BLUE]:
+        for slot in [SLOT['weapon'], SLOT['clothes'], SLOT['vehicle']]:
+            res = await ctx.bell_labs.get_item_score(
+                axis, slot, items).call()
+            assert res.result.result == item_score(axis, slot, STRONG_ITEMS)
+        res = await ctx.bell_labs.get_aggregate_score(
+            axis, STRONG_ITEMS).call()
+        assert res.result.score == aggregate_scores(STRONG_ITEMS)[0,
+            axis - 1]
+
+    # The AK47 is strong, the clothes have no table.
+    assert item_score(RED, SLOT['weapon'], STRONG_ITEMS) == 99
+    assert item_score(RED, SLOT['clothes'], STRONG_ITEMS) == NEUTRAL_SCORE
+    with pytest.raises(Exception):
+        await ctx.bell_labs.get_item_score(4, 0, items).call()
+
+
+def test_batch_scores():
+    rng = np.random.default_rng(0)
+    tokens = rng.integers(0, 20, size=(8000, NUM_SLOTS))
+    scores = batch_scores(tokens)
+    assert scores.shape == (8000, NUM_SLOTS, NUM_AXES)
+    assert ((scores >= 0) & (scores <= 99)).all()
+    for i in [0, 1234, 7999]:
+        assert list(scores[i].reshape(-1)) == all_scores(tokens[i])
@@ -0,0 +1,121 @@
+import pytest
+import asyncio
+from types import SimpleNamespace
+from utils.deploy import (Deployer, Manifest, Ref, STEPS, MODULES,
+    ACCEPTED, check_graph, dependencies, invoke)
+
+NETWORK = 'testnet'
+PRIVATE_KEY = 123456789
+
+
+class FakeNode():
+    # Gateway and feeder gateway of a fake network. A transaction is
+    # RECEIVED on its first status poll, then accepted, or rejected if
+    # its step is in reject.
+    def __init__(self, reject=()):
+        self.reject = set(reject)
+        self.count = 0
+        # tx_hash -> step name, filled by RecordingDeployer.
+        self.names = {}
+        self.polls = {}
+        # ('submit' or 'accept' or 'reject', step name), in order.
+        self.events = []
+
+    async def add_transaction(self, tx):
+        self.count += 1
+        return dict(transaction_hash=hex(self.count),
+            address=hex(0x1000 + self.count))
+
+    async def get_transaction_status(self, tx_hash):
+        self.polls[tx_hash] = self.polls.get(tx_hash, 0) + 1
+        if self.polls[tx_hash] == 1:
+            return dict(tx_status='RECEIVED')
+        name = self.names.get(tx_hash)
+        if name in self.reject:
+            self.events.append(('reject', name))
+            return dict(tx_status='REJECTED')
+        self.events.append(('accept', name))
+        return dict(tx_status='ACCEPTED_ON_L2')
+
+    async def call_contract(self, invoke_tx):
+        # The account nonce.
+        return dict(result=['0x0'])
+
+
+class RecordingDeployer(Deployer):
+    def __init__(self, manifest, node):
+        super().__init__(NETWORK, 'http://localhost/', manifest,
+            PRIVATE_KEY, poll_interval=0, gateway=node, feeder=node)
+        self.node = node
+        self.submitted = []
+
+    def log(self, name, message):
+        pass
+
+    def deploy_transaction(self, contract, salt, inputs):
+        # No compiled artifacts are needed by the fake gateway.
+        return SimpleNamespace(contract=contract, inputs=inputs)
+
+    async def submit(self, step, inputs):
+        self.submitted.append(step.name)
+        record = await super().submit(step, inputs)
+        self.node.names[record['tx_hash']] = step.name
+        self.node.events.append(('submit', step.name))
+        return record
+
+
+def test_check_graph():
+    check_graph(STEPS)
+    with pytest.raises(ValueError):
+        check_graph([invoke('a', Ref('b'), 'f', [])])
+    with pytest.raises(ValueError):
+        check_graph([invoke('a', Ref('b'), 'f', []),
+            invoke('b', Ref('a'), 'f', [])])
+
+
+@pytest.mark.asyncio
+async def test_steps_run_in_dependency_order(tmp_path):
+    manifest = Manifest(str(tmp_path / 'deployment.json'), NETWORK)
+    node = FakeNode()
+    deployer = RecordingDeployer(manifest, node)
+    await deployer.run(STEPS)
+
+    assert sorted(deployer.submitted) == sorted(s.name for s in STEPS)
+    events = node.events
+    for step in STEPS:
+        submitted = events.index(('submit', step.name))
+        for d in dependencies(step):
+            assert events.index(('accept', d)) < submitted
+    # Independent modules are in flight together.
+    first_accept = min(events.index(('accept', m)) for m in MODULES)
+    assert all(events.index(('submit', m)) < first_accept for m in MODULES)
+
+    saved = Manifest(manifest.path, NETWORK)
+    assert all(saved.steps[s.name]['status'] in ACCEPTED for s in STEPS)
+
+
+@pytest.mark.asyncio
+async def test_resume_after_rejection(tmp_path):
+    path = str(tmp_path / 'deployment.json')
+    node = FakeNode(reject=['set_address_of_controller'])
+    deployer = RecordingDeployer(Manifest(path, NETWORK), node)
+    with pytest.raises(RuntimeError):
+        await deployer.run(STEPS)
+
+    # The rejected step is not recorded, nor what depends on it. The
+    # other steps finished.
+    saved = Manifest(path, NETWORK)
+    assert 'set_address_of_controller' not in saved.steps
+    assert 'batch_set_controller_addresses' not in saved.steps
+    assert all(saved.steps[m]['status'] in ACCEPTED for m in MODULES)
+
+    # A step left pending is polled again rather than resubmitted.
+    saved.steps['06_DrugLord']['status'] = 'RECEIVED'
+    saved.save()
+    node = FakeNode()
+    deployer = RecordingDeployer(Manifest(path, NETWORK), node)
+    await deployer.run(STEPS)
+    assert deployer.submitted == ['set_address_of_controller',
+        'batch_set_controller_addresses']
+    saved = Manifest(path, NETWORK)
+    assert all(saved.steps[s.name]['status'] in ACCEPTED for s in STEPS)
@@ -0,0 +1,44 @@
+import random
+from functools import reduce
+from starkware.cairo.common.hash_state import compute_hash_on_elements \
+    as reference_hash_on_elements
+from starkware.crypto.signature.signature import pedersen_hash
+from utils import pedersen
+
+
+def test_matches_reference():
+    rng = random.Random(3)
+    pairs = [(rng.randrange(2 ** 251), rng.randrange(2 ** 251))
+        for _ in range(20)] + [(0, 0), (1, 0), (0, 1)]
+    for a, b in pairs:
+        assert pedersen.hash2(a, b) == pedersen_hash(a, b)
+    assert pedersen.hash_many(pairs) == [pedersen_hash(a, b)
+        for a, b in pairs]
+    data = [rng.randrange(2 ** 251) for _ in range(7)]
+    assert pedersen.compute_hash_on_elements(data) == \
+        reference_hash_on_elements(data)
+    assert pedersen.compute_hash_on_elements([]) == \
+        reference_hash_on_elements([])
+    assert pedersen.list_to_hash(data) == reduce(pedersen_hash, data, 0)
+    assert pedersen.add_to_seed(12345, 13, 2000) == \
+        12345 ^ pedersen_hash(13, 2000)
+
+
+def test_cache():
+    pedersen.cache_clear()
+    calldata = [34, 0, 13, 2000]
+    first = pedersen.compute_hash_on_elements(calldata)
+    assert pedersen.compute_hash_on_elements(tuple(calldata)) == first
+    info = pedersen.cache_info()
+    assert info['elements'].hits == 1 and info['elements'].misses == 1
+    # The pairs of a list are shared with hash2.
+    pedersen.hash2(0, 34)
+    assert pedersen.cache_info()['pairs'].hits == 1
+
+
+def test_hash_many_in_a_pool():
+    rng = random.Random(4)
+    pairs = [(rng.randrange(2 ** 64), rng.randrange(2 ** 64))
+        for _ in range(pedersen.MIN_PARALLEL)]
+    assert pedersen.hash_many(pairs, processes=2) == \
+        pedersen.hash_many(pairs)
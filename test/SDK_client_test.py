@@ -0,0 +1,122 @@
+import pytest
+import asyncio
+from utils.sdk import Codec, Game, InProcess
+
+ABI = [
+    dict(type='struct', name='Point', size=2, members=[
+        dict(name='y', offset=1, type='felt'),
+        dict(name='x', offset=0, type='felt')]),
+    dict(type='struct', name='Line', size=4, members=[
+        dict(name='a', offset=0, type='Point'),
+        dict(name='b', offset=2, type='Point')]),
+    dict(type='function', name='f', stateMutability='view',
+        inputs=[dict(name='line', type='Line'),
+            dict(name='ids_len', type='felt'),
+            dict(name='ids', type='felt*')],
+        outputs=[dict(name='count', type='felt'),
+            dict(name='points_len', type='felt'),
+            dict(name='points', type='Point*')]),
+]
+
+
+class Counting(InProcess):
+    # Records the calls reaching the transport.
+    def __init__(self, ctx, account_name):
+        super().__init__(ctx, account_name)
+        self.calls = 0
+        self.active = 0
+        self.peak = 0
+
+    async def call(self, block, address, name, calldata):
+        self.calls += 1
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(0)
+            return await super().call(block, address, name, calldata)
+        finally:
+            self.active -= 1
+
+
+def test_codec():
+    codec = Codec(ABI)
+    assert codec.is_view('f')
+    line = ((1, 2), dict(x=3, y=4))
+    assert codec.encode('f', [line], dict(ids=[7, 8])) == \
+        [1, 2, 3, 4, 2, 7, 8]
+    res = codec.decode('f', [5, 2, 1, 2, 3, 4])
+    assert res._fields == ('count', 'points')
+    assert res.count == 5
+    assert res.points[1].x == 3 and res.points[1].y == 4
+    with pytest.raises(TypeError):
+        codec.encode('f', [line], {})
+    with pytest.raises(ValueError):
+        codec.encode('f', [((1, 2),), []], {})
+
+
+@pytest.mark.asyncio
+async def test_resolve_and_decode(ctx_factory):
+    ctx = ctx_factory()
+    game = await Game.in_process(ctx, "alice")
+    for name in ['engine', 'location_owned', 'user_owned', 'registry',
+            'combat', 'drug_lord', 'pseudorandom', 'state_channel']:
+        assert getattr(game, name).address == \
+            getattr(ctx, name).contract_address
+
+    await game.engine.have_turn(34, 0, 13, 2000)
+    clock = (await game.engine.read_game_clock()).clock
+    log = (await game.engine.view_given_turn(clock)).turn_log
+    res = await ctx.engine.view_given_turn(clock).call()
+    assert log == tuple(res.result.turn_log)
+    assert log.location_id == 34 and log.item_id == 13
+
+    alice = ctx.alice.contract_address
+    items = (await game.user_owned.check_user_state(alice)).items
+    res = await ctx.user_owned.check_user_state(alice).call()
+    assert items == res.result.items
+    res = await game.drug_lord.drug_lords_read([34, 0])
+    assert len(res.user_ids) == len(res.stat_hashes) == 2
+
+
+@pytest.mark.asyncio
+async def test_cache_and_coalescing(ctx_factory):
+    ctx = ctx_factory()
+    transport = Counting(ctx, "bob")
+    game = await Game.connect(transport, ctx.controller.contract_address,
+        abis=ctx.abis)
+    calls = transport.calls
+
+    def read():
+        return game.location_owned.check_market_state(34, 13)
+
+    first = await asyncio.gather(*(read() for _ in range(10)))
+    assert transport.calls == calls + 1
+    assert game.client.stats['coalesced'] == 9
+    assert await read() == first[0]
+    assert transport.calls == calls + 1
+
+    # A turn through the client drops the cache.
+    await game.engine.have_turn(34, 0, 13, 2000)
+    after = await read()
+    assert transport.calls == calls + 2
+    assert after != first[0]
+
+    # So does a new block timestamp.
+    ctx.advance_clock(60)
+    await read()
+    assert transport.calls == calls + 3
+
+
+@pytest.mark.asyncio
+async def test_fan_out_is_bounded(ctx_factory):
+    ctx = ctx_factory()
+    transport = Counting(ctx, "carol")
+    game = await Game.connect(transport, ctx.controller.contract_address,
+        abis=ctx.abis, max_concurrency=4)
+    calls = transport.calls
+    markets = await game.fan_out(
+        lambda location_id: game.location_owned.check_market_state(
+            location_id, 13), range(ctx.consts.CITIES * 4))
+    assert len(markets) == 76
+    assert transport.calls == calls + 76
+    assert transport.peak <= 4
@@ -0,0 +1,44 @@
+import random
+import pytest
+from utils.signing import get_backend, sign_many, MIN_PARALLEL
+from utils.Signer import Signer
+
+pytest.importorskip("fastecdsa")
+
+
+def hashes(rng, n):
+    # Includes the one-nibble-short hashes that the nonce pads.
+    return [rng.randrange(2 ** bits) for bits in (1, 8, 247, 248, 249, 250,
+        251) for _ in range(n)]
+
+
+def test_fastecdsa_matches_reference():
+    rng = random.Random(1)
+    reference = get_backend("reference")
+    fast = get_backend("fastecdsa")
+    for _ in range(5):
+        private_key = rng.randrange(1, 2 ** 251)
+        assert fast.public_key(private_key) == \
+            reference.public_key(private_key)
+        for msg_hash in hashes(rng, 3):
+            assert fast.sign(msg_hash, private_key) == \
+                reference.sign(msg_hash, private_key)
+
+
+def test_signer_backends():
+    a = Signer(7891011, backend="reference")
+    b = Signer(7891011, backend="fastecdsa")
+    assert a.public_key == b.public_key
+    assert a.sign(12345) == b.sign(12345)
+    with pytest.raises(ValueError):
+        Signer(1, backend="openssl")
+
+
+def test_sign_many():
+    rng = random.Random(2)
+    signer = Signer(12345)
+    batch = [rng.randrange(2 ** 251) for _ in range(MIN_PARALLEL * 2)]
+    expected = [signer.sign(h) for h in batch]
+    assert signer.sign_many(batch, processes=2) == expected
+    assert sign_many(signer.private_key, batch[:3], "reference") == \
+        expected[:3]
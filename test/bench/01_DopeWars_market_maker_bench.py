@@ -0,0 +1,15 @@
+import os
+from utils.market_fuzz import fuzz
+
+N_CASES = 4000
+
+
+def test_fuzz_cases_per_second():
+    # Throughput should scale with the number of workers.
+    workers = 1
+    while workers <= os.cpu_count():
+        res = fuzz(N_CASES, workers=workers, seed=workers)
+        print(f"\n{workers} workers: {res.per_second:.0f} cases/s, "
+            f"{len(res.discrepancies)} discrepancies")
+        assert res.discrepancies == []
+        workers *= 2
@@ -0,0 +1,27 @@
+import pytest
+import asyncio
+
+# Writes the collapsed stacks of one turn, e.g. for:
+# flamegraph.pl have_turn.folded > have_turn.svg
+OUTPUT = "have_turn.folded"
+TOP_N = 25
+
+
+@pytest.mark.asyncio
+async def test_profile_have_turn(ctx_factory):
+    ctx = ctx_factory()
+    with ctx.profile() as p:
+        await ctx.execute(
+            "alice",
+            ctx.engine.contract_address,
+            'have_turn',
+            [34, 0, 13, 2000])
+    functions = p.functions()
+    # The whole turn is inside the account execute() entry point.
+    total = p.total_steps()
+    assert functions["alice::execute"][0] == total
+    assert functions["engine::have_turn"][0] < total
+    p.write_collapsed(OUTPUT)
+    print(f"\nhave_turn: {total} steps, stacks in {OUTPUT}")
+    print(p.table(TOP_N))
+    print(p.table(TOP_N, key='exclusive'))
@@ -0,0 +1,20 @@
+import os
+import pytest
+import asyncio
+from utils.recorder import load, replay
+
+# Replays a recorded session as a workload, e.g.:
+# REPLAY_LOG=session.jsonl pytest -s test/bench/01_DopeWars_replay_bench.py
+REPLAY_LOG = os.environ.get("REPLAY_LOG")
+
+
+@pytest.mark.skipif(REPLAY_LOG is None, reason="REPLAY_LOG is not set")
+@pytest.mark.asyncio
+async def test_replay_session(ctx_factory):
+    ctx = ctx_factory()
+    for i, session in enumerate(load(REPLAY_LOG)):
+        res = await replay(ctx, session)
+        n = len(session.records)
+        print(f"\nsession {i} (seed {session.seed}): {n} txs in "
+            f"{res.seconds:.2f}s ({n / res.seconds:.1f} txs/s), "
+            f"diverged at {res.diverged_at}")
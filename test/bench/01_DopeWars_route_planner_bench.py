@@ -0,0 +1,23 @@
+import time
+import numpy as np
+from utils.route_planner import (Planner, snapshot_from_states, LOCATIONS,
+    ITEMS)
+
+DECISIONS = 20
+HOPS = 3
+
+
+def test_decisions_per_second():
+    rng = np.random.default_rng(0)
+    snapshot = snapshot_from_states(
+        rng.integers(0, 3000, size=LOCATIONS * ITEMS),
+        rng.integers(0, 30000, size=LOCATIONS * ITEMS))
+    planner = Planner(snapshot)
+    starts = rng.integers(0, LOCATIONS, size=DECISIONS)
+    start = time.perf_counter()
+    for location_id in starts:
+        routes = planner.plan(int(location_id), 20000, {13: 50}, hops=HOPS)
+    elapsed = time.perf_counter() - start
+    print(f"\n{DECISIONS} decisions of {HOPS} hops in "
+        f"{elapsed * 1000:.1f}ms ({elapsed * 1000 / DECISIONS:.1f}ms each, "
+        f"best {routes[0].money})")
@@ -0,0 +1,25 @@
+import time
+import numpy as np
+from utils.combat import fight_1v1, random_legal_stats, search
+
+N_MATCHUPS = 1000000
+LORD_STATS = [3] * 16
+
+
+def test_matchups_per_second():
+    rng = np.random.default_rng(0)
+    users = random_legal_stats(N_MATCHUPS, rng)
+    lords = random_legal_stats(N_MATCHUPS, rng)
+    start = time.perf_counter()
+    wins = fight_1v1(users, lords)
+    elapsed = time.perf_counter() - start
+    print(f"\n{N_MATCHUPS} matchups in {elapsed:.2f}s "
+        f"({N_MATCHUPS / elapsed:.0f} matchups/s, "
+        f"{wins.mean():.1%} user wins)")
+
+
+def test_loadout_search():
+    start = time.perf_counter()
+    best, scores = search(LORD_STATS, seed=0)
+    elapsed = time.perf_counter() - start
+    print(f"\nsearch in {elapsed:.2f}s, best {list(best[0])}")
@@ -0,0 +1,110 @@
+import time
+import asyncio
+import pytest
+from starkware.crypto.signature.signature import private_to_stark_key
+from starkware.starknet.public.abi import get_storage_var_address
+from starkware.starknet.storage.starknet_storage import StorageLeaf
+from utils.state_channel import (ChannelPeer, LocalTransport, Action,
+    DURATION, exchange)
+
+# Number of channels played back to back.
+N_CHANNELS = 10
+# Queue sizes for the matchmaking benchmark.
+QUEUE_SIZES = [10, 100, 1000]
+SEEDED_PLAYER = 10**9
+
+
+def walk(peer, nonce):
+    return Action(nonce % 5, 0, 1)
+
+
+async def play_channel(channel_id, keys):
+    transport_0, transport_1 = LocalTransport.pair()
+    peers = [ChannelPeer(i, keys[i], t)
+        for i, t in enumerate([transport_0, transport_1])]
+    public_keys = [private_to_stark_key(k) for k in keys]
+    for peer in peers:
+        peer.attach(channel_id, public_keys)
+    assert await exchange(peers[0], peers[1], walk) is None
+    return len(peers[0].moves)
+
+
+@pytest.mark.asyncio
+async def test_moves_per_second():
+    # Off-chain throughput: sign, send, hash check, signature check
+    # and state transition check for every move. No L2 transactions.
+    keys = (12345, 7891011)
+    start = time.perf_counter()
+    moves = 0
+    for channel_id in range(1, N_CHANNELS + 1):
+        moves += await play_channel(channel_id, keys)
+    elapsed = time.perf_counter() - start
+    assert moves == N_CHANNELS * (DURATION + 1)
+    print(f"\n{moves} moves in {elapsed:.2f}s "
+        f"({moves / elapsed:.1f} moves/s, "
+        f"{DURATION + 1} moves per channel)")
+
+
+def storage_of(ctx, contract):
+    contract_states = ctx.starknet.state.state.contract_states
+    return contract_states[contract.contract_address].storage_updates
+
+
+def write_storage(ctx, contract, var_name, value, *keys):
+    address = get_storage_var_address(var_name, *keys)
+    storage_of(ctx, contract)[address] = StorageLeaf(value)
+
+
+def seed_queue(ctx, n, expiry):
+    # Writes n waiting players directly, as if they had signalled.
+    channel = ctx.state_channel
+    for index in range(n):
+        player = SEEDED_PLAYER + index
+        write_storage(ctx, channel, 'player_from_queue_index', player, index)
+        write_storage(ctx, channel, 'queue_index_of_player', index, player)
+        write_storage(ctx, channel, 'offer_expires', expiry, player)
+        write_storage(ctx, channel, 'player_signing_key', player, player)
+    write_storage(ctx, channel, 'queue_tail', n)
+    write_storage(ctx, channel, 'queue_length', n)
+    write_storage(ctx, channel, 'clock', 1)
+
+
+async def measure_signal(ctx, account_name):
+    # Returns (n_steps, storage writes) of one signal_available tx.
+    before = dict(storage_of(ctx, ctx.state_channel))
+    tx = await ctx.execute(
+        account_name,
+        ctx.state_channel.contract_address,
+        'signal_available',
+        [DURATION, ctx.signers[account_name].public_key])
+    after = storage_of(ctx, ctx.state_channel)
+    writes = sum(1 for k, v in after.items() if before.get(k) != v)
+    return tx.call_info.cairo_usage.n_steps, writes
+
+
+@pytest.mark.asyncio
+async def test_queue_cost(ctx_factory):
+    # Cost of signal_available against a queue of n waiting players.
+    # match: the front offer is open, the caller is matched.
+    # expire: every offer has expired, all are dropped then the caller
+    # joins. Cost per dropped offer is the amortized expiry cost.
+    ctx = ctx_factory()
+    steps, writes = await measure_signal(ctx, "bob")
+    print(f"\njoin (empty queue): {steps} steps, {writes} writes")
+
+    print(f"{'n':>6} {'match steps':>12} {'writes':>7} "
+        f"{'expire steps':>13} {'writes':>7} {'per offer':>10}")
+    for n in QUEUE_SIZES:
+        ctx = ctx_factory()
+        seed_queue(ctx, n, expiry=DURATION)
+        match_steps, match_writes = await measure_signal(ctx, "bob")
+
+        ctx = ctx_factory()
+        seed_queue(ctx, n, expiry=0)
+        expire_steps, expire_writes = await measure_signal(ctx, "bob")
+        res = await ctx.state_channel.read_queue_length().call()
+        assert res.result.length == 1
+
+        print(f"{n:>6} {match_steps:>12} {match_writes:>7} "
+            f"{expire_steps:>13} {expire_writes:>7} "
+            f"{expire_steps // n:>10}")
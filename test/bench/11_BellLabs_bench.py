@@ -0,0 +1,17 @@
+import time
+import numpy as np
+from utils.bell_labs import NUM_SLOTS, batch_scores, aggregate_scores
+
+N_TOKENS = 8000
+
+
+def test_tokens_per_second():
+    rng = np.random.default_rng(0)
+    tokens = rng.integers(0, 20, size=(N_TOKENS, NUM_SLOTS))
+    start = time.perf_counter()
+    scores = batch_scores(tokens)
+    aggregates = aggregate_scores(tokens)
+    elapsed = time.perf_counter() - start
+    print(f"\n{N_TOKENS} tokens in {elapsed * 1000:.1f}ms "
+        f"({N_TOKENS / elapsed:.0f} tokens/s, "
+        f"mean aggregate {aggregates.mean(axis=0).round(1)})")
@@ -0,0 +1,39 @@
+import os
+import time
+import random
+from starkware.crypto.signature.signature import pedersen_hash
+from utils import pedersen
+
+# Pedersen hashes per second of the shared module, e.g.:
+# pytest -s test/bench/Pedersen_bench.py
+N = 2000
+
+
+def rate(fn, n):
+    start = time.perf_counter()
+    fn()
+    return n / (time.perf_counter() - start)
+
+
+def test_hashes_per_second():
+    rng = random.Random(0)
+    pairs = [(rng.randrange(2 ** 251), rng.randrange(2 ** 251))
+        for _ in range(N)]
+    processes = os.cpu_count() or 1
+    pure = rate(lambda: [pedersen_hash(a, b) for a, b in pairs[:N // 10]],
+        N // 10)
+    pedersen.cache_clear()
+    cold = rate(lambda: pedersen.hash_many(pairs), N)
+    warm = rate(lambda: pedersen.hash_many(pairs), N)
+    pool = rate(lambda: pedersen.hash_many(pairs * 4, processes), N * 4)
+    # A signer hashes the same calldata again and again.
+    calldata = [34, 0, 13, 2000]
+    repeated = rate(lambda: [pedersen.compute_hash_on_elements(calldata)
+        for _ in range(N)], N)
+    print(f"\nbackend {pedersen.BACKEND}")
+    print(f"pure pedersen_hash    {pure:12.1f} hashes/s")
+    print(f"hash_many, cold cache {cold:12.1f} hashes/s")
+    print(f"hash_many, warm cache {warm:12.1f} hashes/s")
+    print(f"hash_many, {processes} processes {pool:12.1f} hashes/s")
+    print(f"repeated calldata     {repeated:12.1f} messages/s")
+    print(pedersen.cache_info())
@@ -0,0 +1,31 @@
+import os
+import time
+import random
+from utils.signing import available, get_backend, sign_many
+
+# Signatures per second of every installed backend, e.g.:
+# pytest -s test/bench/Signer_bench.py
+N = 200
+PRIVATE_KEY = 7891011
+
+
+def rate(fn, n):
+    start = time.perf_counter()
+    fn()
+    return n / (time.perf_counter() - start)
+
+
+def test_signatures_per_second():
+    rng = random.Random(0)
+    batch = [rng.randrange(2 ** 251) for _ in range(N)]
+    processes = os.cpu_count() or 1
+    print()
+    for name in available():
+        backend = get_backend(name)
+        backend.sign(batch[0], PRIVATE_KEY)
+        serial = rate(lambda: [backend.sign(h, PRIVATE_KEY) for h in batch],
+            N)
+        pool = rate(lambda: sign_many(PRIVATE_KEY, batch * 4, backend,
+            processes), N * 4)
+        print(f"{name:10} {serial:10.1f} sig/s, sign_many over "
+            f"{processes} processes {pool:10.1f} sig/s")
@@ -0,0 +1,19 @@
+import os
+import pytest
+import asyncio
+from utils.harness_bench import run, record, table
+
+# Times the harness phases on the cached deployment (cache_build needs a
+# fresh build, see `python -m utils.harness_bench run`), e.g.:
+# HARNESS_BENCH_SCALE=0.2 pytest -s test/bench/harness_wall_clock_bench.py
+SCALE = float(os.environ.get("HARNESS_BENCH_SCALE", 1))
+
+
+@pytest.mark.asyncio
+async def test_harness_wall_clock(copyable_deployment):
+    results = await run(copyable_deployment, scale=SCALE)
+    assert "cache_build" not in results
+    for stats in results.values():
+        assert stats["min"] <= stats["p50"] <= stats["p99"] <= stats["max"]
+    print("\n" + table(results))
+    print(f"Recorded as {record(results)}")
@@ -11,6 +11,7 @@ from starkware.starknet.testing.starknet import Starknet, StarknetContract
 from starkware.starknet.business_logic.state import BlockInfo
 
 from utils.Signer import Signer
+from utils.profiler import StepProfiler
 
 # pytest-xdest only shows stderr
 sys.stdout = sys.stderr
@@ -81,7 +82,10 @@ async def build_copyable_deployment():
         registry=compile("04_UserRegistry.cairo"),
         combat=compile("05_Combat.cairo"),
         drug_lord=compile("06_DrugLord.cairo"),
-        pseudorandom=compile("07_PseudoRandom.cairo")
+        pseudorandom=compile("07_PseudoRandom.cairo"),
+        state_channel=compile("08_StateChannel.cairo"),
+        wall=compile("09_Wall.cairo"),
+        bell_labs=compile("11_BellLabs.cairo")
     )
 
     signers = dict(
@@ -152,6 +156,18 @@ async def build_copyable_deployment():
         contract_def=defs.pseudorandom,
         constructor_calldata=[controller.contract_address])
 
+    state_channel = await starknet.deploy(
+        contract_def=defs.state_channel,
+        constructor_calldata=[controller.contract_address])
+
+    wall = await starknet.deploy(
+        contract_def=defs.wall,
+        constructor_calldata=[controller.contract_address])
+
+    bell_labs = await starknet.deploy(
+        contract_def=defs.bell_labs,
+        constructor_calldata=[controller.contract_address])
+
     consts = SimpleNamespace(
         CITIES=19,
         DISTRICTS_PER_CITY=4,
@@ -223,6 +239,10 @@ async def build_copyable_deployment():
             drug_lord=serialize_contract(drug_lord, defs.drug_lord.abi),
             pseudorandom=serialize_contract(
                 pseudorandom, defs.pseudorandom.abi),
+            state_channel=serialize_contract(
+                state_channel, defs.state_channel.abi),
+            wall=serialize_contract(wall, defs.wall.abi),
+            bell_labs=serialize_contract(bell_labs, defs.bell_labs.abi),
         ),
     )
 
@@ -246,8 +266,9 @@ async def ctx_factory(copyable_deployment):
     signers = copyable_deployment.signers
     consts = copyable_deployment.consts
 
-    def make():
-        starknet_state = copyable_deployment.starknet.state.copy()
+    def make(from_state=None):
+        # A fresh copy of the deployment, or of another ctx's state.
+        starknet_state = (from_state or copyable_deployment.starknet.state).copy()
         contracts = {
             name: unserialize_contract(starknet_state, serialized_contract)
             for name, serialized_contract in serialized_contracts.items()
@@ -267,11 +288,23 @@ async def ctx_factory(copyable_deployment):
                     starknet_state) + num_seconds
             )
 
+        def profile():
+            # See utils/profiler.py. Stacks are labelled by contract name.
+            return StepProfiler({c.contract_address: name
+                for name, c in contracts.items()})
+
         return SimpleNamespace(
             starknet=Starknet(starknet_state),
             advance_clock=advance_clock,
+            get_clock=lambda: get_block_timestamp(starknet_state),
+            set_clock=lambda timestamp: set_block_timestamp(
+                starknet_state, timestamp),
+            copy=lambda: make(starknet_state),
             consts=consts,
+            signers=signers,
+            abis={name: c['abi'] for name, c in serialized_contracts.items()},
             execute=execute,
+            profile=profile,
             **contracts,
         )
 
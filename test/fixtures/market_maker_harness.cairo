@@ -0,0 +1,25 @@
+%lang starknet
+
+from starkware.cairo.common.cairo_builtins import HashBuiltin
+
+from contracts.utils.market_maker import trade
+
+# Exposes the market maker to the fuzzer in utils/market_fuzz.py.
+@view
+func trade_view{
+        syscall_ptr : felt*,
+        pedersen_ptr : HashBuiltin*,
+        range_check_ptr
+    }(
+        market_a_pre : felt,
+        market_b_pre : felt,
+        user_gives_a : felt
+    ) -> (
+        market_a_post : felt,
+        market_b_post : felt,
+        user_gets_b : felt
+    ):
+    let (market_a_post, market_b_post, user_gets_b) = trade(
+        market_a_pre, market_b_pre, user_gives_a)
+    return (market_a_post, market_b_post, user_gets_b)
+end
@@ -1,17 +1,30 @@
 # OpenZepellin commit hash: 259d2854a5c1e7d62878f0fb03d0772777c7c348
 
-from starkware.crypto.signature.signature import private_to_stark_key, sign
 from starkware.starknet.public.abi import get_selector_from_name
-from starkware.cairo.common.hash_state import compute_hash_on_elements
+
+from utils.pedersen import compute_hash_on_elements
+from utils.signing import get_backend, sign_many
 
 
 class Signer():
-    def __init__(self, private_key):
+    # backend: see utils/signing.py (the fastest installed by default).
+    def __init__(self, private_key, backend=None):
         self.private_key = private_key
-        self.public_key = private_to_stark_key(private_key)
+        # Kept by name, signers are pickled with the cached deployment.
+        self.backend_name = get_backend(backend).name
+        self.public_key = self.backend.public_key(private_key)
+
+    @property
+    def backend(self):
+        return get_backend(getattr(self, 'backend_name', None))
 
     def sign(self, message_hash):
-        return sign(msg_hash=message_hash, priv_key=self.private_key)
+        return self.backend.sign(message_hash, self.private_key)
+
+    def sign_many(self, message_hashes, processes=None):
+        # Bulk pre-signing over a process pool.
+        return sign_many(self.private_key, message_hashes, self.backend,
+            processes)
 
     async def send_transaction(self, account, to, selector_name, calldata, nonce=None):
         if nonce is None:
@@ -0,0 +1,192 @@
+# Item scores for Module 11 (BellLabs).
+#
+# The per-item score tables of the contract are generated from the
+# csv files in mappings/ by this module:
+#
+#     cd test && python -m utils.bell_labs
+#
+# which rewrites contracts/utils/bell_labs_tables.cairo. The same
+# tables back a NumPy mirror of the scorer that scores many DOPE
+# tokens at once (see test/11_BellLabs_test.py).
+#
+# Items are rows of NUM_SLOTS item indices in the order of the Items
+# struct (zero-based, as in the DOPE NFT). Scores are in [0, 99].
+
+import csv
+import os
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+MAPPINGS = os.path.join(ROOT, 'mappings')
+TABLES_PATH = os.path.join(ROOT, 'contracts', 'utils',
+    'bell_labs_tables.cairo')
+
+RED, GREEN, BLUE = 1, 2, 3
+NUM_AXES = 3
+NEUTRAL_SCORE = 50
+MAX_SCORE = 99
+
+SLOTS = ['weapon', 'clothes', 'vehicle', 'waist', 'foot', 'hand',
+    'necklace', 'ring', 'item_suffix', 'drug', 'name_prefix', 'name_suffix']
+NUM_SLOTS = len(SLOTS)
+SLOT = {name: i for i, name in enumerate(SLOTS)}
+
+# (slot, axis, csv file, value column, scale). A value is scored as
+# value * MAX_SCORE // scale. A scale of None means the largest value
+# in the column. A slot is neutral on every axis not listed here.
+SOURCES = [
+    ('weapon', RED, 'weapon_strength.csv', 1, 10),
+    ('vehicle', BLUE, 'vehicle_speed.csv', 1, 10),
+    ('foot', BLUE, 'footArmor_speed.csv', 1, 10),
+    ('necklace', GREEN, 'necklace_bribe.csv', 1, 10),
+    ('ring', GREEN, 'ring_bribe.csv', 1, 10),
+    ('drug', GREEN, 'drugs_value.csv', 2, None),
+]
+AXIS_NAMES = {RED: 'red', GREEN: 'green', BLUE: 'blue'}
+
+
+def read_column(file_name, column):
+    # Values of one column, in item order (one row per item).
+    with open(os.path.join(MAPPINGS, file_name), newline='') as f:
+        rows = list(csv.reader(f))[1:]
+    return [int(row[column].strip()) for row in rows if row]
+
+
+def build_tables():
+    # Returns the (offsets, lengths, scores) tables of the contract.
+    # Entry slot * NUM_AXES + axis - 1 of offsets is the start of that
+    # slot's scores plus one, or zero if the slot is neutral there.
+    offsets = [0] * (NUM_SLOTS * NUM_AXES)
+    lengths = [0] * (NUM_SLOTS * NUM_AXES)
+    scores = []
+    comments = []
+    for slot, axis, file_name, column, scale in SOURCES:
+        values = read_column(file_name, column)
+        scale = scale or max(values)
+        entry = SLOT[slot] * NUM_AXES + axis - 1
+        offsets[entry] = len(scores) + 1
+        lengths[entry] = len(values)
+        for i, v in enumerate(values):
+            scores.append(min(v * MAX_SCORE // scale, MAX_SCORE))
+            comments.append(f'{slot} {i}, {AXIS_NAMES[axis]}')
+    return offsets, lengths, scores, comments
+
+
+def render_tables():
+    # Source of contracts/utils/bell_labs_tables.cairo.
+    offsets, lengths, scores, comments = build_tables()
+
+    def table(name, doc, values, value_comments):
+        lines = [f'# {doc}',
+            f'func {name}() -> (table : felt*):',
+            '    let (address) = get_label_location(data)',
+            '    return (table=address)',
+            '',
+            '    data:']
+        for v, c in zip(values, value_comments):
+            lines.append(f'    dw {v}  # {c}')
+        lines.append('end')
+        return lines
+
+    entry_comments = [f'{slot} {AXIS_NAMES[axis]}'
+        for slot in SLOTS for axis in range(1, NUM_AXES + 1)]
+    lines = [
+        '%lang starknet',
+        '',
+        '# Generated by test/utils/bell_labs.py from mappings/*.csv.',
+        '# Do not edit, run bin/gen instead.',
+        '',
+        'from starkware.cairo.common.registers import get_label_location',
+        '',
+        f'const NUM_SLOTS = {NUM_SLOTS}',
+        f'const NUM_AXES = {NUM_AXES}',
+        f'const NEUTRAL_SCORE = {NEUTRAL_SCORE}',
+        '',
+    ]
+    lines += table('score_offsets',
+        'Start of the scores of (slot, axis) in score_table() plus one, '
+        '0 if neutral.',
+        offsets, entry_comments)
+    lines.append('')
+    lines += table('score_lengths',
+        'Number of items with a score for (slot, axis).',
+        lengths, entry_comments)
+    lines.append('')
+    lines += table('score_table', 'Item scores in [0, 99].',
+        scores, comments)
+    return '\n'.join(lines) + '\n'
+
+
+def write_tables(path=TABLES_PATH):
+    with open(path, 'w') as f:
+        f.write(render_tables())
+
+
+def dense_table():
+    # (NUM_SLOTS, NUM_AXES + 1, max_items) array of scores. Axis 0 is
+    # unused so that axes index directly.
+    offsets, lengths, scores, _ = build_tables()
+    max_items = max(lengths)
+    dense = np.full((NUM_SLOTS, NUM_AXES + 1, max_items), NEUTRAL_SCORE,
+        dtype=np.int64)
+    for slot in range(NUM_SLOTS):
+        for axis in range(1, NUM_AXES + 1):
+            entry = slot * NUM_AXES + axis - 1
+            if offsets[entry]:
+                start = offsets[entry] - 1
+                dense[slot, axis, :lengths[entry]] = \
+                    scores[start:start + lengths[entry]]
+    return dense
+
+
+_DENSE = None
+
+
+def _dense():
+    global _DENSE
+    if _DENSE is None:
+        _DENSE = dense_table()
+    return _DENSE
+
+
+def batch_scores(items):
+    # Mirror of get_all_scores() for many tokens. Takes an (n, NUM_SLOTS)
+    # array of item indices and returns an (n, NUM_SLOTS, NUM_AXES)
+    # array of scores. Unknown items are neutral.
+    dense = _dense()
+    a = np.asarray(items, dtype=np.int64)
+    if a.ndim == 1:
+        a = a[None, :]
+    known = (a >= 0) & (a < dense.shape[2])
+    index = np.where(known, a, 0)
+    slots = np.arange(NUM_SLOTS)
+    out = np.empty(a.shape + (NUM_AXES,), dtype=np.int64)
+    for axis in range(1, NUM_AXES + 1):
+        out[:, :, axis - 1] = np.where(known,
+            dense[slots, axis, index], NEUTRAL_SCORE)
+    return out
+
+
+def all_scores(items):
+    # Mirror of get_all_scores(): scores of every slot on every axis,
+    # flattened as slot * NUM_AXES + axis - 1.
+    return [int(s) for s in batch_scores(items)[0].reshape(-1)]
+
+
+def item_score(axis, item_type, items):
+    # Mirror of get_item_score().
+    return int(batch_scores(items)[0, item_type, axis - 1])
+
+
+def aggregate_scores(items):
+    # Mirror of get_aggregate_score() for every axis. Returns an
+    # (n, NUM_AXES) array: the mean of the weapon, ring and drug scores.
+    s = batch_scores(items)
+    used = [SLOT['weapon'], SLOT['ring'], SLOT['drug']]
+    return s[:, used, :].sum(axis=1) // len(used)
+
+
+if __name__ == '__main__':
+    write_tables()
+    print(f'Wrote {os.path.relpath(TABLES_PATH)}')
@@ -0,0 +1,70 @@
+# Off-chain view of the per-city clock mode of 01_DopeWars.
+#
+# After enable_city_clocks() each city (location_id // DISTRICTS) logs
+# its turns by its own clock, with the block timestamp of the turn.
+# Turns in different cities share no storage, so any merge of the city
+# orders is a valid global order. merge() picks the one ordered by
+# (timestamp, city, clock), with the turns logged by the global clock
+# before the switch first:
+#
+#     async for index, turn in global_turn_logs(ctx.engine):
+#         turn.city, turn.clock, turn.log
+
+import heapq
+from collections import namedtuple
+
+# MUST be consistent with contracts/utils/game_constants.cairo.
+CITIES = 19
+DISTRICTS = 4
+MIN_TURN_LOCKOUT = 3
+
+# city is None and timestamp 0 for turns logged by the global clock.
+Turn = namedtuple('Turn', ['city', 'clock', 'timestamp', 'log'])
+
+
+def city_of(location_id):
+    return location_id // DISTRICTS
+
+
+async def city_turn_logs(engine, city, first=MIN_TURN_LOCKOUT + 1,
+        last=None):
+    # Yields the Turns of a city at clocks [first, last] (by default up
+    # to the current clock of the city).
+    if last is None:
+        res = await engine.read_city_clock(city).call()
+        last = res.result.clock
+    for clock in range(first, last + 1):
+        res = await engine.view_given_city_turn(city, clock).call()
+        yield Turn(city, clock, res.result.timestamp, res.result.turn_log)
+
+
+async def game_clock_turn_logs(engine, first=MIN_TURN_LOCKOUT + 1,
+        last=None):
+    # Yields the Turns logged by the global clock at clocks [first,
+    # last] (by default up to the current clock).
+    if last is None:
+        res = await engine.read_game_clock().call()
+        last = res.result.clock
+    for clock in range(first, last + 1):
+        res = await engine.view_given_turn(clock).call()
+        yield Turn(None, clock, 0, res.result.turn_log)
+
+
+def merge(streams):
+    # One order of the Turns of all streams that keeps the order of
+    # each stream (each sorted by clock).
+    return heapq.merge(*streams,
+        key=lambda t: (t.timestamp, -1 if t.city is None else t.city,
+            t.clock))
+
+
+async def global_turn_logs(engine):
+    # Yields (index, Turn) of every turn of the game in a global order.
+    streams = [[turn async for turn in game_clock_turn_logs(engine)]]
+    res = await engine.read_clock_mode().call()
+    if res.result.city_clocks:
+        for city in range(CITIES):
+            streams.append([turn async for turn in city_turn_logs(engine,
+                city)])
+    for index, turn in enumerate(merge(streams)):
+        yield index, turn
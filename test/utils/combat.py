@@ -0,0 +1,290 @@
+# Off-chain combat engine for Module 05 (Combat).
+#
+# Reproduces fight_1v1() from contracts/05_Combat.cairo and evaluates
+# many stat arrays at once with NumPy. Any change to the fight logic
+# in the contract MUST be mirrored here (see test/05_Combat_test.py).
+#
+# Stat arrays are rows of NUM_FIGHTER_STATS integers in the order of
+# array_to_struct(). The contract rejects other lengths, and only
+# fights with both fighters in [0, MAX_STAT], so healths stay far below
+# 2**63 and int64 arithmetic matches its felt arithmetic.
+
+from types import SimpleNamespace
+
+import numpy as np
+
+ROUNDS = 10
+NUM_FIGHTER_STATS = 16
+MAX_STAT = 31
+MAX_QUADRATIC_TOTAL = 1000
+HEALTH_MULTIPLIER = 10
+# Clout and outwit thresholds used in defence() and defence_react().
+CLOUT_THRESHOLD = 10
+OUTWIT_THRESHOLD = 10
+# Combat record layout, see HEALTH_BITS in the contract.
+HEALTH_BITS = 20
+HEALTH_OFFSET = 2 ** 19
+SEQUENCE_BITS = 2 * HEALTH_BITS
+SEQUENCES_PER_FELT = 5
+MOVE_SEQUENCE_FELTS = 4
+
+STATS = ['strength', 'agility', 'duck', 'block', 'climb', 'strike',
+    'shoot', 'grapple', 'courage', 'iq', 'psyops', 'notoriety', 'friends',
+    'stamina', 'health', 'speed']
+S = {name: i for i, name in enumerate(STATS)}
+
+# Categories of are_params_legal(). A category total is squared.
+CATEGORIES = [
+    ['strength', 'agility'],
+    ['duck', 'block', 'climb'],
+    ['strike', 'shoot', 'grapple'],
+    ['courage', 'iq', 'psyops'],
+    ['notoriety', 'friends'],
+    ['stamina', 'health', 'speed'],
+]
+CATEGORY_INDICES = [[S[name] for name in c] for c in CATEGORIES]
+
+
+def as_stats(stats):
+    # Returns a (n, NUM_FIGHTER_STATS) int64 array.
+    a = np.asarray(stats, dtype=np.int64)
+    if a.ndim == 1:
+        a = a[None, :]
+    if a.shape[1] != NUM_FIGHTER_STATS:
+        raise ValueError(f'Expected {NUM_FIGHTER_STATS} stats, got '
+            f'{a.shape[1]}')
+    return a
+
+
+def are_stats_in_range(stats):
+    # Mirror of are_stats_in_range().
+    a = as_stats(stats)
+    return np.all((a >= 0) & (a <= MAX_STAT), axis=1)
+
+
+def are_params_legal(stats):
+    # Mirror of are_stats_in_range() and are_params_legal().
+    a = as_stats(stats)
+    in_range = are_stats_in_range(a)
+    total = np.zeros(len(a), dtype=np.int64)
+    for idx in CATEGORY_INDICES:
+        c = a[:, idx].sum(axis=1)
+        total += c * c
+    return in_range & (total <= MAX_QUADRATIC_TOTAL)
+
+
+def attack_sequence(att, dfn, att_health, def_health):
+    # Mirror of attack_sequence(). Returns new (att_health, def_health),
+    # neither below 0.
+    col = lambda a, name: a[:, S[name]]
+    damage = col(att, 'strike') * col(att, 'strength') + \
+        col(att, 'shoot') * col(att, 'shoot')
+    react_damage = col(dfn, 'iq') * col(dfn, 'iq') + \
+        col(dfn, 'courage') * col(dfn, 'psyops')
+    reduction = col(dfn, 'duck') * col(dfn, 'speed') + \
+        col(dfn, 'climb') * col(dfn, 'stamina')
+    clout = col(dfn, 'notoriety') + col(dfn, 'friends') > CLOUT_THRESHOLD
+    reduction = reduction + np.where(clout,
+        col(dfn, 'friends') * col(dfn, 'friends'), 0)
+    outwit = col(att, 'psyops') + col(att, 'iq') > OUTWIT_THRESHOLD
+    counter = np.where(outwit, col(att, 'stamina'), 0)
+    return np.maximum(att_health - react_damage, 0), \
+        np.maximum(def_health - (damage - reduction + counter), 0)
+
+
+def fight(user_stats, lord_stats):
+    # Mirror of fight() for legal users. Lord stats may be one row
+    # (broadcast against every user) or one row per user.
+    # Returns arrays: user_wins, rounds fought, final healths.
+    user = as_stats(user_stats)
+    lord = np.broadcast_to(as_stats(lord_stats), user.shape)
+    n = len(user)
+    user_health = user[:, S['health']] * HEALTH_MULTIPLIER
+    lord_health = lord[:, S['health']] * HEALTH_MULTIPLIER
+    user_wins = np.zeros(n, dtype=np.int64)
+    rounds = np.zeros(n, dtype=np.int64)
+    active = np.ones(n, dtype=bool)
+
+    def settle(user_health, lord_health):
+        # Ends fights where anyone is defeated.
+        user_down = user_health <= 0
+        lord_down = lord_health <= 0
+        done = active & (user_down | lord_down)
+        user_wins[done] = (lord_down & ~user_down)[done]
+        active[done] = False
+
+    for r in range(1, ROUNDS + 1):
+        rounds[active] = r
+        u, l = attack_sequence(user, lord, user_health, lord_health)
+        user_health = np.where(active, u, user_health)
+        lord_health = np.where(active, l, lord_health)
+        settle(user_health, lord_health)
+        l, u = attack_sequence(lord, user, lord_health, user_health)
+        user_health = np.where(active, u, user_health)
+        lord_health = np.where(active, l, lord_health)
+        settle(user_health, lord_health)
+        if not active.any():
+            break
+
+    return user_wins, rounds, user_health, lord_health
+
+
+def fight_1v1(user_stats, lord_stats):
+    # Mirror of fight_1v1(). Returns user_wins_bool per user. A legal
+    # user wins against a lord with stats out of range without a fight.
+    user = as_stats(user_stats)
+    legal = are_params_legal(user)
+    lord_in_range = np.broadcast_to(are_stats_in_range(lord_stats),
+        legal.shape)
+    user_wins, _, _, _ = fight(user, np.clip(as_stats(lord_stats), 0,
+        MAX_STAT))
+    return np.where(legal, np.where(lord_in_range, user_wins, 1), 0)
+
+
+def combat_log(user_stats, lord_stats):
+    # Healths (user, lord) after every attack sequence of one fight,
+    # as recorded by fight(). Empty if there is no fight.
+    if not are_params_legal(user_stats)[0] or \
+            not are_stats_in_range(lord_stats)[0]:
+        return []
+    user = as_stats(user_stats)
+    lord = as_stats(lord_stats)
+    user_health = user[:, S['health']] * HEALTH_MULTIPLIER
+    lord_health = lord[:, S['health']] * HEALTH_MULTIPLIER
+    log = []
+    for _ in range(ROUNDS):
+        user_health, lord_health = attack_sequence(
+            user, lord, user_health, lord_health)
+        log.append((int(user_health[0]), int(lord_health[0])))
+        if user_health[0] <= 0 or lord_health[0] <= 0:
+            break
+        lord_health, user_health = attack_sequence(
+            lord, user, lord_health, user_health)
+        log.append((int(user_health[0]), int(lord_health[0])))
+        if user_health[0] <= 0 or lord_health[0] <= 0:
+            break
+    return log
+
+
+def pack_combat_log(log):
+    # Mirror of pack_combat_log(). Returns the move_sequence_* felts.
+    felts = [0] * MOVE_SEQUENCE_FELTS
+    for i, (user_health, lord_health) in enumerate(log):
+        for health in (user_health, lord_health):
+            if not 0 <= health + HEALTH_OFFSET < 2 ** HEALTH_BITS:
+                raise ValueError(f'Health out of range: {health}')
+        entry = (user_health + HEALTH_OFFSET) + \
+            ((lord_health + HEALTH_OFFSET) << HEALTH_BITS)
+        felt, slot = divmod(i, SEQUENCES_PER_FELT)
+        felts[felt] += entry << (slot * SEQUENCE_BITS)
+    return felts
+
+
+def unpack_combat_log(felts):
+    # Inverse of pack_combat_log(). Stops at the first unused sequence.
+    mask = 2 ** HEALTH_BITS - 1
+    log = []
+    for felt in felts:
+        for slot in range(SEQUENCES_PER_FELT):
+            entry = (felt >> (slot * SEQUENCE_BITS)) % 2 ** SEQUENCE_BITS
+            if entry == 0:
+                return log
+            log.append(((entry & mask) - HEALTH_OFFSET,
+                (entry >> HEALTH_BITS) - HEALTH_OFFSET))
+    return log
+
+
+def replay(record, user_stats=None, lord_stats=None):
+    # Turns a view_combat() record into a timeline of attacks. With the
+    # stats, the damage of the first attack is also known.
+    felts = [getattr(record, f'move_sequence_{i}')
+        for i in range(1, MOVE_SEQUENCE_FELTS + 1)]
+    log = unpack_combat_log(felts)
+    previous = (None, None)
+    if user_stats is not None and lord_stats is not None:
+        previous = (int(as_stats(user_stats)[0, S['health']]) *
+            HEALTH_MULTIPLIER, int(as_stats(lord_stats)[0, S['health']]) *
+            HEALTH_MULTIPLIER)
+    damage = lambda before, after: None if before is None \
+        else before - after
+    timeline = []
+    for i, (user_health, lord_health) in enumerate(log):
+        timeline.append(SimpleNamespace(
+            round=i // 2 + 1,
+            attacker='user' if i % 2 == 0 else 'lord',
+            user_health=user_health,
+            lord_health=lord_health,
+            user_damage=damage(previous[0], user_health),
+            lord_damage=damage(previous[1], lord_health)))
+        previous = (user_health, lord_health)
+    return SimpleNamespace(
+        index=record.index,
+        user=record.user,
+        drug_lord=record.drug_lord,
+        winner=record.winner,
+        timeline=timeline)
+
+
+def random_legal_stats(n, rng=None):
+    # Samples n legal stat arrays. Each category gets a budget whose
+    # squares sum to at most MAX_QUADRATIC_TOTAL, split at random.
+    rng = rng or np.random.default_rng()
+    n_cat = len(CATEGORIES)
+    weights = rng.dirichlet(np.ones(n_cat), size=n)
+    budgets = np.floor(np.sqrt(weights * MAX_QUADRATIC_TOTAL)).astype(
+        np.int64)
+    stats = np.zeros((n, NUM_FIGHTER_STATS), dtype=np.int64)
+    for c, idx in enumerate(CATEGORY_INDICES):
+        split = rng.dirichlet(np.ones(len(idx)), size=n)
+        parts = np.floor(split * budgets[:, c:c + 1]).astype(np.int64)
+        stats[:, idx] = parts
+    assert are_params_legal(stats).all()
+    return stats
+
+
+def mutate(stats, rng, scale=2):
+    # Moves a few points between stats and drops illegal results.
+    noise = rng.integers(-scale, scale + 1, size=stats.shape)
+    mask = rng.random(stats.shape) < 0.25
+    candidates = np.clip(stats + noise * mask, 0, MAX_STAT)
+    return candidates[are_params_legal(candidates)]
+
+
+def score(user_stats, lord_stats):
+    # Higher is better. Wins first, then faster wins, then the health
+    # margin (useful to rank losses while searching).
+    user_wins, rounds, user_health, lord_health = fight(
+        user_stats, lord_stats)
+    margin = user_health - lord_health
+    return user_wins * 10**9 + user_wins * (ROUNDS - rounds) * 10**6 + \
+        np.clip(margin, -10**6 + 1, 10**6 - 1)
+
+
+def search(lord_stats, n_candidates=10000, generations=20, top=10,
+        seed=None):
+    # Finds strong legal loadouts against the given lord. Starts from
+    # random legal stats then keeps the best and mutates them.
+    # Returns (stats, scores) of the best `top`, best first.
+    rng = np.random.default_rng(seed)
+    population = random_legal_stats(n_candidates, rng)
+    for _ in range(generations):
+        s = score(population, lord_stats)
+        order = np.argsort(-s)
+        elite = population[order[:max(top, n_candidates // 10)]]
+        children = mutate(np.repeat(elite, 8, axis=0), rng)
+        fresh = random_legal_stats(n_candidates // 10, rng)
+        population = np.unique(
+            np.concatenate([elite, children, fresh]), axis=0)
+    s = score(population, lord_stats)
+    order = np.argsort(-s)[:top]
+    return population[order], s[order]
+
+
+if __name__ == '__main__':
+    import sys
+    # E.g., python -m utils.combat 5 5 5 ... (16 lord stats).
+    lord = [int(x) for x in sys.argv[1:]] or [3] * NUM_FIGHTER_STATS
+    best, best_scores = search(lord, seed=0)
+    wins = fight_1v1(best, lord)
+    for stats, win in zip(best, wins):
+        print(f"{'win ' if win else 'loss'} {list(stats)}")
@@ -0,0 +1,357 @@
+# Deploys the game to a StarkNet gateway (see bin/deploy).
+#
+# The deployment is declared once in STEPS. A step starts as soon as
+# the steps it depends on are accepted, so independent deploys are
+# submitted together and their transactions are polled in parallel.
+#
+# Progress is saved to a JSON manifest (<network>.deployment.json)
+# after every change. Running again resumes from the manifest: accepted
+# steps are kept, submitted transactions are polled again and steps
+# whose transaction was rejected (which are dropped from the manifest)
+# are submitted again. A step whose inputs changed (e.g. because a
+# dependency was redeployed) is redone.
+#
+# Flow:
+## The Controller is the only unchangeable contract.
+## First deploy the admin Account and the Arbiter (owned by the admin).
+## Then send the Arbiter address during Controller deployment.
+## Then save the controller address in the Arbiter.
+## Then deploy Controller address during module deployments.
+## Then the admin has the Arbiter save the module addresses.
+
+import argparse
+import asyncio
+import json
+import os
+import random
+from types import SimpleNamespace
+
+from services.external_api.base_client import RetryConfig
+from starkware.crypto.signature.signature import private_to_stark_key, sign
+from starkware.starknet.public.abi import get_selector_from_name
+from starkware.starknet.services.api.contract_definition import \
+    ContractDefinition
+from starkware.starknet.services.api.feeder_gateway.feeder_gateway_client \
+    import FeederGatewayClient
+from starkware.starknet.services.api.gateway.gateway_client import \
+    GatewayClient
+from starkware.starknet.services.api.gateway.transaction import (Deploy,
+    InvokeFunction)
+
+from utils.pedersen import compute_hash_on_elements
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+ARTIFACTS = os.path.join(ROOT, 'artifacts')
+
+NETWORKS = {
+    'goerli': 'https://alpha4.starknet.io/',
+    'mainnet': 'https://alpha-mainnet.starknet.io/',
+}
+ACCEPTED = ('PENDING', 'ACCEPTED_ON_L2', 'ACCEPTED_ON_L1')
+REJECTED = ('REJECTED',)
+
+MODULES = ['01_DopeWars', '02_LocationOwned', '03_UserOwned',
+    '04_UserRegistry', '05_Combat', '06_DrugLord', '07_PseudoRandom']
+
+
+# Input replaced by the public key of ADMIN_PRIVATE_KEY.
+ADMIN_PUBLIC_KEY = 'admin_public_key'
+
+
+class Ref():
+    # The address of the contract deployed by another step.
+    def __init__(self, name):
+        self.name = name
+
+
+def deploy(name, contract, inputs):
+    return SimpleNamespace(kind='deploy', name=name, contract=contract,
+        inputs=inputs, after=[])
+
+
+def invoke(name, to, selector, inputs, account=None, after=()):
+    # Sent through the admin Account if account is given.
+    return SimpleNamespace(kind='invoke', name=name, to=to,
+        selector=selector, inputs=inputs, account=account, after=list(after))
+
+
+# The dependencies of a step are the steps it references plus `after`.
+STEPS = [
+    deploy('AdminAccount', 'Account', [ADMIN_PUBLIC_KEY]),
+    deploy('Arbiter', 'Arbiter', [Ref('AdminAccount')]),
+    deploy('ModuleController', 'ModuleController', [Ref('Arbiter')]),
+    invoke('set_address_of_controller', Ref('Arbiter'),
+        'set_address_of_controller', [Ref('ModuleController')]),
+] + [
+    deploy(module, module, [Ref('ModuleController')]) for module in MODULES
+] + [
+    invoke('batch_set_controller_addresses', Ref('Arbiter'),
+        'batch_set_controller_addresses',
+        [Ref(module) for module in MODULES],
+        account='AdminAccount', after=['set_address_of_controller']),
+]
+
+
+def dependencies(step):
+    refs = [i.name for i in step.inputs if isinstance(i, Ref)]
+    if step.kind == 'invoke':
+        refs.append(step.to.name)
+        if step.account:
+            refs.append(step.account)
+    return sorted(set(refs + step.after))
+
+
+def check_graph(steps):
+    # Every dependency must be declared and the graph must be acyclic.
+    by_name = {s.name: s for s in steps}
+    state = {}
+
+    def visit(name, path):
+        if name not in by_name:
+            raise ValueError(f'Unknown step {name} (needed by {path[-1]}).')
+        if state.get(name) == 'visiting':
+            raise ValueError(f"Cycle: {' -> '.join(path + [name])}")
+        if state.get(name) == 'done':
+            return
+        state[name] = 'visiting'
+        for d in dependencies(by_name[name]):
+            visit(d, path + [name])
+        state[name] = 'done'
+
+    for s in steps:
+        visit(s.name, [])
+
+
+class Manifest():
+    # The JSON record of a deployment. Saved atomically.
+    def __init__(self, path, network):
+        self.path = path
+        self.data = dict(network=network, steps={})
+        if os.path.exists(path):
+            with open(path) as f:
+                self.data = json.load(f)
+            if self.data.get('network') != network:
+                raise ValueError(f'{path} is for network '
+                    f"{self.data.get('network')}, not {network}.")
+
+    @property
+    def steps(self):
+        return self.data['steps']
+
+    def save(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.data, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def address(self, name):
+        return int(self.steps[name]['address'], 16)
+
+
+class Deployer():
+    def __init__(self, network, url, manifest, private_key,
+            poll_interval=5, max_in_flight=8, gateway=None, feeder=None):
+        # gateway and feeder default to the clients of url.
+        self.network = network
+        retry = RetryConfig(n_retries=1)
+        self.gateway = gateway or GatewayClient(url=url + 'gateway',
+            retry_config=retry)
+        self.feeder = feeder or FeederGatewayClient(
+            url=url + 'feeder_gateway', retry_config=retry)
+        self.manifest = manifest
+        self.private_key = private_key
+        self.poll_interval = poll_interval
+        self.in_flight = asyncio.Semaphore(max_in_flight)
+        # A signed invoke needs the account nonce, so send one at a time.
+        self.account_lock = asyncio.Lock()
+
+    def log(self, name, message):
+        print(f'{name:32} {message}', flush=True)
+
+    def resolve(self, inputs):
+        values = []
+        for i in inputs:
+            if isinstance(i, Ref):
+                values.append(self.manifest.address(i.name))
+            elif i == ADMIN_PUBLIC_KEY:
+                values.append(private_to_stark_key(self.private_key))
+            else:
+                values.append(int(i))
+        return values
+
+    async def run(self, steps):
+        check_graph(steps)
+        tasks = {}
+
+        async def run_step(step):
+            deps = dependencies(step)
+            if deps:
+                await asyncio.gather(*(tasks[d] for d in deps))
+            await self.run_step(step)
+
+        # Tasks start together, each waits for its own dependencies.
+        # After a failure the other steps still finish and are saved.
+        for step in steps:
+            tasks[step.name] = asyncio.ensure_future(run_step(step))
+        results = await asyncio.gather(*tasks.values(),
+            return_exceptions=True)
+        self.manifest.save()
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors:
+            raise errors[0]
+
+    async def run_step(self, step):
+        inputs = self.resolve(step.inputs)
+        record = self.manifest.steps.get(step.name)
+        if record and record.get('inputs') != inputs:
+            self.log(step.name, 'inputs changed, redoing')
+            record = None
+        if record and record.get('status') in ACCEPTED:
+            self.log(step.name, f"done ({record.get('address', '')})")
+            return
+        if record is None or record.get('status') in REJECTED or \
+                'tx_hash' not in record:
+            async with self.in_flight:
+                record = await self.submit(step, inputs)
+            self.manifest.steps[step.name] = record
+            self.manifest.save()
+            self.log(step.name, f"submitted {record['tx_hash']}")
+        status = await self.wait(step.name, record['tx_hash'])
+        if status in ACCEPTED:
+            record['status'] = status
+        else:
+            # Nothing was deployed or invoked: the next run starts over.
+            del self.manifest.steps[step.name]
+        self.manifest.save()
+        if status not in ACCEPTED:
+            raise RuntimeError(f"{step.name}: transaction "
+                f"{record['tx_hash']} {status}. Run again to resume.")
+        self.log(step.name, f"{status} {record.get('address', '')}")
+
+    async def submit(self, step, inputs):
+        if step.kind == 'deploy':
+            salt = random.randint(0, 2 ** 251 - 1)
+            tx = self.deploy_transaction(step.contract, salt, inputs)
+            response = await self.gateway.add_transaction(tx=tx)
+            return dict(inputs=inputs, salt=hex(salt),
+                address=response['address'],
+                tx_hash=response['transaction_hash'], status='RECEIVED')
+
+        to = self.manifest.address(step.to.name)
+        selector = get_selector_from_name(step.selector)
+        if step.account is None:
+            tx = InvokeFunction(contract_address=to,
+                entry_point_selector=selector, calldata=inputs,
+                signature=[])
+            response = await self.gateway.add_transaction(tx=tx)
+        else:
+            async with self.account_lock:
+                response = await self.send_from_account(
+                    self.manifest.address(step.account), to, selector,
+                    inputs)
+        return dict(inputs=inputs, tx_hash=response['transaction_hash'],
+            status='RECEIVED')
+
+    def deploy_transaction(self, contract, salt, inputs):
+        path = os.path.join(ARTIFACTS, f'{contract}.json')
+        with open(path) as f:
+            definition = ContractDefinition.loads(f.read())
+        return Deploy(contract_address_salt=salt,
+            contract_definition=definition, constructor_calldata=inputs)
+
+    async def send_from_account(self, account, to, selector, calldata):
+        nonce = await account_nonce(self.feeder, account)
+        tx = signed_invoke(account, to, selector, calldata, nonce,
+            self.private_key)
+        return await self.gateway.add_transaction(tx=tx)
+
+    async def wait(self, name, tx_hash):
+        # Polls until the transaction is accepted or rejected.
+        last = None
+        while True:
+            response = await self.feeder.get_transaction_status(
+                tx_hash=tx_hash)
+            status = response['tx_status']
+            if status != last:
+                self.log(name, status)
+                last = status
+            if status in ACCEPTED or status in REJECTED:
+                return status
+            await asyncio.sleep(self.poll_interval)
+
+
+async def account_nonce(feeder, account):
+    nonce_call = InvokeFunction(contract_address=account,
+        entry_point_selector=get_selector_from_name('get_nonce'),
+        calldata=[], signature=[])
+    result = await feeder.call_contract(invoke_tx=nonce_call)
+    return int(result['result'][0], 16)
+
+
+def signed_invoke(account, to, selector, calldata, nonce, private_key):
+    # Mirror of Signer.send_transaction() for a gateway.
+    message_hash = compute_hash_on_elements([account, to, selector,
+        compute_hash_on_elements(calldata), nonce])
+    sig_r, sig_s = sign(msg_hash=message_hash, priv_key=private_key)
+    return InvokeFunction(contract_address=account,
+        entry_point_selector=get_selector_from_name('execute'),
+        calldata=[to, selector, len(calldata)] + list(calldata) + [nonce],
+        signature=[sig_r, sig_s])
+
+
+def write_nile_deployments(manifest, network):
+    # Keeps `nile call/invoke <alias>` working with the deployed contracts.
+    lines = []
+    for step in STEPS:
+        record = manifest.steps.get(step.name, {})
+        if step.kind == 'deploy' and record.get('status') in ACCEPTED:
+            lines.append(f"{record['address']}:artifacts/abis/"
+                f'{step.contract}.json:{step.name}')
+    with open(os.path.join(ROOT, f'{network}.deployments.txt'), 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def node_url(network):
+    if network in NETWORKS:
+        return NETWORKS[network]
+    # Written by `nile node`.
+    with open(os.path.join(ROOT, 'node.json')) as f:
+        url = json.load(f)[network]
+    return url if url.endswith('/') else url + '/'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Deploy the game.')
+    parser.add_argument('--network', default='localhost',
+        help='localhost (nile node), goerli or mainnet.')
+    parser.add_argument('--url', help='Overrides the node url.')
+    parser.add_argument('--manifest', help='Defaults to '
+        '<network>.deployment.json in the repository root.')
+    parser.add_argument('--fresh', action='store_true',
+        help='Ignore an existing manifest and deploy everything.')
+    parser.add_argument('--poll_interval', type=float, default=5)
+    args = parser.parse_args()
+
+    # The private key of the admin account (owner of the Arbiter).
+    private_key = int(os.environ['ADMIN_PRIVATE_KEY'], 0)
+    path = args.manifest or os.path.join(ROOT,
+        f'{args.network}.deployment.json')
+    if args.fresh and os.path.exists(path):
+        os.remove(path)
+    url = args.url or node_url(args.network)
+    if not url.endswith('/'):
+        url += '/'
+
+    manifest = Manifest(path, args.network)
+    deployer = Deployer(args.network, url, manifest, private_key,
+        poll_interval=args.poll_interval)
+    loop = asyncio.get_event_loop()
+    try:
+        loop.run_until_complete(deployer.run(STEPS))
+    finally:
+        write_nile_deployments(manifest, args.network)
+    print(f'Manifest: {os.path.relpath(path)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+# Index of drug lord turnover and of the revenue each lord collects.
+#
+#     index = await DrugLordIndex(ctx).fill()
+#     index.attach(ctx)  # Follows every challenge and turn from now on.
+#     ...
+#     index.revenue(ctx.alice.contract_address)  # {item_id: amount}
+#
+# The history of every location is a list of tenures. A tenure starts
+# at the game clock when the lord took the title and covers all turns
+# logged after that clock, up to the start of the next tenure. A
+# location without a lord has tenures of user_id 0: their cut is paid
+# to user 0 by the contract.
+#
+# Lord changes are taken from challenge_current_drug_lord transactions
+# (the combat record and the location of the challenger), and the cut
+# of each turn from its TurnLog, as take_cut computes it. Revenue is
+# what was paid to the lord, which is not the balance of the lord:
+# take_cut overwrites that balance rather than adding to it.
+#
+# Without attach(), sync() polls all_drug_lords_read and the TurnLogs.
+# That is exact as long as no turn at a location happens between a
+# change of its lord and the next sync.
+
+from collections import Counter
+from types import SimpleNamespace
+
+from utils.pedersen import list_to_hash
+
+# MUST be consistent with contracts/utils/game_constants.cairo.
+LOCATIONS = 76
+DRUG_LORD_PERCENTAGE = 2
+
+NO_LORD = 0
+
+
+def lord_cut(amount_to_give):
+    # Mirror of take_cut(): the lord gets whole percents of the amount.
+    return amount_to_give // 100 * DRUG_LORD_PERCENTAGE
+
+
+def cut_of_turn(log, lord_user_id):
+    # Returns (item_id, amount) paid to the lord by a turn, item_id 0
+    # being money. (0, 0) if the user is the lord.
+    if log.user_id == lord_user_id:
+        return (0, 0)
+    return (log.item_id * log.buy_or_sell, lord_cut(log.amount_to_give))
+
+
+def stat_hash(stats):
+    # The drug_lord_stat_hash stored for a lord with these combat stats.
+    return list_to_hash(stats)
+
+
+class DrugLordIndex():
+    def __init__(self, ctx):
+        # Anything with the drug_lord, combat, user_owned and engine
+        # contracts (e.g. the ctx of the harness).
+        self.drug_lord = ctx.drug_lord
+        self.combat = ctx.combat
+        self.user_owned = ctx.user_owned
+        self.engine = ctx.engine
+        # location_id -> [tenure], the last one is the current lord.
+        self.tenures = {}
+        self.stat_hashes = {}
+        # Game clock of the last turn indexed.
+        self.clock = None
+        self.combat_count = 0
+        self.calls = 0
+
+    def _tenure(self, location_id, user_id, start):
+        return SimpleNamespace(location_id=location_id, user_id=user_id,
+            start=start, end=None, turns=0, revenue=Counter())
+
+    async def fill(self):
+        # Reads the current lords of all locations in one call.
+        self.calls += 3
+        res = await self.engine.read_game_clock().call()
+        self.clock = res.result.clock
+        res = await self.combat.read_combat_count().call()
+        self.combat_count = res.result.count
+        res = await self.drug_lord.all_drug_lords_read().call()
+        r = res.result
+        for location_id, (user_id, stat_hash) in enumerate(
+                zip(r.user_ids, r.stat_hashes)):
+            self.tenures[location_id] = [
+                self._tenure(location_id, user_id, self.clock)]
+            self.stat_hashes[location_id] = stat_hash
+        return self
+
+    def lord(self, location_id):
+        return self.tenures[location_id][-1].user_id
+
+    def lord_at(self, location_id, clock):
+        # The lord who collected the cut of the turn logged at clock.
+        for tenure in reversed(self.tenures[location_id]):
+            if tenure.start < clock:
+                return tenure.user_id
+        return None
+
+    def record_lord(self, location_id, user_id, clock):
+        # The lord of location_id is user_id from game clock `clock`.
+        current = self.tenures[location_id][-1]
+        if current.user_id == user_id:
+            return
+        current.end = clock
+        self.tenures[location_id].append(
+            self._tenure(location_id, user_id, clock))
+
+    def record_challenge(self, location_id, combat, clock=None):
+        # combat is a record of view_combat(). The winner holds the title.
+        self.combat_count = max(self.combat_count, combat.index)
+        self.record_lord(location_id, combat.winner,
+            self.clock if clock is None else clock)
+
+    def record_turn(self, clock, log):
+        # Attributes the cut of the turn logged at clock.
+        tenure = self.tenures[log.location_id][-1]
+        item_id, amount = cut_of_turn(log, tenure.user_id)
+        tenure.turns += 1
+        if amount > 0:
+            tenure.revenue[item_id] += amount
+        self.clock = max(self.clock, clock)
+
+    def attach(self, ctx):
+        # Indexes every successful challenge and turn of ctx.execute().
+        execute = ctx.execute
+
+        async def indexed_execute(account_name, contract_address,
+                selector_name, calldata):
+            res = await execute(account_name, contract_address,
+                selector_name, calldata)
+            if contract_address == self.combat.contract_address and \
+                    selector_name == 'challenge_current_drug_lord':
+                await self._index_challenge()
+            elif contract_address == self.engine.contract_address and \
+                    selector_name == 'have_turn':
+                await self._index_turns()
+            return res
+
+        ctx.execute = indexed_execute
+        return self
+
+    async def _index_challenge(self):
+        self.calls += 1
+        res = await self.combat.read_combat_count().call()
+        for index in range(self.combat_count + 1, res.result.count + 1):
+            self.calls += 2
+            res = await self.combat.view_combat(index).call()
+            combat = res.result.combat_details
+            # The challenger cannot move before the next turn.
+            res = await self.user_owned.user_in_location_read(
+                combat.user).call()
+            self.record_challenge(res.result.location_id, combat)
+
+    async def _index_turns(self):
+        self.calls += 1
+        res = await self.engine.read_game_clock().call()
+        for clock in range(self.clock + 1, res.result.clock + 1):
+            self.calls += 1
+            res = await self.engine.view_given_turn(clock).call()
+            self.record_turn(clock, res.result.turn_log)
+
+    async def sync(self):
+        # Indexes the turns since the last sync, then any change of lord.
+        await self._index_turns()
+        self.calls += 2
+        res = await self.combat.read_combat_count().call()
+        self.combat_count = res.result.count
+        res = await self.drug_lord.all_drug_lords_read().call()
+        r = res.result
+        for location_id, (user_id, stat_hash) in enumerate(
+                zip(r.user_ids, r.stat_hashes)):
+            self.record_lord(location_id, user_id, self.clock)
+            self.stat_hashes[location_id] = stat_hash
+
+    def history(self, user_id):
+        # All tenures of a user, in order of start.
+        return sorted((t for tenures in self.tenures.values()
+            for t in tenures if t.user_id == user_id),
+            key=lambda t: (t.start, t.location_id))
+
+    def revenue(self, user_id, location_id=None):
+        # {item_id: amount} collected by user_id (item_id 0 is money).
+        total = Counter()
+        for t in self.history(user_id):
+            if location_id is None or t.location_id == location_id:
+                total.update(t.revenue)
+        return dict(total)
+
+    def turnover(self):
+        # {location_id: number of lord changes since fill()}.
+        return {location_id: len(tenures) - 1
+            for location_id, tenures in self.tenures.items()}
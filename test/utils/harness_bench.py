@@ -0,0 +1,271 @@
+# Wall-clock benchmarks of the Python test harness.
+#
+# Cairo steps (see utils/profiler.py) do not show where the harness
+# itself spends real seconds. Each phase here is timed with warmup runs
+# and repetitions, summarized as percentiles:
+#
+#     cache_build               build_copyable_deployment() (conftest.py)
+#     dill_load                 loading the pytest cache entry
+#     state_copy                StarknetState.copy() in ctx_factory
+#     unserialize_contract      all contracts of a ctx
+#     signer_sign               Signer.sign()
+#     compute_hash_on_elements  a 5 element message (as hash_message)
+#     have_turn                 one signed have_turn invoke
+#
+# Results are appended to a JSON history keyed by commit:
+#
+#     {"<commit>": [{"time": ..., "phases": {"<phase>": {stats}}}]}
+#
+# Usage (from test/):
+#
+#     python -m utils.harness_bench run [--skip cache_build]
+#     python -m utils.harness_bench compare [BASE [HEAD]]
+#
+# compare reports the p50 of every phase and exits with 1 if one of
+# them is slower than the base by more than --threshold.
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+HISTORY = os.path.join(ROOT, 'harness_bench.json')
+# Slowdown of the p50 reported by compare, as a fraction.
+THRESHOLD = 0.10
+PERCENTILES = [50, 90, 99]
+# (warmup, repeat) of each phase, repeat is scaled by --scale.
+PHASES = dict(
+    cache_build=(0, 1),
+    dill_load=(1, 10),
+    state_copy=(3, 50),
+    unserialize_contract=(3, 50),
+    signer_sign=(10, 200),
+    compute_hash_on_elements=(10, 500),
+    have_turn=(2, 20),
+)
+
+
+def percentile(ordered, p):
+    # Linear interpolation between the closest ranks.
+    if len(ordered) == 1:
+        return ordered[0]
+    k = (len(ordered) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(samples):
+    # Seconds -> stats of one phase.
+    ordered = sorted(samples)
+    stats = dict(n=len(ordered), min=ordered[0], max=ordered[-1],
+        mean=sum(ordered) / len(ordered))
+    for p in PERCENTILES:
+        stats[f'p{p}'] = percentile(ordered, p)
+    return stats
+
+
+async def measure(fn, warmup, repeat, setup=None):
+    # Seconds of repeat calls of fn(*setup()), after warmup calls.
+    # fn may be a coroutine function, setup is not timed.
+    samples = []
+    for i in range(warmup + repeat):
+        args = setup() if setup else ()
+        start = time.perf_counter()
+        res = fn(*args)
+        if asyncio.iscoroutine(res):
+            await res
+        elapsed = time.perf_counter() - start
+        if i >= warmup:
+            samples.append(elapsed)
+    return samples
+
+
+def phases(deployment):
+    # name -> (fn, setup) of the phases that use a deployment. Imported
+    # here so that compare works without cairo-lang.
+    import dill
+    from starkware.cairo.common.hash_state import compute_hash_on_elements
+    from starkware.starknet.public.abi import get_selector_from_name
+    from conftest import unserialize_contract
+
+    dumps = []
+
+    def dumped():
+        # Dumped once, the dump itself is not a phase.
+        if not dumps:
+            dumps.append(dill.dumps(deployment).decode('cp437'))
+        return (dumps[0],)
+
+    def unserialize(starknet_state):
+        return {name: unserialize_contract(starknet_state, c)
+            for name, c in deployment.serialized_contracts.items()}
+
+    def fresh_state():
+        return (deployment.starknet.state.copy(),)
+
+    def fresh_contracts():
+        return (unserialize(deployment.starknet.state.copy()),)
+
+    async def have_turn(contracts):
+        await deployment.signers['alice'].send_transaction(
+            contracts['alice'], contracts['engine'].contract_address,
+            'have_turn', [34, 0, 13, 2000])
+
+    signer = deployment.signers['alice']
+    message = [1, 2, get_selector_from_name('have_turn'), 3, 0]
+    message_hash = compute_hash_on_elements(message)
+    return dict(
+        dill_load=(lambda data: dill.loads(data.encode('cp437')), dumped),
+        state_copy=(lambda: deployment.starknet.state.copy(), None),
+        unserialize_contract=(unserialize, fresh_state),
+        signer_sign=(lambda: signer.sign(message_hash), None),
+        compute_hash_on_elements=(lambda: compute_hash_on_elements(message),
+            None),
+        have_turn=(have_turn, fresh_contracts),
+    )
+
+
+async def run(deployment=None, scale=1, skip=()):
+    # Returns name -> stats, in PHASES order. Without a deployment one
+    # is built first, timed as cache_build.
+    results = {}
+    if deployment is None:
+        from conftest import build_copyable_deployment
+        built = []
+
+        async def cache_build():
+            built.append(await build_copyable_deployment())
+
+        warmup, repeat = PHASES['cache_build']
+        if 'cache_build' in skip:
+            warmup, repeat = 0, 1
+        samples = await measure(cache_build, warmup, repeat)
+        if 'cache_build' not in skip:
+            results['cache_build'] = summarize(samples)
+        deployment = built[-1]
+    fns = phases(deployment)
+    for name, (warmup, repeat) in PHASES.items():
+        if name not in fns or name in skip:
+            continue
+        fn, setup = fns[name]
+        samples = await measure(fn, warmup, max(1, round(repeat * scale)),
+            setup)
+        results[name] = summarize(samples)
+    return results
+
+
+def commit():
+    # Short hash of HEAD, marked if the tree has changes.
+    try:
+        head = subprocess.check_output(['git', 'rev-parse', '--short',
+            'HEAD'], cwd=ROOT, text=True).strip()
+        dirty = subprocess.call(['git', 'diff', '--quiet', 'HEAD'],
+            cwd=ROOT) != 0
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return head + ('-dirty' if dirty else '')
+
+
+def load_history(path=HISTORY):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def record(results, path=HISTORY, key=None):
+    # Appends a run to the history and returns its key.
+    history = load_history(path)
+    key = key or commit()
+    history.setdefault(key, []).append(dict(time=round(time.time()),
+        phases=results))
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(history, f, indent=2)
+    os.replace(tmp, path)
+    return key
+
+
+def compare(history, base=None, head=None, threshold=THRESHOLD,
+        stat='p50'):
+    # Compares the latest runs of two commits (by default the last two
+    # in the history). Returns (base, head, rows), with rows of
+    # (phase, base seconds, head seconds, ratio, slower).
+    keys = list(history)
+    if head is None and keys:
+        head = keys[-1]
+    if head not in history:
+        raise ValueError(f'No run for {head} in the history.')
+    if base is None:
+        before = keys[:keys.index(head)]
+        if not before:
+            raise ValueError(f'No run before {head} to compare with.')
+        base = before[-1]
+    if base not in history:
+        raise ValueError(f'No run for {base} in the history.')
+    a = history[base][-1]['phases']
+    b = history[head][-1]['phases']
+    rows = []
+    for phase in PHASES:
+        if phase in a and phase in b:
+            ratio = b[phase][stat] / a[phase][stat]
+            rows.append((phase, a[phase][stat], b[phase][stat], ratio,
+                ratio > 1 + threshold))
+    return base, head, rows
+
+
+def table(results):
+    lines = [f"{'phase':26} {'n':>5} " + ' '.join(f'{s:>10}'
+        for s in ['min', 'mean'] + [f'p{p}' for p in PERCENTILES])]
+    for name, s in results.items():
+        lines.append(f"{name:26} {s['n']:5d} " + ' '.join(
+            f'{s[k] * 1000:9.3f}m' for k in ['min', 'mean'] +
+            [f'p{p}' for p in PERCENTILES]))
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Wall-clock benchmarks of the test harness.')
+    parser.add_argument('--history', default=HISTORY)
+    sub = parser.add_subparsers(dest='command')
+    run_parser = sub.add_parser('run')
+    run_parser.add_argument('--scale', type=float, default=1,
+        help='Multiplies the repetitions of every phase.')
+    run_parser.add_argument('--skip', nargs='*', default=[],
+        choices=list(PHASES))
+    run_parser.add_argument('--key', help='Defaults to the commit.')
+    compare_parser = sub.add_parser('compare')
+    compare_parser.add_argument('base', nargs='?')
+    compare_parser.add_argument('head', nargs='?')
+    compare_parser.add_argument('--threshold', type=float,
+        default=THRESHOLD)
+    compare_parser.add_argument('--stat', default='p50')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        loop = asyncio.get_event_loop()
+        results = loop.run_until_complete(run(scale=args.scale,
+            skip=args.skip))
+        print(table(results))
+        print(f'Recorded as {record(results, args.history, args.key)}')
+    elif args.command == 'compare':
+        base, head, rows = compare(load_history(args.history), args.base,
+            args.head, args.threshold, args.stat)
+        print(f"{'phase':26} {base:>14} {head:>14}   ratio")
+        for phase, a, b, ratio, slower in rows:
+            print(f'{phase:26} {a * 1000:13.3f}m {b * 1000:13.3f}m '
+                f"{ratio:7.2f}{'  SLOWER' if slower else ''}")
+        if any(row[-1] for row in rows):
+            sys.exit(1)
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
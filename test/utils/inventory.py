@@ -0,0 +1,74 @@
+# Codec for the packed inventories of 03_UserOwned.
+#
+# Balances are indexed by item_id (0 is money) and stored three per
+# slot: item_id = slot * LANES + lane.
+#
+#     packed = lane_0 + lane_1 * 2**64 + lane_2 * 2**128 + SLOT_TAG
+#
+# A slot of 0 has not been written in this layout and is read from the
+# legacy user_has_item slots.
+
+from starkware.starknet.public.abi import get_storage_var_address
+
+# MUST be consistent with contracts/03_UserOwned.cairo.
+BALANCE_SHIFT = 2 ** 64
+SLOT_TAG = 2 ** 192
+LANES = 3
+INVENTORY_SIZE = 20
+INVENTORY_SLOTS = 7
+
+
+def locate(item_id):
+    # Returns (slot, lane) of an item_id.
+    if not 0 <= item_id < INVENTORY_SIZE:
+        raise ValueError(f'No item_id {item_id} in an inventory.')
+    return divmod(item_id, LANES)
+
+
+def pack_slot(balances):
+    # balances: up to LANES values, missing lanes are 0.
+    if len(balances) > LANES:
+        raise ValueError(f'At most {LANES} balances per slot.')
+    packed = SLOT_TAG
+    for lane, value in enumerate(balances):
+        if not 0 <= value < BALANCE_SHIFT:
+            raise ValueError(f'Balance out of range: {value}')
+        packed += value * BALANCE_SHIFT ** lane
+    return packed
+
+
+def unpack_slot(packed):
+    # Returns the LANES balances of a slot (which must be written).
+    if packed // SLOT_TAG != 1:
+        raise ValueError(f'Not a packed slot: {packed}')
+    return [packed // BALANCE_SHIFT ** lane % BALANCE_SHIFT
+        for lane in range(LANES)]
+
+
+def pack(items):
+    # Returns the INVENTORY_SLOTS words of a full inventory.
+    if len(items) != INVENTORY_SIZE:
+        raise ValueError(f'An inventory has {INVENTORY_SIZE} balances.')
+    return [pack_slot(items[i:i + LANES])
+        for i in range(0, INVENTORY_SIZE, LANES)]
+
+
+def unpack(words, legacy=None):
+    # Returns the INVENTORY_SIZE balances from the slot words. Slots
+    # that are 0 are taken from legacy(item_id) (0 if not given).
+    items = []
+    for slot, packed in enumerate(words):
+        if packed == 0:
+            items += [legacy(slot * LANES + lane) if legacy else 0
+                for lane in range(LANES)]
+        else:
+            items += unpack_slot(packed)
+    return items[:INVENTORY_SIZE]
+
+
+def storage_key(user_id, slot):
+    return get_storage_var_address('user_inventory', user_id, slot)
+
+
+def legacy_storage_key(user_id, item_id):
+    return get_storage_var_address('user_has_item', user_id, item_id)
@@ -0,0 +1,143 @@
+# Incremental cache of all market states for off-chain observers.
+#
+# A turn only writes the traded market and, via update_regional_items,
+# the item side of the same item in the four districts of that city.
+# The cache is filled once with check_market_states, then kept in sync
+# by reading the TurnLog of every new turn:
+#
+# - The traded market is set from the post-trade post-event values.
+# - Other initialized districts are scaled by the regional factor.
+# - Anything that cannot be derived (e.g. a district market that was
+#   initialized by the turn) is marked dirty and re-fetched on read.
+#
+# In the per-city clock mode (see utils/city_clocks.py) the TurnLogs of
+# each city are followed by its own clock. A turn only writes markets
+# of its city, so cities can be applied in any order.
+#
+# Markets are (item_quantity, money_quantity), (0, 0) if uninitialized.
+
+from types import SimpleNamespace
+
+from utils.city_clocks import city_turn_logs, CITIES, MIN_TURN_LOCKOUT
+
+# MUST be consistent with contracts/utils/game_constants.cairo.
+LOCATIONS = 76
+DISTRICTS = 4
+ITEMS = 19
+MARKETS = LOCATIONS * ITEMS
+
+
+def market_index(location_id, item_id):
+    return location_id * ITEMS + item_id - 1
+
+
+def turn_write_set(location_id, item_id):
+    # Markets a have_turn() at (location_id, item_id) may change.
+    city = location_id // DISTRICTS * DISTRICTS
+    return [(location, item_id) for location in range(city,
+        city + DISTRICTS)]
+
+
+class MarketCache():
+    def __init__(self, location_owned, engine):
+        # StarknetContracts (or anything with the same views).
+        self.location_owned = location_owned
+        self.engine = engine
+        # (location_id, item_id) -> (item_quantity, money_quantity)
+        self.markets = {}
+        self.dirty = set()
+        # Game clock and city clocks of the last turns applied.
+        self.clock = None
+        self.city_clocks = None
+        self.calls = 0
+
+    async def read_clocks(self):
+        # (game clock, city clocks). The city clocks are all 0 until
+        # enable_city_clocks() sets them to MIN_TURN_LOCKOUT.
+        self.calls += 2
+        res = await self.engine.read_game_clock().call()
+        clock = res.result.clock
+        res = await self.engine.read_city_clocks().call()
+        return clock, [max(c, MIN_TURN_LOCKOUT) for c in res.result.clocks]
+
+    async def fill(self, chunk=MARKETS):
+        # Reads every market, in chunks of market indices.
+        self.clock, self.city_clocks = await self.read_clocks()
+        for start in range(0, MARKETS, chunk):
+            count = min(chunk, MARKETS - start)
+            self.calls += 1
+            res = await self.location_owned.check_market_states(
+                start, count).call()
+            r = res.result
+            for i, (item, money) in enumerate(zip(r.item_quantities,
+                    r.money_quantities)):
+                location_id, item_index = divmod(start + i, ITEMS)
+                self.markets[(location_id, item_index + 1)] = (item, money)
+        self.dirty.clear()
+        return self
+
+    def invalidate(self, location_id, item_id):
+        # Marks the write set of a turn dirty (no TurnLog needed).
+        self.dirty.update(turn_write_set(location_id, item_id))
+
+    def apply_turn_log(self, log):
+        # Updates the cache from a TurnLog without any calls.
+        traded = (log.location_id, log.item_id)
+        for market in turn_write_set(log.location_id, log.item_id):
+            if market == traded:
+                continue
+            item, money = self.markets.get(market, (0, 0))
+            if market in self.dirty or item == 0 or money == 0:
+                # Unknown, or initialized during the turn (either side
+                # empty is generated on read).
+                self.dirty.add(market)
+            else:
+                self.markets[market] = (
+                    item * log.regional_item_reduction_factor // 100, money)
+        self.markets[traded] = (log.market_post_trade_post_event_item,
+            log.market_post_trade_post_event_money)
+        self.dirty.discard(traded)
+
+    async def sync(self):
+        # Applies the TurnLogs of all turns since the last sync, by the
+        # game clock then by the clock of each city.
+        clock, city_clocks = await self.read_clocks()
+        for c in range(self.clock + 1, clock + 1):
+            self.calls += 1
+            res = await self.engine.view_given_turn(c).call()
+            self.apply_turn_log(res.result.turn_log)
+        self.clock = clock
+        for city in range(CITIES):
+            async for turn in city_turn_logs(self.engine, city,
+                    self.city_clocks[city] + 1, city_clocks[city]):
+                self.calls += 1
+                self.apply_turn_log(turn.log)
+        self.city_clocks = city_clocks
+
+    async def refresh(self):
+        # Re-fetches the dirty markets only.
+        for location_id, item_id in sorted(self.dirty):
+            self.calls += 1
+            res = await self.location_owned.check_market_state(
+                location_id, item_id).call()
+            self.markets[(location_id, item_id)] = (
+                res.result.item_quantity, res.result.money_quantity)
+        self.dirty.clear()
+
+    async def get(self, location_id, item_id):
+        market = (location_id, item_id)
+        if market in self.dirty:
+            self.calls += 1
+            res = await self.location_owned.check_market_state(
+                location_id, item_id).call()
+            self.markets[market] = (res.result.item_quantity,
+                res.result.money_quantity)
+            self.dirty.discard(market)
+        item, money = self.markets[market]
+        return SimpleNamespace(item_quantity=item, money_quantity=money)
+
+    async def observe(self):
+        # Syncs, refreshes and returns {(location_id, item_id): market}.
+        await self.sync()
+        await self.refresh()
+        return self.markets
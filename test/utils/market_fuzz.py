@@ -0,0 +1,418 @@
+# Differential fuzzer for trade() in contracts/utils/market_maker.cairo.
+#
+# Every case (market_a_pre, market_b_pre, user_gives_a) is run through
+# the Cairo function (via test/fixtures/market_maker_harness.cairo) and
+# through the Python mirror below. The outcomes, either the three
+# return values or a failure, must be identical.
+#
+# The harness is deployed once, then a process pool is forked so each
+# worker has its own copy of the StarknetState. Cases are sharded by
+# seed. Any discrepancy is shrunk to a minimal reproducer by the worker
+# that found it.
+#
+#     cd test && python -m utils.market_fuzz 100000
+#
+# fuzz_turns() runs the whole have_turn() pipeline instead: the cut,
+# execute_trade(), the events and the TurnLog. Each worker plays its
+# shards on its own copy of the copyable_deployment (conftest.py),
+# players in rotation, with amounts biased towards the boundaries of
+# the state it sees (balances, rounding to zero, the upper bound). After
+# each turn the TurnLog must agree with the mirrors:
+#
+#     - The pre-trade market is read_pair() as seen before the turn.
+#     - Without a trade, the market and the user are unchanged.
+#     - With one, trade() of the amount after the cut gives the
+#       post-trade market, and the user pays and gets exactly that.
+#     - The post-event user balances are the pre-event ones times the
+#       reduction factors.
+#     - A turn reverts only if its lockout, cut or trade would fail.
+#
+# Turns are stateful, so a discrepancy is reported with its shard seed
+# and turn index rather than minimized.
+#
+#     cd test && python -m utils.market_fuzz 200 --turns
+
+import asyncio
+import multiprocessing
+import os
+import random
+import time
+from types import SimpleNamespace
+
+from starkware.cairo.lang.cairo_constants import DEFAULT_PRIME
+from starkware.starknet.compiler.compile import compile_starknet_files
+from starkware.starknet.public.abi import get_storage_var_address
+from starkware.starknet.testing.starknet import Starknet
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+HARNESS = os.path.join(ROOT, 'test', 'fixtures',
+    'market_maker_harness.cairo')
+
+# MUST be consistent with BALANCE_UPPER_BOUND in market_maker.cairo.
+BALANCE_UPPER_BOUND = 2 ** 64
+FAILED = 'failed'
+# MUST be consistent with contracts/utils/game_constants.cairo.
+LOCATIONS = 76
+ITEMS = 19
+MIN_TURN_LOCKOUT = 3
+DRUG_LORD_PERCENTAGE = 2
+STARTING_MONEY = 20000
+# unsigned_div_rem() in take_cut() needs a quotient below 2 ** 128.
+CUT_UPPER_BOUND = 100 * 2 ** 128
+PLAYERS = ['alice', 'bob', 'carol', 'dave', 'eric', 'frank', 'grace',
+    'hank']
+
+# Set in the parent before the pool forks.
+_harness = None
+_deployment = None
+
+
+def trade(market_a_pre, market_b_pre, user_gives_a):
+    # Mirror of trade(). Inputs are felts. Returns the three outputs or
+    # FAILED if an assertion of the contract would fail.
+    values = [x % DEFAULT_PRIME for x in
+        (market_a_pre, market_b_pre, user_gives_a)]
+    if any(v >= BALANCE_UPPER_BOUND for v in values):
+        return FAILED
+    a, b, gives = values
+    if a + gives == 0:
+        return FAILED
+    gets = b * gives // (a + gives)
+    if gives < 1 or gets < 1:
+        return FAILED
+    return (a + gives, b - gets, gets)
+
+
+def edge_case(rng):
+    # A case biased towards the boundaries of trade().
+    top = BALANCE_UPPER_BOUND
+
+    def value():
+        kind = rng.random()
+        if kind < 0.2:
+            # Near or beyond the upper bound.
+            return top + rng.randint(-3, 1)
+        if kind < 0.35:
+            return rng.randint(0, 2)
+        if kind < 0.45:
+            # Negative, i.e. just below the prime.
+            return -rng.randint(1, 3)
+        if kind < 0.6:
+            return rng.randint(0, 1000)
+        return rng.randrange(top)
+
+    a, b, gives = value(), value(), value()
+    kind = rng.random()
+    if kind < 0.15:
+        # The market holds one item.
+        b = 1
+    elif kind < 0.3 and 0 < a < top:
+        # An amount that rounds to zero or one item.
+        b = max(b % top, 1)
+        gives = rng.randint(1, max(1, (a + b - 1) // b))
+    return (a, b, gives)
+
+
+def cases(seed, n):
+    rng = random.Random(seed)
+    return [edge_case(rng) for _ in range(n)]
+
+
+async def cairo_trade(contract, case):
+    try:
+        res = await contract.trade_view(
+            *[x % DEFAULT_PRIME for x in case]).call()
+    except Exception:
+        return FAILED
+    return tuple(res.result)
+
+
+def minimize(case, differs):
+    # Shrinks each value (to 0, 1, halves, minus one) while the
+    # discrepancy remains. differs(case) -> bool.
+    case = list(case)
+    progress = True
+    while progress:
+        progress = False
+        for i in range(len(case)):
+            v = case[i]
+            for smaller in [0, 1, v // 2, v - 1, v % BALANCE_UPPER_BOUND]:
+                if 0 <= smaller < v or (v < 0 and smaller >= 0):
+                    candidate = case[:i] + [smaller] + case[i + 1:]
+                    if differs(candidate):
+                        case = candidate
+                        progress = True
+                        break
+    return tuple(case)
+
+
+async def _run_shard(seed, n):
+    discrepancies = []
+    for case in cases(seed, n):
+        cairo = await cairo_trade(_harness, case)
+        expected = trade(*case)
+        if cairo != expected:
+            discrepancies.append(SimpleNamespace(case=case, cairo=cairo,
+                mirror=expected))
+    return discrepancies
+
+
+def run_shard(shard):
+    # Runs in a worker. Returns (number of cases, discrepancies).
+    seed, n = shard
+    loop = asyncio.new_event_loop()
+    try:
+        found = loop.run_until_complete(_run_shard(seed, n))
+        for d in found:
+            d.reproducer = minimize(d.case,
+                lambda c: loop.run_until_complete(
+                    cairo_trade(_harness, c)) != trade(*c))
+            d.reproducer_cairo = loop.run_until_complete(
+                cairo_trade(_harness, d.reproducer))
+            d.reproducer_mirror = trade(*d.reproducer)
+    finally:
+        loop.close()
+    return n, found
+
+
+async def deploy_harness():
+    definition = compile_starknet_files(files=[HARNESS], debug_info=True,
+        cairo_path=[ROOT])
+    starknet = await Starknet.empty()
+    return await starknet.deploy(contract_def=definition)
+
+
+def fuzz(n_cases, workers=None, seed=0, shard_size=500):
+    # Returns .cases, .discrepancies, .seconds and .per_second.
+    global _harness
+    workers = workers or os.cpu_count()
+    if _harness is None:
+        _harness = asyncio.new_event_loop().run_until_complete(
+            deploy_harness())
+    shards = [(seed * 1000003 + i, min(shard_size, n_cases - start))
+        for i, start in enumerate(range(0, n_cases, shard_size))]
+    start = time.perf_counter()
+    if workers == 1:
+        results = [run_shard(s) for s in shards]
+    else:
+        with multiprocessing.get_context('fork').Pool(workers) as pool:
+            results = pool.map(run_shard, shards, chunksize=1)
+    seconds = time.perf_counter() - start
+    discrepancies = [d for _, found in results for d in found]
+    done = sum(n for n, _ in results)
+    return SimpleNamespace(cases=done, discrepancies=discrepancies,
+        seconds=seconds, per_second=done / seconds if seconds else 0)
+
+
+def post_cut(amount, lord):
+    # Mirror of take_cut(): the amount that reaches execute_trade(), or
+    # FAILED. lord is whether the player is the lord of the location.
+    if lord:
+        return amount
+    if amount >= CUT_UPPER_BOUND:
+        return FAILED
+    return amount - amount // 100 * DRUG_LORD_PERCENTAGE
+
+
+def turn_amount(rng, held, market_a, market_b):
+    # An amount_to_give biased towards the boundaries of the turn, for
+    # a player holding held of what they give, against a market
+    # (market_a, market_b) as seen by trade().
+    kind = rng.random()
+    if kind < 0.15:
+        # All of it, or one more.
+        return held + rng.randint(0, 1)
+    if kind < 0.3:
+        return rng.randint(0, 2)
+    if kind < 0.45 and market_b:
+        # Rounds to zero or one of b, before and after the cut.
+        return rng.randint(1, max(1, 2 * (market_a // market_b) + 2))
+    if kind < 0.55:
+        # Near or beyond the upper bounds, or negative.
+        return rng.choice([BALANCE_UPPER_BOUND + rng.randint(-2, 1),
+            CUT_UPPER_BOUND + rng.randint(-1, 0),
+            DEFAULT_PRIME - rng.randint(1, 3)])
+    return rng.randint(0, max(held, 1))
+
+
+def _slot(contract, name, *keys):
+    # A storage_var of a contract, read from the state.
+    state = contract.state.state.contract_states[contract.contract_address]
+    leaf = state.storage_updates.get(get_storage_var_address(name, *keys))
+    return leaf.value if leaf else 0
+
+
+def _deploy_contracts():
+    # A copy of _deployment, as ctx_factory makes one.
+    from conftest import unserialize_contract
+    state = _deployment.starknet.state.copy()
+    return {name: unserialize_contract(state, c)
+        for name, c in _deployment.serialized_contracts.items()}
+
+
+async def _call(view):
+    return (await view.call()).result
+
+
+def check_turn(expected, log):
+    # Problems of a TurnLog (a dict) against the prediction of the
+    # mirrors, [] if none.
+    problems = []
+    if (log['market_pre_trade_item'], log['market_pre_trade_money']) != \
+            expected.market:
+        problems.append('pre-trade market is not read_pair()')
+    if (log['user_pre_trade_item'], log['user_pre_trade_money']) != \
+            expected.user:
+        problems.append('pre-trade user balances')
+    market_post = (log['market_post_trade_pre_event_item'],
+        log['market_post_trade_pre_event_money'])
+    user_post = (log['user_post_trade_pre_event_item'],
+        log['user_post_trade_pre_event_money'])
+    if not log['trade_occurs_bool']:
+        if market_post != expected.market or user_post != expected.user:
+            problems.append('changed without a trade')
+    elif expected.trade == FAILED:
+        problems.append('a failing trade succeeded')
+    else:
+        a_post, b_post, gets = expected.trade
+        if expected.buy:
+            market = (b_post, a_post)
+            user = (expected.user[0] + gets, expected.user[1] - expected.gives)
+        else:
+            market = (a_post, b_post)
+            user = (expected.user[0] - expected.gives, expected.user[1] + gets)
+        if market_post != market:
+            problems.append(f'post-trade market {market_post}, '
+                f'mirror {market}')
+        if user_post != user:
+            problems.append(f'post-trade user {user_post}, mirror {user}')
+    if log['user_post_trade_post_event_money'] != \
+            log['user_post_trade_pre_event_money'] * \
+            log['money_reduction_factor'] // 100:
+        problems.append('money_reduction_factor')
+    if log['user_post_trade_post_event_item'] != \
+            log['user_post_trade_pre_event_item'] * \
+            log['item_reduction_factor'] // 100:
+        problems.append('item_reduction_factor')
+    return problems
+
+
+async def _run_turn_shard(seed, n):
+    rng = random.Random(seed)
+    c = _deploy_contracts()
+    engine, location_owned = c['engine'], c['location_owned']
+    user_owned, drug_lord = c['user_owned'], c['drug_lord']
+    last_turn = {name: 0 for name in PLAYERS}
+    discrepancies = []
+    for i in range(n):
+        name = PLAYERS[i % len(PLAYERS)]
+        user_id = c[name].contract_address
+        location_id = rng.randrange(LOCATIONS)
+        item_id = rng.randint(1, ITEMS)
+        buy_or_sell = 2 if rng.random() < 0.03 else rng.randint(0, 1)
+
+        # The state the turn will see.
+        market = tuple(await _call(location_owned.read_pair(location_id,
+            item_id)))
+        item = (await _call(user_owned.user_has_item_read(user_id,
+            item_id))).value
+        money = STARTING_MONEY
+        if _slot(engine, 'user_initialized', user_id):
+            money = (await _call(user_owned.user_has_item_read(user_id,
+                0))).value
+        lord = (await _call(drug_lord.drug_lord_read(location_id))).user_id
+        clock = (await _call(engine.read_game_clock())).clock
+
+        buy = buy_or_sell == 0
+        held = money if buy else item
+        a, b = (market[1], market[0]) if buy else market
+        amount = turn_amount(rng, held, a, b)
+        gives = post_cut(amount, lord == user_id)
+        expected = SimpleNamespace(market=market, user=(item, money),
+            buy=buy, gives=gives, trade=FAILED)
+        if gives != FAILED and buy_or_sell <= 1 and gives <= held:
+            expected.trade = trade(a, b, gives)
+        locked = clock < last_turn[name] + MIN_TURN_LOCKOUT
+
+        turn = (name, location_id, buy_or_sell, item_id, amount)
+        try:
+            await _deployment.signers[name].send_transaction(c[name],
+                engine.contract_address, 'have_turn',
+                [location_id, buy_or_sell, item_id, amount])
+        except Exception as e:
+            if not (locked or gives == FAILED or expected.trade == FAILED):
+                discrepancies.append(SimpleNamespace(seed=seed, index=i,
+                    turn=turn, problems=[f'reverted: {e}'.splitlines()[0]]))
+            continue
+        last_turn[name] = clock + 1
+        log = (await _call(engine.view_given_turn(clock + 1))).turn_log
+        log = log._asdict()
+        problems = check_turn(expected, log)
+        if locked:
+            problems.append('a locked out player had a turn')
+        if gives == FAILED:
+            problems.append('the cut could not be taken')
+        if problems:
+            discrepancies.append(SimpleNamespace(seed=seed, index=i,
+                turn=turn, problems=problems, log=log))
+    return discrepancies
+
+
+def run_turn_shard(shard):
+    # Runs in a worker. Returns (number of turns, discrepancies).
+    seed, n = shard
+    loop = asyncio.new_event_loop()
+    try:
+        found = loop.run_until_complete(_run_turn_shard(seed, n))
+    finally:
+        loop.close()
+    return n, found
+
+
+def fuzz_turns(deployment, n_turns, workers=None, seed=0, shard_size=50):
+    # deployment: the copyable_deployment fixture (or
+    # build_copyable_deployment() of conftest.py). Returns .turns,
+    # .discrepancies, .seconds and .per_second.
+    global _deployment
+    workers = workers or os.cpu_count()
+    _deployment = deployment
+    shards = [(seed * 1000003 + i, min(shard_size, n_turns - start))
+        for i, start in enumerate(range(0, n_turns, shard_size))]
+    start = time.perf_counter()
+    if workers == 1:
+        results = [run_turn_shard(s) for s in shards]
+    else:
+        with multiprocessing.get_context('fork').Pool(workers) as pool:
+            results = pool.map(run_turn_shard, shards, chunksize=1)
+    seconds = time.perf_counter() - start
+    discrepancies = [d for _, found in results for d in found]
+    done = sum(n for n, _ in results)
+    return SimpleNamespace(turns=done, discrepancies=discrepancies,
+        seconds=seconds, per_second=done / seconds if seconds else 0)
+
+
+if __name__ == '__main__':
+    import sys
+    turns = '--turns' in sys.argv
+    args = [a for a in sys.argv[1:] if a != '--turns']
+    n = int(args[0]) if args else (200 if turns else 10000)
+    workers = int(args[1]) if len(args) > 1 else None
+    if turns:
+        from conftest import build_copyable_deployment
+        deployment = asyncio.new_event_loop().run_until_complete(
+            build_copyable_deployment())
+        res = fuzz_turns(deployment, n, workers)
+        print(f'{res.turns} turns in {res.seconds:.1f}s '
+            f'({res.per_second:.1f} turns/s), '
+            f'{len(res.discrepancies)} discrepancies')
+        for d in res.discrepancies:
+            print(f'  shard {d.seed} turn {d.index} {d.turn}: '
+                f'{"; ".join(d.problems)}')
+        sys.exit(0)
+    res = fuzz(n, workers)
+    print(f'{res.cases} cases in {res.seconds:.1f}s '
+        f'({res.per_second:.0f} cases/s), '
+        f'{len(res.discrepancies)} discrepancies')
+    for d in res.discrepancies:
+        print(f'  {d.reproducer}: cairo {d.reproducer_cairo}, '
+            f'mirror {d.reproducer_mirror} (found as {d.case})')
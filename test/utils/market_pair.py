@@ -0,0 +1,116 @@
+# Codec for the packed market pairs of 02_LocationOwned, and a driver
+# that migrates markets from the legacy slots.
+#
+#     packed = (region_turn * PAIR_SHIFT + item_quantity) * PAIR_SHIFT +
+#         money_quantity
+#
+# region_turn is the number of regional supply turns already applied to
+# the stored quantities (see utils/regional_supply.py), so the slot
+# only matches check_market_state until the next turn of the region.
+#
+# Markets stored before market_pair existed are in location_has_item
+# and location_has_money. They are moved to market_pair on their next
+# read_pair, or all at once with:
+#
+#     await migrate(ctx.execute, "admin", ctx.location_owned.contract_address)
+#
+# Markets are generated on their first read, inside a turn. The admin
+# can initialize all of them (or a range) ahead of play instead, in as
+# few init_markets transactions as the step limit allows:
+#
+#     await initialize(ctx.execute, "admin",
+#         ctx.location_owned.contract_address)
+
+from starkware.starknet.public.abi import get_storage_var_address
+
+# MUST be consistent with PAIR_SHIFT in contracts/02_LocationOwned.cairo.
+PAIR_SHIFT = 2 ** 64
+# MUST be consistent with contracts/utils/game_constants.cairo.
+LOCATIONS = 76
+ITEMS = 19
+MARKETS = LOCATIONS * ITEMS
+# Markets moved per migrate_markets transaction.
+MIGRATION_CHUNK = 76
+# Steps of an invoke transaction (invoke_tx_max_n_steps of the
+# StarkNet general config) and the share of it initialize() plans for.
+MAX_STEPS = 250000
+STEP_MARGIN = 0.8
+# Markets of the first init_markets transaction, which measures the
+# steps per market. Small, as markets do not cost the same: those with
+# turns of their region pending cost more.
+PROBE_CHUNK = 4
+
+
+def pack(item_quantity, money_quantity, region_turn=0):
+    if not (0 <= item_quantity < PAIR_SHIFT and
+            0 <= money_quantity < PAIR_SHIFT and
+            0 <= region_turn < PAIR_SHIFT):
+        raise ValueError(
+            f'Market pair out of range: ({item_quantity}, {money_quantity})')
+    return (region_turn * PAIR_SHIFT + item_quantity) * PAIR_SHIFT + \
+        money_quantity
+
+
+def unpack(packed):
+    # Returns (item_quantity, money_quantity) as stored.
+    rest, money_quantity = divmod(packed, PAIR_SHIFT)
+    return (rest % PAIR_SHIFT, money_quantity)
+
+
+def region_turn(packed):
+    return packed // PAIR_SHIFT ** 2
+
+
+def storage_key(location_id, item_id, name='market_pair'):
+    # Storage address of a market in 02_LocationOwned. name can also be
+    # 'location_has_item' or 'location_has_money' (legacy).
+    return get_storage_var_address(name, location_id, item_id)
+
+
+async def migrate(execute, account_name, location_owned_address,
+        start=0, count=MARKETS, chunk=MIGRATION_CHUNK):
+    # Sends migrate_markets for markets [start, start + count) in chunks.
+    # Returns the number of transactions.
+    sent = 0
+    for lo in range(start, start + count, chunk):
+        n = min(chunk, start + count - lo)
+        await execute(account_name, location_owned_address,
+            'migrate_markets', [lo, n])
+        sent += 1
+    return sent
+
+
+async def initialize(execute, account_name, location_owned_address,
+        start=0, count=MARKETS, max_steps=MAX_STEPS):
+    # Sends init_markets for markets [start, start + count). Each chunk
+    # is sized from the most steps per market seen so far (including
+    # the cost of the transaction itself), to stay under
+    # max_steps * STEP_MARGIN. A transaction that fails (e.g. over the
+    # step limit, for markets dearer than those measured) is sent again
+    # with half the markets, and the estimate raised to match. Raises if
+    # a single market fails. Returns [(start, count, n_steps)] of the
+    # transactions that succeeded.
+    sent = []
+    per_market = None
+    lo, end = start, start + count
+    n = PROBE_CHUNK
+    while lo < end:
+        if per_market is not None:
+            n = max(1, int(max_steps * STEP_MARGIN // per_market))
+        n = min(n, end - lo)
+        while True:
+            try:
+                tx = await execute(account_name, location_owned_address,
+                    'init_markets', [lo, n])
+                break
+            except Exception:
+                if n == 1:
+                    raise
+                # n markets do not fit in max_steps.
+                per_market = max(per_market or 0, max_steps / n)
+                n //= 2
+        steps = tx.call_info.cairo_usage.n_steps
+        per_market = max(per_market or 0, steps / n)
+        sent.append((lo, n, steps))
+        lo += n
+    return sent
@@ -0,0 +1,91 @@
+# Pedersen hashing shared by the off-chain tooling.
+#
+#     hash2(a, b)                     hash2() of starkware.cairo.common
+#     compute_hash_on_elements(data)  as starkware's hash_state (Signer)
+#     list_to_hash(values)            list_to_hash() in
+#                                     contracts/utils/general.cairo (no
+#                                     length at the end)
+#     add_to_seed(seed, val0, val1)   mirror of 07_PseudoRandom
+#     hash_many(pairs)                hash2 over a batch
+#
+# The hash is the native-backed fast_pedersen_hash (fastecdsa) when it
+# can be imported, and the pure Python pedersen_hash otherwise. The
+# same transaction calldata, lord stat arrays and moves are hashed over
+# and over, so pairs and whole element lists are kept in LRU caches.
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, reduce
+
+try:
+    from starkware.crypto.signature.fast_pedersen_hash import \
+        pedersen_hash as _pedersen
+    BACKEND = 'native'
+except ImportError:
+    from starkware.crypto.signature.signature import \
+        pedersen_hash as _pedersen
+    BACKEND = 'pure'
+
+PAIR_CACHE_SIZE = 2 ** 16
+LIST_CACHE_SIZE = 2 ** 12
+# Below this many pairs hash_many() does not start a pool.
+MIN_PARALLEL = 512
+
+
+@lru_cache(maxsize=PAIR_CACHE_SIZE)
+def hash2(a, b):
+    return _pedersen(a, b)
+
+
+@lru_cache(maxsize=LIST_CACHE_SIZE)
+def _hash_on_elements(data):
+    return hash2(reduce(hash2, data, 0), len(data))
+
+
+@lru_cache(maxsize=LIST_CACHE_SIZE)
+def _list_to_hash(values):
+    return reduce(hash2, values, 0)
+
+
+def compute_hash_on_elements(data):
+    return _hash_on_elements(tuple(data))
+
+
+def list_to_hash(values):
+    return _list_to_hash(tuple(values))
+
+
+def add_to_seed(seed, val0, val1):
+    # seed XOR hash2(val0, val1), the new seed of add_to_seed().
+    return seed ^ hash2(val0, val1)
+
+
+def _hash_chunk(pairs):
+    # Runs in a pool worker.
+    return [_pedersen(a, b) for a, b in pairs]
+
+
+def hash_many(pairs, processes=1):
+    # hash2 of every (a, b), in order. Large batches can be split across
+    # a process pool (processes=None for the CPU count); pool workers do
+    # not share the cache.
+    pairs = [(int(a), int(b)) for a, b in pairs]
+    processes = processes or os.cpu_count() or 1
+    if processes == 1 or len(pairs) < MIN_PARALLEL:
+        return [hash2(a, b) for a, b in pairs]
+    chunk = -(-len(pairs) // (processes * 4))
+    with ProcessPoolExecutor(processes) as pool:
+        return [h for hashes in pool.map(_hash_chunk, [pairs[i:i + chunk]
+            for i in range(0, len(pairs), chunk)]) for h in hashes]
+
+
+def cache_info():
+    return dict(pairs=hash2.cache_info(),
+        elements=_hash_on_elements.cache_info(),
+        lists=_list_to_hash.cache_info())
+
+
+def cache_clear():
+    hash2.cache_clear()
+    _hash_on_elements.cache_clear()
+    _list_to_hash.cache_clear()
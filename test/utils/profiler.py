@@ -0,0 +1,141 @@
+# Function-level step profiler for Cairo contracts run in the harness.
+#
+#     with ctx.profile() as p:
+#         await ctx.execute("alice", ctx.engine.contract_address,
+#             'have_turn', [34, 0, 13, 2000])
+#     print(p.table(20))
+#     p.write_collapsed('have_turn.folded')  # For flamegraph.pl etc.
+#
+# While active, every entry point run (including calls into other
+# contracts) keeps its pc trace. The trace is mapped to Cairo functions
+# with the debug info that conftest.compile() adds, and the call stack
+# is rebuilt from fp: a new fp is a call, a previous fp is a return.
+# A contract call made by a syscall continues the stack of the caller.
+
+from collections import Counter
+from types import SimpleNamespace
+
+from starkware.cairo.common.cairo_function_runner import CairoFunctionRunner
+
+UNKNOWN = '<unknown>'
+
+
+class StepProfiler():
+    def __init__(self, names=None):
+        # Maps contract address -> label for the stacks.
+        self.names = names or {}
+        self.runs = []
+        self._active = []
+        self._original = None
+
+    def __enter__(self):
+        self._original = CairoFunctionRunner.run_from_entrypoint
+        profiler = self
+        original = self._original
+
+        def run_from_entrypoint(runner, *args, **kwargs):
+            handler = (kwargs.get('hint_locals') or {}).get('syscall_handler')
+            address = getattr(handler, 'contract_address', None)
+            run = SimpleNamespace(runner=runner, address=address,
+                parent=None, position=None, children=[])
+            if profiler._active:
+                # The caller is inside a syscall hint: its next trace
+                # entry is the instruction making the call.
+                run.parent = profiler._active[-1]
+                run.position = len(run.parent.runner.vm.trace)
+                run.parent.children.append(run)
+            else:
+                profiler.runs.append(run)
+            profiler._active.append(run)
+            try:
+                return original(runner, *args, **kwargs)
+            finally:
+                profiler._active.pop()
+
+        CairoFunctionRunner.run_from_entrypoint = run_from_entrypoint
+        return self
+
+    def __exit__(self, *exc):
+        CairoFunctionRunner.run_from_entrypoint = self._original
+        return False
+
+    def label(self, run):
+        name = self.names.get(run.address)
+        if name is None and run.address is not None:
+            name = hex(run.address)
+        return name or UNKNOWN
+
+    def stacks(self):
+        # Counter of call stacks (tuples of frames) -> steps.
+        counts = Counter()
+        for run in self.runs:
+            self._collect(run, (), counts)
+        return counts
+
+    def _collect(self, run, prefix, counts):
+        runner = run.runner
+        program = runner.program
+        locations = program.debug_info.instruction_locations \
+            if program.debug_info is not None else {}
+        contract = self.label(run)
+
+        def function_at(pc):
+            location = locations.get(pc - runner.program_base)
+            if location is None:
+                return f'{contract}::{UNKNOWN}'
+            scope = str(location.accessible_scopes[-1])
+            if scope.startswith('__main__.'):
+                scope = scope[len('__main__.'):]
+            return f'{contract}::{scope}'
+
+        children = {}
+        for child in run.children:
+            children.setdefault(child.position, []).append(child)
+
+        # Frames are (fp, function).
+        frames = []
+        for position, entry in enumerate(runner.vm.trace):
+            fps = [fp for fp, _ in frames]
+            if entry.fp in fps:
+                del frames[fps.index(entry.fp) + 1:]
+            else:
+                frames.append((entry.fp, function_at(entry.pc)))
+            path = prefix + tuple(f for _, f in frames)
+            counts[path] += 1
+            for child in children.get(position, []):
+                self._collect(child, path, counts)
+
+    def functions(self):
+        # Returns {function: (inclusive steps, exclusive steps)}.
+        inclusive = Counter()
+        exclusive = Counter()
+        for path, steps in self.stacks().items():
+            for f in set(path):
+                inclusive[f] += steps
+            exclusive[path[-1]] += steps
+        return {f: (inclusive[f], exclusive[f]) for f in inclusive}
+
+    def total_steps(self):
+        return sum(self.stacks().values())
+
+    def table(self, n=20, key='inclusive'):
+        # Top-n functions as text, sorted by inclusive or exclusive steps.
+        index = 0 if key == 'inclusive' else 1
+        rows = sorted(self.functions().items(),
+            key=lambda item: -item[1][index])[:n]
+        total = self.total_steps() or 1
+        lines = [f"{'inclusive':>10} {'%':>6} {'exclusive':>10} {'%':>6}"
+            '  function']
+        for f, (inc, exc) in rows:
+            lines.append(f'{inc:>10} {100 * inc / total:>6.1f} '
+                f'{exc:>10} {100 * exc / total:>6.1f}  {f}')
+        return '\n'.join(lines)
+
+    def collapsed(self):
+        # Collapsed stacks, one "frame;frame;frame steps" per line.
+        return '\n'.join(f"{';'.join(path)} {steps}"
+            for path, steps in sorted(self.stacks().items())) + '\n'
+
+    def write_collapsed(self, path):
+        with open(path, 'w') as f:
+            f.write(self.collapsed())
@@ -0,0 +1,222 @@
+# Transaction recorder and deterministic replay for the test harness.
+#
+#     recorder = Recorder('session.jsonl').attach(ctx)
+#     rng = recorder.rng  # Use for all random choices of the session.
+#     await ctx.execute("alice", ...)  # Recorded.
+#
+# The log is append-only JSON lines. Each session starts with a header
+# holding the RNG seed, the clock and the build (see build_id), followed
+# by one line per transaction:
+#
+#     t   block timestamp when the transaction was sent
+#     a   account name (or address)
+#     to  contract name (or address)
+#     s   selector name
+#     c   calldata
+#     ok  0 if the transaction raised
+#     f   fingerprint of all contract storage afterwards
+#
+# Names are used where possible so that records stay readable. Storage
+# still holds addresses (e.g. controller_address, keys derived from
+# user ids), so fingerprints only compare within one build of the
+# deployment: replay() and bisect() refuse a session recorded on
+# another build. replay() re-executes a session on a copy of a ctx with
+# the recorded timestamps, and bisect() finds the first transaction
+# after which a check fails.
+
+import hashlib
+import json
+import random
+import time
+from types import SimpleNamespace
+
+
+def contract_names(ctx):
+    # Maps address -> name for every contract of a ctx.
+    return {v.contract_address: name for name, v in vars(ctx).items()
+        if hasattr(v, 'contract_address')}
+
+
+def build_id(ctx):
+    # Digest of the contract addresses of a ctx. Copies of a deployment
+    # share it, a rebuilt deployment does not.
+    h = hashlib.blake2b(digest_size=8)
+    for address, name in sorted(contract_names(ctx).items(),
+            key=lambda item: item[1]):
+        h.update(f'{name}={address};'.encode())
+    return h.hexdigest()
+
+
+def check_build(ctx, session):
+    # Sessions recorded before build ids were kept are not checked.
+    build = getattr(session, 'build', None)
+    if build is not None and build != build_id(ctx):
+        raise ValueError(f'Session recorded on build {build}, not '
+            f'{build_id(ctx)}: fingerprints would not match.')
+
+
+def fingerprint(starknet_state, names=None):
+    # Digest of the raw storage of every contract, labelled by name for
+    # the named contracts. Addresses stored in keys and values are
+    # hashed as they are (see build_id).
+    names = names or {}
+    h = hashlib.blake2b(digest_size=16)
+    contract_states = starknet_state.state.contract_states
+    entries = sorted((names.get(address, hex(address)), address)
+        for address in contract_states)
+    for label, address in entries:
+        storage = contract_states[address].storage_updates
+        h.update(label.encode())
+        for key in sorted(storage):
+            h.update(f':{key}={storage[key].value}'.encode())
+        h.update(b';')
+    return h.hexdigest()
+
+
+class Recorder():
+    def __init__(self, path, seed=None, fingerprints=True):
+        self.path = path
+        self.seed = random.randrange(2 ** 32) if seed is None else seed
+        self.rng = random.Random(self.seed)
+        self.fingerprints = fingerprints
+        self.names = {}
+        self.count = 0
+        self.file = open(path, 'a')
+
+    def attach(self, ctx):
+        # Records every ctx.execute() from now on.
+        self.names.update(contract_names(ctx))
+        self._write(dict(session=dict(seed=self.seed,
+            clock=ctx.get_clock(), build=build_id(ctx),
+            started=round(time.time()))))
+        execute = ctx.execute
+
+        async def recorded_execute(account_name, contract_address,
+                selector_name, calldata):
+            return await self._record(ctx.starknet.state, account_name,
+                contract_address, selector_name, calldata,
+                lambda: execute(account_name, contract_address,
+                    selector_name, calldata))
+
+        ctx.execute = recorded_execute
+        return self
+
+    async def send_transaction(self, signer, account, to, selector_name,
+            calldata, nonce=None):
+        # Recorded Signer.send_transaction().
+        return await self._record(account.state,
+            self.names.get(account.contract_address,
+                hex(account.contract_address)),
+            to, selector_name, calldata,
+            lambda: signer.send_transaction(account, to, selector_name,
+                calldata, nonce))
+
+    async def _record(self, starknet_state, account, to, selector_name,
+            calldata, send):
+        entry = dict(n=self.count,
+            t=starknet_state.state.block_info.block_timestamp,
+            a=account, to=self.names.get(to, hex(to)), s=selector_name,
+            c=[int(x) for x in calldata], ok=1)
+        self.count += 1
+        try:
+            return await send()
+        except Exception:
+            entry['ok'] = 0
+            raise
+        finally:
+            if self.fingerprints:
+                entry['f'] = fingerprint(starknet_state, self.names)
+            self._write(entry)
+
+    def _write(self, entry):
+        self.file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def load(path):
+    # Returns the sessions of a log, each with .seed, .clock and .records.
+    sessions = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if 'session' in entry:
+                sessions.append(SimpleNamespace(records=[],
+                    **entry['session']))
+            else:
+                sessions[-1].records.append(entry)
+    return sessions
+
+
+async def apply(ctx, records):
+    # Re-executes records in ctx. Failures are expected to repeat, so
+    # they do not stop the replay. Returns the ok flag of each record.
+    names = {name: address for address, name in contract_names(ctx).items()}
+    results = []
+    for r in records:
+        if r['a'] not in ctx.signers:
+            raise ValueError(f"Record {r['n']}: unknown account {r['a']}.")
+        to = names[r['to']] if r['to'] in names else int(r['to'], 16)
+        ctx.set_clock(r['t'])
+        try:
+            await ctx.execute(r['a'], to, r['s'], r['c'])
+            results.append(1)
+        except Exception:
+            results.append(0)
+    return results
+
+
+def matches(ctx, record):
+    # True if ctx has the state recorded after record.
+    return 'f' not in record or \
+        fingerprint(ctx.starknet.state, contract_names(ctx)) == record['f']
+
+
+async def replay(ctx, session, check=True):
+    # Replays a session on a copy of ctx. Returns .ctx (the final state),
+    # .diverged_at (index of the first record whose outcome or state
+    # differs, or None) and .seconds. Raises ValueError if the session
+    # was recorded on another build.
+    check_build(ctx, session)
+    ctx = ctx.copy()
+    diverged_at = None
+    start = time.perf_counter()
+    for r in session.records:
+        ok, = await apply(ctx, [r])
+        if check and diverged_at is None and (
+                ok != r['ok'] or not matches(ctx, r)):
+            diverged_at = r['n']
+    return SimpleNamespace(ctx=ctx, diverged_at=diverged_at,
+        seconds=time.perf_counter() - start)
+
+
+async def bisect(ctx, session, check=None):
+    # Finds the first record after which check(ctx, record) is false
+    # (by default: the state differs from the recording). Only calls
+    # check O(log n) times and replays about 2n records, by keeping a
+    # copy of the last good state. Returns the record index or None.
+    check = check or matches
+    check_build(ctx, session)
+    records = session.records
+    if not records:
+        return None
+    lo, lo_ctx = 0, ctx.copy()
+    probe = lo_ctx.copy()
+    await apply(probe, records)
+    if check(probe, records[-1]):
+        return None
+    hi = len(records)
+    # Invariant: records[:lo] are good, records[:hi] are not.
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        probe = lo_ctx.copy()
+        await apply(probe, records[lo:mid])
+        if check(probe, records[mid - 1]):
+            lo, lo_ctx = mid, probe
+        else:
+            hi = mid
+    return records[hi - 1]['n']
@@ -0,0 +1,245 @@
+# Mirror of the markets of 02_LocationOwned under regional supply
+# events, in two versions that must read the same:
+#
+#     Eager  every turn scales the item side of the traded item in all
+#            four districts of the city (update_regional_items before
+#            the factors were recorded).
+#     Lazy   every turn records its factor in the head of the region
+#            (city, item), markets apply the turns they have not seen
+#            when read and are folded when written, and all four when
+#            a page of factors fills (scale_region).
+#
+# Both count the storage slots they write. Lazy also keeps the most
+# turns a read has applied (max_lag), at most REGION_PAGE. simulate() plays random
+# turns through both and compares check_market_state of every market:
+#
+#     res = simulate(100000, seed=1)
+#     res.mismatches, res.eager_writes, res.lazy_writes
+
+import random
+from types import SimpleNamespace
+
+# MUST be consistent with contracts/utils/game_constants.cairo.
+CITIES = 19
+DISTRICTS = 4
+LOCATIONS = 76
+ITEMS = 19
+DEFAULT_MARKET_MONEY = 10000
+DEFAULT_MARKET_ITEM = 1000
+DEALER_DASH_BP = 1000
+WRANGLE_DASHED_DEALER_BP = 5000
+LOCAL_SHIPMENT_BP = 5000
+LOCAL_SHIPMENT_IMPACT = 20
+WAREHOUSE_SEIZURE_BP = 5000
+WAREHOUSE_SEIZURE_IMPACT = 20
+
+# MUST be consistent with contracts/02_LocationOwned.cairo.
+FACTOR_SHIFT = 2 ** 8
+REGION_PAGE = 15
+
+# Lookup tables of generate_curve(), 0 if missing.
+CITY_MONEY = [60, 70, 80, 90, 100, 110, 120, 130, 140, 150, 65, 0, 75, 85,
+    95, 105, 115, 125, 135]
+CITY_ITEM = [60, 70, 80, 90, 100, 110, 120, 130, 140, 150, 135, 0, 125, 115,
+    105, 95, 85, 75, 65]
+DISTRICT_MONEY = [80, 100, 80, 120]
+DISTRICT_ITEM = [80, 100, 110, 120]
+# By item_id, from 1.
+ITEM_MONEY = [0, 70, 80, 90, 100, 110, 120, 130, 140, 150, 135, 130, 125,
+    115, 105, 95, 85, 75, 65, 60]
+ITEM_QUANTITY = [0, 70, 80, 90, 100, 110, 120, 130, 140, 150, 65, 75, 75,
+    85, 95, 105, 115, 125, 135, 145]
+
+
+def generate_curve(location_id, item_id):
+    # Returns (item, money) of a new market.
+    city, district = divmod(location_id, DISTRICTS)
+    money = DEFAULT_MARKET_MONEY * CITY_MONEY[city] * \
+        DISTRICT_MONEY[district] * ITEM_MONEY[item_id] // 1000000
+    item = DEFAULT_MARKET_ITEM * CITY_ITEM[city] * \
+        DISTRICT_ITEM[district] * ITEM_QUANTITY[item_id] // 1000000
+    return (item, money)
+
+
+def fill(location_id, item_id, item, money):
+    # An empty market is generated again, as read_pair does.
+    if item == 0 or money == 0:
+        return generate_curve(location_id, item_id)
+    return (item, money)
+
+
+def districts(location_id):
+    city = location_id // DISTRICTS * DISTRICTS
+    return range(city, city + DISTRICTS)
+
+
+class Eager():
+    def __init__(self):
+        # (location_id, item_id) -> (item, money)
+        self.markets = {}
+        self.writes = 0
+
+    def check_market_state(self, location_id, item_id):
+        return self.markets.get((location_id, item_id), (0, 0))
+
+    def read_pair(self, location_id, item_id):
+        market = self.check_market_state(location_id, item_id)
+        if 0 in market:
+            market = generate_curve(location_id, item_id)
+            self.write_pair(location_id, item_id, *market)
+        return market
+
+    def write_pair(self, location_id, item_id, item, money):
+        self.markets[(location_id, item_id)] = (item, money)
+        self.writes += 1
+
+    def scale_region(self, location_id, item_id, factor):
+        for location in districts(location_id):
+            item, money = self.read_pair(location, item_id)
+            self.write_pair(location, item_id, item * factor // 100, money)
+
+
+class Lazy():
+    def __init__(self):
+        # (location_id, item_id) -> (item, money, region_turn)
+        self.pairs = {}
+        # (city, item_id) -> (turns, factors of the latest page)
+        self.heads = {}
+        # (city, item_id, page) -> factors
+        self.pages = {}
+        self.writes = 0
+        self.max_lag = 0
+
+    def factor(self, city, item_id, turn):
+        turns, factors = self.heads[(city, item_id)]
+        page, position = divmod(turn - 1, REGION_PAGE)
+        if page != (turns - 1) // REGION_PAGE:
+            factors = self.pages[(city, item_id, page)]
+        return factors // FACTOR_SHIFT ** position % FACTOR_SHIFT
+
+    def check_market_state(self, location_id, item_id):
+        item, money, turn = self.pairs.get((location_id, item_id),
+            (0, 0, 0))
+        city = location_id // DISTRICTS
+        turns, _ = self.heads.get((city, item_id), (0, 0))
+        self.max_lag = max(self.max_lag, turns - turn)
+        for t in range(turn + 1, turns + 1):
+            item, money = fill(location_id, item_id, item, money)
+            item = item * self.factor(city, item_id, t) // 100
+        return (item, money)
+
+    def read_pair(self, location_id, item_id):
+        market = self.check_market_state(location_id, item_id)
+        if 0 in market:
+            market = generate_curve(location_id, item_id)
+            self.write_pair(location_id, item_id, *market)
+        return market
+
+    def write_pair(self, location_id, item_id, item, money):
+        turns, _ = self.heads.get((location_id // DISTRICTS, item_id),
+            (0, 0))
+        self.pairs[(location_id, item_id)] = (item, money, turns)
+        self.writes += 1
+
+    def scale_region(self, location_id, item_id, factor):
+        assert 0 <= factor < FACTOR_SHIFT
+        key = (location_id // DISTRICTS, item_id)
+        turns, factors = self.heads.get(key, (0, 0))
+        page, position = divmod(turns, REGION_PAGE)
+        if position == 0:
+            if turns != 0:
+                self.pages[key + (page - 1,)] = factors
+                self.writes += 1
+                self.fold(location_id, item_id)
+            factors = 0
+        self.heads[key] = (turns + 1,
+            factors + factor * FACTOR_SHIFT ** position)
+        self.writes += 1
+
+    def fold(self, location_id, item_id):
+        # Applies the turns of the region to its four markets.
+        turns, _ = self.heads[(location_id // DISTRICTS, item_id)]
+        for location in districts(location_id):
+            market = (location, item_id)
+            if self.pairs.get(market, (0, 0, 0))[2] == turns:
+                continue
+            self.pairs[market] = self.check_market_state(location,
+                item_id) + (turns,)
+            self.writes += 1
+
+
+def amm(market_a, market_b, gives):
+    # Mirror of trade() in market_maker.cairo. None if it would fail.
+    gets = market_b * gives // (market_a + gives)
+    if gives < 1 or gets < 1:
+        return None
+    return (market_a + gives, market_b - gets, gets)
+
+
+def market_turn(markets, location_id, item_id, buy_or_sell, amount,
+        trade_occurs, factor):
+    # The market side of have_turn(). Returns the market after the turn
+    # (the user side is not modelled), None if the trade would fail and
+    # the turn revert.
+    item, money = fill(location_id, item_id,
+        *markets.check_market_state(location_id, item_id))
+    res = None
+    if trade_occurs:
+        if buy_or_sell == 0:
+            res = amm(money, item, amount)
+            post = None if res is None else (res[1], res[0])
+        else:
+            res = amm(item, money, amount)
+            post = None if res is None else (res[0], res[1])
+        if res is None:
+            return None
+    markets.read_pair(location_id, item_id)
+    if res is not None:
+        markets.write_pair(location_id, item_id, *post)
+    markets.scale_region(location_id, item_id, factor)
+    return markets.read_pair(location_id, item_id)
+
+
+def random_turn(rng, cities, items):
+    # (location_id, item_id, buy_or_sell, amount, trade_occurs, factor)
+    # with the event probabilities of get_events() (wearables ignored).
+    def occurs(bp):
+        return rng.randrange(10000) < bp
+
+    city = rng.choice(cities)
+    location_id = city * DISTRICTS + rng.randrange(DISTRICTS)
+    dash = occurs(DEALER_DASH_BP)
+    trade_occurs = not dash or occurs(WRANGLE_DASHED_DEALER_BP)
+    factor = 100 + LOCAL_SHIPMENT_IMPACT * occurs(LOCAL_SHIPMENT_BP) - \
+        WAREHOUSE_SEIZURE_IMPACT * occurs(WAREHOUSE_SEIZURE_BP)
+    return (location_id, rng.choice(items), rng.randrange(2),
+        rng.randint(1, 2000), trade_occurs, factor)
+
+
+def simulate(n_turns, seed=0, cities=range(CITIES),
+        items=range(1, ITEMS + 1), check_every=1):
+    # Plays n_turns random turns through Eager and Lazy. Every
+    # check_every turns, all markets of the cities played are compared.
+    # Returns the first mismatches as (turn, market, eager, lazy).
+    rng = random.Random(seed)
+    cities, items = list(cities), list(items)
+    eager, lazy = Eager(), Lazy()
+    mismatches = []
+    for n in range(1, n_turns + 1):
+        turn = random_turn(rng, cities, items)
+        if market_turn(eager, *turn) != market_turn(lazy, *turn):
+            mismatches.append((n, turn[:2], None, None))
+        if n % check_every and n != n_turns:
+            continue
+        for city in cities:
+            for location_id in districts(city * DISTRICTS):
+                for item_id in items:
+                    a = eager.check_market_state(location_id, item_id)
+                    b = lazy.check_market_state(location_id, item_id)
+                    if a != b:
+                        mismatches.append((n, (location_id, item_id), a, b))
+        if len(mismatches) > 10:
+            break
+    return SimpleNamespace(turns=n, mismatches=mismatches,
+        eager_writes=eager.writes, lazy_writes=lazy.writes,
+        eager=eager, lazy=lazy)
@@ -0,0 +1,186 @@
+# Offline trade-route planner over a snapshot of all markets.
+#
+# A hop is two turns: buy an item with some of the money where the
+# player is, travel to another location and sell all of it there. A
+# route is k hops, the sale location of a hop being where the next
+# one buys:
+#
+#     snapshot = await fetch_snapshot(ctx.location_owned)
+#     planner = Planner(snapshot)
+#     routes = planner.plan(start=34, money=20000, inventory={13: 50},
+#         hops=3)
+#     routes[0].money, routes[0].hops
+#
+# Each trade is priced as trade() of market_maker.cairo after the cut
+# of take_cut(), which is not taken where the player is the lord. Every
+# hop is computed over all (spend, buy location, item, sell location)
+# at once, so a decision over all 76 locations takes a few
+# milliseconds. Markets are the snapshot (empty ones as generated on
+# first read): the hops of a route do not see each other's trades, nor
+# regional supply events.
+#
+# The inventory is sold on the first hop, together with what is bought
+# if it is the same item. Items held but not traded on the first hop
+# are not valued.
+#
+# There is no travel rule in the contracts yet. A trip to another city
+# costs travel_cost_out_of_1000 of the destination in
+# mappings/location_travel.csv, as a share of TRAVEL_MONEY. Moving
+# between the districts of a city is free.
+
+import csv
+import os
+from collections import namedtuple
+
+import numpy as np
+
+from utils.regional_supply import generate_curve
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+TRAVEL_PATH = os.path.join(ROOT, 'mappings', 'location_travel.csv')
+
+# MUST be consistent with contracts/utils/game_constants.cairo.
+CITIES = 19
+DISTRICTS = 4
+LOCATIONS = 76
+ITEMS = 19
+MARKETS = LOCATIONS * ITEMS
+DRUG_LORD_PERCENTAGE = 2
+
+# Money cost of a trip of travel cost 1000.
+TRAVEL_MONEY = 1000
+# Shares of the money tried for each buy: 0, 1/SPEND_STEPS, ..., 1.
+SPEND_STEPS = 4
+
+# item and money are (LOCATIONS, ITEMS) arrays, indexed by item_id - 1.
+Snapshot = namedtuple('Snapshot', ['item', 'money'])
+# Bought amount of item_id at buy_at for spend, all of it (and the
+# inventory of item_id on the first hop) sold at sell_at. money is the
+# money after the sale and the trip.
+Hop = namedtuple('Hop', ['buy_at', 'item_id', 'spend', 'bought',
+    'sell_at', 'money'])
+Route = namedtuple('Route', ['money', 'hops'])
+
+
+def load_travel_costs(path=TRAVEL_PATH):
+    # travel_cost_out_of_1000 of each city, by city index.
+    with open(path) as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == CITIES, f'{path}: {len(rows)} cities'
+    return np.array([int(row['travel_cost_out_of_1000']) for row in rows],
+        dtype=np.int64)
+
+
+def travel_matrix(costs=None, travel_money=TRAVEL_MONEY):
+    # (LOCATIONS, LOCATIONS) money cost of the trip from a to b.
+    if costs is None:
+        costs = load_travel_costs()
+    city = np.arange(LOCATIONS) // DISTRICTS
+    to_city = np.asarray(costs)[city] * travel_money // 1000
+    return np.where(city[:, None] == city[None, :], 0, to_city[None, :])
+
+
+def snapshot_from_states(item_quantities, money_quantities):
+    # From check_market_states(0, MARKETS). Empty markets are generated
+    # as on their first read.
+    item = np.array(item_quantities, dtype=np.int64).reshape(LOCATIONS,
+        ITEMS)
+    money = np.array(money_quantities, dtype=np.int64).reshape(LOCATIONS,
+        ITEMS)
+    for location_id, index in zip(*np.nonzero((item == 0) | (money == 0))):
+        item[location_id, index], money[location_id, index] = \
+            generate_curve(int(location_id), int(index) + 1)
+    return Snapshot(item, money)
+
+
+async def fetch_snapshot(location_owned):
+    # location_owned: the 02_LocationOwned contract (e.g.
+    # ctx.location_owned).
+    res = await location_owned.check_market_states(0, MARKETS).call()
+    return snapshot_from_states(res.result.item_quantities,
+        res.result.money_quantities)
+
+
+def post_cut(amount, lord):
+    # Mirror of take_cut(): what reaches the market. lord is where the
+    # player is the lord and pays nothing.
+    return np.where(lord, amount,
+        amount - amount // 100 * DRUG_LORD_PERCENTAGE)
+
+
+def trade(market_a, market_b, gives):
+    # Mirror of trade() in market_maker.cairo: what the user gets of b
+    # for gives of a, 0 where the trade would fail.
+    gets = market_b * gives // (market_a + np.maximum(gives, 1))
+    return np.where((gives >= 1) & (gets >= 1), gets, 0)
+
+
+class Planner():
+    def __init__(self, snapshot, travel=None, lords=None,
+            spend_steps=SPEND_STEPS):
+        # travel: travel_matrix() by default. lords: (LOCATIONS,) bools,
+        # True where the player is the lord.
+        self.item = np.asarray(snapshot.item, dtype=np.int64)
+        self.money = np.asarray(snapshot.money, dtype=np.int64)
+        self.travel = travel_matrix() if travel is None else \
+            np.asarray(travel, dtype=np.int64)
+        self.lords = np.zeros(LOCATIONS, dtype=bool) if lords is None \
+            else np.asarray(lords, dtype=bool)
+        self.steps = np.arange(spend_steps + 1)
+        self.spend_steps = spend_steps
+
+    def hop(self, money, inventory):
+        # Money after one hop from every location with money >= 0, as a
+        # (spends, buy locations, ITEMS, LOCATIONS) array, -1 if the
+        # hop is not possible. Returns (buy locations, spend, bought,
+        # money).
+        rows = np.flatnonzero(money >= 0)
+        have = money[rows]
+        # (S, A)
+        spend = have[None, :] * self.steps[:, None] // self.spend_steps
+        gives = post_cut(spend, self.lords[rows][None, :])
+        # (S, A, I)
+        bought = trade(self.money[rows][None], self.item[rows][None],
+            gives[:, :, None])
+        bought_ok = (spend[:, :, None] == 0) | (bought > 0)
+        sold = bought + inventory[None, None, :]
+        # (S, A, I, B)
+        sold_gives = post_cut(sold[..., None], self.lords)
+        got = trade(self.item.T, self.money.T, sold_gives)
+        left = have[None, :, None, None] - spend[:, :, None, None] + got - \
+            self.travel[rows][None, :, None, :]
+        ok = bought_ok[..., None] & (got > 0) & (left >= 0)
+        return rows, spend, bought, np.where(ok, left, -1)
+
+    def plan(self, start, money, inventory=None, hops=1, top=5):
+        # The best routes of hops hops from start, one per final
+        # location, best first.
+        held = np.zeros(ITEMS, dtype=np.int64)
+        for item_id, amount in (inventory or {}).items():
+            held[item_id - 1] = amount
+        best = np.full(LOCATIONS, -1, dtype=np.int64)
+        best[start] = money
+        steps = []
+        for n in range(hops):
+            rows, spend, bought, after = self.hop(best,
+                held if n == 0 else np.zeros_like(held))
+            flat = after.reshape(-1, LOCATIONS)
+            choice = flat.argmax(axis=0)
+            best = flat[choice, np.arange(LOCATIONS)]
+            steps.append((rows, spend, bought, choice, best))
+        routes = []
+        for end in np.argsort(-best, kind='stable')[:top]:
+            if best[end] < 0:
+                break
+            routes.append(Route(int(best[end]), self.route(steps, end)))
+        return routes
+
+    def route(self, steps, end):
+        hops = []
+        sell_at = int(end)
+        for rows, spend, bought, choice, best in reversed(steps):
+            s, a, i = np.unravel_index(choice[sell_at], bought.shape)
+            hops.append(Hop(int(rows[a]), int(i) + 1, int(spend[s, a]),
+                int(bought[s, a, i]), sell_at, int(best[sell_at])))
+            sell_at = int(rows[a])
+        return hops[::-1]
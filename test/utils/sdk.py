@@ -0,0 +1,527 @@
+# Async client for the game modules, driven by their ABIs.
+#
+# One class per module. Module addresses are resolved once through the
+# ModuleController. Every function in the ABI is a method: @view
+# functions return their decoded outputs, externals send a transaction
+# from the client account.
+#
+#     game = await Game.in_process(ctx, "alice")      # tests
+#     game = await Game.from_node("localhost", account, private_key)
+#
+#     await game.engine.have_turn(34, 0, 13, 2000)
+#     res = await game.location_owned.check_market_state(34, 13)
+#     res.item_quantity, res.money_quantity
+#     res = await game.user_owned.check_user_state(user_id)
+#     res.items                                       # list, no items_len
+#
+# Arguments and outputs follow the ABI: `x_len` of a `x : felt*` pair is
+# filled in from the list and dropped from outputs, structs are
+# namedtuples (or tuples / dicts as arguments).
+#
+# Views are cached per block: the cache key is the block of the
+# transport plus (address, function, calldata), and the cache is
+# dropped when the block changes or the client sends a transaction.
+# Identical calls in flight are coalesced into one. At most
+# max_concurrency calls reach the transport at once, so a fan-out like
+#
+#     await game.fan_out(
+#         lambda l: game.location_owned.check_market_state(l, 13),
+#         range(76))
+#
+# can be written without batching by hand.
+#
+# With an archive (see utils/turn_archive.py), engine.view_given_turn()
+# and engine.view_given_city_turn() of turns no longer retained by the
+# contract are answered from the archive:
+#
+#     game = await Game.in_process(ctx, "alice", archive=Archive('turns'))
+
+import asyncio
+import json
+import os
+import time
+from collections import Counter, namedtuple
+
+from services.external_api.base_client import RetryConfig
+from starkware.starknet.public.abi import get_selector_from_name
+from starkware.starknet.services.api.feeder_gateway.feeder_gateway_client \
+    import FeederGatewayClient
+from starkware.starknet.services.api.gateway.gateway_client import \
+    GatewayClient
+from starkware.starknet.services.api.gateway.transaction import \
+    InvokeFunction
+
+from utils.deploy import (ARTIFACTS, ACCEPTED, REJECTED, ROOT, Manifest,
+    account_nonce, node_url, signed_invoke)
+
+MAX_CONCURRENCY = 16
+
+
+class Codec():
+    # Calldata encoding and retdata decoding for one contract ABI.
+    def __init__(self, abi):
+        self.structs = {}
+        self.functions = {}
+        for entry in abi:
+            if entry['type'] == 'struct':
+                members = sorted(entry['members'], key=lambda m: m['offset'])
+                self.structs[entry['name']] = Struct(entry['name'],
+                    members, entry['size'])
+            elif entry['type'] == 'function':
+                self.functions[entry['name']] = entry
+        self.results = {name: namedtuple(f'{name}_result',
+            [o['name'] for o in fields(f['outputs'])])
+            for name, f in self.functions.items()}
+
+    def is_view(self, name):
+        return self.functions[name].get('stateMutability') == 'view'
+
+    def size(self, type):
+        if type == 'felt' or type.endswith('*'):
+            return 1
+        if type in self.structs:
+            return self.structs[type].size
+        raise ValueError(f'Unsupported ABI type {type}')
+
+    def encode(self, name, args, kwargs):
+        inputs = fields(self.functions[name]['inputs'])
+        names = [i['name'] for i in inputs]
+        if len(args) > len(names):
+            raise TypeError(f'{name}() takes {len(names)} arguments.')
+        values = dict(zip(names, args))
+        for key, value in kwargs.items():
+            if key not in names or key in values:
+                raise TypeError(f'{name}() got an unexpected or repeated '
+                    f'argument {key}.')
+            values[key] = value
+        missing = [n for n in names if n not in values]
+        if missing:
+            raise TypeError(f'{name}() missing arguments {missing}.')
+        calldata = []
+        for i in inputs:
+            value = values[i['name']]
+            if i['type'].endswith('*'):
+                element = i['type'][:-1]
+                calldata.append(len(value))
+                for v in value:
+                    calldata += self.flatten(element, v)
+            else:
+                calldata += self.flatten(i['type'], value)
+        return calldata
+
+    def flatten(self, type, value):
+        if type == 'felt':
+            return [int(value)]
+        struct = self.structs.get(type)
+        if struct is None:
+            raise ValueError(f'Unsupported ABI type {type}')
+        if isinstance(value, dict):
+            value = [value[m['name']] for m in struct.members]
+        if len(value) != len(struct.members):
+            raise ValueError(f'{type} has {len(struct.members)} members.')
+        felts = []
+        for m, v in zip(struct.members, value):
+            felts += self.flatten(m['type'], v)
+        return felts
+
+    def decode(self, name, retdata):
+        outputs = self.functions[name]['outputs']
+        values = []
+        pos = 0
+        length = None
+        for o in outputs:
+            if o['type'].endswith('*'):
+                element = o['type'][:-1]
+                size = self.size(element)
+                items = []
+                for _ in range(length):
+                    items.append(self.build(element, retdata[pos:pos + size]))
+                    pos += size
+                values.append(items)
+                continue
+            size = self.size(o['type'])
+            value = self.build(o['type'], retdata[pos:pos + size])
+            pos += size
+            if is_length(o, outputs):
+                length = value
+            else:
+                values.append(value)
+        return self.results[name](*values)
+
+    def build(self, type, felts):
+        if type == 'felt':
+            return felts[0]
+        struct = self.structs[type]
+        values = []
+        pos = 0
+        for m in struct.members:
+            size = self.size(m['type'])
+            values.append(self.build(m['type'], felts[pos:pos + size]))
+            pos += size
+        return struct.tuple(*values)
+
+
+class Struct():
+    def __init__(self, name, members, size):
+        self.members = members
+        self.size = size
+        self.tuple = namedtuple(name, [m['name'] for m in members])
+
+
+def is_length(field, fields):
+    # `x_len : felt` directly followed by `x : T*`.
+    if not field['name'].endswith('_len'):
+        return False
+    i = fields.index(field)
+    return i + 1 < len(fields) and fields[i + 1]['type'].endswith('*') \
+        and fields[i + 1]['name'] == field['name'][:-len('_len')]
+
+
+def fields(entries):
+    # Arguments as seen by the caller (without array lengths).
+    return [e for e in entries if not is_length(e, entries)]
+
+
+def load_abi(contract):
+    # Written by `nile compile`.
+    with open(os.path.join(ARTIFACTS, 'abis', f'{contract}.json')) as f:
+        return json.load(f)
+
+
+class InProcess():
+    # Transport to a ctx from conftest.py, sending as one of its accounts.
+    def __init__(self, ctx, account_name):
+        self.ctx = ctx
+        self.account_name = account_name
+        self.state = ctx.starknet.state
+        # Bumped by every write, so cached views are not reused after
+        # the state changed. Call invalidate() after writing to the
+        # state without this transport (e.g. with ctx.execute).
+        self.writes = 0
+
+    def invalidate(self):
+        self.writes += 1
+
+    async def block(self):
+        info = self.state.state.block_info
+        return (info.block_number, info.block_timestamp, self.writes)
+
+    async def call(self, block, address, name, calldata):
+        # Like StarknetContract.call(): run on a copy of the state.
+        info = await self.state.copy().invoke_raw(contract_address=address,
+            selector=get_selector_from_name(name), calldata=calldata)
+        return info.call_info.retdata
+
+    async def invoke(self, address, name, calldata):
+        self.writes += 1
+        return await self.ctx.execute(self.account_name, address, name,
+            calldata)
+
+
+class Node():
+    # Transport to a gateway (e.g. `nile node`), sending signed
+    # transactions from an Account contract.
+    def __init__(self, url, account_address, private_key, block_ttl=1.0,
+            poll_interval=1.0):
+        retry = RetryConfig(n_retries=1)
+        self.gateway = GatewayClient(url=url + 'gateway',
+            retry_config=retry)
+        self.feeder = FeederGatewayClient(url=url + 'feeder_gateway',
+            retry_config=retry)
+        self.account_address = account_address
+        self.private_key = private_key
+        # Seconds a block number is used before asking for a new one.
+        self.block_ttl = block_ttl
+        self.poll_interval = poll_interval
+        self.block_number = None
+        self.checked = 0
+        self.account_lock = None
+
+    def invalidate(self):
+        self.block_number = None
+
+    async def block(self):
+        now = time.monotonic()
+        if self.block_number is None or now - self.checked > self.block_ttl:
+            res = await self.feeder.get_block()
+            self.block_number = res['block_number']
+            self.checked = now
+        return self.block_number
+
+    async def call(self, block, address, name, calldata):
+        tx = InvokeFunction(contract_address=address,
+            entry_point_selector=get_selector_from_name(name),
+            calldata=calldata, signature=[])
+        res = await self.feeder.call_contract(invoke_tx=tx,
+            block_number=block)
+        return [int(x, 16) for x in res['result']]
+
+    async def invoke(self, address, name, calldata, wait=True):
+        # The nonce is read from the account, so send one at a time.
+        if self.account_lock is None:
+            self.account_lock = asyncio.Lock()
+        async with self.account_lock:
+            nonce = await account_nonce(self.feeder, self.account_address)
+            tx = signed_invoke(self.account_address, address,
+                get_selector_from_name(name), calldata, nonce,
+                self.private_key)
+            res = await self.gateway.add_transaction(tx=tx)
+            status = 'RECEIVED'
+            while wait and status not in ACCEPTED + REJECTED:
+                await asyncio.sleep(self.poll_interval)
+                status = (await self.feeder.get_transaction_status(
+                    tx_hash=res['transaction_hash']))['tx_status']
+        self.invalidate()
+        if status in REJECTED:
+            raise RuntimeError(f'{name}: transaction '
+                f"{res['transaction_hash']} {status}.")
+        return res
+
+
+class Client():
+    # View cache, coalescing and the concurrency bound over a transport.
+    def __init__(self, transport, max_concurrency=MAX_CONCURRENCY):
+        self.transport = transport
+        self.max_concurrency = max_concurrency
+        self.semaphore = None
+        self.block = None
+        # (block, address, name, calldata) -> retdata
+        self.cache = {}
+        self.pending = {}
+        # calls (sent to the transport), hits, coalesced, invokes.
+        self.stats = Counter()
+
+    async def view(self, address, name, calldata):
+        block = await self.transport.block()
+        if block != self.block:
+            self.cache.clear()
+            self.block = block
+        key = (block, address, name, tuple(calldata))
+        if key in self.cache:
+            self.stats['hits'] += 1
+            return self.cache[key]
+        future = self.pending.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self.call(block, address, name,
+                calldata))
+            self.pending[key] = future
+            future.add_done_callback(lambda f: self.done(key, f))
+        else:
+            self.stats['coalesced'] += 1
+        # A cancelled caller must not cancel the call of the others.
+        return await asyncio.shield(future)
+
+    async def call(self, block, address, name, calldata):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self.semaphore:
+            self.stats['calls'] += 1
+            return await self.transport.call(block, address, name, calldata)
+
+    def done(self, key, future):
+        self.pending.pop(key, None)
+        if key[0] == self.block and not future.cancelled() and \
+                future.exception() is None:
+            self.cache[key] = future.result()
+
+    async def invoke(self, address, name, calldata):
+        self.stats['invokes'] += 1
+        try:
+            return await self.transport.invoke(address, name, calldata)
+        finally:
+            self.invalidate()
+
+    def invalidate(self):
+        # Drops cached views, e.g. after writes made without the client.
+        self.transport.invalidate()
+        self.cache.clear()
+        self.block = None
+
+
+class Module():
+    # A deployed contract. Functions of the ABI are methods.
+    MODULE_ID = None
+    CONTRACT = None
+    NAME = None
+
+    def __init__(self, client, address, abi):
+        self.client = client
+        self.address = address
+        self.codec = Codec(abi)
+
+    def __getattr__(self, name):
+        codec = self.__dict__.get('codec')
+        if codec is None or name not in codec.functions:
+            raise AttributeError(f'{type(self).__name__} has no {name}')
+        if codec.is_view(name):
+            return lambda *args, **kwargs: self.call(name, *args, **kwargs)
+        return lambda *args, **kwargs: self.invoke(name, *args, **kwargs)
+
+    async def call(self, name, *args, **kwargs):
+        # Also runs an external as a view (nothing is written).
+        calldata = self.codec.encode(name, args, kwargs)
+        retdata = await self.client.view(self.address, name, calldata)
+        return self.codec.decode(name, retdata)
+
+    async def invoke(self, name, *args, **kwargs):
+        calldata = self.codec.encode(name, args, kwargs)
+        return await self.client.invoke(self.address, name, calldata)
+
+
+class ModuleController(Module):
+    CONTRACT = 'ModuleController'
+    NAME = 'controller'
+
+
+class DopeWars(Module):
+    MODULE_ID = 1
+    CONTRACT = '01_DopeWars'
+    NAME = 'engine'
+    # A turn_archive.Archive, set by Game.connect().
+    archive = None
+
+    async def view_given_turn(self, game_clock_at_turn):
+        turn = await self.archived(None, game_clock_at_turn)
+        if turn is None:
+            return await self.call('view_given_turn', game_clock_at_turn)
+        return self.codec.results['view_given_turn'](self.turn_log(turn))
+
+    async def view_given_city_turn(self, city, city_clock_at_turn):
+        turn = await self.archived(city, city_clock_at_turn)
+        if turn is None:
+            return await self.call('view_given_city_turn', city,
+                city_clock_at_turn)
+        return self.codec.results['view_given_city_turn'](
+            self.turn_log(turn), turn.timestamp)
+
+    async def archived(self, city, clock):
+        # The archived Turn if the log of the clock was overwritten
+        # on-chain (see log_retention), None if it is retained.
+        if self.archive is None:
+            return None
+        retention = (await self.call('read_log_retention')).turns
+        if retention == 0:
+            return None
+        if city is None:
+            last = (await self.call('read_game_clock')).clock
+        else:
+            last = (await self.call('read_city_clock', city)).clock
+        if last - clock < retention:
+            return None
+        turn = self.archive.lookup(city, clock)
+        if turn is None:
+            raise LookupError(f'The log of clock {clock} (city {city}) is '
+                'neither retained nor archived.')
+        return turn
+
+    def turn_log(self, turn):
+        return self.codec.build('TurnLog', turn.log)
+
+
+class LocationOwned(Module):
+    MODULE_ID = 2
+    CONTRACT = '02_LocationOwned'
+    NAME = 'location_owned'
+
+
+class UserOwned(Module):
+    MODULE_ID = 3
+    CONTRACT = '03_UserOwned'
+    NAME = 'user_owned'
+
+
+class UserRegistry(Module):
+    MODULE_ID = 4
+    CONTRACT = '04_UserRegistry'
+    NAME = 'registry'
+
+
+class Combat(Module):
+    MODULE_ID = 5
+    CONTRACT = '05_Combat'
+    NAME = 'combat'
+
+
+class DrugLord(Module):
+    MODULE_ID = 6
+    CONTRACT = '06_DrugLord'
+    NAME = 'drug_lord'
+
+
+class PseudoRandom(Module):
+    MODULE_ID = 7
+    CONTRACT = '07_PseudoRandom'
+    NAME = 'pseudorandom'
+
+
+class StateChannel(Module):
+    # Not registered in the ModuleController: the address is given.
+    CONTRACT = '08_StateChannel'
+    NAME = 'state_channel'
+
+
+MODULES = [DopeWars, LocationOwned, UserOwned, UserRegistry, Combat,
+    DrugLord, PseudoRandom, StateChannel]
+
+
+class Game():
+    # The modules of a deployment, as attributes named like in the ctx
+    # (engine, location_owned, ...), sharing one Client.
+    def __init__(self, client, controller, modules):
+        self.client = client
+        self.controller = controller
+        for module in modules:
+            setattr(self, module.NAME, module)
+
+    @classmethod
+    async def connect(cls, transport, controller_address, abis=None,
+            addresses=None, max_concurrency=MAX_CONCURRENCY, archive=None):
+        # abis: NAME -> ABI, read from artifacts/abis if missing.
+        # addresses: NAME -> address of modules that are not registered
+        # in the ModuleController (StateChannel is left out otherwise).
+        # archive: turn_archive.Archive of the TurnLogs.
+        abis = abis or {}
+        addresses = dict(addresses or {})
+
+        def abi(module):
+            if module.NAME in abis:
+                return abis[module.NAME]
+            return load_abi(module.CONTRACT)
+
+        client = Client(transport, max_concurrency)
+        controller = ModuleController(client, controller_address,
+            abi(ModuleController))
+        registered = [m for m in MODULES if m.MODULE_ID is not None]
+        results = await asyncio.gather(*(controller.get_module_address(
+            m.MODULE_ID) for m in registered))
+        for module, res in zip(registered, results):
+            addresses[module.NAME] = res.address
+        modules = [m(client, addresses[m.NAME], abi(m)) for m in MODULES
+            if m.NAME in addresses]
+        for module in modules:
+            if isinstance(module, DopeWars):
+                module.archive = archive
+        return cls(client, controller, modules)
+
+    @classmethod
+    async def in_process(cls, ctx, account_name, **kwargs):
+        return await cls.connect(InProcess(ctx, account_name),
+            ctx.controller.contract_address, abis=ctx.abis,
+            addresses=dict(state_channel=ctx.state_channel.contract_address),
+            **kwargs)
+
+    @classmethod
+    async def from_node(cls, network, account_address, private_key,
+            url=None, manifest=None, **kwargs):
+        # The controller address is read from the deploy manifest
+        # (see utils/deploy.py).
+        manifest = Manifest(manifest or os.path.join(ROOT,
+            f'{network}.deployment.json'), network)
+        transport = Node(url or node_url(network), account_address,
+            private_key)
+        return await cls.connect(transport,
+            manifest.address('ModuleController'), **kwargs)
+
+    async def fan_out(self, fn, args):
+        # Results of fn(arg) for every arg, bounded by max_concurrency.
+        return await asyncio.gather(*(fn(arg) for arg in args))
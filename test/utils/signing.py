@@ -0,0 +1,125 @@
+# STARK curve ECDSA backends for Signer.
+#
+#     reference  starkware.crypto.signature.signature (pure Python)
+#     fastecdsa  the same algorithm with the curve arithmetic of
+#                fastecdsa (native code)
+#
+# Both produce the same keys and signatures bit for bit: the nonce is
+# the RFC 6979 nonce of the reference (generate_k_rfc6979) and only the
+# scalar multiplications are replaced. The default backend is the
+# fastest one installed, or RYO_SIGNER_BACKEND if set.
+#
+#     backend = get_backend()
+#     r, s = backend.sign(msg_hash, private_key)
+#     signatures = sign_many(private_key, msg_hashes, processes=8)
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from starkware.crypto.signature.math_utils import div_mod
+from starkware.crypto.signature.signature import (ALPHA, BETA, EC_GEN,
+    EC_ORDER, FIELD_PRIME, N_ELEMENT_BITS_ECDSA, generate_k_rfc6979,
+    private_to_stark_key, sign)
+
+# Below this many hashes sign_many() does not start a pool.
+MIN_PARALLEL = 64
+
+
+class Reference():
+    name = 'reference'
+
+    def public_key(self, private_key):
+        return private_to_stark_key(private_key)
+
+    def sign(self, msg_hash, private_key):
+        return sign(msg_hash=msg_hash, priv_key=private_key)
+
+
+class FastEcdsa():
+    # Mirror of starkware's sign() with native point multiplication.
+    name = 'fastecdsa'
+
+    def __init__(self):
+        from fastecdsa.curve import Curve
+        from fastecdsa.point import Point
+        self.curve = Curve('StarkCurve', FIELD_PRIME, ALPHA, BETA, EC_ORDER,
+            *EC_GEN)
+        self.generator = Point(*EC_GEN, curve=self.curve)
+
+    def multiply(self, k):
+        # x coordinate of k * EC_GEN.
+        return (k * self.generator).x
+
+    def public_key(self, private_key):
+        assert 0 < private_key < EC_ORDER
+        return self.multiply(private_key)
+
+    def sign(self, msg_hash, private_key):
+        assert 0 <= msg_hash < 2 ** N_ELEMENT_BITS_ECDSA
+        seed = None
+        while True:
+            k = generate_k_rfc6979(msg_hash, private_key, seed)
+            seed = 1 if seed is None else seed + 1
+            r = self.multiply(k)
+            if not 1 <= r < 2 ** N_ELEMENT_BITS_ECDSA:
+                continue
+            if (msg_hash + r * private_key) % EC_ORDER == 0:
+                continue
+            w = div_mod(k, msg_hash + r * private_key, EC_ORDER)
+            if not 1 <= w < 2 ** N_ELEMENT_BITS_ECDSA:
+                continue
+            return r, div_mod(1, w, EC_ORDER)
+
+
+BACKENDS = dict(reference=Reference, fastecdsa=FastEcdsa)
+# Fastest first.
+PREFERENCE = ['fastecdsa', 'reference']
+_instances = {}
+
+
+def available():
+    # Names of the backends that can be loaded here.
+    names = []
+    for name in PREFERENCE:
+        try:
+            get_backend(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def get_backend(name=None):
+    # A backend by name, by default RYO_SIGNER_BACKEND or the fastest.
+    name = name or os.environ.get('RYO_SIGNER_BACKEND')
+    if name is None:
+        return get_backend(available()[0])
+    if name not in BACKENDS:
+        raise ValueError(f'Unknown signing backend {name}, '
+            f'one of {list(BACKENDS)}.')
+    if name not in _instances:
+        _instances[name] = BACKENDS[name]()
+    return _instances[name]
+
+
+def _sign_chunk(args):
+    # Runs in a pool worker.
+    name, private_key, msg_hashes = args
+    backend = get_backend(name)
+    return [backend.sign(h, private_key) for h in msg_hashes]
+
+
+def sign_many(private_key, msg_hashes, backend=None, processes=None,
+        chunk=None):
+    # Signatures of all msg_hashes, in order. Large batches are split
+    # across a process pool (processes defaults to the CPU count).
+    backend = backend if hasattr(backend, 'sign') else get_backend(backend)
+    msg_hashes = list(msg_hashes)
+    processes = processes or os.cpu_count() or 1
+    if processes == 1 or len(msg_hashes) < MIN_PARALLEL:
+        return [backend.sign(h, private_key) for h in msg_hashes]
+    chunk = chunk or -(-len(msg_hashes) // (processes * 4))
+    jobs = [(backend.name, private_key, msg_hashes[i:i + chunk])
+        for i in range(0, len(msg_hashes), chunk)]
+    with ProcessPoolExecutor(processes) as pool:
+        return [sig for sigs in pool.map(_sign_chunk, jobs) for sig in sigs]
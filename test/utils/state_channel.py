@@ -0,0 +1,334 @@
+# Off-chain runtime for Module 08 (StateChannel).
+#
+# Two peers exchange signed moves directly. L2 is only touched to open
+# a channel (signal_available), to dispute a bad state (submit_bad_state)
+# or to close the channel (cooperative_close).
+#
+# The move array layout and the rules below MUST be consistent with
+# array_to_move_struct, is_valid_hash and check_state_transition in
+# contracts/08_StateChannel.cairo.
+
+import asyncio
+from collections import namedtuple
+
+from starkware.crypto.signature.signature import (private_to_stark_key,
+    sign, verify)
+
+from utils.pedersen import hash2, list_to_hash
+
+# Contract constants.
+DURATION = 20
+LEN_ACHIEVEMENTS = 10
+LEN_REPORT = 10
+LEN_ACTION_HISTORY = 10
+LEN_ACTION = 3
+MAX_X = 9
+MAX_Y = 9
+
+# Positions of the Move members in a move array.
+POS_CHANNEL_ID = 0
+POS_COMMIT = 1
+POS_ACHIEVEMENTS_A = 2
+POS_ACHIEVEMENTS_B = POS_ACHIEVEMENTS_A + 1 + LEN_ACHIEVEMENTS
+POS_REPORT_A = POS_ACHIEVEMENTS_B + 1 + LEN_ACHIEVEMENTS
+POS_REPORT_B = POS_REPORT_A + LEN_REPORT
+POS_ACTION_HISTORY_LEN = POS_REPORT_B + LEN_REPORT
+POS_ACTION_HISTORY = POS_ACTION_HISTORY_LEN + 1
+POS_HASH = POS_ACTION_HISTORY + LEN_ACTION_HISTORY * LEN_ACTION
+POS_NONCE = POS_HASH + 1
+POS_PARENT_HASH = POS_NONCE + 1
+POS_PLAYER_INDEX = POS_PARENT_HASH + 1
+POS_REVEAL = POS_PLAYER_INDEX + 1
+MOVE_LEN = POS_REVEAL + LEN_ACTION
+
+assert (POS_ACTION_HISTORY, POS_NONCE, MOVE_LEN) == (45, 76, 82)
+
+# x/y are positions, type is the encoded punch/kick/duck/jump/shoot.
+Action = namedtuple('Action', ['x', 'y', 'type'])
+NULL_ACTION = Action(0, 0, 0)
+
+
+class Move():
+    # A move as signed by a player. Achievements and reports are kept
+    # as raw felt lists until their structs are designed.
+    def __init__(self, channel_id, nonce, player_index, reveal,
+            action_history, parent_hash=0, commit=0,
+            achievements=None, reports=None,
+            hash=None, sig_r=None, sig_s=None):
+        self.channel_id = channel_id
+        self.commit = commit
+        self.achievements = achievements or (
+            [0] * (1 + LEN_ACHIEVEMENTS), [0] * (1 + LEN_ACHIEVEMENTS))
+        self.reports = reports or ([0] * LEN_REPORT, [0] * LEN_REPORT)
+        self.action_history = list(action_history)
+        self.nonce = nonce
+        self.parent_hash = parent_hash
+        self.player_index = player_index
+        self.reveal = Action(*reveal)
+        self.hash = hash
+        self.sig_r = sig_r
+        self.sig_s = sig_s
+
+    def to_array(self):
+        a = [0] * MOVE_LEN
+        a[POS_CHANNEL_ID] = self.channel_id
+        a[POS_COMMIT] = self.commit
+        a[POS_ACHIEVEMENTS_A:POS_ACHIEVEMENTS_B] = self.achievements[0]
+        a[POS_ACHIEVEMENTS_B:POS_REPORT_A] = self.achievements[1]
+        a[POS_REPORT_A:POS_REPORT_B] = self.reports[0]
+        a[POS_REPORT_B:POS_ACTION_HISTORY_LEN] = self.reports[1]
+        a[POS_ACTION_HISTORY_LEN] = LEN_ACTION_HISTORY
+        for i, action in enumerate(self.action_history):
+            start = POS_ACTION_HISTORY + i * LEN_ACTION
+            a[start:start + LEN_ACTION] = action
+        a[POS_NONCE] = self.nonce
+        a[POS_PARENT_HASH] = self.parent_hash
+        a[POS_PLAYER_INDEX] = self.player_index
+        a[POS_REVEAL:POS_REVEAL + LEN_ACTION] = self.reveal
+        assert len(a) == MOVE_LEN
+        return a
+
+    @classmethod
+    def from_array(cls, a, hash=None, sig_r=None, sig_s=None):
+        if len(a) != MOVE_LEN:
+            raise ValueError(f'Move array has {len(a)} elements, '
+                f'expected {MOVE_LEN}.')
+        history = [
+            Action(*a[start:start + LEN_ACTION])
+            for start in range(POS_ACTION_HISTORY, POS_HASH, LEN_ACTION)]
+        return cls(
+            channel_id=a[POS_CHANNEL_ID],
+            commit=a[POS_COMMIT],
+            achievements=(list(a[POS_ACHIEVEMENTS_A:POS_ACHIEVEMENTS_B]),
+                list(a[POS_ACHIEVEMENTS_B:POS_REPORT_A])),
+            reports=(list(a[POS_REPORT_A:POS_REPORT_B]),
+                list(a[POS_REPORT_B:POS_ACTION_HISTORY_LEN])),
+            action_history=history,
+            nonce=a[POS_NONCE],
+            parent_hash=a[POS_PARENT_HASH],
+            player_index=a[POS_PLAYER_INDEX],
+            reveal=a[POS_REVEAL:POS_REVEAL + LEN_ACTION],
+            hash=hash, sig_r=sig_r, sig_s=sig_s)
+
+    def calldata(self):
+        # (move_len, move, hash, sig_r, sig_s) as the contract expects.
+        a = self.to_array()
+        return [len(a)] + a + [self.hash, self.sig_r, self.sig_s]
+
+
+def move_hash(move_array):
+    # Same as list_to_hash() in contracts/utils/general.cairo. Unlike
+    # compute_hash_on_elements, the length is not hashed in at the end.
+    return list_to_hash(move_array)
+
+
+def action_commit(action):
+    # h(x, h(y, type)), as recomputed in submit_bad_reveal.
+    return hash2(action.x, hash2(action.y, action.type))
+
+
+def sign_move(move, private_key):
+    move.hash = move_hash(move.to_array())
+    move.sig_r, move.sig_s = sign(msg_hash=move.hash, priv_key=private_key)
+    return move
+
+
+def is_valid_move_signature(move, public_keys):
+    return verify(move.hash, move.sig_r, move.sig_s,
+        public_keys[move.player_index])
+
+
+def is_valid_hash(move_array, supplied_hash):
+    return len(move_array) == MOVE_LEN and \
+        move_hash(move_array) == supplied_hash
+
+
+def check_state_transition(m_parent, m):
+    # Mirror of check_state_transition(). Returns is_valid_bool.
+    # Raises ValueError where the contract assert would revert.
+    if m.nonce != m_parent.nonce + 1:
+        raise ValueError('Moves are not sequential.')
+    # State to apply transition to and the new state that was signed.
+    prior = m_parent.action_history[0]
+    proposed = m.reveal
+    x_ok = abs(prior.x - proposed.x) <= MAX_X
+    y_ok = abs(prior.y - proposed.y) <= MAX_Y
+    # The stored history must match.
+    if m.action_history[0] != m_parent.reveal:
+        raise ValueError('Move history does not match parent reveal.')
+    return int(x_ok and y_ok)
+
+
+def parse_moves(bad_move, bad_move_hash, bad_move_sig_r, bad_move_sig_s,
+        parent_move, parent_move_hash, parent_move_sig_r, parent_move_sig_s,
+        public_keys):
+    # Mirror of parse_moves(). public_keys are the channel signing keys
+    # by player index (read from player_signing_key on-chain).
+    if not is_valid_hash(bad_move, bad_move_hash) or \
+            not is_valid_hash(parent_move, parent_move_hash):
+        raise ValueError('Move hash does not match move array.')
+    m = Move.from_array(bad_move, bad_move_hash,
+        bad_move_sig_r, bad_move_sig_s)
+    parent_m = Move.from_array(parent_move, parent_move_hash,
+        parent_move_sig_r, parent_move_sig_s)
+    if not is_valid_move_signature(m, public_keys) or \
+            not is_valid_move_signature(parent_m, public_keys):
+        raise ValueError('Move signature is not valid.')
+    return m, parent_m
+
+
+def player_for_nonce(nonce):
+    # The genesis move (nonce 0) is signed by player 1, then players
+    # alternate. The final move (nonce DURATION) is signed by player 1.
+    return (nonce + 1) % 2
+
+
+class LocalTransport():
+    # One end of an in-process, ordered message pipe between two peers.
+    def __init__(self, inbox, outbox):
+        self.inbox = inbox
+        self.outbox = outbox
+
+    @classmethod
+    def pair(cls):
+        a_to_b = asyncio.Queue()
+        b_to_a = asyncio.Queue()
+        return cls(b_to_a, a_to_b), cls(a_to_b, b_to_a)
+
+    async def send(self, message):
+        await self.outbox.put(message)
+
+    async def recv(self):
+        return await self.inbox.get()
+
+
+class ChannelPeer():
+    # One player in an open channel. Signs own moves, validates moves
+    # from the opponent and keeps the evidence needed for a dispute.
+    def __init__(self, player_index, private_key, transport,
+            start_position=NULL_ACTION, execute=None, channel_address=None):
+        self.player_index = player_index
+        self.private_key = private_key
+        self.public_key = private_to_stark_key(private_key)
+        self.transport = transport
+        # execute(to, selector_name, calldata) sends an L2 transaction.
+        self.execute = execute
+        self.channel_address = channel_address
+        self.channel_id = None
+        self.public_keys = None
+        self.moves = []
+        self.next_action = Action(*start_position)
+        self.evidence = None
+
+    def attach(self, channel_id, public_keys):
+        # Called once the channel is open on L2.
+        self.channel_id = channel_id
+        self.public_keys = tuple(public_keys)
+
+    @property
+    def latest(self):
+        return self.moves[-1] if self.moves else None
+
+    def genesis(self):
+        # The agreed starting state. Player 1 signs it and sends it first.
+        start = [NULL_ACTION] * LEN_ACTION_HISTORY
+        move = Move(self.channel_id, nonce=0, player_index=1,
+            reveal=self.next_action, action_history=start,
+            commit=0)
+        return move
+
+    def build_move(self, action):
+        # Reveal the action committed to last turn, commit to the next.
+        parent = self.latest
+        reveal = self.next_action
+        move = Move(self.channel_id,
+            nonce=parent.nonce + 1,
+            player_index=self.player_index,
+            reveal=reveal,
+            action_history=[parent.reveal] + parent.action_history[:-1],
+            parent_hash=parent.hash,
+            commit=action_commit(Action(*action)),
+            achievements=parent.achievements,
+            reports=parent.reports)
+        self.next_action = Action(*action)
+        return move
+
+    async def play(self, action):
+        if self.latest is None:
+            move = self.genesis()
+            # The first committed action is revealed at the next move.
+            move.commit = action_commit(Action(*action))
+            self.next_action = Action(*action)
+        else:
+            move = self.build_move(action)
+        sign_move(move, self.private_key)
+        self.moves.append(move)
+        await self.transport.send(
+            (move.to_array(), move.hash, move.sig_r, move.sig_s))
+        return move
+
+    async def receive(self):
+        # Returns the move if valid. If the move breaks the game rules it
+        # is kept as evidence for submit_bad_state and None is returned.
+        array, hash, sig_r, sig_s = await self.transport.recv()
+        if not is_valid_hash(array, hash):
+            raise ValueError('Move hash does not match move array.')
+        move = Move.from_array(array, hash, sig_r, sig_s)
+        if move.player_index != 1 - self.player_index or \
+                move.player_index != player_for_nonce(move.nonce):
+            raise ValueError('Move signed out of turn.')
+        if not is_valid_move_signature(move, self.public_keys):
+            raise ValueError('Move signature is not valid.')
+        parent = self.latest
+        if parent is None:
+            # Genesis move.
+            if move.nonce != 0:
+                raise ValueError('Channel must start from nonce 0.')
+            self.moves.append(move)
+            return move
+        if move.parent_hash != parent.hash:
+            raise ValueError('Move does not extend the latest move.')
+        if check_state_transition(parent, move) == 0:
+            self.evidence = (move, parent)
+            return None
+        # The reveal must match the commitment made by the same player.
+        if len(self.moves) > 1 and \
+                action_commit(move.reveal) != self.moves[-2].commit:
+            raise ValueError('Reveal does not match commitment.')
+        self.moves.append(move)
+        return move
+
+    ##### L2 #####
+    async def signal_available(self, duration=DURATION):
+        return await self.execute(self.channel_address, 'signal_available',
+            [duration, self.public_key])
+
+    async def dispute(self):
+        # Punish the opponent for a signed move that breaks the rules.
+        bad_move, parent_move = self.evidence
+        return await self.execute(self.channel_address, 'submit_bad_state',
+            bad_move.calldata() + parent_move.calldata())
+
+    async def close(self):
+        # Submit the final move (nonce == DURATION) to close the channel.
+        final = self.latest
+        if final.nonce != DURATION:
+            raise ValueError(f'Channel closes at nonce {DURATION}, '
+                f'latest is {final.nonce}.')
+        return await self.execute(self.channel_address, 'cooperative_close',
+            final.calldata())
+
+
+async def exchange(peer_0, peer_1, strategy, n_moves=DURATION):
+    # Plays n_moves after genesis. strategy(peer, nonce) -> Action.
+    # Stops early if a peer receives a move that breaks the rules.
+    players = (peer_0, peer_1)
+    await peer_1.play(strategy(peer_1, 0))
+    await peer_0.receive()
+    for nonce in range(1, n_moves + 1):
+        mover = players[player_for_nonce(nonce)]
+        other = players[1 - player_for_nonce(nonce)]
+        await mover.play(strategy(mover, nonce))
+        if await other.receive() is None:
+            return other
+    return None
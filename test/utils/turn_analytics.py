@@ -0,0 +1,549 @@
+# Streaming analytics over TurnLogs, for balancing the game.
+#
+#     analytics = run(simulate(10 ** 7), 'analytics/')
+#     analytics = await arun(contract_turn_logs(ctx.engine), 'analytics/')
+#
+# The pipeline is a chain of generators, so memory is bounded by one
+# chunk of turns whatever the length of the log:
+#
+#     source     (clock, TurnLog) pairs: contract_turn_logs() or
+#                simulate()
+#     columns    chunks of chunk_size turns as NumPy columns
+#     Analytics  aggregates indexed [location_id, item_id - 1]
+#     NpzWriter  one .npz file per chunk and per closed window
+#
+# Aggregates are kept since the start (totals) and over a rolling
+# window of the last `windows` windows of `window_turns` game clock
+# ticks each. When a window closes, its prices, volumes, event hits and
+# the money supply at its end are written out, so prices over time can
+# be read back from the windows-*.npz files.
+#
+# Written files:
+#
+#     turns-NNNNNN.npz    The columns of the TurnLog, plus `clock`. The
+#                         user_id is replaced by `user`, an index into
+#                         `users` of aggregates.npz.
+#     windows-NNNNNN.npz  Closed windows, stacked on the first axis.
+#     aggregates.npz      Totals at the end of the run.
+#
+#     cd test && python -m utils.turn_analytics 1000000 analytics/
+
+import os
+import random
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from utils.city_clocks import global_turn_logs
+
+# MUST be consistent with TurnLog in contracts/utils/game_structs.cairo.
+FIELDS = ['user_id', 'location_id', 'buy_or_sell', 'item_id',
+    'amount_to_give', 'market_pre_trade_item',
+    'market_post_trade_pre_event_item', 'market_post_trade_post_event_item',
+    'market_pre_trade_money', 'market_post_trade_pre_event_money',
+    'market_post_trade_post_event_money', 'user_pre_trade_item',
+    'user_post_trade_pre_event_item', 'user_post_trade_post_event_item',
+    'user_pre_trade_money', 'user_post_trade_pre_event_money',
+    'user_post_trade_post_event_money', 'trade_occurs_bool',
+    'money_reduction_factor', 'item_reduction_factor',
+    'regional_item_reduction_factor', 'dealer_dash_bool',
+    'wrangle_dashed_dealer_bool', 'mugging_bool', 'run_from_mugging_bool',
+    'gang_war_bool', 'defend_gang_war_bool', 'cop_raid_bool',
+    'bribe_cops_bool', 'find_item_bool', 'local_shipment_bool',
+    'warehouse_seizure_bool']
+EVENTS = [f for f in FIELDS if f.endswith('_bool') and f !=
+    'trade_occurs_bool']
+# Small values, the rest are balances. Balances above MAX_VALUE are
+# stored as MAX_VALUE.
+SMALL_FIELDS = set(['location_id', 'buy_or_sell', 'item_id',
+    'trade_occurs_bool', 'money_reduction_factor', 'item_reduction_factor',
+    'regional_item_reduction_factor'] + EVENTS)
+
+MAX_VALUE = 2 ** 64 - 1
+
+TurnLog = namedtuple('TurnLog', FIELDS)
+
+# MUST be consistent with contracts/utils/game_constants.cairo.
+LOCATIONS = 76
+DISTRICTS = 4
+ITEMS = 19
+MARKETS = LOCATIONS * ITEMS
+MIN_TURN_LOCKOUT = 3
+DRUG_LORD_PERCENTAGE = 2
+STARTING_MONEY = 20000
+MIN_MONEY = 100
+MAX_ATTEMPTS = 100
+DEFAULT_MARKET_MONEY = 10000
+DEFAULT_MARKET_ITEM = 1000
+EVENT_BP = dict(dealer_dash_bool=1000, wrangle_dashed_dealer_bool=5000,
+    mugging_bool=5000, run_from_mugging_bool=5000, gang_war_bool=5000,
+    defend_gang_war_bool=5000, cop_raid_bool=5000, bribe_cops_bool=5000,
+    find_item_bool=5000, local_shipment_bool=5000,
+    warehouse_seizure_bool=5000)
+MUGGING_IMPACT = 30
+GANG_WAR_IMPACT = 30
+COP_RAID_IMPACT = 20
+FIND_ITEM_IMPACT = 50
+LOCAL_SHIPMENT_IMPACT = 20
+WAREHOUSE_SEIZURE_IMPACT = 20
+
+CHUNK_SIZE = 65536
+
+
+##### Sources #####
+
+async def contract_turn_logs(engine, first=MIN_TURN_LOCKOUT + 1,
+        last=None):
+    # Yields (clock, TurnLog) of the turns logged at clocks [first, last]
+    # (by default up to the current game clock). In the per-city clock
+    # mode the turns of all cities are numbered from MIN_TURN_LOCKOUT +
+    # 1 in the order of global_turn_logs() (see utils/city_clocks.py),
+    # and first and last are in that numbering. That order needs every
+    # log, so they are all read before the first is yielded.
+    res = await engine.read_clock_mode().call()
+    if res.result.city_clocks:
+        async for index, turn in global_turn_logs(engine):
+            clock = MIN_TURN_LOCKOUT + 1 + index
+            if last is not None and clock > last:
+                break
+            if clock >= first:
+                yield clock, turn.log
+        return
+    if last is None:
+        res = await engine.read_game_clock().call()
+        last = res.result.clock
+    for clock in range(first, last + 1):
+        res = await engine.view_given_turn(clock).call()
+        yield clock, res.result.turn_log
+
+
+def simulate(n_turns, seed=0, players=64):
+    # Yields (clock, TurnLog) of n_turns random turns, following the
+    # rules of have_turn() with wearables of score 1 and no drug lords.
+    # Markets start at the default pair rather than a generated curve.
+    # Players only send trades that would not revert. A player with
+    # less than MIN_MONEY and no items, or who finds no possible trade
+    # in MAX_ATTEMPTS tries, is replaced by a new player.
+    rng = random.Random(seed)
+    markets = {}
+    money = [STARTING_MONEY] * players
+    items = [[0] * (ITEMS + 1) for _ in range(players)]
+    last_turn = [0] * players
+    attempts = [0] * players
+    clock = MIN_TURN_LOCKOUT
+    done = 0
+    while done < n_turns:
+        p = rng.randrange(players)
+        if last_turn[p] + MIN_TURN_LOCKOUT > clock:
+            continue
+        if attempts[p] == MAX_ATTEMPTS or (
+                money[p] < MIN_MONEY and not any(items[p])):
+            money[p] = STARTING_MONEY
+            items[p] = [0] * (ITEMS + 1)
+            attempts[p] = 0
+        attempts[p] += 1
+        location_id = rng.randrange(LOCATIONS)
+        item_id = rng.randint(1, ITEMS)
+        market = markets.setdefault((location_id, item_id),
+            [DEFAULT_MARKET_ITEM, DEFAULT_MARKET_MONEY])
+        market_item, market_money = market
+        held = items[p][item_id]
+        if held > 0 and rng.random() < 0.5:
+            buy_or_sell, amount_to_give = 1, rng.randint(1,
+                min(held, max(market_item, 1)))
+        elif money[p] > 0:
+            buy_or_sell, amount_to_give = 0, rng.randint(1, money[p])
+        else:
+            continue
+        # Only the amount after the cut reaches the market and leaves
+        # the player. take_cut() credits the cut to the lord of the
+        # location, which is not simulated: there are no lords here.
+        cut = amount_to_give // 100 * DRUG_LORD_PERCENTAGE
+        gives = amount_to_give - cut
+        if buy_or_sell == 0:
+            a, b = market_money, market_item
+        else:
+            a, b = market_item, market_money
+        gets = b * gives // (a + gives) if a + gives > 0 else 0
+        if gives < 1 or gets < 1 or max(a + gives, b) >= MAX_VALUE:
+            # trade() would fail.
+            continue
+
+        e = {name: int(rng.randrange(10000) < bp)
+            for name, bp in EVENT_BP.items()}
+        trade_occurs = 1 - e['dealer_dash_bool'] * (
+            1 - e['wrangle_dashed_dealer_bool'])
+        cops = e['cop_raid_bool'] * (1 - e['bribe_cops_bool'])
+        money_factor = 100 - MUGGING_IMPACT * e['mugging_bool'] * (
+            1 - e['run_from_mugging_bool']) - COP_RAID_IMPACT * cops
+        item_factor = 100 - GANG_WAR_IMPACT * e['gang_war_bool'] * (
+            1 - e['defend_gang_war_bool']) - COP_RAID_IMPACT * cops + \
+            FIND_ITEM_IMPACT * e['find_item_bool']
+        regional_factor = 100 + \
+            LOCAL_SHIPMENT_IMPACT * e['local_shipment_bool'] - \
+            WAREHOUSE_SEIZURE_IMPACT * e['warehouse_seizure_bool']
+
+        user_item, user_money = items[p][item_id], money[p]
+        if trade_occurs:
+            if buy_or_sell == 0:
+                market[:] = [market_item - gets, market_money + gives]
+                money[p] -= gives
+                items[p][item_id] += gets
+            else:
+                market[:] = [market_item + gives, market_money - gets]
+                money[p] += gets
+                items[p][item_id] -= gives
+        post_trade = list(market)
+        pre_event_item, pre_event_money = items[p][item_id], money[p]
+        money[p] = money[p] * money_factor // 100
+        items[p][item_id] = items[p][item_id] * item_factor // 100
+        city = location_id // DISTRICTS * DISTRICTS
+        for location in range(city, city + DISTRICTS):
+            other = markets.get((location, item_id))
+            if other is not None:
+                other[0] = other[0] * regional_factor // 100
+
+        clock += 1
+        last_turn[p] = clock
+        attempts[p] = 0
+        done += 1
+        yield clock, TurnLog(user_id=p + 1, location_id=location_id,
+            buy_or_sell=buy_or_sell, item_id=item_id,
+            amount_to_give=amount_to_give,
+            market_pre_trade_item=market_item,
+            market_post_trade_pre_event_item=post_trade[0],
+            market_post_trade_post_event_item=market[0],
+            market_pre_trade_money=market_money,
+            market_post_trade_pre_event_money=post_trade[1],
+            market_post_trade_post_event_money=market[1],
+            user_pre_trade_item=user_item,
+            user_post_trade_pre_event_item=pre_event_item,
+            user_post_trade_post_event_item=items[p][item_id],
+            user_pre_trade_money=user_money,
+            user_post_trade_pre_event_money=pre_event_money,
+            user_post_trade_post_event_money=money[p],
+            trade_occurs_bool=trade_occurs,
+            money_reduction_factor=money_factor,
+            item_reduction_factor=item_factor,
+            regional_item_reduction_factor=regional_factor, **e)
+
+
+##### Columns #####
+
+def to_chunk(rows, users):
+    # Converts (clock, TurnLog) pairs to columns. users maps user_id ->
+    # dense index and is extended with new users.
+    clocks, logs = zip(*rows)
+    chunk = dict(clock=np.array(clocks, dtype=np.uint64))
+    for name, values in zip(FIELDS, zip(*[tuple(log) for log in logs])):
+        if name == 'user_id':
+            chunk['user'] = np.array([users.setdefault(int(u), len(users))
+                for u in values], dtype=np.int64)
+        elif name in SMALL_FIELDS:
+            chunk[name] = np.array(values, dtype=np.int16)
+        else:
+            try:
+                chunk[name] = np.array(values, dtype=np.uint64)
+            except OverflowError:
+                # Only user balances are unbounded (e.g. found items).
+                chunk[name] = np.array([min(v, MAX_VALUE) for v in values],
+                    dtype=np.uint64)
+    return chunk
+
+
+def columns(rows, users, chunk_size=CHUNK_SIZE):
+    buffer = []
+    for row in rows:
+        buffer.append(row)
+        if len(buffer) == chunk_size:
+            yield to_chunk(buffer, users)
+            buffer = []
+    if buffer:
+        yield to_chunk(buffer, users)
+
+
+async def acolumns(rows, users, chunk_size=CHUNK_SIZE):
+    buffer = []
+    async for row in rows:
+        buffer.append(row)
+        if len(buffer) == chunk_size:
+            yield to_chunk(buffer, users)
+            buffer = []
+    if buffer:
+        yield to_chunk(buffer, users)
+
+
+##### Aggregates #####
+
+def last_rows(keys):
+    # Returns (unique keys, index of the last row with each key).
+    reverse = keys[::-1]
+    unique, first = np.unique(reverse, return_index=True)
+    return unique, len(keys) - 1 - first
+
+
+def ratio(a, b):
+    # a / b, NaN where b is 0.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(b > 0, a / np.where(b > 0, b, 1), np.nan)
+
+
+class Analytics():
+    def __init__(self, window_turns=1000, windows=10):
+        self.window_turns = window_turns
+        self.windows = windows
+        # Totals since the start, per market (flat market index).
+        self.turns = np.zeros(MARKETS, dtype=np.int64)
+        self.trades = np.zeros(MARKETS, dtype=np.int64)
+        self.buys = np.zeros(MARKETS, dtype=np.int64)
+        self.item_volume = np.zeros(MARKETS)
+        self.money_volume = np.zeros(MARKETS)
+        # Latest state of each market (NaN/0 if never traded).
+        self.last_price = np.full(MARKETS, np.nan)
+        self.market_money = np.zeros(MARKETS)
+        # Event hits and turns per location.
+        self.event_hits = np.zeros((LOCATIONS, len(EVENTS)), dtype=np.int64)
+        self.location_turns = np.zeros(LOCATIONS, dtype=np.int64)
+        # Money of each user (dense index) after their last turn.
+        self.user_money = np.zeros(0)
+        # Rolling window: a ring of per-window sums.
+        self.ring_trades = np.zeros((windows, MARKETS), dtype=np.int64)
+        self.ring_item_volume = np.zeros((windows, MARKETS))
+        self.ring_money_volume = np.zeros((windows, MARKETS))
+        self.ring_event_hits = np.zeros((windows, len(EVENTS)),
+            dtype=np.int64)
+        self.ring_turns = np.zeros(windows, dtype=np.int64)
+        self.start = None
+        self.window = None
+        self.clock = None
+        self.count = 0
+        # Closed windows not yet written.
+        self.closed = []
+
+    def update(self, chunk):
+        clocks = chunk['clock'].astype(np.int64)
+        if self.start is None:
+            self.start = int(clocks[0])
+            self.window = 0
+        window = (clocks - self.start) // self.window_turns
+        # Clocks are increasing, so windows are contiguous.
+        bounds = np.flatnonzero(np.diff(window)) + 1
+        for lo, hi in zip(np.r_[0, bounds], np.r_[bounds, len(window)]):
+            w = int(window[lo])
+            while self.window < w:
+                self._close()
+                self._advance()
+            self._add(chunk, slice(lo, hi))
+        self.clock = int(clocks[-1])
+        self.count += len(clocks)
+
+    def _add(self, chunk, rows):
+        c = {name: values[rows] for name, values in chunk.items()}
+        location = c['location_id'].astype(np.intp)
+        market = location * ITEMS + c['item_id'] - 1
+        slot = self.window % self.windows
+
+        def count(weights=None):
+            return np.bincount(market, weights, minlength=MARKETS)
+
+        item_volume = np.abs(
+            c['market_post_trade_pre_event_item'].astype(np.float64) -
+            c['market_pre_trade_item'].astype(np.float64))
+        money_volume = np.abs(
+            c['market_post_trade_pre_event_money'].astype(np.float64) -
+            c['market_pre_trade_money'].astype(np.float64))
+        trades = count(c['trade_occurs_bool']).astype(np.int64)
+        self.turns += count().astype(np.int64)
+        self.trades += trades
+        self.buys += count(c['trade_occurs_bool'] *
+            (1 - c['buy_or_sell'])).astype(np.int64)
+        self.item_volume += count(item_volume)
+        self.money_volume += count(money_volume)
+        self.ring_trades[slot] += trades
+        self.ring_item_volume[slot] += count(item_volume)
+        self.ring_money_volume[slot] += count(money_volume)
+
+        hits = np.stack([c[e] for e in EVENTS], axis=1).astype(np.int64)
+        np.add.at(self.event_hits, location, hits)
+        self.location_turns += np.bincount(location, minlength=LOCATIONS)
+        self.ring_event_hits[slot] += hits.sum(axis=0)
+        self.ring_turns[slot] += len(location)
+
+        markets, last = last_rows(market)
+        item = c['market_post_trade_post_event_item'][last].astype(
+            np.float64)
+        money = c['market_post_trade_post_event_money'][last].astype(
+            np.float64)
+        self.last_price[markets] = ratio(money, item)
+        self.market_money[markets] = money
+
+        users, last = last_rows(c['user'])
+        if len(users) and users[-1] >= len(self.user_money):
+            self.user_money = np.concatenate([self.user_money,
+                np.zeros(users[-1] + 1 - len(self.user_money))])
+        self.user_money[users] = c['user_post_trade_post_event_money'][
+            last].astype(np.float64)
+
+    def money_supply(self):
+        # Money held by markets that were traded and by users.
+        return self.market_money.sum() + self.user_money.sum()
+
+    def _close(self):
+        # Records the current window as closed.
+        slot = self.window % self.windows
+        self.closed.append(dict(
+            window=self.window,
+            clock=self.start + (self.window + 1) * self.window_turns - 1,
+            turns=self.ring_turns[slot],
+            trades=self.ring_trades[slot].reshape(LOCATIONS, ITEMS),
+            item_volume=self.ring_item_volume[slot].reshape(LOCATIONS,
+                ITEMS),
+            money_volume=self.ring_money_volume[slot].reshape(LOCATIONS,
+                ITEMS),
+            price=ratio(self.ring_money_volume[slot],
+                self.ring_item_volume[slot]).reshape(LOCATIONS, ITEMS),
+            event_hits=self.ring_event_hits[slot].copy(),
+            money_supply=self.money_supply()))
+
+    def _advance(self):
+        # Moves to the next window, reusing the slot of the oldest.
+        self.window += 1
+        slot = self.window % self.windows
+        for ring in [self.ring_trades, self.ring_item_volume,
+                self.ring_money_volume, self.ring_event_hits]:
+            ring[slot] = 0
+        self.ring_turns[slot] = 0
+
+    def finish(self):
+        # Closes the last, partial window. No updates may follow.
+        if self.window is not None:
+            self._close()
+
+    def drain(self):
+        closed, self.closed = self.closed, []
+        return closed
+
+    def rolling(self):
+        # Aggregates over the last `windows` windows, [location, item].
+        item_volume = self.ring_item_volume.sum(axis=0)
+        money_volume = self.ring_money_volume.sum(axis=0)
+        turns = self.ring_turns.sum()
+        return dict(
+            trades=self.ring_trades.sum(axis=0).reshape(LOCATIONS, ITEMS),
+            item_volume=item_volume.reshape(LOCATIONS, ITEMS),
+            money_volume=money_volume.reshape(LOCATIONS, ITEMS),
+            price=ratio(money_volume, item_volume).reshape(LOCATIONS, ITEMS),
+            event_rates=self.ring_event_hits.sum(axis=0) / max(turns, 1))
+
+    def totals(self):
+        return dict(
+            turns=self.turns.reshape(LOCATIONS, ITEMS),
+            trades=self.trades.reshape(LOCATIONS, ITEMS),
+            buys=self.buys.reshape(LOCATIONS, ITEMS),
+            item_volume=self.item_volume.reshape(LOCATIONS, ITEMS),
+            money_volume=self.money_volume.reshape(LOCATIONS, ITEMS),
+            price=ratio(self.money_volume, self.item_volume).reshape(
+                LOCATIONS, ITEMS),
+            last_price=self.last_price.reshape(LOCATIONS, ITEMS),
+            market_money=self.market_money.reshape(LOCATIONS, ITEMS),
+            event_hits=self.event_hits,
+            event_rates=ratio(self.event_hits,
+                self.location_turns[:, None].astype(np.float64)),
+            user_money=self.user_money,
+            money_supply=self.money_supply())
+
+
+##### Output #####
+
+class NpzWriter():
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.chunks = 0
+        self.window_files = 0
+
+    def write_chunk(self, chunk):
+        np.savez_compressed(os.path.join(self.directory,
+            f'turns-{self.chunks:06d}.npz'), **chunk)
+        self.chunks += 1
+
+    def write_windows(self, closed):
+        if not closed:
+            return
+        np.savez_compressed(os.path.join(self.directory,
+            f'windows-{self.window_files:06d}.npz'),
+            **{k: np.stack([w[k] for w in closed]) for k in closed[0]})
+        self.window_files += 1
+
+    def close(self, analytics, users):
+        addresses = sorted(users, key=users.get)
+        np.savez_compressed(os.path.join(self.directory, 'aggregates.npz'),
+            users=np.array([hex(u) for u in addresses]),
+            count=analytics.count, **analytics.totals())
+
+
+def read_files(directory, prefix='turns'):
+    # Yields the contents of turns-*.npz (or windows-*.npz) in order.
+    names = sorted(n for n in os.listdir(directory)
+        if n.startswith(prefix + '-') and n.endswith('.npz'))
+    for name in names:
+        with np.load(os.path.join(directory, name)) as data:
+            yield {k: data[k] for k in data.files}
+
+
+##### Pipeline #####
+
+def run(rows, directory=None, chunk_size=CHUNK_SIZE, window_turns=1000,
+        windows=10):
+    # Streams (clock, TurnLog) pairs through the pipeline. Returns the
+    # Analytics. Files are only written if a directory is given.
+    analytics = Analytics(window_turns, windows)
+    writer = NpzWriter(directory) if directory else None
+    users = {}
+    for chunk in columns(rows, users, chunk_size):
+        _consume(analytics, writer, chunk)
+    return _finish(analytics, writer, users)
+
+
+async def arun(rows, directory=None, chunk_size=CHUNK_SIZE,
+        window_turns=1000, windows=10):
+    # As run(), for an async source such as contract_turn_logs().
+    analytics = Analytics(window_turns, windows)
+    writer = NpzWriter(directory) if directory else None
+    users = {}
+    async for chunk in acolumns(rows, users, chunk_size):
+        _consume(analytics, writer, chunk)
+    return _finish(analytics, writer, users)
+
+
+def _consume(analytics, writer, chunk):
+    analytics.update(chunk)
+    if writer:
+        writer.write_chunk(chunk)
+        writer.write_windows(analytics.drain())
+
+
+def _finish(analytics, writer, users):
+    analytics.finish()
+    if writer:
+        writer.write_windows(analytics.drain())
+        writer.close(analytics, users)
+    return analytics
+
+
+if __name__ == '__main__':
+    import sys
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    directory = sys.argv[2] if len(sys.argv) > 2 else None
+    start = time.perf_counter()
+    analytics = run(simulate(n), directory)
+    seconds = time.perf_counter() - start
+    totals = analytics.totals()
+    print(f'{analytics.count} turns in {seconds:.1f}s '
+        f'({analytics.count / seconds:.0f} turns/s)')
+    print(f'money supply {totals["money_supply"]:.0f}, '
+        f'trades {totals["trades"].sum()}')
+    rates = analytics.event_hits.sum(axis=0) / max(analytics.count, 1)
+    for name, rate in zip(EVENTS, rates):
+        print(f'  {name:<28} {rate:.3f}')
@@ -0,0 +1,200 @@
+# Archive of the TurnLogs of 01_DopeWars.
+#
+# With set_log_retention(N) the contract keeps the log of the last N
+# turns of each clock only (the log of clock c is stored at c % N). The
+# Archiver copies every log to disk before it is overwritten:
+#
+#     archiver = Archiver(ctx.engine, 'turns')
+#     archiver.attach(ctx)  # Archives after every turn of ctx.execute().
+#     await archiver.sync()  # Or poll, at least every N turns per clock.
+#     archiver.archive.lookup(GAME, clock).log
+#
+# Each clock is a stream: 'game' for the global clock and 'city-NN' for
+# the clocks of the per-city mode. A stream is split into segment files
+# of SEGMENT_TURNS clocks, <stream>-<segment>.gz. A sync appends one
+# gzip member (JSON lines of clock, timestamp and log) to the segment
+# files and then one line per member to index.jsonl:
+#
+#     {"stream": "game", "first": 4, "last": 9, "file": "game-000000.gz",
+#      "offset": 0, "length": 311}
+#
+# Files are only ever appended to. A lookup decompresses the one member
+# holding the clock.
+
+import gzip
+import json
+import os
+from collections import OrderedDict, defaultdict
+
+from utils.city_clocks import (MIN_TURN_LOCKOUT, Turn, city_turn_logs,
+    game_clock_turn_logs)
+
+GAME = 'game'
+SEGMENT_TURNS = 1024
+INDEX = 'index.jsonl'
+# Decompressed members kept by Archive.
+MEMBER_CACHE_SIZE = 16
+FIRST_CLOCK = MIN_TURN_LOCKOUT + 1
+
+
+class Evicted(RuntimeError):
+    # Logs were overwritten on-chain before they were archived.
+    pass
+
+
+def stream_of(city):
+    return GAME if city is None else f'city-{city:02d}'
+
+
+def city_of_stream(stream):
+    return None if stream == GAME else int(stream[len('city-'):])
+
+
+def segment_file(stream, clock, segment_turns=SEGMENT_TURNS):
+    return f'{stream}-{(clock - FIRST_CLOCK) // segment_turns:06d}.gz'
+
+
+class Archive():
+    # Reads an archive directory, following the index as it grows.
+    def __init__(self, path):
+        self.path = path
+        # stream -> [index entry], ordered by clock.
+        self.entries = defaultdict(list)
+        self.index_offset = 0
+        self.members = OrderedDict()
+        self.refresh()
+
+    def refresh(self):
+        # Reads the lines appended to the index since the last refresh.
+        index = os.path.join(self.path, INDEX)
+        if not os.path.exists(index):
+            return
+        with open(index) as f:
+            f.seek(self.index_offset)
+            for line in f:
+                if not line.endswith('\n'):
+                    # Being written.
+                    break
+                self.index_offset += len(line)
+                entry = json.loads(line)
+                self.entries[entry['stream']].append(entry)
+
+    def last(self, stream):
+        # Last clock archived of a stream, FIRST_CLOCK - 1 if none.
+        entries = self.entries.get(stream)
+        return entries[-1]['last'] if entries else FIRST_CLOCK - 1
+
+    def lookup(self, stream, clock):
+        # The Turn of a stream (or city) at a clock, None if missing.
+        if not isinstance(stream, str):
+            stream = stream_of(stream)
+        if clock > self.last(stream):
+            self.refresh()
+        for entry in self.entries.get(stream, []):
+            if entry['first'] <= clock <= entry['last']:
+                record = self.member(entry)[clock - entry['first']]
+                return Turn(city_of_stream(stream), record['clock'],
+                    record['timestamp'], record['log'])
+        return None
+
+    def member(self, entry):
+        key = (entry['file'], entry['offset'])
+        if key in self.members:
+            self.members.move_to_end(key)
+            return self.members[key]
+        with open(os.path.join(self.path, entry['file']), 'rb') as f:
+            f.seek(entry['offset'])
+            data = gzip.decompress(f.read(entry['length']))
+        records = [json.loads(line) for line in data.splitlines()]
+        self.members[key] = records
+        if len(self.members) > MEMBER_CACHE_SIZE:
+            self.members.popitem(last=False)
+        return records
+
+    def turns(self, stream):
+        # Yields all archived Turns of a stream, by clock.
+        city = city_of_stream(stream)
+        for entry in list(self.entries.get(stream, [])):
+            for record in self.member(entry):
+                yield Turn(city, record['clock'], record['timestamp'],
+                    record['log'])
+
+
+class Archiver():
+    def __init__(self, engine, path, segment_turns=SEGMENT_TURNS):
+        # engine: the 01_DopeWars contract (e.g. ctx.engine).
+        os.makedirs(path, exist_ok=True)
+        self.engine = engine
+        self.path = path
+        self.segment_turns = segment_turns
+        self.archive = Archive(path)
+
+    async def sync(self):
+        # Archives the logs of every clock up to its current value.
+        # Returns the number of turns archived.
+        res = await self.engine.read_log_retention().call()
+        retention = res.result.turns
+        res = await self.engine.read_game_clock().call()
+        clocks = {GAME: res.result.clock}
+        res = await self.engine.read_clock_mode().call()
+        if res.result.city_clocks:
+            res = await self.engine.read_city_clocks().call()
+            for city, clock in enumerate(res.result.clocks):
+                clocks[stream_of(city)] = clock
+        count = 0
+        for stream, last in clocks.items():
+            first = self.archive.last(stream) + 1
+            if first > last:
+                continue
+            if retention and last - first >= retention:
+                raise Evicted(f'{stream}: clocks {first} to '
+                    f'{last - retention} were overwritten before they '
+                    'were archived.')
+            city = city_of_stream(stream)
+            if city is None:
+                turns = game_clock_turn_logs(self.engine, first, last)
+            else:
+                turns = city_turn_logs(self.engine, city, first, last)
+            self.append(stream, [turn async for turn in turns])
+            count += last - first + 1
+        return count
+
+    def append(self, stream, turns):
+        # Writes the Turns (consecutive clocks after the last archived)
+        # as one member per segment file, then indexes them.
+        by_file = OrderedDict()
+        for turn in turns:
+            name = segment_file(stream, turn.clock, self.segment_turns)
+            by_file.setdefault(name, []).append(turn)
+        entries = []
+        for name, chunk in by_file.items():
+            data = ''.join(json.dumps(dict(clock=t.clock,
+                timestamp=t.timestamp, log=[int(v) for v in t.log])) + '\n'
+                for t in chunk).encode()
+            with open(os.path.join(self.path, name), 'ab') as f:
+                offset = f.tell()
+                f.write(gzip.compress(data))
+                length = f.tell() - offset
+            entries.append(dict(stream=stream, first=chunk[0].clock,
+                last=chunk[-1].clock, file=name, offset=offset,
+                length=length))
+        with open(os.path.join(self.path, INDEX), 'a') as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + '\n')
+        self.archive.refresh()
+
+    def attach(self, ctx):
+        # Archives after every turn of ctx.execute().
+        execute = ctx.execute
+
+        async def archived_execute(account_name, contract_address,
+                selector_name, calldata):
+            res = await execute(account_name, contract_address,
+                selector_name, calldata)
+            if contract_address == self.engine.contract_address and \
+                    selector_name == 'have_turn':
+                await self.sync()
+            return res
+
+        ctx.execute = archived_execute
+        return self
@@ -0,0 +1,67 @@
+# Streaming reader for Module 09 (Wall).
+#
+# Reads the wall a page at a time with read_tags_page so that every
+# call stays within a bounded number of steps. The text of a tag never
+# changes once left, so it is cached by index. Points can change and
+# are only returned when fresh points are requested.
+
+from types import SimpleNamespace
+
+# MUST be consistent with MAX_PAGE_SIZE in contracts/09_Wall.cairo.
+MAX_PAGE_SIZE = 100
+
+
+class WallReader():
+    def __init__(self, wall, page_size=MAX_PAGE_SIZE):
+        if not 0 < page_size <= MAX_PAGE_SIZE:
+            raise ValueError(f'page_size must be in [1, {MAX_PAGE_SIZE}].')
+        # The wall is a StarknetContract (or anything with the same views).
+        self.wall = wall
+        self.page_size = page_size
+        # tag_index -> text.
+        self.texts = {}
+        self.calls = 0
+
+    async def count(self):
+        self.calls += 1
+        res = await self.wall.read_tag_count().call()
+        return res.result.count
+
+    async def read_page(self, offset, limit):
+        self.calls += 1
+        res = await self.wall.read_tags_page(offset, limit).call()
+        tags, points = res.result.tags, res.result.points
+        for i, text in enumerate(tags):
+            self.texts[offset + i] = text
+        return [SimpleNamespace(index=offset + i, text=text, points=p)
+            for i, (text, p) in enumerate(zip(tags, points))]
+
+    async def stream(self, start=0, with_points=True):
+        # Async generator of tags from start to the current end of the
+        # wall. Without points, cached tags are served without a call.
+        end = await self.count()
+        offset = start
+        while offset < end:
+            limit = min(self.page_size, end - offset)
+            page_indices = range(offset, offset + limit)
+            if not with_points and all(
+                    i in self.texts for i in page_indices):
+                for i in page_indices:
+                    yield SimpleNamespace(index=i, text=self.texts[i],
+                        points=None)
+            else:
+                for t in await self.read_page(offset, limit):
+                    if not with_points:
+                        t.points = None
+                    yield t
+            offset += limit
+
+    async def top(self, n):
+        # The n tags with the most points, most points first.
+        self.calls += 1
+        res = await self.wall.read_top_tags(n).call()
+        r = res.result
+        for index, text in zip(r.tag_indices, r.tags):
+            self.texts[index] = text
+        return [SimpleNamespace(index=i, text=text, points=p)
+            for i, text, p in zip(r.tag_indices, r.tags, r.points)]